@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+批准到提交的端到端压测
+
+在进程内启动模拟 CDN 服务（mock_cdn.py），使用临时数据库：逐个批准审核请求并加入预热队列
+（与 Telegram 批准按钮相同的调用），同时由预热调度器按检查间隔从队列提交到模拟服务，
+测量批准吞吐量、提交吞吐量、每个 URL 从批准到提交的延迟，以及频率限制/配额错误次数。
+
+用法:
+    python benchmark_cdn_provider.py                          # 默认 2000 个请求
+    python benchmark_cdn_provider.py --requests 5000 --latency-ms 50 --rate 10 --json
+    python benchmark_cdn_provider.py --quota 500              # 观察配额用完后 URL 留在队列中
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+from typing import Any, Dict, List
+
+os.environ.setdefault("DB_FILE", os.path.join(tempfile.mkdtemp(prefix="bench_cdn_"), "review.db"))
+
+from benchmark_webhook import _percentile
+from cdn_preheat import CDNPreheatService
+from database import ReviewDatabase
+from mock_cdn import MockCDNProvider, MockCDNServer, MockCDNState
+from preheat_history import PreheatHistory
+from preheat_scheduler import PreheatQueue, PreheatScheduler, PushQuota
+
+
+class _TimedProvider(MockCDNProvider):
+    """记录每个 URL 提交成功的时间"""
+
+    def __init__(self, endpoint: str):
+        super().__init__(endpoint)
+        self.submitted_at: Dict[str, float] = {}
+
+    def push_urls(self, urls: List[str]) -> Dict[str, Any]:
+        result = super().push_urls(urls)
+        if result["success"]:
+            now = time.perf_counter()
+            for url in urls:
+                self.submitted_at[url] = now
+        return result
+
+
+async def _approve_all(db: ReviewDatabase, scheduler: PreheatScheduler, request_ids: List[int],
+                       approved_at: Dict[str, float]):
+    """逐个批准并入队（与 Telegram 批准按钮相同），每个请求之后让出事件循环"""
+    for request_id in request_ids:
+        request = db.get_request_by_id(request_id)
+        db.approve_request(request_id, "bench")
+        scheduler.enqueue_requests([request])
+        approved_at[scheduler.service.encode_url(request["cdn_url"])] = time.perf_counter()
+        await asyncio.sleep(0)
+
+
+async def _drain(scheduler: PreheatScheduler, interval: float, approving: asyncio.Task, deadline: float):
+    """按检查间隔提交队列，批准结束且队列为空（或配额用完、超时）时停止"""
+    while True:
+        stats = await scheduler.drain_once()
+        if approving.done() and stats["depth"] == 0:
+            return
+        if approving.done() and scheduler.quota.remaining(time.time()) == 0:
+            return
+        if time.perf_counter() > deadline:
+            return
+        await asyncio.sleep(interval)
+
+
+def run_benchmark(
+    requests: int = 2000,
+    latency_ms: float = 20,
+    rate: int = 50,
+    batch: int = 20,
+    quota: int = 10 ** 9,
+    interval: float = 0.05,
+    timeout: float = 120
+) -> Dict[str, Any]:
+    """执行一次压测并返回统计结果"""
+    db = ReviewDatabase(os.path.join(tempfile.mkdtemp(prefix="bench_cdn_"), "review.db"))
+    request_ids = [
+        db.add_review_request(
+            cdn_url=f"https://cdn.example.com/剧集/压测剧集{i // 10}/Season 01/压测剧集{i // 10} S01E{i % 10 + 1:02d}.mkv",
+            media_name=f"压测剧集{i // 10} S01E{i % 10 + 1:02d}",
+            media_type="Episode"
+        )
+        for i in range(requests)
+    ]
+
+    state = MockCDNState(daily_quota=quota, batch_limit=batch, rate_limit=rate,
+                         latency=latency_ms / 1000, task_seconds=0)
+    with MockCDNServer(state) as server:
+        service = CDNPreheatService(provider_name="mock")
+        service.enabled = True
+        service.batch_size = batch
+        service.provider = _TimedProvider(server.endpoint)
+        service._history = PreheatHistory(db.db_file)
+        scheduler = PreheatScheduler(service, PreheatQueue(db.db_file), PushQuota(),
+                                     burst=requests, pause=0)
+        approved_at: Dict[str, float] = {}
+
+        async def main():
+            approving = asyncio.create_task(_approve_all(db, scheduler, request_ids, approved_at))
+            await _drain(scheduler, interval, approving, time.perf_counter() + timeout)
+            await approving
+
+        started = time.perf_counter()
+        asyncio.run(main())
+        finished = time.perf_counter()
+
+    submitted_at = service.provider.submitted_at
+    latencies = sorted(submitted_at[url] - approved_at[url] for url in submitted_at if url in approved_at)
+    approve_seconds = max(approved_at.values()) - started if approved_at else 0
+    counts = state.stats()["counts"]
+
+    return {
+        "requests": requests,
+        "submitted": len(submitted_at),
+        "left_in_queue": scheduler.queue.depth(),
+        "approvals_per_second": requests / approve_seconds if approve_seconds else 0,
+        "submitted_per_second": len(submitted_at) / (finished - started),
+        "total_seconds": finished - started,
+        "latency_p50_ms": _percentile(latencies, 50) * 1000,
+        "latency_p95_ms": _percentile(latencies, 95) * 1000,
+        "latency_p99_ms": _percentile(latencies, 99) * 1000,
+        "api_calls": counts.get("PushUrlsCache", 0),
+        "throttled": counts.get("RequestLimitExceeded", 0),
+        "quota_errors": counts.get("LimitExceeded.CdnPushExceedDayLimit", 0),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="批准到提交的端到端压测（模拟 CDN 服务）")
+    parser.add_argument("--requests", type=int, default=2000, help="审核请求数量")
+    parser.add_argument("--latency-ms", type=float, default=20, help="模拟 API 延迟（毫秒）")
+    parser.add_argument("--rate", type=int, default=50, help="模拟 API 每秒最多请求数，0 表示不限制")
+    parser.add_argument("--batch", type=int, default=20, help="单次提交的 URL 数量")
+    parser.add_argument("--quota", type=int, default=10 ** 9, help="模拟的每日预热配额")
+    parser.add_argument("--interval", type=float, default=0.05, help="预热队列检查间隔（秒）")
+    parser.add_argument("--timeout", type=float, default=120, help="最长运行时间（秒）")
+    parser.add_argument("--json", action="store_true", help="以 JSON 输出结果")
+    args = parser.parse_args()
+
+    result = run_benchmark(
+        requests=args.requests, latency_ms=args.latency_ms, rate=args.rate, batch=args.batch,
+        quota=args.quota, interval=args.interval, timeout=args.timeout
+    )
+
+    if args.json:
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+        return
+
+    print("=" * 70)
+    print(f"📊 批准到提交压测（{result['requests']} 个请求，模拟延迟 {args.latency_ms:.0f}ms，"
+          f"限制 {args.rate} 次/秒）")
+    print("=" * 70)
+    print(f"  批准吞吐:   {result['approvals_per_second']:>10.0f} 个/秒")
+    print(f"  提交吞吐:   {result['submitted_per_second']:>10.0f} 个/秒（共 {result['submitted']} 个，"
+          f"耗时 {result['total_seconds']:.2f} 秒）")
+    print(f"  批准→提交:  p50 {result['latency_p50_ms']:.0f}ms / p95 {result['latency_p95_ms']:.0f}ms / "
+          f"p99 {result['latency_p99_ms']:.0f}ms")
+    print(f"  API 调用:   {result['api_calls']} 次，频率限制 {result['throttled']} 次，配额错误 {result['quota_errors']} 次")
+    print(f"  留在队列:   {result['left_in_queue']}")
+    print("=" * 70)
+
+
+if __name__ == "__main__":
+    main()
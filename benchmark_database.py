@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+审核数据库查询压测工具
+
+在临时数据库中生成大量审核请求，分别在旧索引（单列 status）和当前索引下
+测量列表与统计查询的耗时，并输出查询计划。
+
+用法:
+    python benchmark_database.py                   # 默认 100 万行
+    python benchmark_database.py --rows 200000 --repeat 20
+    python benchmark_database.py --json
+"""
+import argparse
+import json
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List
+
+from database import ReviewDatabase, url_hash
+
+# 旧版本的索引布局（用于对比）
+LEGACY_INDEXES = {
+    "idx_status": "CREATE INDEX idx_status ON review_requests(status)",
+}
+CURRENT_INDEXES = {
+    "idx_status_created_at": "CREATE INDEX idx_status_created_at ON review_requests(status, created_at)",
+    "idx_status_reviewed_at": "CREATE INDEX idx_status_reviewed_at ON review_requests(status, reviewed_at)",
+}
+
+PLAN_QUERIES = {
+    "list_pending": "SELECT * FROM review_requests WHERE status = 'pending' ORDER BY created_at DESC LIMIT 10",
+    "list_approved": "SELECT * FROM review_requests WHERE status = 'approved' ORDER BY reviewed_at DESC LIMIT 10",
+    "statistics": "SELECT status, COUNT(*) FROM review_requests GROUP BY status",
+}
+
+
+def populate(db_file: str, rows: int, pending_ratio: float = 0.05, seed: int = 42) -> ReviewDatabase:
+    """
+    生成测试数据：按时间顺序写入，大部分已批准，少量待审核/已拒绝
+    """
+    db = ReviewDatabase(db_file)
+    rng = random.Random(seed)
+    start = datetime(2025, 1, 1)
+
+    def generate():
+        for i in range(rows):
+            created = start + timedelta(seconds=i * 30)
+            roll = rng.random()
+            if roll < pending_ratio:
+                status, reviewed = "pending", None
+            elif roll < pending_ratio + 0.05:
+                status, reviewed = "rejected", created + timedelta(minutes=rng.randint(1, 600))
+            else:
+                status, reviewed = "approved", created + timedelta(minutes=rng.randint(1, 600))
+            cdn_url = f"https://cdn.example.com/媒体/{i // 1000}/{i}.mkv"
+            yield (
+                cdn_url,
+                f"压测媒体{i}",
+                "Movie" if i % 3 else "Episode",
+                f"/media/{i}.mkv",
+                f"/mnt/media/{i}.mkv",
+                status,
+                created.strftime("%Y-%m-%d %H:%M:%S"),
+                reviewed.strftime("%Y-%m-%d %H:%M:%S") if reviewed else None,
+                created.strftime("%Y-%m-%d %H:%M:%S"),
+                url_hash(cdn_url),
+            )
+
+    with sqlite3.connect(db_file) as conn:
+        conn.executemany("""
+            INSERT INTO review_requests
+            (cdn_url, media_name, media_type, emby_path, host_path, status, created_at, reviewed_at, notified_at, url_hash)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, generate())
+    return db
+
+
+def use_indexes(db_file: str, indexes: Dict[str, str]):
+    """切换到指定的索引布局（先删除两种布局的全部索引）"""
+    with sqlite3.connect(db_file) as conn:
+        for name in list(LEGACY_INDEXES) + list(CURRENT_INDEXES):
+            conn.execute(f"DROP INDEX IF EXISTS {name}")
+        for sql in indexes.values():
+            conn.execute(sql)
+        conn.execute("ANALYZE")
+
+
+def query_plans(db_file: str) -> Dict[str, List[str]]:
+    """返回各查询的 EXPLAIN QUERY PLAN"""
+    with sqlite3.connect(db_file) as conn:
+        return {
+            name: [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}")]
+            for name, sql in PLAN_QUERIES.items()
+        }
+
+
+def time_call(func: Callable[[], Any], repeat: int) -> float:
+    """重复执行取中位数（毫秒）"""
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def measure(db: ReviewDatabase, repeat: int) -> Dict[str, float]:
+    return {
+        "list_pending_ms": time_call(lambda: db.get_pending_requests(limit=10), repeat),
+        "list_approved_ms": time_call(lambda: db.get_approved_requests(limit=10), repeat),
+        "statistics_ms": time_call(db.get_statistics, repeat),
+    }
+
+
+def measure_deep_page(db: ReviewDatabase, repeat: int, depth: float = 0.9, limit: int = 10) -> Dict[str, float]:
+    """
+    对比深页翻页：键集分页（从边界行继续）与 OFFSET 分页（跳过前面所有行）
+    """
+    with sqlite3.connect(db.db_file) as conn:
+        pending = conn.execute("SELECT COUNT(*) FROM review_requests WHERE status = 'pending'").fetchone()[0]
+        offset = int(pending * depth)
+        row = conn.execute("""
+            SELECT id FROM review_requests WHERE status = 'pending'
+            ORDER BY created_at DESC, id DESC LIMIT 1 OFFSET ?
+        """, (offset,)).fetchone()
+    if row is None:
+        return {}
+
+    def offset_page():
+        with sqlite3.connect(db.db_file) as conn:
+            conn.execute("""
+                SELECT * FROM review_requests WHERE status = 'pending'
+                ORDER BY created_at DESC, id DESC LIMIT ? OFFSET ?
+            """, (limit, offset + 1)).fetchall()
+
+    return {
+        "deep_page_offset": offset,
+        "deep_page_keyset_ms": time_call(lambda: db.get_requests_page("pending", limit, cursor=row[0]), repeat),
+        "deep_page_offset_ms": time_call(offset_page, repeat),
+    }
+
+
+def run_benchmark(rows: int = 1_000_000, repeat: int = 10, db_file: str = None) -> Dict[str, Any]:
+    """生成数据后分别在旧索引和当前索引下测量"""
+    work_dir = None
+    if db_file is None:
+        work_dir = tempfile.mkdtemp(prefix="bench_db_")
+        db_file = os.path.join(work_dir, "review.db")
+
+    started = time.perf_counter()
+    db = populate(db_file, rows)
+    populate_seconds = time.perf_counter() - started
+
+    result = {"rows": rows, "repeat": repeat, "populate_seconds": populate_seconds}
+    for layout, indexes in (("legacy", LEGACY_INDEXES), ("current", CURRENT_INDEXES)):
+        use_indexes(db_file, indexes)
+        result[layout] = {"timings": measure(db, repeat), "plans": query_plans(db_file)}
+    result["pagination"] = measure_deep_page(db, repeat)
+
+    if work_dir:
+        for name in os.listdir(work_dir):
+            os.remove(os.path.join(work_dir, name))
+        os.rmdir(work_dir)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="审核数据库查询压测")
+    parser.add_argument("--rows", type=int, default=1_000_000, help="生成的审核请求行数")
+    parser.add_argument("--repeat", type=int, default=10, help="每个查询的重复次数（取中位数）")
+    parser.add_argument("--db-file", help="使用指定的数据库文件（默认临时文件）")
+    parser.add_argument("--json", action="store_true", help="以 JSON 输出结果")
+    args = parser.parse_args()
+
+    result = run_benchmark(rows=args.rows, repeat=args.repeat, db_file=args.db_file)
+
+    if args.json:
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+        return
+
+    print("=" * 70)
+    print(f"📊 审核数据库查询压测（{result['rows']} 行，生成耗时 {result['populate_seconds']:.1f} 秒）")
+    print("=" * 70)
+    print(f"  {'查询':<20}{'旧索引 (ms)':>15}{'当前索引 (ms)':>18}{'加速':>10}")
+    for key in result["current"]["timings"]:
+        legacy = result["legacy"]["timings"][key]
+        current = result["current"]["timings"][key]
+        speedup = legacy / current if current else float("inf")
+        print(f"  {key[:-3]:<20}{legacy:>15.2f}{current:>18.2f}{speedup:>9.1f}x")
+    pagination = result["pagination"]
+    if pagination:
+        print(f"\n  待审核列表第 {pagination['deep_page_offset']} 行处翻页: "
+              f"键集 {pagination['deep_page_keyset_ms']:.2f} ms / OFFSET {pagination['deep_page_offset_ms']:.2f} ms")
+    print("\n  当前索引的查询计划:")
+    for name, plan in result["current"]["plans"].items():
+        print(f"    {name}: {' / '.join(plan)}")
+    print("=" * 70)
+
+
+if __name__ == "__main__":
+    main()
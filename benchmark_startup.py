@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+服务冷启动耗时测量工具
+
+使用 `python -X importtime` 在子进程中导入 webhook_server，统计导入总耗时和最慢的模块；
+可选启动真实服务，测量从进程启动到健康检查首次返回的时间。
+
+用法:
+    python benchmark_startup.py                       # 测量导入耗时
+    python benchmark_startup.py --runs 5 --top 15     # 多次测量取中位数，显示最慢的 15 个模块
+    python benchmark_startup.py --budget-ms 800       # 导入耗时超过预算时以非零状态退出
+    python benchmark_startup.py --serve               # 同时测量健康检查首次响应时间
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from typing import Any, Dict, List, Optional
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# 启动阶段不应导入的重量级依赖
+HEAVY_MODULES = ("tencentcloud", "telegram")
+
+
+def _isolated_env(work_dir: str, extra: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+    """子进程环境：临时数据库与锁文件，不启用 Telegram，避免访问外部服务"""
+    env = dict(os.environ)
+    env.update({
+        "PYTHONPATH": PROJECT_DIR + os.pathsep + env.get("PYTHONPATH", ""),
+        "DB_FILE": os.path.join(work_dir, "preheat_review.db"),
+        "LEADER_LOCK_FILE": os.path.join(work_dir, "leader.lock"),
+        "LIBRARY_MANIFEST_DB_FILE": os.path.join(work_dir, "library_manifest.db"),
+        "TELEGRAM_REVIEW_ENABLED": "false",
+        "PREHEAT_ENABLED": "false",
+    })
+    if extra:
+        env.update(extra)
+    return env
+
+
+def parse_importtime(output: str) -> List[Dict[str, Any]]:
+    """
+    解析 -X importtime 的输出
+
+    每行格式: "import time: <self us> | <cumulative us> | <缩进的模块名>"
+
+    Returns:
+        模块列表，包含 module、self_us、cumulative_us、depth
+    """
+    records = []
+    for line in output.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3:
+            continue
+        try:
+            self_us = int(parts[0].strip())
+            cumulative_us = int(parts[1].strip())
+        except ValueError:
+            # 表头行
+            continue
+        name = parts[2].rstrip()
+        stripped = name.lstrip()
+        records.append({
+            "module": stripped,
+            "self_us": self_us,
+            "cumulative_us": cumulative_us,
+            "depth": (len(name) - len(stripped)) // 2,
+        })
+    return records
+
+
+def measure_import(module: str = "webhook_server", top: int = 10) -> Dict[str, Any]:
+    """
+    在全新子进程中导入模块一次
+
+    Returns:
+        导入耗时、最慢模块以及是否导入了重量级依赖
+    """
+    with tempfile.TemporaryDirectory(prefix="startup_") as work_dir:
+        code = (
+            "import sys, json, os; "
+            f"import {module}; "
+            f"print(json.dumps({{'heavy': sorted({{m.split('.')[0] for m in sys.modules}} & {set(HEAVY_MODULES)!r}), "
+            "'db_created': os.path.exists(os.environ['DB_FILE'])}))"
+        )
+        started = time.perf_counter()
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", code],
+            cwd=work_dir,
+            env=_isolated_env(work_dir),
+            capture_output=True,
+            text=True
+        )
+        wall_ms = (time.perf_counter() - started) * 1000
+
+    if proc.returncode != 0:
+        raise RuntimeError(f"导入 {module} 失败:\n{proc.stderr[-2000:]}")
+
+    records = parse_importtime(proc.stderr)
+    target = next((r for r in records if r["module"] == module and r["depth"] == 0), None)
+    slowest = sorted(records, key=lambda r: r["self_us"], reverse=True)[:top]
+    status = json.loads(proc.stdout.strip().splitlines()[-1])
+
+    return {
+        "module": module,
+        "import_ms": (target["cumulative_us"] if target else 0) / 1000,
+        "process_wall_ms": wall_ms,
+        "modules_imported": len(records),
+        "heavy_modules": status["heavy"],
+        "db_created_at_import": status["db_created"],
+        "slowest": [
+            {"module": r["module"], "self_ms": r["self_us"] / 1000, "cumulative_ms": r["cumulative_us"] / 1000}
+            for r in slowest
+        ],
+    }
+
+
+def measure_time_to_health(port: int, timeout: float = 30.0) -> Dict[str, Any]:
+    """
+    启动真实服务，测量从进程启动到健康检查首次返回 200 的时间
+    """
+    url = f"http://127.0.0.1:{port}/"
+    with tempfile.TemporaryDirectory(prefix="startup_") as work_dir:
+        started = time.perf_counter()
+        proc = subprocess.Popen(
+            [sys.executable, os.path.join(PROJECT_DIR, "webhook_server.py")],
+            cwd=work_dir,
+            env=_isolated_env(work_dir, {"SERVER_HOST": "127.0.0.1", "SERVER_PORT": str(port)}),
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL
+        )
+        try:
+            while time.perf_counter() - started < timeout:
+                if proc.poll() is not None:
+                    raise RuntimeError(f"服务进程提前退出，返回码 {proc.returncode}")
+                try:
+                    with urllib.request.urlopen(url, timeout=1) as resp:
+                        body = json.loads(resp.read())
+                        return {
+                            "time_to_health_ms": (time.perf_counter() - started) * 1000,
+                            "ready_at_first_health": body.get("ready"),
+                        }
+                except OSError:
+                    time.sleep(0.02)
+            raise RuntimeError(f"{timeout} 秒内健康检查未响应")
+        finally:
+            proc.terminate()
+            try:
+                proc.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+
+
+def run_benchmark(runs: int = 3, top: int = 10, serve: bool = False, port: int = 18899) -> Dict[str, Any]:
+    """多次测量取中位数"""
+    samples = [measure_import(top=top) for _ in range(runs)]
+    result = dict(samples[-1])
+    result["runs"] = runs
+    result["import_ms"] = statistics.median(s["import_ms"] for s in samples)
+    result["process_wall_ms"] = statistics.median(s["process_wall_ms"] for s in samples)
+    if serve:
+        result.update(measure_time_to_health(port))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="服务冷启动耗时测量")
+    parser.add_argument("--runs", type=int, default=3, help="测量次数（取中位数）")
+    parser.add_argument("--top", type=int, default=10, help="显示自身耗时最长的模块数量")
+    parser.add_argument("--serve", action="store_true", help="启动服务并测量健康检查首次响应时间")
+    parser.add_argument("--port", type=int, default=18899, help="--serve 使用的端口")
+    parser.add_argument("--json", action="store_true", help="以 JSON 输出结果")
+    parser.add_argument("--budget-ms", type=float, help="导入耗时超过该值时以非零状态退出")
+    args = parser.parse_args()
+
+    result = run_benchmark(runs=args.runs, top=args.top, serve=args.serve, port=args.port)
+
+    if args.json:
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+    else:
+        print("=" * 60)
+        print("🚀 冷启动耗时")
+        print("=" * 60)
+        print(f"  导入 {result['module']}: {result['import_ms']:.1f} ms (中位数，{result['runs']} 次)")
+        print(f"  进程总耗时:   {result['process_wall_ms']:.1f} ms")
+        print(f"  导入模块数:   {result['modules_imported']}")
+        print(f"  重量级依赖:   {', '.join(result['heavy_modules']) or '无'}")
+        print(f"  导入时建库:   {'是' if result['db_created_at_import'] else '否'}")
+        if 'time_to_health_ms' in result:
+            print(f"  健康检查首次响应: {result['time_to_health_ms']:.1f} ms (ready={result['ready_at_first_health']})")
+        print(f"\n  自身耗时最长的模块:")
+        for item in result["slowest"]:
+            print(f"    {item['self_ms']:8.1f} ms  {item['module']}")
+        print("=" * 60)
+
+    failed = False
+    if args.budget_ms is not None and result["import_ms"] > args.budget_ms:
+        print(f"❌ 导入耗时 {result['import_ms']:.1f} ms 超过预算 {args.budget_ms} ms")
+        failed = True
+    if result["heavy_modules"]:
+        print(f"⚠️  启动时导入了重量级依赖: {', '.join(result['heavy_modules'])}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
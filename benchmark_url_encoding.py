@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+URL 编码压测工具
+
+对比两种编码方式处理大量中文路径 URL 的速度：
+- full:   每个 URL 都用 urlparse 解析并编码完整路径（旧版本的 encode_url）
+- prefix: 缓存目录前缀的编码结果，只编码文件名（CDNPreheatService.encode_urls）
+
+用法:
+    python benchmark_url_encoding.py                 # 默认 10 万个 URL
+    python benchmark_url_encoding.py --urls 500000 --json
+    python benchmark_url_encoding.py --shuffled      # 打乱顺序（同一目录的 URL 不相邻）
+"""
+import argparse
+import json
+import time
+from typing import Any, Dict
+
+from benchmark_url_index import generate_urls
+from cdn_preheat import CDNPreheatService, _encode_prefix, _quote_url
+
+
+def run_benchmark(count: int = 100_000, shuffled: bool = False, repeat: int = 3) -> Dict[str, Any]:
+    """分别测量两种编码方式（取 repeat 次中最快的一次），并校验结果一致"""
+    urls = list(generate_urls(count, shuffled=shuffled))
+    service = CDNPreheatService()
+
+    def best_of(func) -> float:
+        best = None
+        for _ in range(repeat):
+            _encode_prefix.cache_clear()
+            started = time.perf_counter()
+            func()
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        return best
+
+    full_seconds = best_of(lambda: [_quote_url(url) for url in urls])
+    prefix_seconds = best_of(lambda: service.encode_urls(urls))
+    cache = _encode_prefix.cache_info()
+
+    _encode_prefix.cache_clear()
+    identical = service.encode_urls(urls) == [_quote_url(url) for url in urls]
+
+    return {
+        "urls": count,
+        "shuffled": shuffled,
+        "identical": identical,
+        "full_urls_per_second": count / full_seconds,
+        "prefix_urls_per_second": count / prefix_seconds,
+        "speedup": full_seconds / prefix_seconds,
+        "prefix_cache_hits": cache.hits,
+        "prefix_cache_misses": cache.misses,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="URL 编码压测")
+    parser.add_argument("--urls", type=int, default=100_000, help="URL 数量")
+    parser.add_argument("--shuffled", action="store_true", help="打乱 URL 顺序（默认同一目录的 URL 相邻）")
+    parser.add_argument("--repeat", type=int, default=3, help="重复次数（取最快的一次）")
+    parser.add_argument("--json", action="store_true", help="以 JSON 输出结果")
+    args = parser.parse_args()
+
+    result = run_benchmark(count=args.urls, shuffled=args.shuffled, repeat=args.repeat)
+
+    if args.json:
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+        return
+
+    print("=" * 70)
+    order = "乱序" if result["shuffled"] else "按目录顺序"
+    print(f"📊 URL 编码压测（{result['urls']} 个中文路径 URL，{order}）")
+    print("=" * 70)
+    print(f"  完整编码:   {result['full_urls_per_second']:>12.0f} 个/秒")
+    print(f"  前缀缓存:   {result['prefix_urls_per_second']:>12.0f} 个/秒（{result['speedup']:.1f}x）")
+    print(f"  前缀缓存命中: {result['prefix_cache_hits']} / 未命中: {result['prefix_cache_misses']}")
+    print(f"  结果一致:   {'✅' if result['identical'] else '❌'}")
+    print("=" * 70)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""
+URL 去重索引压测工具
+
+对比两种去重方式在大量数据下的索引大小、写入吞吐和查重速度：
+- unique_url: 旧版本的 UNIQUE(cdn_url) 唯一索引（索引中保存完整 URL）
+- url_hash:   64 位 URL 哈希索引，查重时再比较完整 URL
+
+用法:
+    python benchmark_url_index.py                  # 默认 200 万行
+    python benchmark_url_index.py --rows 500000 --json
+    python benchmark_url_index.py --sequential     # 按路径顺序写入
+"""
+import argparse
+import json
+import math
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from typing import Any, Dict, Iterator
+
+from database import ReviewDatabase, _normalized_url_hash, normalize_url
+
+# 与审核请求表一致的主要列
+_TABLE_COLUMNS = """
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    cdn_url TEXT NOT NULL,
+    media_name TEXT NOT NULL,
+    media_type TEXT NOT NULL,
+    status TEXT DEFAULT 'pending',
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+"""
+
+LAYOUTS = {
+    "unique_url": [
+        f"CREATE TABLE review_requests ({_TABLE_COLUMNS}, UNIQUE(cdn_url))",
+    ],
+    "url_hash": [
+        f"CREATE TABLE review_requests ({_TABLE_COLUMNS}, url_hash INTEGER)",
+        "CREATE INDEX idx_url_hash ON review_requests(url_hash)",
+    ],
+}
+
+
+def _url(i: int) -> str:
+    series = f"某某电视剧第{i // 240}部"
+    season = (i // 24) % 10 + 1
+    episode = i % 24 + 1
+    return (
+        f"https://cdn.example.com/媒体库/电视剧/国产剧/{series} (2024)/Season {season:02d}/"
+        f"{series} - S{season:02d}E{episode:02d} - 第{episode}集 [1080p][{i}].mkv"
+    )
+
+
+def generate_urls(count: int, shuffled: bool = True) -> Iterator[str]:
+    """
+    生成接近真实媒体库的 URL（中文目录、较长的文件名）
+
+    shuffled 时按乘法置换打乱顺序：Webhook 来自多个媒体库交替到达，按路径有序写入会让
+    UNIQUE(cdn_url) 每次都追加到索引末尾，结果偏乐观
+    """
+    step = _permutation_step(count) if shuffled else 1
+    for i in range(count):
+        yield _url(i * step % count)
+
+
+def _permutation_step(count: int) -> int:
+    """接近 count 黄金分割点且与 count 互质的步长，i * step % count 即为一个置换"""
+    step = max(1, int(count * 0.618))
+    while math.gcd(step, count) != 1:
+        step += 1
+    return step
+
+
+def _insert_unique_url(cursor: sqlite3.Cursor, url: str) -> bool:
+    try:
+        cursor.execute(
+            "INSERT INTO review_requests (cdn_url, media_name, media_type) VALUES (?, ?, 'Episode')",
+            (url, url[-40:])
+        )
+        return True
+    except sqlite3.IntegrityError:
+        return False
+
+
+def _insert_url_hash(cursor: sqlite3.Cursor, url: str) -> bool:
+    normalized = normalize_url(url)
+    hash_value = _normalized_url_hash(normalized)
+    if ReviewDatabase._url_exists(cursor, "review_requests", normalized, hash_value):
+        return False
+    cursor.execute(
+        "INSERT INTO review_requests (cdn_url, media_name, media_type, url_hash) VALUES (?, ?, 'Episode', ?)",
+        (url, url[-40:], hash_value)
+    )
+    return True
+
+
+def _exists_unique_url(cursor: sqlite3.Cursor, url: str) -> bool:
+    cursor.execute("SELECT 1 FROM review_requests WHERE cdn_url = ?", (url,))
+    return cursor.fetchone() is not None
+
+
+def _exists_url_hash(cursor: sqlite3.Cursor, url: str) -> bool:
+    normalized = normalize_url(url)
+    return ReviewDatabase._url_exists(cursor, "review_requests", normalized, _normalized_url_hash(normalized))
+
+
+INSERTERS = {"unique_url": _insert_unique_url, "url_hash": _insert_url_hash}
+LOOKUPS = {"unique_url": _exists_unique_url, "url_hash": _exists_url_hash}
+
+
+def index_sizes(conn: sqlite3.Connection) -> Dict[str, int]:
+    """各表/索引占用的字节数（需要 SQLite 编译时启用 dbstat）"""
+    try:
+        return dict(conn.execute("SELECT name, SUM(pgsize) FROM dbstat GROUP BY name").fetchall())
+    except sqlite3.OperationalError:
+        return {}
+
+
+def run_layout(layout: str, db_file: str, rows: int, lookups: int,
+               shuffled: bool = True, batch: int = 1000) -> Dict[str, Any]:
+    """在指定布局下写入 rows 行，再随机查重 lookups 次"""
+    conn = sqlite3.connect(db_file)
+    conn.execute("PRAGMA journal_mode=WAL")
+    for sql in LAYOUTS[layout]:
+        conn.execute(sql)
+    conn.commit()
+
+    insert = INSERTERS[layout]
+    cursor = conn.cursor()
+    urls = generate_urls(rows, shuffled)
+
+    started = time.perf_counter()
+    inserted = 0
+    while True:
+        chunk = [url for _, url in zip(range(batch), urls)]
+        if not chunk:
+            break
+        cursor.execute("BEGIN")
+        inserted += sum(1 for url in chunk if insert(cursor, url))
+        conn.commit()
+    insert_seconds = time.perf_counter() - started
+
+    # 查重：一半已存在（均匀抽样），一半不存在，打乱顺序避免顺序访问
+    step = max(1, rows // max(1, lookups // 2))
+    probe = [_url(i) for i in range(0, rows, step)][:lookups // 2]
+    probe += [url.replace(".mkv", ".missing.mkv") for url in probe]
+    random.Random(7).shuffle(probe)
+    exists = LOOKUPS[layout]
+
+    started = time.perf_counter()
+    hits = sum(1 for url in probe if exists(cursor, url))
+    lookup_seconds = time.perf_counter() - started
+
+    sizes = index_sizes(conn)
+    conn.close()
+
+    index_name = "sqlite_autoindex_review_requests_1" if layout == "unique_url" else "idx_url_hash"
+    return {
+        "inserted": inserted,
+        "insert_rows_per_second": inserted / insert_seconds if insert_seconds else 0.0,
+        "lookups": len(probe),
+        "lookup_hits": hits,
+        "lookups_per_second": len(probe) / lookup_seconds if lookup_seconds else 0.0,
+        "table_bytes": sizes.get("review_requests"),
+        "dedupe_index_bytes": sizes.get(index_name),
+        "file_bytes": os.path.getsize(db_file),
+    }
+
+
+def run_benchmark(rows: int = 2_000_000, lookups: int = 20_000, shuffled: bool = True) -> Dict[str, Any]:
+    """依次测量两种布局"""
+    result = {"rows": rows, "shuffled": shuffled}
+    with tempfile.TemporaryDirectory(prefix="bench_url_") as work_dir:
+        for layout in LAYOUTS:
+            result[layout] = run_layout(layout, os.path.join(work_dir, f"{layout}.db"), rows, lookups, shuffled)
+    return result
+
+
+def _mb(value) -> str:
+    return f"{value / 1024 / 1024:.1f} MB" if value is not None else "n/a"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="URL 去重索引压测")
+    parser.add_argument("--rows", type=int, default=2_000_000, help="写入的行数")
+    parser.add_argument("--lookups", type=int, default=20_000, help="查重次数（一半命中）")
+    parser.add_argument("--sequential", action="store_true", help="按路径顺序写入（默认打乱顺序）")
+    parser.add_argument("--json", action="store_true", help="以 JSON 输出结果")
+    args = parser.parse_args()
+
+    result = run_benchmark(rows=args.rows, lookups=args.lookups, shuffled=not args.sequential)
+
+    if args.json:
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+        return
+
+    print("=" * 70)
+    order = "乱序写入" if result["shuffled"] else "顺序写入"
+    print(f"📊 URL 去重索引压测（{result['rows']} 行，{order}）")
+    print("=" * 70)
+    print(f"  {'':<22}{'UNIQUE(cdn_url)':>20}{'url_hash':>20}")
+    legacy, hashed = result["unique_url"], result["url_hash"]
+    print(f"  {'去重索引大小':<18}{_mb(legacy['dedupe_index_bytes']):>20}{_mb(hashed['dedupe_index_bytes']):>20}")
+    print(f"  {'表大小':<19}{_mb(legacy['table_bytes']):>20}{_mb(hashed['table_bytes']):>20}")
+    print(f"  {'文件大小':<18}{_mb(legacy['file_bytes']):>20}{_mb(hashed['file_bytes']):>20}")
+    print(f"  {'写入 (行/秒)':<17}{legacy['insert_rows_per_second']:>20.0f}{hashed['insert_rows_per_second']:>20.0f}")
+    print(f"  {'查重 (次/秒)':<17}{legacy['lookups_per_second']:>20.0f}{hashed['lookups_per_second']:>20.0f}")
+    print("=" * 70)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,373 @@
+#!/usr/bin/env python3
+"""
+Webhook 回放压测工具
+
+在进程内把采集到的 Webhook 请求（JSON Lines）回放到 ASGI 应用，
+Telegram 与腾讯云 CDN 均使用桩对象，不需要启动服务或任何外部账号。
+
+用法:
+    python benchmark_webhook.py                              # 使用随机生成的请求
+    python benchmark_webhook.py --payloads captured.jsonl    # 回放采集的请求
+    python benchmark_webhook.py -n 2000 -c 32 --max-p95-ms 20
+    python benchmark_webhook.py --backend memory             # 不访问磁盘，只测处理流程
+
+采集文件格式（每行一个 JSON，WEBHOOK_CAPTURE_FILE 即按此格式写入）:
+    {"captured_at": "...", "path": "/emby", "body": "<原始请求体>"}
+也可以每行直接是一个 Emby Webhook JSON。
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+from cdn_provider import CDNProvider
+
+
+# ==================== 外部服务桩 ====================
+
+class _StubMessage:
+    def __init__(self, message_id: int):
+        self.message_id = message_id
+
+
+class StubTelegramBot:
+    """模拟 telegram.Bot，只记录发送次数"""
+
+    def __init__(self):
+        self.sent = 0
+
+    async def send_message(self, **kwargs):
+        self.sent += 1
+        return _StubMessage(self.sent)
+
+    async def edit_message_text(self, **kwargs):
+        return True
+
+    async def edit_message_reply_markup(self, **kwargs):
+        return True
+
+
+class StubCdnProvider(CDNProvider):
+    """进程内的 CDN 服务商桩对象（不发起网络请求）"""
+
+    name = "stub"
+
+    def __init__(self):
+        self.calls = 0
+
+    def push_urls(self, urls):
+        self.calls += 1
+        return {"success": True, "message": "预热任务已提交", "urls": urls, "task_id": f"stub-task-{self.calls}"}
+
+    def describe_push_task(self, task_id):
+        return {"success": False, "message": "未找到任务信息"}
+
+    def describe_push_quota(self, area):
+        return {"success": True, "area": area, "total": 100000, "available": 100000, "batch": 20}
+
+    def purge_urls(self, urls):
+        return {"success": True, "message": "刷新任务已提交", "urls": urls, "task_id": f"stub-purge-{self.calls}"}
+
+
+# ==================== 请求数据 ====================
+
+def load_payloads(path: str) -> List[bytes]:
+    """读取采集文件，返回原始请求体列表"""
+    bodies = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                print(f"⚠️  跳过无法解析的第 {line_no} 行")
+                continue
+
+            body = record.get("body", record) if isinstance(record, dict) else record
+            if not isinstance(body, str):
+                body = json.dumps(body, ensure_ascii=False)
+            bodies.append(body.encode('utf-8'))
+    return bodies
+
+
+def generate_payloads(count: int, seed: int = 42) -> List[bytes]:
+    """生成随机的电影/剧集 Webhook 请求"""
+    rng = random.Random(seed)
+    bodies = []
+    for i in range(count):
+        if rng.random() < 0.5:
+            name = f"压测电影{i}"
+            item = {
+                "Name": name,
+                "Type": "Movie",
+                "Path": f"/media/电影/{name} (2024)/{name}.mkv",
+                "Id": f"bench_{i}",
+                "ProductionYear": 2024,
+            }
+        else:
+            series = f"压测剧集{i // 10}"
+            episode = i % 10 + 1
+            item = {
+                "Name": f"{series} S01E{episode:02d}",
+                "Type": "Episode",
+                "Path": f"/media/剧集/{series}/Season 01/{series} - S01E{episode:02d}.mkv",
+                "Id": f"bench_{i}",
+                "ProductionYear": 2024,
+            }
+        payload = {"Event": "library.new", "Item": item, "Server": {"Name": "Bench"}}
+        bodies.append(json.dumps(payload, ensure_ascii=False).encode('utf-8'))
+    return bodies
+
+
+def make_unique(body: bytes, index: int) -> bytes:
+    """给媒体路径加上序号，避免回放时全部命中去重分支"""
+    try:
+        data = json.loads(body)
+    except json.JSONDecodeError:
+        return body
+
+    target = data.get("body_json", data)
+    item = target.get("Item") if isinstance(target, dict) else None
+    if isinstance(item, dict) and item.get("Path"):
+        root, ext = os.path.splitext(item["Path"])
+        item["Path"] = f"{root}.r{index}{ext}"
+    return json.dumps(data, ensure_ascii=False).encode('utf-8')
+
+
+# ==================== 压测 ====================
+
+def _percentile(sorted_values: List[float], percent: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(percent / 100 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+@contextmanager
+def bench_app(log_level: str, log_file: Optional[str] = None, backend: str = "sqlite"):
+    """
+    准备被测应用：临时数据库（或内存存储）、桩对象、日志重定向
+
+    退出时恢复根日志配置、全局审核存储，以及 Telegram Bot 和 CDN 服务上被替换的属性，
+    在测试进程中运行压测不会影响之后的测试
+    """
+    # 必须在导入 webhook_server 之前替换日志处理器，否则会写入项目目录下的 webhook.log
+    root = logging.getLogger()
+    saved_logging = (root.handlers[:], root.level)
+    handler = logging.FileHandler(log_file, encoding='utf-8') if log_file else logging.NullHandler()
+    handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+    root.handlers = [handler]
+    root.setLevel(getattr(logging, log_level.upper(), logging.WARNING))
+
+    import database
+    import webhook_server
+    from telegram_bot import telegram_bot
+    from cdn_preheat import cdn_service
+
+    saved_store = database._db_instance
+    saved_stubs = (telegram_bot.bot, cdn_service.provider, cdn_service.enabled)
+
+    if backend == "sqlite":
+        store = database.ReviewDatabase(os.path.join(tempfile.mkdtemp(prefix="bench_"), "review.db"))
+    else:
+        # 不访问磁盘，只测量处理流程本身
+        store = database.create_store(backend)
+    database.use_store(store)
+
+    telegram_bot.bot = StubTelegramBot()
+    cdn_service.provider = StubCdnProvider()
+    cdn_service.enabled = True
+    try:
+        yield webhook_server.app
+    finally:
+        telegram_bot.bot, cdn_service.provider, cdn_service.enabled = saved_stubs
+        database.use_store(saved_store)
+        root.handlers, level = saved_logging
+        root.setLevel(level)
+        handler.close()
+
+
+async def replay(app, bodies: List[bytes], concurrency: int, path: str = "/emby") -> Dict[str, Any]:
+    """按指定并发回放请求，返回每个请求的耗时与状态码统计"""
+    import httpx
+
+    latencies: List[float] = []
+    status_counts: Dict[int, int] = {}
+    next_index = 0
+
+    transport = httpx.ASGITransport(app=app, client=("127.0.0.1", 50000))
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+
+        async def worker():
+            nonlocal next_index
+            while next_index < len(bodies):
+                body = bodies[next_index]
+                next_index += 1
+                start = time.perf_counter()
+                response = await client.post(
+                    path, content=body, headers={"Content-Type": "application/json"}
+                )
+                latencies.append(time.perf_counter() - start)
+                status_counts[response.status_code] = status_counts.get(response.status_code, 0) + 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "concurrency": concurrency,
+        "elapsed_seconds": elapsed,
+        "throughput_rps": len(latencies) / elapsed if elapsed else 0.0,
+        "p50_ms": _percentile(latencies, 50) * 1000,
+        "p95_ms": _percentile(latencies, 95) * 1000,
+        "p99_ms": _percentile(latencies, 99) * 1000,
+        "max_ms": (latencies[-1] if latencies else 0.0) * 1000,
+        "status_counts": status_counts,
+    }
+
+
+async def measure_allocations(app, bodies: List[bytes]) -> Dict[str, Any]:
+    """串行回放一小批请求，用 tracemalloc 统计内存分配"""
+    tracemalloc.start()
+    try:
+        before, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        await replay(app, bodies, concurrency=1)
+        after, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    count = max(1, len(bodies))
+    return {
+        "alloc_requests": len(bodies),
+        "alloc_peak_kb": (peak - before) / 1024,
+        "alloc_retained_bytes_per_request": (after - before) / count,
+    }
+
+
+def run_benchmark(
+    bodies: List[bytes],
+    concurrency: int = 16,
+    unique: bool = True,
+    alloc_sample: int = 200,
+    warmup: int = 20,
+    log_level: str = "WARNING",
+    log_file: Optional[str] = None,
+    backend: str = "sqlite"
+) -> Dict[str, Any]:
+    """
+    执行一次完整压测
+
+    Args:
+        bodies: 原始请求体列表
+        concurrency: 并发数
+        unique: 是否给每个请求的媒体路径加序号（避免去重）
+        alloc_sample: 内存分配统计使用的请求数，0 表示不统计
+        warmup: 预热请求数（不计入结果）
+        log_level: 被测应用的日志级别
+        log_file: 被测应用的日志文件（默认丢弃日志）
+        backend: 审核存储引擎（sqlite 或 memory）
+
+    Returns:
+        压测结果字典（stored 为压测结束时存储中的审核请求数）
+    """
+    if unique:
+        bodies = [make_unique(body, i) for i, body in enumerate(bodies)]
+        warmup_bodies = [make_unique(body, -i - 1) for i, body in enumerate(bodies[:warmup])]
+    else:
+        warmup_bodies = bodies[:warmup]
+
+    async def _run(app):
+        if warmup_bodies:
+            await replay(app, warmup_bodies, concurrency)
+        result = await replay(app, bodies, concurrency)
+        if alloc_sample:
+            sample = bodies[:alloc_sample]
+            if unique:
+                sample = [make_unique(body, 10_000_000 + i) for i, body in enumerate(sample)]
+            result.update(await measure_allocations(app, sample))
+        result["backend"] = backend
+        from database import get_db
+        result["stored"] = get_db().get_statistics()["total"]
+        return result
+
+    with bench_app(log_level, log_file, backend) as app:
+        return asyncio.run(_run(app))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Webhook 回放压测")
+    parser.add_argument("--payloads", help="采集的请求文件（JSON Lines），不指定则随机生成")
+    parser.add_argument("-n", "--requests", type=int, default=1000, help="请求总数（回放文件时循环使用）")
+    parser.add_argument("-c", "--concurrency", type=int, default=16, help="并发数")
+    parser.add_argument("--no-unique", action="store_true", help="不改写媒体路径（测试去重分支）")
+    parser.add_argument("--alloc-sample", type=int, default=200, help="内存分配统计的请求数，0 关闭")
+    parser.add_argument("--log-level", default="WARNING", help="被测应用日志级别，INFO 可测量完整日志开销")
+    parser.add_argument("--log-file", help="被测应用日志写入的文件（默认丢弃）")
+    parser.add_argument("--backend", default="sqlite", choices=["sqlite", "memory"],
+                        help="审核存储引擎，memory 不访问磁盘")
+    parser.add_argument("--json", action="store_true", help="以 JSON 输出结果")
+    parser.add_argument("--max-p95-ms", type=float, help="p95 延迟超过该值时以非零状态退出")
+    parser.add_argument("--min-rps", type=float, help="吞吐量低于该值时以非零状态退出")
+    args = parser.parse_args()
+
+    if args.payloads:
+        source = load_payloads(args.payloads)
+        if not source:
+            print("❌ 采集文件中没有可用的请求")
+            sys.exit(1)
+        bodies = [source[i % len(source)] for i in range(args.requests)]
+    else:
+        bodies = generate_payloads(args.requests)
+
+    result = run_benchmark(
+        bodies,
+        concurrency=args.concurrency,
+        unique=not args.no_unique,
+        alloc_sample=args.alloc_sample,
+        log_level=args.log_level,
+        log_file=args.log_file,
+        backend=args.backend
+    )
+
+    if args.json:
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+    else:
+        print("=" * 60)
+        print("📊 Webhook 回放压测结果")
+        print("=" * 60)
+        print(f"  请求数:     {result['requests']}  (并发 {result['concurrency']}, 存储 {result['backend']})")
+        print(f"  总耗时:     {result['elapsed_seconds']:.2f} 秒")
+        print(f"  吞吐量:     {result['throughput_rps']:.1f} req/s")
+        print(f"  p50 / p95 / p99: {result['p50_ms']:.2f} / {result['p95_ms']:.2f} / {result['p99_ms']:.2f} ms")
+        print(f"  最大延迟:   {result['max_ms']:.2f} ms")
+        print(f"  状态码:     {result['status_counts']}")
+        if 'alloc_peak_kb' in result:
+            print(f"  内存峰值:   {result['alloc_peak_kb']:.1f} KB ({result['alloc_requests']} 个请求)")
+            print(f"  每请求常驻: {result['alloc_retained_bytes_per_request']:.0f} 字节")
+        print("=" * 60)
+
+    failed = False
+    if args.max_p95_ms is not None and result['p95_ms'] > args.max_p95_ms:
+        print(f"❌ p95 延迟 {result['p95_ms']:.2f} ms 超过阈值 {args.max_p95_ms} ms")
+        failed = True
+    if args.min_rps is not None and result['throughput_rps'] < args.min_rps:
+        print(f"❌ 吞吐量 {result['throughput_rps']:.1f} req/s 低于阈值 {args.min_rps} req/s")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,394 @@
+"""
+文件替换后刷新 CDN 缓存
+在原路径替换或升级文件（洗版）时，CDN 节点上仍然缓存着旧文件，而同一 URL 的审核请求已经存在，
+新的入库事件不会再形成审核请求。这里按 CDN URL 记录文件的大小和修改时间（file_signatures 表），
+已知 URL 的大小或修改时间变化时判定为替换：
+
+- URL（及其在其他域名上的副本）写入持久化的刷新队列（purge_queue 表），由预热调度器在提交预热之前
+  按账号分批调用 PurgeUrlsCache，与预热共用批次大小、批次间隔和 API 限流处理
+- 刷新成功后删除这些 URL 的预热记录，已批准预热过的 URL 以 PREHEAT_PRIORITY_REPLACED 的优先级
+  重新加入预热队列
+- 没有预热队列时（未启用队列、edge 模式）同样写入刷新队列，由 Leader 的 PurgeDrainer 按相同的批次和间隔
+  刷新，成功后直接重新预热；收到 Webhook 的 worker 不直接调用 CDN API
+"""
+import asyncio
+import logging
+import os
+import sqlite3
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import config
+import metrics
+from cdn_accounts import DEFAULT_ACCOUNT
+from circuit_breaker import OPEN, is_circuit_open
+from database import _normalized_url_hash, normalize_url
+
+logger = logging.getLogger(__name__)
+
+
+def file_signature(host_path: Optional[str], item_data: Optional[Dict[str, Any]] = None
+                   ) -> Optional[Tuple[int, float]]:
+    """
+    文件的 (大小, 修改时间)
+
+    Args:
+        host_path: 宿主机路径
+        item_data: Emby 媒体项目数据，服务读不到媒体文件时使用其中的 Size（修改时间记为 0）
+
+    Returns:
+        读不到文件且 Emby 没有提供大小时返回 None
+    """
+    if host_path:
+        try:
+            st = os.stat(host_path)
+            return st.st_size, st.st_mtime
+        except OSError:
+            pass
+    size = (item_data or {}).get("Size")
+    if isinstance(size, int) and size > 0:
+        return size, 0.0
+    return None
+
+
+class FileSignatures:
+    """每个 CDN URL 最近一次看到的文件大小和修改时间"""
+
+    def __init__(self, db_file: str):
+        """
+        Args:
+            db_file: 审核数据库文件（表由数据库迁移创建）
+        """
+        self.db_file = db_file
+
+    def observe(self, cdn_url: str, size: int, mtime: float) -> bool:
+        """
+        记录 URL 当前的文件签名
+
+        Returns:
+            URL 之前有记录且大小或修改时间发生变化时返回 True（第一次看到的 URL 返回 False）
+        """
+        normalized = normalize_url(cdn_url)
+        hash_value = _normalized_url_hash(normalized)
+        with sqlite3.connect(self.db_file) as conn:
+            # 读取和写入在同一个写事务中，多个 worker 同时收到同一事件时只有一个判定为替换
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT cdn_url, size, mtime FROM file_signatures WHERE url_hash = ?", (hash_value,)
+            ).fetchone()
+            # 哈希相同时比较完整 URL，碰撞时按第一次看到处理
+            known = row is not None and row[0] == normalized
+            # Emby 只提供大小时修改时间为 0，不参与比较
+            replaced = known and (row[1] != size or (row[2] and mtime and row[2] != mtime))
+            conn.execute("""
+                INSERT OR REPLACE INTO file_signatures (url_hash, cdn_url, size, mtime, seen_at)
+                VALUES (?, ?, ?, ?, ?)
+            """, (hash_value, normalized, size, mtime or (row[2] if known else 0.0), time.time()))
+            conn.commit()
+        return bool(replaced)
+
+
+def was_approved(db_file: str, cdn_url: str) -> bool:
+    """URL 的审核请求是否已批准（包括已归档的请求）"""
+    normalized = normalize_url(cdn_url)
+    hash_value = _normalized_url_hash(normalized)
+    with sqlite3.connect(db_file) as conn:
+        for table in ("review_requests", "review_tombstones"):
+            for url, status in conn.execute(
+                f"SELECT cdn_url, status FROM {table} WHERE url_hash = ?", (hash_value,)
+            ):
+                if status == "approved" and normalize_url(url) == normalized:
+                    return True
+    return False
+
+
+class PurgeQueue:
+    """持久化的刷新队列（按入队顺序出队，同一 URL 只保留一条，每条记录属于一个 CDN 账号）"""
+
+    def __init__(self, db_file: str):
+        """
+        Args:
+            db_file: 审核数据库文件（表由数据库迁移创建）
+        """
+        self.db_file = db_file
+
+    def push(self, urls: List[str], account: str = DEFAULT_ACCOUNT, repreheat: bool = True) -> int:
+        """
+        加入队列；已在队列中的 URL 需要重新预热时更新标记
+
+        Returns:
+            新加入的 URL 数量
+        """
+        if not urls:
+            return 0
+        now = time.time()
+        with sqlite3.connect(self.db_file) as conn:
+            before = conn.total_changes
+            conn.executemany(
+                "INSERT OR IGNORE INTO purge_queue (cdn_url, account, repreheat, enqueued_at) VALUES (?, ?, ?, ?)",
+                [(url, account, int(repreheat), now) for url in urls]
+            )
+            added = conn.total_changes - before
+            if repreheat:
+                conn.executemany("UPDATE purge_queue SET repreheat = 1 WHERE cdn_url = ?", [(url,) for url in urls])
+            conn.commit()
+        return added
+
+    def peek(self, limit: int, account: str = DEFAULT_ACCOUNT) -> List[Dict[str, Any]]:
+        """按入队顺序读取某个账号的最多 limit 条（不移出队列）"""
+        if limit <= 0:
+            return []
+        with sqlite3.connect(self.db_file) as conn:
+            conn.row_factory = sqlite3.Row
+            rows = conn.execute(
+                "SELECT id, cdn_url, repreheat, attempts FROM purge_queue WHERE account = ? ORDER BY id LIMIT ?",
+                (account, limit)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def remove(self, ids: List[int]):
+        """移出已刷新的 URL"""
+        if not ids:
+            return
+        with sqlite3.connect(self.db_file) as conn:
+            conn.executemany("DELETE FROM purge_queue WHERE id = ?", [(i,) for i in ids])
+            conn.commit()
+
+    def mark_failed(self, ids: List[int], max_attempts: int) -> List[str]:
+        """
+        记录一次刷新失败，达到 max_attempts 次的 URL 移出队列
+
+        Returns:
+            移出队列的 URL
+        """
+        if not ids:
+            return []
+        marks = ",".join("?" * len(ids))
+        with sqlite3.connect(self.db_file) as conn:
+            conn.execute(f"UPDATE purge_queue SET attempts = attempts + 1 WHERE id IN ({marks})", ids)
+            dropped = conn.execute(
+                f"SELECT cdn_url FROM purge_queue WHERE id IN ({marks}) AND attempts >= ?",
+                [*ids, max_attempts]
+            ).fetchall()
+            conn.execute(f"DELETE FROM purge_queue WHERE id IN ({marks}) AND attempts >= ?", [*ids, max_attempts])
+            conn.commit()
+        return [row[0] for row in dropped]
+
+    def depth(self, account: Optional[str] = None) -> int:
+        """队列中的 URL 数量（account 为 None 时统计所有账号）"""
+        with sqlite3.connect(self.db_file) as conn:
+            if account is None:
+                return conn.execute("SELECT COUNT(*) FROM purge_queue").fetchone()[0]
+            return conn.execute("SELECT COUNT(*) FROM purge_queue WHERE account = ?", (account,)).fetchone()[0]
+
+
+async def purge_batches(service, queue: PurgeQueue, entries: List[Dict[str, Any]], batch_size: int,
+                        pause: float, max_attempts: int, on_purged) -> Tuple[int, int, bool]:
+    """
+    按批次刷新一个账号在刷新队列中的 URL（预热调度器和 PurgeDrainer 共用）
+
+    刷新成功的批次移出队列并删除预热记录，再交给 await on_purged(这一批的记录) 重新预热；
+    刷新配额用完时停止，其他失败计入失败次数
+
+    Args:
+        service: 该账号的 CDNPreheatService
+        queue: 刷新队列
+        entries: PurgeQueue.peek 读取的记录
+        batch_size: 每批的 URL 数量
+        pause: 各批之间的间隔（秒）
+        max_attempts: 最多失败次数
+        on_purged: 刷新成功后的回调
+
+    Returns:
+        (刷新的 URL 数量, 调用 API 的次数, 是否遇到 API 频率限制或熔断)
+    """
+    from preheat_scheduler import is_quota_exceeded, is_throttled
+
+    loop = asyncio.get_running_loop()
+    purged = calls = 0
+    for start in range(0, len(entries), batch_size):
+        if start:
+            await asyncio.sleep(pause)
+        chunk = entries[start:start + batch_size]
+        ids = [entry["id"] for entry in chunk]
+        urls = [entry["cdn_url"] for entry in chunk]
+        result = await service.purge_urls(urls)
+        calls += 1
+
+        if result["success"]:
+            purged += len(chunk)
+            await loop.run_in_executor(None, queue.remove, ids)
+            # 旧的预热记录已失效，重新预热不能被跳过
+            await loop.run_in_executor(None, service.history.forget, urls)
+            await on_purged(chunk)
+        elif is_quota_exceeded(result):
+            # 刷新配额与预热配额相互独立，不影响预热
+            logger.warning(f"⚠️  刷新配额已用完（账号 {service.account}），剩余 URL 留在刷新队列中")
+            break
+        elif is_throttled(result) or is_circuit_open(result):
+            logger.warning(f"⚠️  CDN API 频率限制或已熔断（账号 {service.account}），刷新下次检查时继续")
+            return purged, calls, True
+        else:
+            dropped = await loop.run_in_executor(None, queue.mark_failed, ids, max_attempts)
+            for url in dropped:
+                logger.error(f"❌ 刷新缓存连续失败 {max_attempts} 次，移出刷新队列: {url}")
+            break
+
+    return purged, calls, False
+
+
+class PurgeDrainer:
+    """没有预热队列时（未启用队列、edge 模式）按账号分批处理刷新队列，刷新成功后直接重新预热"""
+
+    def __init__(
+        self,
+        services: Dict[str, Any],
+        queue: PurgeQueue,
+        burst: int = config.PURGE_QUEUE_BURST,
+        max_attempts: int = config.PREHEAT_QUEUE_MAX_ATTEMPTS,
+        pause: float = 1.0
+    ):
+        """
+        Args:
+            services: 账号名称 → CDNPreheatService
+            queue: 刷新队列
+            burst: 每次检查每个账号最多刷新的 URL 数量
+            max_attempts: 最多失败次数
+            pause: 各批之间的间隔（秒），避免触发 API 限流
+        """
+        self.services = services
+        self.queue = queue
+        self.burst = burst
+        self.max_attempts = max_attempts
+        self.pause = pause
+
+    async def drain_once(self) -> Dict[str, int]:
+        """
+        检查一次刷新队列，各账号并发刷新
+
+        Returns:
+            {"purged": 刷新的 URL 数量, "repreheated": 重新预热的 URL 数量, "depth": 剩余队列长度}
+        """
+        loop = asyncio.get_running_loop()
+        results = await asyncio.gather(*(self._drain_account(account) for account in self.services))
+        stats = {key: sum(result[key] for result in results) for key in ("purged", "repreheated")}
+        stats["depth"] = await loop.run_in_executor(None, self.queue.depth)
+        metrics.PURGE_QUEUE_DEPTH.set(stats["depth"])
+        return stats
+
+    async def _drain_account(self, account: str) -> Dict[str, int]:
+        """分批刷新一个账号的 URL，每批刷新成功后立即重新预热其中已批准的 URL"""
+        service = self.services[account]
+        loop = asyncio.get_running_loop()
+        stats = {"purged": 0, "repreheated": 0}
+
+        # 熔断器打开期间不调用 API，URL 留在队列中
+        if not service.api_available or service.breaker.state == OPEN:
+            return stats
+        entries = await loop.run_in_executor(None, self.queue.peek, self.burst, account)
+
+        async def repreheat(chunk: List[Dict[str, Any]]):
+            urls = [entry["cdn_url"] for entry in chunk if entry["repreheat"]]
+            if not urls:
+                return
+            # API 故障时写入重试队列
+            result = await service.preheat_urls(urls, skip_recent=False, park=True)
+            if result["success"]:
+                stats["repreheated"] += len(urls)
+            else:
+                logger.error(f"❌ 重新预热被替换文件失败（账号 {account}）: {result['message']}")
+
+        stats["purged"], _, _ = await purge_batches(
+            service, self.queue, entries, service.batch_size, self.pause, self.max_attempts, repreheat
+        )
+        if stats["purged"]:
+            logger.info(f"🧹 已刷新 {stats['purged']} 个被替换文件的缓存（账号 {account}）")
+        return stats
+
+
+_drainer: Optional[PurgeDrainer] = None
+
+
+def get_purge_drainer() -> Optional[PurgeDrainer]:
+    """
+    没有预热队列时处理刷新队列的全局实例
+
+    Returns:
+        启用了预热和 PURGE_ON_REPLACE、没有预热调度器（有调度器时由它处理刷新队列）、使用 SQLite 存储
+        且至少一个账号可以调用 CDN API（edge 模式可以不配置 API 凭证）时返回，否则返回 None
+    """
+    global _drainer
+    if _drainer is None:
+        from cdn_accounts import get_fanout
+        from database import get_db
+        from preheat_scheduler import get_scheduler
+
+        if not config.PURGE_ON_REPLACE or not config.PREHEAT_ENABLED or get_scheduler() is not None:
+            return None
+        db_file = get_db().db_file
+        services = {account: service for account, service in get_fanout().services.items() if service.api_available}
+        if db_file is None or not services:
+            return None
+        _drainer = PurgeDrainer(services, PurgeQueue(db_file))
+    return _drainer
+
+
+def handle_replacement(cdn_url: str, host_path: Optional[str], item_data: Optional[Dict[str, Any]] = None,
+                       media_type: Optional[str] = None) -> bool:
+    """
+    检查 URL 对应的文件是否被替换，被替换时刷新缓存并重新预热
+
+    Args:
+        cdn_url: 主 CDN URL
+        host_path: 宿主机路径
+        item_data: Emby 媒体项目数据
+        media_type: 媒体类型
+
+    Returns:
+        文件是否被替换
+    """
+    if not config.PURGE_ON_REPLACE or not config.PREHEAT_ENABLED:
+        return False
+
+    from database import get_db
+
+    db_file = get_db().db_file
+    signature = file_signature(host_path, item_data)
+    if db_file is None or signature is None:
+        return False
+
+    try:
+        if not FileSignatures(db_file).observe(cdn_url, *signature):
+            return False
+
+        metrics.FILES_REPLACED.inc()
+        from cdn_accounts import get_fanout
+        from preheat_scheduler import get_scheduler
+
+        # edge 模式可以不配置 API 凭证，这时无法刷新缓存，旧缓存只能等 CDN 过期
+        fanout = get_fanout()
+        groups = {
+            account: account_urls for account, account_urls in fanout.targets.group([cdn_url]).items()
+            if fanout.services[account].api_available
+        }
+        if not groups:
+            logger.warning(f"⚠️  文件已替换，但 CDN API 不可用，无法刷新缓存: {cdn_url}")
+            return False
+
+        # 被拒绝或仍在审核中的 URL 只刷新旧缓存，不绕过审核重新预热
+        repreheat = was_approved(db_file, cdn_url)
+        logger.info(f"♻️  文件已替换，刷新 CDN 缓存{'并重新预热' if repreheat else ''}: {cdn_url}")
+
+        scheduler = get_scheduler()
+        if scheduler is not None:
+            scheduler.enqueue_purge([cdn_url], repreheat=repreheat)
+        else:
+            # 没有预热队列时同样写入刷新队列，由 Leader 分批刷新（见 PurgeDrainer）
+            queue = PurgeQueue(db_file)
+            for account, account_urls in groups.items():
+                queue.push(account_urls, account, repreheat)
+        return True
+
+    except Exception as e:
+        logger.error(f"处理文件替换失败 {cdn_url}: {str(e)}")
+        return False
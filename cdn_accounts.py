@@ -0,0 +1,208 @@
+"""
+多域名 / 多账号 CDN 预热
+同一批文件可以通过多个 CDN 域名分发（CDN_URL_MAPPINGS 的目标写成列表），各域名可以属于不同的
+CDN 账号（CDN_ACCOUNTS）。审核请求只保存第一个域名的 URL，提交时展开为所有域名的 URL 并按账号分组，
+各账号使用独立的客户端、配额和提交节奏并发提交，结果再汇总回同一个审核请求
+"""
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlparse
+
+import config
+
+logger = logging.getLogger(__name__)
+
+# 默认账号（CDN_PROVIDER + TENCENT_SECRET_ID / TENCENT_SECRET_KEY），未在 CDN_ACCOUNTS 中列出的域名使用
+DEFAULT_ACCOUNT = "default"
+
+# 账号配置中传给 CDN 服务商的参数
+_PROVIDER_OPTIONS = ("secret_id", "secret_key", "endpoint")
+
+
+class CDNTargets:
+    """把主 URL 展开为所有域名的 URL，并按域名找到所属的账号"""
+
+    def __init__(self, mappings: Optional[Dict[str, Any]] = None, accounts: Optional[Dict[str, Any]] = None):
+        """
+        Args:
+            mappings: 宿主机路径 → CDN URL 前缀（或前缀列表），默认使用 CDN_URL_MAPPINGS
+            accounts: 账号名称 → 账号配置（domains 为该账号的域名），默认使用 CDN_ACCOUNTS
+        """
+        mappings = config.CDN_URL_MAPPINGS if mappings is None else mappings
+        accounts = config.CDN_ACCOUNTS if accounts is None else accounts
+
+        # 主前缀 → 所有前缀（只保留有多个目标的映射），按主前缀长度降序，最长匹配优先
+        self._mirrors = sorted(
+            (
+                (targets[0], list(dict.fromkeys(targets)))
+                for targets in mappings.values()
+                if isinstance(targets, (list, tuple)) and len(targets) > 1
+            ),
+            key=lambda item: len(item[0]),
+            reverse=True
+        )
+        self._domains = {
+            domain.lower(): name
+            for name, options in accounts.items()
+            for domain in options.get("domains", [])
+        }
+
+    def target_urls(self, cdn_url: str) -> List[str]:
+        """主 URL 对应的所有域名的 URL（第一个是主 URL 本身）"""
+        for primary, prefixes in self._mirrors:
+            if cdn_url.startswith(primary):
+                rest = cdn_url[len(primary):]
+                return [prefix + rest for prefix in prefixes]
+        return [cdn_url]
+
+    def account_of(self, url: str) -> str:
+        """URL 的域名所属的账号"""
+        return self._domains.get((urlparse(url).hostname or "").lower(), DEFAULT_ACCOUNT)
+
+    def group(self, urls: List[str]) -> Dict[str, List[str]]:
+        """
+        展开所有域名并按账号分组
+
+        Returns:
+            账号名称 → URL 列表（保持输入顺序，去重）
+        """
+        groups: Dict[str, List[str]] = {}
+        for url in urls:
+            for target in self.target_urls(url):
+                groups.setdefault(self.account_of(target), []).append(target)
+        return {account: list(dict.fromkeys(targets)) for account, targets in groups.items()}
+
+
+def create_services(accounts: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    创建各账号的预热服务（默认账号使用全局 cdn_service）
+
+    Args:
+        accounts: 账号名称 → 账号配置，默认使用 CDN_ACCOUNTS
+
+    Returns:
+        账号名称 → CDNPreheatService
+    """
+    from cdn_preheat import CDNPreheatService, cdn_service
+
+    accounts = config.CDN_ACCOUNTS if accounts is None else accounts
+    services = {DEFAULT_ACCOUNT: cdn_service}
+    for name, options in accounts.items():
+        service = CDNPreheatService(
+            provider_name=options.get("provider", config.CDN_PROVIDER),
+            account=name,
+            provider_options={key: options[key] for key in _PROVIDER_OPTIONS if key in options}
+        )
+        service.batch_size = options.get("batch_size", service.batch_size)
+        services[name] = service
+    return services
+
+
+def merge_results(results: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    把各账号的预热结果汇总为一个结果
+
+    Args:
+        results: 账号名称 → CDNPreheatService.preheat_urls 的结果
+
+    Returns:
+        与 preheat_urls 相同格式的结果：全部账号成功时 success 为 True，task_id 为各账号任务 ID
+        以逗号连接（没有时为 None），urls / skipped / warmed 合并，bytes / file_bytes / parked 相加，
+        accounts 为各账号的原始结果
+    """
+    if len(results) == 1:
+        return next(iter(results.values()))
+
+    merged: Dict[str, Any] = {
+        "success": all(result["success"] for result in results.values()),
+        "message": "；".join(f"{account}: {result['message']}" for account, result in results.items()),
+        "urls": [],
+        "skipped": [],
+        "accounts": results
+    }
+    task_ids = []
+    for result in results.values():
+        merged["urls"].extend(result.get("urls", []))
+        merged["skipped"].extend(result.get("skipped", []))
+        if result.get("task_id"):
+            task_ids.append(str(result["task_id"]))
+        if "warmed" in result:
+            merged.setdefault("warmed", []).extend(result["warmed"])
+        for key in ("bytes", "file_bytes", "parked"):
+            if key in result:
+                merged[key] = merged.get(key, 0) + result[key]
+        if not result["success"] and result.get("error_code") and "error_code" not in merged:
+            merged["error_code"] = result["error_code"]
+    merged["task_id"] = ", ".join(task_ids) or None
+    return merged
+
+
+class CDNFanout:
+    """按账号并发提交预热，接口与 CDNPreheatService 的 preheat_urls / preheat_batch 相同"""
+
+    def __init__(self, services: Dict[str, Any], targets: CDNTargets):
+        """
+        Args:
+            services: 账号名称 → CDNPreheatService（必须包含默认账号）
+            targets: 域名展开与账号查找
+        """
+        self.services = services
+        self.targets = targets
+
+    @property
+    def enabled(self) -> bool:
+        return any(service.enabled for service in self.services.values())
+
+    async def preheat_urls(self, urls: List[str], skip_recent: bool = True,
+                           media_type: Optional[str] = None) -> Dict[str, Any]:
+        """
+        预热 URL 在所有域名上的副本，各账号并发提交一次
+
+        Returns:
+            汇总后的结果（见 merge_results）；因 API 故障失败的账号把 URL 写入重试队列
+        """
+        groups = self.targets.group(urls)
+        accounts = list(groups)
+        results = await asyncio.gather(*(
+            self.services[account].preheat_urls(
+                groups[account], skip_recent=skip_recent, media_type=media_type, park=True
+            )
+            for account in accounts
+        ))
+        return merge_results(dict(zip(accounts, results)))
+
+    async def preheat_batch(self, urls: List[str], media_type: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        批量预热所有域名上的副本，各账号按自己的批次大小分批、并发提交
+
+        Returns:
+            各账号每批的结果（account 为所属账号）；因 API 故障失败的批次写入重试队列
+        """
+        groups = self.targets.group(urls)
+        accounts = list(groups)
+        batches = await asyncio.gather(*(
+            self.services[account].preheat_batch(groups[account], media_type=media_type, park=True)
+            for account in accounts
+        ))
+        return [
+            {**result, "account": account}
+            for account, results in zip(accounts, batches)
+            for result in results
+        ]
+
+    async def aclose(self):
+        """关闭各账号的连接池"""
+        for service in self.services.values():
+            await service.aclose()
+
+
+_fanout: Optional[CDNFanout] = None
+
+
+def get_fanout() -> CDNFanout:
+    """全局多账号预热入口（只有默认账号且没有多域名映射时等同于直接使用 cdn_service）"""
+    global _fanout
+    if _fanout is None:
+        _fanout = CDNFanout(create_services(), CDNTargets())
+    return _fanout
@@ -1,58 +1,437 @@
 """
 CDN 预热模块
-支持腾讯云 CDN URL 预热，包括 URL 编码和批量提交
+URL 编码、批量提交和重复提交过滤；具体的 CDN 接口由 CDN 服务商实现（见 cdn_provider.py）。
+PREHEAT_MODE=edge 时不调用预热接口，改为直接请求 CDN URL 预热边缘节点（EdgeWarmer），
+可以只预热文件的开头和结尾部分（起播需要的数据和 MKV/MP4 索引）。
+每个账号的服务商调用经过熔断器（见 circuit_breaker.py），直接提交时因 API 故障失败的 URL
+写入重试队列（见 retry_queue.py）
 """
 import logging
-from typing import List, Dict, Any, Optional
+import re
+import time
+from functools import lru_cache
+from typing import List, Dict, Any, Optional, Tuple
 from urllib.parse import quote, urlparse
 import asyncio
-from tencentcloud.common import credential
-from tencentcloud.common.exception.tencent_cloud_sdk_exception import TencentCloudSDKException
-from tencentcloud.cdn.v20180606 import cdn_client, models
 import config
+import metrics
+from circuit_breaker import CIRCUIT_OPEN, CircuitBreaker, is_transient_error
+from preheat_scheduler import library_of
+from retry_queue import RetryQueue, is_retryable
 
 logger = logging.getLogger(__name__)
 
+# 可以按“目录前缀 + 文件名”拆分编码的 URL：有协议和路径，文件名中没有 ; 参数，
+# 没有 # 片段和制表、换行符（这些情况交给 urlparse 完整处理）
+_SIMPLE_URL_PATTERN = re.compile(
+    r"([A-Za-z][A-Za-z0-9+.\-]*://[^/?#\t\r\n]*/(?:[^?#\t\r\n]*/)?)"
+    r"([^/?#;\t\r\n]*)"
+    r"(?:\?([^#\t\r\n]*))?"
+)
+
+# 缓存的目录前缀数量（同一部剧的所有剧集共用一个前缀）
+URL_PREFIX_CACHE_SIZE = 4096
+
+
+def _quote_url(url: str) -> str:
+    """完整解析并编码 URL：路径中保留 / 和 :，查询参数中保留 = 和 &"""
+    parsed = urlparse(url)
+
+    # 对路径部分进行编码（保留 /）
+    # safe 参数指定不需要编码的字符
+    encoded_path = quote(parsed.path, safe='/:')
+
+    # 重新组装 URL
+    encoded_url = f"{parsed.scheme}://{parsed.netloc}{encoded_path}"
+
+    if parsed.query:
+        encoded_query = quote(parsed.query, safe='=&')
+        encoded_url += f"?{encoded_query}"
+
+    return encoded_url
+
+
+@lru_cache(maxsize=URL_PREFIX_CACHE_SIZE)
+def _encode_prefix(prefix: str) -> str:
+    """编码 CDN 域名和目录前缀（以 / 结尾），结果缓存"""
+    return _quote_url(prefix)
+
+
+MB = 1024 * 1024
+
+# 边缘节点返回缓存状态的响应头（按顺序取第一个存在的）
+CACHE_STATUS_HEADERS = ("x-cache-lookup", "x-cache", "cf-cache-status", "x-cache-status", "eo-cache-status")
+
+
+def _file_size(resp) -> Optional[int]:
+    """从 Content-Range（bytes 0-99/1000）或完整响应的 Content-Length 得到文件大小"""
+    total = resp.headers.get("content-range", "").rpartition("/")[2]
+    if total.isdigit():
+        return int(total)
+    length = resp.headers.get("content-length", "")
+    if resp.status_code == 200 and length.isdigit():
+        return int(length)
+    return None
+
+
+def cache_status(headers) -> Tuple[str, str]:
+    """
+    从响应头判断边缘节点的缓存状态
+
+    Args:
+        headers: 响应头（不区分大小写的映射）
+
+    Returns:
+        (hit / miss / unknown, 响应头原始值)
+    """
+    for name in CACHE_STATUS_HEADERS:
+        value = headers.get(name)
+        if not value:
+            continue
+        lowered = value.lower()
+        # 腾讯云的 "Hit From Upstream" 表示边缘节点未命中，由上层节点返回
+        if "miss" in lowered or "upstream" in lowered or "expired" in lowered:
+            return "miss", value
+        if "hit" in lowered:
+            return "hit", value
+        return "unknown", value
+    return "unknown", ""
+
+
+class EdgeWarmer:
+    """
+    直接请求 CDN URL 预热边缘节点
+
+    边缘节点未命中时会回源拉取并缓存。GET 请求的响应体按流读取后直接丢弃，不在内存中缓冲；
+    连接在请求之间保持复用，总并发数和同一域名的并发数分别受限。
+    设置了开头字节数时只用 Range 请求文件开头，再按结尾字节数请求文件末尾（bytes=-N）
+    """
+
+    def __init__(
+        self,
+        method: str = config.PREHEAT_EDGE_METHOD,
+        head_bytes: int = int(config.PREHEAT_EDGE_HEAD_MB * MB),
+        tail_bytes: int = int(config.PREHEAT_EDGE_TAIL_MB * MB),
+        concurrency: int = config.PREHEAT_EDGE_CONCURRENCY,
+        per_host: int = config.PREHEAT_EDGE_PER_HOST,
+        timeout: float = config.PREHEAT_EDGE_TIMEOUT
+    ):
+        """
+        Args:
+            method: get 或 head
+            head_bytes: GET 时只请求开头多少字节，0 表示读取完整文件
+            tail_bytes: 只请求开头时，另外请求结尾多少字节，0 表示不请求
+            concurrency: 总并发请求数（连接池大小）
+            per_host: 同一域名的并发请求数
+            timeout: 连接和每次读取的超时（秒）
+
+        Raises:
+            ValueError: 不支持的请求方式
+        """
+        if method not in ("get", "head"):
+            raise ValueError(f"不支持的边缘预热请求方式: {method}")
+        self.method = method
+        self.head_bytes = head_bytes
+        self.tail_bytes = tail_bytes
+        self.concurrency = max(1, concurrency)
+        self.per_host = max(1, per_host)
+        self.timeout = timeout
+
+        self._client = None
+        self._loop = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._host_slots: Dict[str, asyncio.Semaphore] = {}
+
+    def _client_for_loop(self):
+        """连接池和并发限制与事件循环绑定，事件循环变化时重新创建"""
+        import httpx
+
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._loop is not loop:
+            self._client = httpx.AsyncClient(
+                timeout=httpx.Timeout(self.timeout, pool=None),
+                limits=httpx.Limits(
+                    max_connections=self.concurrency,
+                    max_keepalive_connections=self.concurrency
+                ),
+                follow_redirects=True
+            )
+            self._loop = loop
+            self._slots = asyncio.Semaphore(self.concurrency)
+            self._host_slots = {}
+        return self._client
+
+    def _host_slot(self, url: str) -> asyncio.Semaphore:
+        host = urlparse(url).netloc
+        slot = self._host_slots.get(host)
+        if slot is None:
+            slot = self._host_slots[host] = asyncio.Semaphore(self.per_host)
+        return slot
+
+    async def _fetch(self, client, url: str, range_header: Optional[str], limit: int):
+        """
+        发起一次请求，GET 时按流读取响应体后丢弃
+
+        Args:
+            range_header: Range 请求头，None 表示请求完整文件
+            limit: 最多读取的字节数（服务器忽略 Range 返回完整文件时读够后断开），0 表示不限
+
+        Returns:
+            (响应, 读取的字节数)
+        """
+        received = 0
+        headers = {"Range": range_header} if range_header else {}
+        async with client.stream(self.method.upper(), url, headers=headers) as resp:
+            if self.method == "get":
+                async for chunk in resp.aiter_raw():
+                    received += len(chunk)
+                    if limit and received >= limit:
+                        break
+        return resp, received
+
+    async def warm_url(self, url: str, head_bytes: Optional[int] = None,
+                       tail_bytes: Optional[int] = None) -> Dict[str, Any]:
+        """
+        请求一个 URL
+
+        Args:
+            url: 已编码的 URL
+            head_bytes: 只请求开头多少字节，默认使用 self.head_bytes
+            tail_bytes: 另外请求结尾多少字节，默认使用 self.tail_bytes
+
+        Returns:
+            {"url", "success", "status_code", "cache_status", "cache_header", "bytes", "size", "seconds", "message"}，
+            缓存状态取自开头部分的响应，size 为文件大小（未知时为 None），请求失败时 cache_status 为 error
+        """
+        client = self._client_for_loop()
+        head = self.head_bytes if head_bytes is None else head_bytes
+        tail = self.tail_bytes if tail_bytes is None else tail_bytes
+        partial = self.method == "get" and head > 0
+
+        received = 0
+        async with self._host_slot(url), self._slots:
+            started = time.perf_counter()
+            try:
+                resp, received = await self._fetch(client, url, f"bytes=0-{head - 1}" if partial else None, head)
+                size = _file_size(resp)
+                ok = resp.status_code < 400
+                status, header = cache_status(resp.headers)
+                message = f"HTTP {resp.status_code}"
+
+                # 文件比开头部分大时再请求结尾（不与开头重叠）
+                if ok and partial and tail > 0 and (size is None or size > head):
+                    if size is not None:
+                        tail = min(tail, size - head)
+                    tail_resp, tail_received = await self._fetch(client, url, f"bytes=-{tail}", tail)
+                    received += tail_received
+                    ok = tail_resp.status_code < 400
+                    message += f" + HTTP {tail_resp.status_code}"
+
+                result = {
+                    "url": url,
+                    "success": ok,
+                    "status_code": resp.status_code,
+                    "cache_status": status,
+                    "cache_header": header,
+                    "bytes": received,
+                    "size": size,
+                    "message": message
+                }
+            except Exception as e:
+                result = {
+                    "url": url,
+                    "success": False,
+                    "status_code": None,
+                    "cache_status": "error",
+                    "cache_header": "",
+                    "bytes": received,
+                    "size": None,
+                    "message": f"请求失败: {type(e).__name__}: {str(e)}"
+                }
+            result["seconds"] = time.perf_counter() - started
+
+        metrics.CDN_EDGE_WARM.labels(cache_status=result["cache_status"]).inc()
+        metrics.CDN_EDGE_WARM_BYTES.inc(result["bytes"])
+        metrics.CDN_EDGE_WARM_SECONDS.observe(result["seconds"])
+        return result
+
+    async def warm_urls(self, urls: List[str],
+                        ranges: Optional[List[Tuple[int, int]]] = None) -> List[Dict[str, Any]]:
+        """
+        并发请求多个 URL
+
+        Args:
+            urls: 已编码的 URL 列表
+            ranges: 每个 URL 的 (开头字节数, 结尾字节数)，默认使用 head_bytes / tail_bytes
+
+        Returns:
+            每个 URL 的结果，顺序与输入一致
+        """
+        ranges = ranges or [(None, None)] * len(urls)
+        return await asyncio.gather(*(
+            self.warm_url(url, head, tail) for url, (head, tail) in zip(urls, ranges)
+        ))
+
+    async def aclose(self):
+        """关闭连接池"""
+        if self._client is not None and self._loop is asyncio.get_running_loop():
+            await self._client.aclose()
+        self._client = None
+        self._loop = None
+
 
 class CDNPreheatService:
     """CDN 预热服务"""
 
-    def __init__(self):
-        self.secret_id = config.TENCENT_SECRET_ID
-        self.secret_key = config.TENCENT_SECRET_KEY
+    def __init__(
+        self,
+        provider_name: str = config.CDN_PROVIDER,
+        mode: str = config.PREHEAT_MODE,
+        account: str = "default",
+        provider_options: Optional[Dict[str, Any]] = None
+    ):
+        """
+        Args:
+            provider_name: CDN 服务商（tencent / mock）
+            mode: 预热方式（api / edge）
+            account: CDN 账号名称（多账号时区分日志和配额，见 cdn_accounts.py）
+            provider_options: 创建服务商的参数（如该账号的 secret_id / secret_key），默认使用全局配置
+        """
+        self.provider_name = provider_name
+        self.mode = mode
+        self.account = account
+        self.provider_options = provider_options or {}
         self.batch_size = config.PREHEAT_BATCH_SIZE
         self.enabled = config.PREHEAT_ENABLED
-        self.client = None
+        self.provider = None
+        # 服务商创建失败的原因（如未配置 API 凭证）；只影响 API 调用，edge 模式的预热不受影响
+        self.provider_error: Optional[str] = None
+        self._history = None
+        self._retry_queue = None
+        self._warmer = None
+        # 该账号 API 故障时熔断，避免每次提交都等到超时
+        self.breaker = CircuitBreaker(account)
+        # 按媒体库或媒体类型只预热开头/结尾的规则：名称 -> (开头 MB, 结尾 MB)
+        self.partial_rules = dict(config.PREHEAT_EDGE_PARTIAL_RULES)
+
+    @property
+    def warmer(self) -> EdgeWarmer:
+        """边缘节点预热（PREHEAT_MODE=edge，首次使用时创建）"""
+        if self._warmer is None:
+            self._warmer = EdgeWarmer()
+        return self._warmer
+
+    @property
+    def history(self):
+        """最近预热记录（首次使用时创建，与审核数据库共用同一个文件）"""
+        if self._history is None:
+            from database import get_db
+            from preheat_history import PreheatHistory
+            self._history = PreheatHistory(get_db().db_file)
+        return self._history
+
+    @property
+    def retry_queue(self):
+        """直接提交失败时的重试队列（首次使用时创建；存储引擎不是 SQLite 时为 None）"""
+        if self._retry_queue is None:
+            from database import get_db
+            db_file = get_db().db_file
+            if db_file:
+                self._retry_queue = RetryQueue(db_file)
+        return self._retry_queue
+
+    def partial_range(self, url: str, media_type: Optional[str] = None) -> Tuple[int, int]:
+        """
+        edge 模式下 URL 需要预热的 (开头字节数, 结尾字节数)
 
-        # 初始化腾讯云客户端
-        if self.enabled:
-            self._init_client()
+        媒体库（CDN URL 第一级目录）的规则优先，其次是媒体类型的规则，都没有时使用
+        PREHEAT_EDGE_HEAD_MB / PREHEAT_EDGE_TAIL_MB；开头为 0 表示读取完整文件
+        """
+        rule = self.partial_rules.get(library_of(url)) or self.partial_rules.get(media_type)
+        if rule is None:
+            return self.warmer.head_bytes, self.warmer.tail_bytes
+        head_mb, tail_mb = rule
+        return int(head_mb * MB), int(tail_mb * MB)
+
+    def filter_recent(self, urls: List[str]) -> Tuple[List[str], List[str]]:
+        """过滤最近已提交过的 URL，返回 (需要提交的 URL, 跳过的 URL)"""
+        urls, skipped = self.history.filter_fresh(urls)
+        if skipped:
+            metrics.CDN_URLS_SKIPPED.inc(len(skipped))
+            logger.info(f"⏭️  跳过 {len(skipped)} 个最近已提交预热的 URL")
+        return urls, skipped
+
+    @staticmethod
+    def _skipped_result(skipped: List[str]) -> Dict[str, Any]:
+        return {
+            "success": True,
+            "message": "最近已提交过预热，跳过重复提交",
+            "urls": [],
+            "task_id": None,
+            "skipped": skipped
+        }
+
+    def _ensure_provider(self) -> bool:
+        """
+        首次使用时才创建 CDN 服务商（腾讯云 SDK 导入较慢），避免拖慢服务启动
 
-    def _init_client(self):
-        """初始化腾讯云 CDN 客户端"""
-        try:
-            if not self.secret_id or not self.secret_key:
-                logger.error("未配置腾讯云 API 凭证，无法初始化 CDN 客户端")
-                self.enabled = False
-                return
+        Returns:
+            服务商是否可用
+        """
+        if self.provider is None and self.enabled and self.provider_error is None:
+            self._init_provider()
+        return self.provider is not None
 
-            if self.secret_id == "your_secret_id_here":
-                logger.warning("腾讯云 API 凭证未设置，CDN 预热功能将不可用")
-                self.enabled = False
-                return
+    @property
+    def api_available(self) -> bool:
+        """能否调用 CDN API（首次访问时创建服务商，创建失败后不再重试）"""
+        return self.enabled and self._ensure_provider()
 
-            cred = credential.Credential(self.secret_id, self.secret_key)
-            self.client = cdn_client.CdnClient(cred, "")
-            logger.info("✅ 腾讯云 CDN 客户端初始化成功")
+    def _init_provider(self):
+        """初始化 CDN 服务商"""
+        from cdn_provider import create_provider
 
+        try:
+            self.provider = create_provider(self.provider_name, **self.provider_options)
+            logger.info(f"✅ CDN 服务商初始化成功: {self.provider_name}（账号 {self.account}）")
         except Exception as e:
-            logger.error(f"初始化腾讯云 CDN 客户端失败: {str(e)}")
-            self.enabled = False
+            logger.error(f"初始化 CDN 服务商失败（账号 {self.account}），该账号的 CDN API 将不可用: {str(e)}")
+            self.provider_error = str(e)
+
+    def _timed_call(self, operation: str, func, *args) -> Dict[str, Any]:
+        """调用服务商接口，记录耗时和错误码指标；熔断器打开时不调用，直接返回失败（错误码 CircuitOpen）"""
+        if not self.breaker.allow():
+            result = {
+                "success": False,
+                "message": f"CDN API 暂时不可用（已熔断，约 {self.breaker.retry_after():.0f} 秒后重试）",
+                "error_code": CIRCUIT_OPEN
+            }
+            if operation in ("PushUrlsCache", "PurgeUrlsCache"):
+                result.update(urls=args[0], task_id=None)
+            metrics.CDN_API_ERRORS.labels(operation=operation, code=CIRCUIT_OPEN).inc()
+            return result
+
+        try:
+            with metrics.CDN_API_SECONDS.labels(operation=operation).time():
+                result = func(*args)
+        except Exception:
+            self.breaker.record_failure()
+            raise
+        if is_transient_error(result):
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+        if not result["success"] and result.get("error_code"):
+            metrics.CDN_API_ERRORS.labels(operation=operation, code=result["error_code"]).inc()
+        return result
 
     def encode_url(self, url: str) -> str:
         """
         对 URL 进行编码
 
+        同一目录下的 URL 共用缓存的目录前缀编码结果，只需编码文件名和查询参数；
+        结果与完整解析编码（_quote_url）一致
+
         Args:
             url: 原始 URL
 
@@ -60,27 +439,37 @@ class CDNPreheatService:
             编码后的 URL
         """
         try:
-            # 解析 URL
-            parsed = urlparse(url)
-
-            # 对路径部分进行编码（保留 /）
-            # safe 参数指定不需要编码的字符
-            encoded_path = quote(parsed.path, safe='/:')
-
-            # 重新组装 URL
-            encoded_url = f"{parsed.scheme}://{parsed.netloc}{encoded_path}"
-
-            if parsed.query:
-                encoded_query = quote(parsed.query, safe='=&')
-                encoded_url += f"?{encoded_query}"
-
-            logger.debug(f"URL 编码: {url} -> {encoded_url}")
+            match = _SIMPLE_URL_PATTERN.fullmatch(url)
+            if match is None:
+                return _quote_url(url)
+
+            prefix, filename, query = match.groups()
+            encoded_url = _encode_prefix(prefix) + quote(filename, safe='/:')
+            if query:
+                encoded_url += "?" + quote(query, safe='=&')
             return encoded_url
 
         except Exception as e:
             logger.error(f"URL 编码失败: {str(e)}")
             return url
 
+    def encode_urls(self, urls: List[str]) -> List[str]:
+        """
+        批量编码 URL
+
+        Args:
+            urls: 原始 URL 列表
+
+        Returns:
+            编码后的 URL 列表（顺序与输入一致）
+        """
+        encode = self.encode_url
+        encoded_urls = [encode(url) for url in urls]
+        if logger.isEnabledFor(logging.DEBUG):
+            for original, encoded in zip(urls, encoded_urls):
+                logger.debug(f"URL 编码: {original} -> {encoded}")
+        return encoded_urls
+
     async def preheat_url(self, url: str) -> Dict[str, Any]:
         """
         预热单个 URL
@@ -93,17 +482,22 @@ class CDNPreheatService:
         """
         return await self.preheat_urls([url])
 
-    async def preheat_urls(self, urls: List[str]) -> Dict[str, Any]:
+    async def preheat_urls(self, urls: List[str], skip_recent: bool = True,
+                           media_type: Optional[str] = None, park: bool = False) -> Dict[str, Any]:
         """
         批量预热 URL
 
         Args:
             urls: URL 列表
+            skip_recent: 是否跳过 PREHEAT_HISTORY_SECONDS 内已提交过的 URL
+            media_type: 媒体类型（edge 模式按媒体类型选择只预热开头/结尾的规则）
+            park: 因 API 故障或熔断失败时是否把 URL 写入重试队列（直接提交时使用，预热队列自己会重试）
 
         Returns:
-            预热结果字典
+            预热结果字典（skipped 为跳过的 URL；全部跳过时 success 为 True、task_id 为 None；
+            写入重试队列时 parked 为写入的 URL 数量）
         """
-        if not self.enabled:
+        if not self.enabled or (self.mode != "edge" and not self._ensure_provider()):
             logger.warning("CDN 预热功能未启用")
             return {
                 "success": False,
@@ -120,38 +514,49 @@ class CDNPreheatService:
                 "task_id": None
             }
 
+        skipped = []
+        if skip_recent:
+            urls, skipped = self.filter_recent(urls)
+            if not urls:
+                return self._skipped_result(skipped)
+
         try:
             logger.info("=" * 80)
             logger.info(f"🚀 开始 CDN 预热")
             logger.info(f"📊 预热 URL 数量: {len(urls)}")
             logger.info("=" * 80)
 
-            # 对所有 URL 进行编码
-            encoded_urls = [self.encode_url(url) for url in urls]
+            # 对所有 URL 进行编码（编码前后对比在 DEBUG 级别输出）
+            encoded_urls = self.encode_urls(urls)
 
-            # 显示编码前后对比
-            for i, (original, encoded) in enumerate(zip(urls, encoded_urls), 1):
-                logger.info(f"\n【URL {i}】")
-                logger.info(f"  📝 原始 URL:")
-                logger.info(f"     {original}")
-                logger.info(f"  🔐 编码后 URL (将提交到 CDN):")
-                logger.info(f"     {encoded}")
-
-            logger.info("\n" + "=" * 80)
-            logger.info(f"📤 准备提交 {len(encoded_urls)} 个编码后的 URL 到腾讯云 CDN")
-            logger.info("=" * 80)
-
-            # 调用腾讯云 CDN API
-            result = await self._call_tencent_api(encoded_urls)
+            if self.mode == "edge":
+                logger.info(f"📤 准备直接请求 {len(encoded_urls)} 个编码后的 URL 预热边缘节点")
+                ranges = [self.partial_range(url, media_type) for url in urls]
+                result = await self._warm(encoded_urls, ranges)
+                warmed = set(result["warmed"])
+                self.history.record([url for url, encoded in zip(urls, encoded_urls) if encoded in warmed])
+            else:
+                logger.info(
+                    f"📤 准备提交 {len(encoded_urls)} 个编码后的 URL 到 CDN（{self.provider_name}，账号 {self.account}）"
+                )
+                result = await self._submit(encoded_urls)
+                if result["success"]:
+                    self.history.record(urls, result["task_id"])
+                elif park and is_retryable(result) and self.retry_queue:
+                    self.retry_queue.push(urls, self.account, result.get("error_code"))
+                    result["parked"] = len(urls)
+                    logger.warning(f"🔁 {len(urls)} 个 URL 已加入重试队列，CDN API 恢复后自动重新提交")
+            result["skipped"] = skipped
 
             logger.info("\n" + "=" * 80)
             if result["success"]:
                 logger.info(f"✅ CDN 预热提交成功！")
-                logger.info(f"📝 任务 ID: {result['task_id']}")
+                if result["task_id"]:
+                    logger.info(f"📝 任务 ID: {result['task_id']}")
                 logger.info(f"📊 已提交 URL 数量: {len(encoded_urls)}")
-                logger.info(f"🔗 提交的编码 URL:")
-                for i, url in enumerate(encoded_urls, 1):
-                    logger.info(f"   {i}. {url}")
+                logger.info("🔗 提交的编码 URL:\n" + "\n".join(
+                    f"   {i}. {url}" for i, url in enumerate(encoded_urls, 1)
+                ))
             else:
                 logger.error(f"❌ CDN 预热提交失败")
                 logger.error(f"💬 错误信息: {result['message']}")
@@ -170,9 +575,9 @@ class CDNPreheatService:
                 "task_id": None
             }
 
-    async def _call_tencent_api(self, urls: List[str]) -> Dict[str, Any]:
+    async def _submit(self, urls: List[str]) -> Dict[str, Any]:
         """
-        调用腾讯云 CDN API 进行预热
+        提交预热（服务商接口是阻塞调用，在线程池中执行）
 
         Args:
             urls: 已编码的 URL 列表
@@ -180,75 +585,122 @@ class CDNPreheatService:
         Returns:
             API 调用结果
         """
-        try:
-            # 创建预热请求
-            req = models.PushUrlsCacheRequest()
-            req.Urls = urls
-
-            # 异步调用 API（在线程池中执行）
-            loop = asyncio.get_event_loop()
-            resp = await loop.run_in_executor(
-                None,
-                self.client.PushUrlsCache,
-                req
-            )
+        loop = asyncio.get_running_loop()
+        result = await loop.run_in_executor(
+            None, self._timed_call, "PushUrlsCache", self.provider.push_urls, urls
+        )
+        if result["success"]:
+            metrics.CDN_URLS_SUBMITTED.inc(len(urls))
+        return result
+
+    async def _warm(self, urls: List[str], ranges: Optional[List[Tuple[int, int]]] = None) -> Dict[str, Any]:
+        """
+        直接请求 URL 预热边缘节点
 
-            # 解析响应
-            task_id = resp.TaskId if hasattr(resp, 'TaskId') else None
+        Args:
+            urls: 已编码的 URL 列表
+            ranges: 每个 URL 的 (开头字节数, 结尾字节数)
 
-            return {
-                "success": True,
-                "message": "预热任务已提交",
-                "urls": urls,
-                "task_id": task_id
-            }
+        Returns:
+            与 _submit 相同格式的结果（task_id 为 None），另含每个 URL 的结果 results、
+            成功的 URL warmed、按缓存状态的计数 cache，以及本次读取的字节数 bytes
+            和已知大小的文件总字节数 file_bytes
+        """
+        results = await self.warmer.warm_urls(urls, ranges)
+        warmed = [r["url"] for r in results if r["success"]]
+        failed = [r for r in results if not r["success"]]
+        cache = {}
+        for r in results:
+            cache[r["cache_status"]] = cache.get(r["cache_status"], 0) + 1
+            logger.info(
+                f"{'🌡️ ' if r['success'] else '❌'} {r['message']} {r['cache_status']}"
+                f"{' (' + r['cache_header'] + ')' if r['cache_header'] else ''} "
+                f"{r['bytes']} 字节 {r['seconds']:.2f}s {r['url']}"
+            )
 
-        except TencentCloudSDKException as e:
-            error_msg = f"腾讯云 API 错误: {e.get_message()}"
-            logger.error(error_msg)
-            return {
-                "success": False,
-                "message": error_msg,
-                "urls": urls,
-                "task_id": None,
-                "error_code": e.get_code()
-            }
+        # 本次读取的字节数与文件总大小（只预热开头/结尾时，两者之比即节省的带宽）
+        read_bytes = sum(r["bytes"] for r in results)
+        file_bytes = sum(r["size"] for r in results if r["size"])
+        message = (
+            f"边缘节点预热完成: 成功 {len(warmed)}/{len(urls)}，"
+            f"命中 {cache.get('hit', 0)}，未命中 {cache.get('miss', 0)}，"
+            f"读取 {read_bytes / MB:.1f} MB"
+        )
+        if file_bytes:
+            message += f"（文件共 {file_bytes / MB:.1f} MB）"
+        if failed:
+            message += f"；失败: {failed[0]['message']}"
+        return {
+            "success": not failed,
+            "message": message,
+            "urls": urls,
+            "task_id": None,
+            "warmed": warmed,
+            "cache": cache,
+            "bytes": read_bytes,
+            "file_bytes": file_bytes,
+            "results": results
+        }
+
+    async def purge_urls(self, urls: List[str]) -> Dict[str, Any]:
+        """
+        刷新（清除）URL 缓存
 
-        except Exception as e:
-            error_msg = f"调用 API 失败: {str(e)}"
-            logger.error(error_msg)
+        Args:
+            urls: URL 列表（未编码）
+
+        Returns:
+            刷新结果字典
+        """
+        if not self.api_available:
             return {
                 "success": False,
-                "message": error_msg,
+                "message": f"CDN API 不可用: {self.provider_error}" if self.provider_error else "CDN 预热功能未启用",
                 "urls": urls,
                 "task_id": None
             }
 
-    async def preheat_batch(self, urls: List[str]) -> List[Dict[str, Any]]:
+        loop = asyncio.get_running_loop()
+        result = await loop.run_in_executor(
+            None, self._timed_call, "PurgeUrlsCache", self.provider.purge_urls, self.encode_urls(urls)
+        )
+        if result["success"]:
+            metrics.CDN_URLS_PURGED.inc(len(urls))
+        return result
+
+    async def preheat_batch(self, urls: List[str], media_type: Optional[str] = None,
+                            park: bool = False) -> List[Dict[str, Any]]:
         """
         批量预热（自动分批）
 
         Args:
             urls: URL 列表
+            media_type: 媒体类型（edge 模式按媒体类型选择只预热开头/结尾的规则）
+            park: 因 API 故障或熔断失败的批次是否写入重试队列
 
         Returns:
-            每批的预热结果列表
+            每批的预热结果列表（最近已提交过而跳过的 URL 单独作为一项，task_id 为 None）
         """
         if not urls:
             return []
 
+        # 分批之前整体过滤一次最近已提交过的 URL
         results = []
+        if self.enabled:
+            urls, skipped = self.filter_recent(urls)
+            if skipped:
+                results.append(self._skipped_result(skipped))
 
         # 按批次大小分割 URL
         for i in range(0, len(urls), self.batch_size):
             batch = urls[i:i + self.batch_size]
             logger.info(f"处理第 {i // self.batch_size + 1} 批，共 {len(batch)} 个 URL")
 
-            result = await self.preheat_urls(batch)
+            result = await self.preheat_urls(batch, skip_recent=False, media_type=media_type, park=park)
             results.append(result)
 
             # 批次之间稍作延迟，避免触发 API 限流
-            if i + self.batch_size < len(urls):
+            if self.mode != "edge" and i + self.batch_size < len(urls):
                 await asyncio.sleep(1)
 
         return results
@@ -263,41 +715,34 @@ class CDNPreheatService:
         Returns:
             任务状态信息
         """
-        if not self.enabled or not self.client:
+        if not self.enabled or not self._ensure_provider():
             return {
                 "success": False,
                 "message": "CDN 客户端未初始化"
             }
+        return self._timed_call("DescribePushTasks", self.provider.describe_push_task, task_id)
 
-        try:
-            req = models.DescribePushTasksRequest()
-            req.TaskId = task_id
-
-            resp = self.client.DescribePushTasks(req)
-
-            # 解析任务状态
-            if hasattr(resp, 'PushLogs') and resp.PushLogs:
-                log = resp.PushLogs[0]
-                return {
-                    "success": True,
-                    "task_id": task_id,
-                    "status": log.Status,
-                    "percent": log.Percent,
-                    "create_time": log.CreateTime,
-                    "update_time": log.UpdateTime
-                }
+    def get_push_quota(self, area: str = config.PREHEAT_QUOTA_AREA) -> Dict[str, Any]:
+        """
+        查询每日预热配额
 
-            return {
-                "success": False,
-                "message": "未找到任务信息"
-            }
+        Args:
+            area: 配额区域（mainland / overseas），没有该区域时返回第一项
 
-        except TencentCloudSDKException as e:
+        Returns:
+            配额信息（total 每日总量、available 当日剩余、batch 单次提交上限）
+        """
+        if not self.enabled or not self._ensure_provider():
             return {
                 "success": False,
-                "message": f"查询失败: {e.get_message()}",
-                "error_code": e.get_code()
+                "message": "CDN 客户端未初始化"
             }
+        return self._timed_call("DescribePushQuota", self.provider.describe_push_quota, area)
+
+    async def aclose(self):
+        """关闭边缘节点预热的连接池"""
+        if self._warmer is not None:
+            await self._warmer.aclose()
 
 
 # 全局 CDN 预热服务实例
@@ -0,0 +1,91 @@
+"""
+CDN 服务商接口
+定义预热服务用到的 CDN 操作，腾讯云（tencent_provider.TencentCDNProvider）和
+本地模拟服务（mock_cdn.MockCDNProvider）都实现该接口，CDNPreheatService 只依赖这里的方法
+"""
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List
+
+import config
+
+# 可选的服务商（CDN_PROVIDER 的取值）
+CDN_PROVIDERS = ("tencent", "mock")
+
+
+class CDNProvider(ABC):
+    """
+    CDN 服务商
+
+    方法都是阻塞调用（由 CDNPreheatService 放到线程池中执行），结果以字典返回：
+    成功时 success 为 True；失败时 success 为 False，message 为错误说明，
+    error_code 为服务商的错误码（如 LimitExceeded.CdnPushExceedDayLimit），不向调用方抛出异常。
+    """
+
+    # 服务商名称（CDN_PROVIDER 的取值）
+    name: str = ""
+
+    @abstractmethod
+    def push_urls(self, urls: List[str]) -> Dict[str, Any]:
+        """
+        提交一批 URL 预热
+
+        Args:
+            urls: 已编码的 URL 列表
+
+        Returns:
+            {"success", "message", "urls", "task_id"}
+        """
+
+    @abstractmethod
+    def describe_push_task(self, task_id: str) -> Dict[str, Any]:
+        """
+        查询预热任务状态
+
+        Returns:
+            {"success", "task_id", "status", "percent", "create_time", "update_time"}
+        """
+
+    @abstractmethod
+    def describe_push_quota(self, area: str) -> Dict[str, Any]:
+        """
+        查询每日预热配额
+
+        Args:
+            area: 配额区域（mainland / overseas），没有该区域时返回第一项
+
+        Returns:
+            {"success", "area", "total", "available", "batch"}
+        """
+
+    @abstractmethod
+    def purge_urls(self, urls: List[str]) -> Dict[str, Any]:
+        """
+        刷新（清除）一批 URL 的缓存
+
+        Args:
+            urls: 已编码的 URL 列表
+
+        Returns:
+            {"success", "message", "urls", "task_id"}
+        """
+
+
+def create_provider(name: str = config.CDN_PROVIDER, **options) -> CDNProvider:
+    """
+    按名称创建 CDN 服务商
+
+    Args:
+        name: tencent 或 mock
+        options: 服务商的构造参数（tencent: secret_id / secret_key；mock: endpoint），
+            未提供时使用全局配置
+
+    Raises:
+        ValueError: 未知的服务商名称，或服务商缺少必要的配置（如 API 凭证）
+    """
+    if name == "tencent":
+        from tencent_provider import TencentCDNProvider
+        return TencentCDNProvider(**options)
+    if name == "mock":
+        from mock_cdn import MockCDNProvider
+        return MockCDNProvider(**options)
+    raise ValueError(f"未知的 CDN 服务商: {name}")
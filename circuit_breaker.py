@@ -0,0 +1,130 @@
+"""
+CDN API 熔断器
+腾讯云 API 故障（内部错误、网络错误、频率限制）时，每次调用都要等到超时或报错。连续失败
+CDN_BREAKER_FAILURES 次后熔断器打开，之后的调用直接失败（错误码 CircuitOpen），不再请求 API；
+CDN_BREAKER_RESET_SECONDS 秒后进入半开状态，只放行一个试探调用，成功则关闭，失败则重新打开。
+
+参数错误、鉴权失败、超出每日配额等说明 API 本身可用，不计入失败次数
+"""
+import logging
+import threading
+import time
+from typing import Any, Dict, Optional
+
+import config
+import metrics
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+HALF_OPEN = "half_open"
+OPEN = "open"
+
+# 熔断器打开时直接失败的错误码
+CIRCUIT_OPEN = "CircuitOpen"
+
+# 不说明 API 故障的错误码前缀（请求本身有问题或配额用完，重试也不会成功）
+_CLIENT_ERROR_PREFIXES = (
+    "AuthFailure", "InvalidAction", "InvalidParameter", "LimitExceeded", "MissingParameter",
+    "ResourceNotFound", "UnauthorizedOperation", "UnknownParameter", "UnsupportedOperation",
+)
+
+# 指标中各状态的取值
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+def is_circuit_open(result: Dict[str, Any]) -> bool:
+    """是否因熔断器打开而直接失败"""
+    return result.get("error_code") == CIRCUIT_OPEN
+
+
+def is_transient_error(result: Dict[str, Any]) -> bool:
+    """
+    失败是否由 API 故障引起（服务端错误、网络错误、频率限制），稍后重试可能成功
+
+    没有错误码的失败（如未返回数据）和客户端错误不算
+    """
+    if result.get("success"):
+        return False
+    code = result.get("error_code") or ""
+    return bool(code) and code != CIRCUIT_OPEN and not code.startswith(_CLIENT_ERROR_PREFIXES)
+
+
+class CircuitBreaker:
+    """连续失败计数的熔断器（线程安全，服务商调用在线程池中执行）"""
+
+    def __init__(
+        self,
+        name: str = "default",
+        failure_threshold: int = config.CDN_BREAKER_FAILURES,
+        reset_seconds: float = config.CDN_BREAKER_RESET_SECONDS,
+        clock=time.monotonic
+    ):
+        """
+        Args:
+            name: 名称（CDN 账号，用于日志和指标）
+            failure_threshold: 连续失败多少次后打开，0 表示不熔断
+            reset_seconds: 打开后多长时间进入半开状态（秒）
+            clock: 时钟（测试中替换）
+        """
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.clock = clock
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        """当前状态（打开超过 reset_seconds 后为半开）"""
+        if self.opened_at is None:
+            return CLOSED
+        if self.clock() - self.opened_at >= self.reset_seconds:
+            return HALF_OPEN
+        return OPEN
+
+    def retry_after(self) -> float:
+        """距离进入半开状态的秒数（未打开时为 0）"""
+        if self.opened_at is None:
+            return 0.0
+        return max(0.0, self.opened_at + self.reset_seconds - self.clock())
+
+    def allow(self) -> bool:
+        """是否放行本次调用（半开状态只放行一个试探调用）"""
+        with self._lock:
+            state = self.state
+            if state == CLOSED:
+                return True
+            if state == HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def record_success(self):
+        """调用成功（或失败原因与 API 故障无关）"""
+        with self._lock:
+            if self.opened_at is not None:
+                logger.info(f"✅ CDN API 已恢复，熔断器关闭（账号 {self.name}）")
+            self.failures = 0
+            self.opened_at = None
+            self._probing = False
+            self._report()
+
+    def record_failure(self):
+        """调用因 API 故障失败"""
+        with self._lock:
+            self.failures += 1
+            if self._probing or (self.failure_threshold and self.failures >= self.failure_threshold):
+                if self._probing or self.opened_at is None:
+                    logger.warning(
+                        f"⚡ CDN API 连续失败 {self.failures} 次，熔断器打开（账号 {self.name}），"
+                        f"{self.reset_seconds:.0f} 秒内直接失败"
+                    )
+                self.opened_at = self.clock()
+                self._probing = False
+            self._report()
+
+    def _report(self):
+        metrics.CDN_CIRCUIT_STATE.labels(account=self.name).set(_STATE_VALUES[self.state])
@@ -8,6 +8,15 @@ from pathlib import Path
 SERVER_HOST = os.getenv("SERVER_HOST", "0.0.0.0")
 SERVER_PORT = int(os.getenv("SERVER_PORT", "8899"))
 
+# uvicorn worker 进程数，大于 1 时由 Leader 进程负责 Telegram 轮询和 CDN 提交
+SERVER_WORKERS = int(os.getenv("SERVER_WORKERS", "1"))
+
+# Leader 选举文件锁路径（所有 worker 必须指向同一个文件）
+LEADER_LOCK_FILE = os.getenv("LEADER_LOCK_FILE", "data/leader.lock")
+
+# 非 Leader worker 重试接管的间隔（秒）
+LEADER_RETRY_INTERVAL = int(os.getenv("LEADER_RETRY_INTERVAL", "5"))
+
 # ==================== 路径映射配置 ====================
 #
 # 路径映射的工作流程：
@@ -36,9 +45,13 @@ STRM_MOUNT_MAPPINGS = {
 
 # 3. 宿主机路径 → CDN URL 映射
 # 将宿主机实际路径映射到 CDN 访问 URL，用于预热
+# 同一批文件通过多个 CDN 域名分发时，目标可以写成列表：审核请求中显示第一个 URL，
+# 批准后所有域名的 URL 都会提交预热（各域名所属的账号见 CDN_ACCOUNTS）
 CDN_URL_MAPPINGS = {
     # 宿主机路径 /media/xxx → CDN URL https://qiufeng.huaijiufu.com/xxx
     "/media/": "https://qiufeng.huaijiufu.com/",
+    # 多个域名：
+    # "/media/": ["https://qiufeng.huaijiufu.com/", "https://backup.example.com/"],
 }
 
 # 4. 不预热路径黑名单
@@ -73,15 +86,113 @@ SMART_MATCH_CDN_BASE = os.getenv("SMART_MATCH_CDN_BASE", "https://your-cdn-domai
 LOG_FILE = "webhook.log"
 LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
 
+# Webhook 请求采集文件（JSON Lines，供 benchmark_webhook.py 回放），留空则不采集
+WEBHOOK_CAPTURE_FILE = os.getenv("WEBHOOK_CAPTURE_FILE", "")
+
 # 腾讯云 CDN 配置（暂未使用，后续添加预热功能时使用）
 TENCENT_SECRET_ID = os.getenv("TENCENT_SECRET_ID", "")
 TENCENT_SECRET_KEY = os.getenv("TENCENT_SECRET_KEY", "")
 CDN_DOMAIN = os.getenv("CDN_DOMAIN", "nginx.example.com")
 
 # 预热配置
+# CDN 服务商：tencent（腾讯云）或 mock（本地模拟服务，见 mock_cdn.py）
+CDN_PROVIDER = os.getenv("CDN_PROVIDER", "tencent")
+CDN_MOCK_ENDPOINT = os.getenv("CDN_MOCK_ENDPOINT", "http://127.0.0.1:9900")
+
+# 其他 CDN 账号：账号名称 → 配置，domains 中的域名使用该账号提交，未列出的域名使用默认账号
+# （CDN_PROVIDER + TENCENT_SECRET_ID / TENCENT_SECRET_KEY）。每个账号使用独立的客户端、
+# 每日配额和提交节奏，可选 provider、secret_id、secret_key、endpoint（mock）、batch_size、daily_quota
+CDN_ACCOUNTS = {
+    # "backup": {
+    #     "provider": "tencent",
+    #     "secret_id": os.getenv("TENCENT_BACKUP_SECRET_ID", ""),
+    #     "secret_key": os.getenv("TENCENT_BACKUP_SECRET_KEY", ""),
+    #     "domains": ["backup.example.com"],
+    # },
+}
+
 PREHEAT_ENABLED = os.getenv("PREHEAT_ENABLED", "false").lower() == "true"
 PREHEAT_BATCH_SIZE = int(os.getenv("PREHEAT_BATCH_SIZE", "10"))  # 每批预热的URL数量
 
+# 同一 URL 提交预热后多长时间内（秒）不再重复提交，0 表示不过滤
+PREHEAT_HISTORY_SECONDS = int(os.getenv("PREHEAT_HISTORY_SECONDS", "86400"))
+
+# 预热方式：api（调用 CDN 服务商的预热接口）或 edge（直接请求 CDN URL，由边缘节点回源缓存）
+# edge 适用于预热接口覆盖不到的节点，不消耗预热配额，也不经过预热队列
+PREHEAT_MODE = os.getenv("PREHEAT_MODE", "api").lower()
+# 直接请求方式：get（流式读取后丢弃响应体）或 head
+PREHEAT_EDGE_METHOD = os.getenv("PREHEAT_EDGE_METHOD", "get").lower()
+# GET 时只预热文件开头 PREHEAT_EDGE_HEAD_MB MB（Range 请求，0 表示读取完整文件），
+# 以及结尾 PREHEAT_EDGE_TAIL_MB MB（MKV/MP4 的索引常在文件末尾，起播和拖动进度时会读取）
+PREHEAT_EDGE_HEAD_MB = float(os.getenv("PREHEAT_EDGE_HEAD_MB", "0"))
+PREHEAT_EDGE_TAIL_MB = float(os.getenv("PREHEAT_EDGE_TAIL_MB", "0"))
+# 按媒体库（CDN URL 第一级目录）或媒体类型单独设置，格式 名称:开头MB+结尾MB，逗号分隔，
+# 如 "电影:64+16,Episode:32+8"，媒体库优先于媒体类型；开头为 0 表示读取完整文件
+PREHEAT_EDGE_PARTIAL_RULES = {
+    name.strip(): (float(sizes.partition("+")[0] or 0), float(sizes.partition("+")[2] or 0))
+    for name, _, sizes in (
+        item.partition(":") for item in os.getenv("PREHEAT_EDGE_PARTIAL_RULES", "").split(",")
+    )
+    if name.strip()
+}
+PREHEAT_EDGE_CONCURRENCY = int(os.getenv("PREHEAT_EDGE_CONCURRENCY", "8"))  # 总并发请求数（连接池大小）
+PREHEAT_EDGE_PER_HOST = int(os.getenv("PREHEAT_EDGE_PER_HOST", "4"))  # 同一域名的并发请求数
+PREHEAT_EDGE_TIMEOUT = float(os.getenv("PREHEAT_EDGE_TIMEOUT", "30"))  # 连接和每次读取的超时（秒）
+
+# 预热队列：批准的 URL 先写入持久化队列，由 Leader 按剩余的每日预热配额匀速提交
+PREHEAT_QUEUE_ENABLED = os.getenv("PREHEAT_QUEUE_ENABLED", "true").lower() == "true"
+PREHEAT_QUEUE_INTERVAL = int(os.getenv("PREHEAT_QUEUE_INTERVAL", "60"))  # 检查队列的间隔（秒）
+# 空闲时积累的提交额度上限，即新批准的 URL 最多可以立即提交多少个
+PREHEAT_QUEUE_BURST = int(os.getenv("PREHEAT_QUEUE_BURST", "50"))
+# 非配额原因提交失败的 URL 最多尝试次数，超过后移出队列
+PREHEAT_QUEUE_MAX_ATTEMPTS = int(os.getenv("PREHEAT_QUEUE_MAX_ATTEMPTS", "3"))
+
+# 预热队列优先级（分值越高越先提交，不同媒体库之间轮流提交）
+# 媒体类型加分（类型:分值，逗号分隔）
+PREHEAT_PRIORITY_TYPE_WEIGHTS = {
+    media_type.strip(): int(weight)
+    for media_type, _, weight in (
+        item.partition(":") for item in os.getenv("PREHEAT_PRIORITY_TYPE_WEIGHTS", "Episode:20,Movie:10").split(",")
+    )
+    if media_type.strip() and weight.strip()
+}
+# 新入库加分：刚入库时加 PREHEAT_PRIORITY_RECENCY 分，PREHEAT_PRIORITY_RECENCY_DAYS 天内线性降到 0
+PREHEAT_PRIORITY_RECENCY = int(os.getenv("PREHEAT_PRIORITY_RECENCY", "50"))
+PREHEAT_PRIORITY_RECENCY_DAYS = int(os.getenv("PREHEAT_PRIORITY_RECENCY_DAYS", "7"))
+# 连载热度：同一季每多一次入库（多次形成剧集分组）加分，最多加 PREHEAT_PRIORITY_POPULARITY_MAX 分
+PREHEAT_PRIORITY_POPULARITY_STEP = int(os.getenv("PREHEAT_PRIORITY_POPULARITY_STEP", "10"))
+PREHEAT_PRIORITY_POPULARITY_MAX = int(os.getenv("PREHEAT_PRIORITY_POPULARITY_MAX", "30"))
+# 管理员通过 /priority 命令提升优先级时默认加的分
+PREHEAT_PRIORITY_ADMIN = int(os.getenv("PREHEAT_PRIORITY_ADMIN", "1000"))
+
+# 文件替换检测：同一 CDN URL 的文件大小或修改时间变化时（在原路径替换/升级了文件），
+# 先刷新（PurgeUrlsCache）CDN 上的旧缓存，已批准预热过的 URL 再重新预热
+PURGE_ON_REPLACE = os.getenv("PURGE_ON_REPLACE", "true").lower() == "true"
+# 重新预热的优先级分值（刷新后旧缓存已失效，应尽快重新预热）
+PREHEAT_PRIORITY_REPLACED = int(os.getenv("PREHEAT_PRIORITY_REPLACED", "500"))
+# 每次检查队列时每个账号最多刷新的 URL 数量（刷新配额与预热配额相互独立）
+PURGE_QUEUE_BURST = int(os.getenv("PURGE_QUEUE_BURST", "100"))
+
+# CDN API 熔断：连续 CDN_BREAKER_FAILURES 次 API 故障（服务端错误、网络错误、频率限制）后，
+# CDN_BREAKER_RESET_SECONDS 秒内直接失败，之后放行一次试探调用；0 表示不熔断
+CDN_BREAKER_FAILURES = int(os.getenv("CDN_BREAKER_FAILURES", "5"))
+CDN_BREAKER_RESET_SECONDS = float(os.getenv("CDN_BREAKER_RESET_SECONDS", "60"))
+# 直接提交（没有预热队列）时因 API 故障失败的 URL 写入重试队列，按指数退避（加随机抖动）重试：
+# 第 n 次重试前等待 CDN_RETRY_BASE_SECONDS * 2^n 秒的 50%~100%，最长 CDN_RETRY_MAX_SECONDS 秒
+CDN_RETRY_BASE_SECONDS = float(os.getenv("CDN_RETRY_BASE_SECONDS", "30"))
+CDN_RETRY_MAX_SECONDS = float(os.getenv("CDN_RETRY_MAX_SECONDS", "3600"))
+CDN_RETRY_MAX_ATTEMPTS = int(os.getenv("CDN_RETRY_MAX_ATTEMPTS", "10"))  # 超过后移出重试队列
+CDN_RETRY_INTERVAL = int(os.getenv("CDN_RETRY_INTERVAL", "30"))  # 检查重试队列的间隔（秒）
+CDN_RETRY_BURST = int(os.getenv("CDN_RETRY_BURST", "100"))  # 每次检查每个账号最多重试的 URL 数量
+
+# 预热配额（DescribePushQuota）查询结果的缓存时间（秒），期间按本地提交数量扣减
+PREHEAT_QUOTA_REFRESH_SECONDS = int(os.getenv("PREHEAT_QUOTA_REFRESH_SECONDS", "600"))
+PREHEAT_QUOTA_AREA = os.getenv("PREHEAT_QUOTA_AREA", "mainland")  # mainland / overseas
+# 配额查询失败时使用的每日配额
+PREHEAT_DAILY_QUOTA = int(os.getenv("PREHEAT_DAILY_QUOTA", "1000"))
+# 配额每日零点重置所在时区（UTC 偏移小时数，腾讯云按北京时间重置）
+PREHEAT_QUOTA_RESET_UTC_OFFSET = int(os.getenv("PREHEAT_QUOTA_RESET_UTC_OFFSET", "8"))
+
 # ==================== Telegram Bot 审核配置 ====================
 # 是否启用 Telegram 人工审核
 TELEGRAM_REVIEW_ENABLED = os.getenv("TELEGRAM_REVIEW_ENABLED", "true").lower() == "true"
@@ -97,9 +208,13 @@ TELEGRAM_ADMIN_CHAT_IDS = [
     if chat_id.strip()
 ]
 
-# 审核超时时间（秒），超时后自动拒绝
+# 审核超时时间（秒），超时后标记为已过期（不会预热），0 表示不限时
 REVIEW_TIMEOUT_SECONDS = int(os.getenv("REVIEW_TIMEOUT_SECONDS", "86400"))  # 默认 24 小时
 
+# 过期清理的检查间隔（秒）和每批处理的最大数量（每批一个事务）
+EXPIRY_SWEEP_INTERVAL = int(os.getenv("EXPIRY_SWEEP_INTERVAL", "60"))
+EXPIRY_SWEEP_BATCH_SIZE = int(os.getenv("EXPIRY_SWEEP_BATCH_SIZE", "500"))
+
 # 如果未启用 Telegram 审核，是否自动批准所有预热请求
 AUTO_APPROVE_IF_NO_REVIEW = os.getenv("AUTO_APPROVE_IF_NO_REVIEW", "false").lower() == "true"
 
@@ -112,3 +227,54 @@ BATCH_PUSH_SIZE = int(os.getenv("BATCH_PUSH_SIZE", "10"))
 
 # 单条消息最多包含的媒体数量（Telegram 消息长度限制）
 MAX_ITEMS_PER_MESSAGE = int(os.getenv("MAX_ITEMS_PER_MESSAGE", "5"))
+
+# /pending、/search 命令每页显示的请求数量
+PENDING_PAGE_SIZE = int(os.getenv("PENDING_PAGE_SIZE", "10"))
+
+# ==================== 剧集分组审核配置 ====================
+# 是否把同一季（同一目录）的剧集合并为一个审核项
+REVIEW_GROUP_ENABLED = os.getenv("REVIEW_GROUP_ENABLED", "true").lower() == "true"
+
+# 分组收集窗口（秒）- 第一集到达后等待这么长时间再推送整组审核
+REVIEW_GROUP_WINDOW = int(os.getenv("REVIEW_GROUP_WINDOW", "300"))
+
+# ==================== 媒体库增量扫描配置 ====================
+# 定期扫描宿主机媒体目录，补偿 Emby 漏发的 Webhook
+# 扫描根目录（宿主机路径，逗号分隔），留空则不启用
+LIBRARY_SCAN_ROOTS = [
+    path.strip()
+    for path in os.getenv("LIBRARY_SCAN_ROOTS", "").split(",")
+    if path.strip()
+]
+
+# 扫描间隔（秒），0 表示禁用
+LIBRARY_SCAN_INTERVAL = int(os.getenv("LIBRARY_SCAN_INTERVAL", "3600"))
+
+# 参与扫描的媒体文件扩展名（逗号分隔）
+LIBRARY_SCAN_EXTENSIONS = [
+    ext.strip()
+    for ext in os.getenv(
+        "LIBRARY_SCAN_EXTENSIONS",
+        ".mkv,.mp4,.ts,.m2ts,.avi,.mov,.wmv,.flv,.rmvb,.webm,.iso,.strm"
+    ).split(",")
+    if ext.strip()
+]
+
+# 文件清单数据库路径
+LIBRARY_MANIFEST_DB_FILE = os.getenv("LIBRARY_MANIFEST_DB_FILE", "data/library_manifest.db")
+
+# 首次扫描某个根目录时是否把已有文件全部当作新增（默认只建立清单）
+LIBRARY_SCAN_EMIT_INITIAL = os.getenv("LIBRARY_SCAN_EMIT_INITIAL", "false").lower() == "true"
+
+# ==================== 审核记录归档配置 ====================
+# 审核完成的请求在热库中保留的天数，超过后移入归档库（0 表示不归档）
+RETENTION_DAYS = int(os.getenv("RETENTION_DAYS", "90"))
+
+# 归档任务执行间隔（秒）
+RETENTION_INTERVAL = int(os.getenv("RETENTION_INTERVAL", "86400"))
+
+# 每批归档的数量（每批两个短事务）
+RETENTION_BATCH_SIZE = int(os.getenv("RETENTION_BATCH_SIZE", "1000"))
+
+# 归档库文件
+ARCHIVE_DB_FILE = os.getenv("ARCHIVE_DB_FILE", "data/preheat_archive.db")
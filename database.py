@@ -4,10 +4,21 @@
 import sqlite3
 import os
 import json
+import hashlib
+import re
 import logging
+import time
+import threading
 from datetime import datetime
 from typing import Optional, List, Dict, Any
 from pathlib import Path
+from urllib.parse import urlsplit, urlunsplit
+
+from metrics import DB_QUERY_SECONDS
+from migrations import (
+    Migration, MigrationRunner, OnlineTableRebuild, ensure_column, table_columns, table_exists
+)
+from review_store import ReviewStore
 
 logger = logging.getLogger(__name__)
 
@@ -15,9 +26,428 @@ logger = logging.getLogger(__name__)
 # 使用环境变量配置，方便 Docker 部署
 DB_FILE = os.getenv("DB_FILE", "data/preheat_review.db")
 
+# 存储引擎：sqlite（默认）或 memory（只保存在进程内存中，用于测试和压测）
+DB_BACKEND = os.getenv("DB_BACKEND", "sqlite")
+
+# 待推送条件：尚未推送，且不属于仍在收集中的剧集分组
+# （分组关闭时会统一标记，之后才写入的剧集按普通请求推送）
+UNNOTIFIED_CONDITION = """
+    notified_at IS NULL
+    AND (group_id IS NULL OR NOT EXISTS (
+        SELECT 1 FROM review_groups g
+        WHERE g.id = review_requests.group_id AND g.status = 'open'
+    ))
+"""
+
+# 审核请求表结构（去重使用 url_hash 索引，不再对长 URL 建唯一索引）
+REVIEW_REQUESTS_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS {table} (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        cdn_url TEXT NOT NULL,
+        media_name TEXT NOT NULL,
+        media_type TEXT NOT NULL,
+        emby_path TEXT,
+        host_path TEXT,
+        media_info TEXT,
+        status TEXT DEFAULT 'pending',
+        telegram_message_id INTEGER,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        reviewed_at TIMESTAMP,
+        reviewed_by TEXT,
+        review_action TEXT,
+        group_id INTEGER,
+        notified_at TIMESTAMP,
+        url_hash INTEGER
+    )
+"""
+
+
+# 结构迁移回填数据时每段处理的行数（每段一个短写事务）
+MIGRATION_BATCH_SIZE = int(os.getenv("MIGRATION_BATCH_SIZE", "5000"))
+
+# trigram 全文索引能查找的最短关键词长度
+SEARCH_MIN_TERM_LENGTH = 3
+
+
+def normalize_url(url: str) -> str:
+    """规范化 URL 用于去重：去掉首尾空白，协议和域名转小写（路径区分大小写）"""
+    parts = urlsplit(url.strip())
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path, parts.query, parts.fragment))
+
+
+def url_hash(url: str) -> int:
+    """
+    规范化 URL 的 64 位哈希（有符号整数，可直接存入 SQLite INTEGER）
+
+    哈希只用于缩小查找范围，判断重复时仍比较完整 URL，碰撞不会导致误判
+    """
+    return _normalized_url_hash(normalize_url(url))
+
+
+def _normalized_url_hash(normalized: str) -> int:
+    """已规范化 URL 的哈希（避免重复规范化）"""
+    digest = hashlib.blake2b(normalized.encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'big', signed=True)
+
+
+# ==================== 数据库结构迁移 ====================
+# 每个迁移都必须可以重复执行：引入迁移框架之前的数据库没有 schema_version 表，
+# 会从第 1 个迁移重新执行一遍，已完成的修改应当被跳过
+
+def _create_review_requests(cursor: sqlite3.Cursor):
+    cursor.execute(REVIEW_REQUESTS_SCHEMA.format(table="review_requests"))
+
+
+def _add_group_id(cursor: sqlite3.Cursor):
+    ensure_column(cursor, "review_requests", "group_id", "INTEGER")
+
+
+def _add_notified_at(cursor: sqlite3.Cursor) -> bool:
+    # notified_at 为空表示尚未推送到 Telegram（数据库即推送队列）
+    return ensure_column(cursor, "review_requests", "notified_at", "TIMESTAMP")
+
+
+def _backfill_notified_at(cursor: sqlite3.Cursor, start: int, end: int):
+    # 升级前的请求已经由旧的内存队列推送过，不再重复推送
+    cursor.execute("""
+        UPDATE review_requests SET notified_at = created_at
+        WHERE id > ? AND id <= ? AND notified_at IS NULL
+    """, (start, end))
+
+
+def _add_url_hash(cursor: sqlite3.Cursor) -> bool:
+    added = ensure_column(cursor, "review_requests", "url_hash", "INTEGER")
+    # 先建索引，回填期间写入的新请求也能按索引去重
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_url_hash ON review_requests(url_hash)")
+    return added
+
+
+def _backfill_url_hash(cursor: sqlite3.Cursor, start: int, end: int):
+    cursor.execute("""
+        UPDATE review_requests SET url_hash = url_hash(cdn_url)
+        WHERE id > ? AND id <= ? AND url_hash IS NULL
+    """, (start, end))
+
+
+def _has_url_unique_constraint(cursor: sqlite3.Cursor) -> bool:
+    cursor.execute("""
+        SELECT 1 FROM sqlite_master
+        WHERE type = 'index' AND tbl_name = 'review_requests' AND name LIKE 'sqlite_autoindex_%'
+    """)
+    return cursor.fetchone() is not None
+
+
+# 旧版本的 UNIQUE(cdn_url) 唯一索引几乎和表一样大，重建表去掉该约束
+_drop_url_unique = OnlineTableRebuild("review_requests", REVIEW_REQUESTS_SCHEMA, _has_url_unique_constraint)
+
+
+def _create_review_groups(cursor: sqlite3.Cursor):
+    # 剧集分组审核表（同一季的多集合并为一个审核项）
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS review_groups (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            group_key TEXT NOT NULL,
+            title TEXT NOT NULL,
+            media_type TEXT NOT NULL,
+            status TEXT DEFAULT 'open',
+            telegram_message_id INTEGER,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            closes_at REAL NOT NULL,
+            reviewed_at TIMESTAMP,
+            reviewed_by TEXT
+        )
+    """)
+
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_groups_status_closes_at
+        ON review_groups(status, closes_at)
+    """)
+
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_groups_key
+        ON review_groups(group_key)
+    """)
+
+
+def _create_review_requests_indexes(cursor: sqlite3.Cursor):
+    # 列表查询按状态过滤后按时间排序，复合索引可以直接按索引顺序读取，无需额外排序；
+    # 统计查询只需要 status 列，可以在索引上完成（覆盖索引）
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_status_created_at
+        ON review_requests(status, created_at)
+    """)
+
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_status_reviewed_at
+        ON review_requests(status, reviewed_at)
+    """)
+
+    # 旧版本的单列状态索引是复合索引的前缀，已经多余
+    cursor.execute("DROP INDEX IF EXISTS idx_status")
+
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_created_at
+        ON review_requests(created_at)
+    """)
+
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_group_id
+        ON review_requests(group_id)
+    """)
+
+    # 去重查找：8 字节整数索引，远小于 URL 文本的唯一索引
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_url_hash
+        ON review_requests(url_hash)
+    """)
+
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_unnotified
+        ON review_requests(id)
+        WHERE notified_at IS NULL
+    """)
+
+
+def _create_review_messages(cursor: sqlite3.Cursor):
+    # 审核消息与请求的对应关系（一条批量消息包含多个请求，并发送给多位管理员），
+    # 用于请求超时后批量编辑对应的 Telegram 消息
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS review_messages (
+            chat_id INTEGER NOT NULL,
+            message_id INTEGER NOT NULL,
+            request_id INTEGER NOT NULL,
+            kind TEXT NOT NULL DEFAULT 'batch',
+            PRIMARY KEY (chat_id, message_id, request_id)
+        ) WITHOUT ROWID
+    """)
+
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_review_messages_request
+        ON review_messages(request_id)
+    """)
+
+
+def _create_review_tombstones(cursor: sqlite3.Cursor) -> bool:
+    # 已归档请求的墓碑：归档后原始行从热库删除，只保留 URL 用于去重
+    # 早期版本以 cdn_url 为主键，改为和请求表一样按 url_hash 查找
+    columns = table_columns(cursor, "review_tombstones")
+    migrate = "cdn_url" in columns and "url_hash" not in columns
+    if migrate:
+        cursor.execute("ALTER TABLE review_tombstones RENAME TO review_tombstones_old")
+        logger.info("数据库升级: review_tombstones 改为按 url_hash 索引")
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS review_tombstones (
+            url_hash INTEGER NOT NULL,
+            cdn_url TEXT NOT NULL,
+            request_id INTEGER NOT NULL,
+            status TEXT NOT NULL,
+            archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_tombstones_url_hash
+        ON review_tombstones(url_hash)
+    """)
+    return migrate
+
+
+def _backfill_review_tombstones(cursor: sqlite3.Cursor, start: int, end: int):
+    cursor.execute("""
+        INSERT INTO review_tombstones (url_hash, cdn_url, request_id, status, archived_at)
+        SELECT url_hash(cdn_url), cdn_url, request_id, status, archived_at
+        FROM review_tombstones_old
+        WHERE rowid > ? AND rowid <= ?
+    """, (start, end))
+
+
+def _drop_old_review_tombstones(cursor: sqlite3.Cursor):
+    cursor.execute("DROP TABLE IF EXISTS review_tombstones_old")
+
+
+def _create_search_index(cursor: sqlite3.Cursor) -> bool:
+    """
+    创建全文索引 review_search（外部内容表，内容即 review_requests，由触发器同步）
+
+    使用 trigram 分词，中文名称和路径中任意 3 个及以上字符的片段都可以走索引。
+    SQLite 未编译 FTS5 或版本低于 3.34 时跳过，搜索退化为 LIKE 扫描。
+
+    Returns:
+        是否需要为已有请求建立索引
+    """
+    existed = table_exists(cursor, "review_search")
+
+    try:
+        cursor.execute("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS review_search USING fts5(
+                media_name, emby_path, cdn_url,
+                content='review_requests', content_rowid='id',
+                tokenize='trigram'
+            )
+        """)
+    except sqlite3.OperationalError as e:
+        logger.warning(f"⚠️  SQLite 不支持 FTS5 trigram 分词，搜索将使用 LIKE 扫描: {str(e)}")
+        return False
+
+    # 只有名称、路径变化时才更新索引，审核状态变化不影响
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS review_search_insert AFTER INSERT ON review_requests BEGIN
+            INSERT INTO review_search (rowid, media_name, emby_path, cdn_url)
+            VALUES (new.id, new.media_name, new.emby_path, new.cdn_url);
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS review_search_delete AFTER DELETE ON review_requests BEGIN
+            INSERT INTO review_search (review_search, rowid, media_name, emby_path, cdn_url)
+            VALUES ('delete', old.id, old.media_name, old.emby_path, old.cdn_url);
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS review_search_update
+        AFTER UPDATE OF media_name, emby_path, cdn_url ON review_requests BEGIN
+            INSERT INTO review_search (review_search, rowid, media_name, emby_path, cdn_url)
+            VALUES ('delete', old.id, old.media_name, old.emby_path, old.cdn_url);
+            INSERT INTO review_search (rowid, media_name, emby_path, cdn_url)
+            VALUES (new.id, new.media_name, new.emby_path, new.cdn_url);
+        END
+    """)
+
+    # 已有数据库第一次创建索引时，为现有请求分段建立索引（新请求由触发器写入）
+    cursor.execute("SELECT 1 FROM review_requests LIMIT 1")
+    return not existed and cursor.fetchone() is not None
+
+
+def _backfill_search_index(cursor: sqlite3.Cursor, start: int, end: int):
+    cursor.execute("""
+        INSERT INTO review_search (rowid, media_name, emby_path, cdn_url)
+        SELECT id, media_name, emby_path, cdn_url FROM review_requests
+        WHERE id > ? AND id <= ?
+    """, (start, end))
+
+
+def _create_preheat_history(cursor: sqlite3.Cursor):
+    # 每个 URL 最近一次提交预热的记录，用于过滤重复提交（见 preheat_history.py）
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS preheat_history (
+            url_hash INTEGER PRIMARY KEY,
+            cdn_url TEXT NOT NULL,
+            pushed_at REAL NOT NULL,
+            task_id TEXT
+        )
+    """)
+
+
+def _create_preheat_queue(cursor: sqlite3.Cursor):
+    # 已批准、等待按配额提交预热的 URL（见 preheat_scheduler.py）
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS preheat_queue (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            cdn_url TEXT NOT NULL UNIQUE,
+            priority INTEGER NOT NULL DEFAULT 0,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            enqueued_at REAL NOT NULL
+        )
+    """)
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_preheat_queue_order ON preheat_queue(priority DESC, id)"
+    )
+
+
+def _add_preheat_queue_library(cursor: sqlite3.Cursor):
+    # 按媒体库轮流出队；升级前已在队列中的 URL 归入空媒体库，同样参与轮流
+    ensure_column(cursor, "preheat_queue", "library", "TEXT NOT NULL DEFAULT ''")
+    cursor.execute("DROP INDEX IF EXISTS idx_preheat_queue_order")
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_preheat_queue_library
+        ON preheat_queue(library, priority DESC, id)
+    """)
+
+
+def _add_preheat_queue_account(cursor: sqlite3.Cursor):
+    # 多账号时每个账号按自己的配额出队；升级前已在队列中的 URL 归入默认账号
+    ensure_column(cursor, "preheat_queue", "account", "TEXT NOT NULL DEFAULT 'default'")
+    cursor.execute("DROP INDEX IF EXISTS idx_preheat_queue_library")
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_preheat_queue_account
+        ON preheat_queue(account, library, priority DESC, id)
+    """)
+
+
+def _create_file_replacement_tables(cursor: sqlite3.Cursor):
+    # 每个 CDN URL 最近一次看到的文件大小和修改时间，变化时说明文件在原路径被替换（见 cache_purge.py）
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS file_signatures (
+            url_hash INTEGER PRIMARY KEY,
+            cdn_url TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            mtime REAL NOT NULL,
+            seen_at REAL NOT NULL
+        )
+    """)
+    # 等待刷新缓存的 URL，刷新成功后按 repreheat 重新加入预热队列
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS purge_queue (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            cdn_url TEXT NOT NULL UNIQUE,
+            account TEXT NOT NULL DEFAULT 'default',
+            repreheat INTEGER NOT NULL DEFAULT 1,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            enqueued_at REAL NOT NULL
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_purge_queue_account ON purge_queue(account, id)")
+
+
+def _create_retry_queue(cursor: sqlite3.Cursor):
+    # 直接提交时因 API 故障失败、等待退避重试的 URL（见 retry_queue.py）
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS retry_queue (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            cdn_url TEXT NOT NULL UNIQUE,
+            account TEXT NOT NULL DEFAULT 'default',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            next_attempt_at REAL NOT NULL,
+            last_error TEXT,
+            enqueued_at REAL NOT NULL
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_retry_queue_due ON retry_queue(account, next_attempt_at)")
+
+# 已发布的迁移不能修改或删除，结构变化只能追加新版本
+MIGRATIONS = [
+    Migration(1, "创建审核请求表", _create_review_requests),
+    Migration(2, "审核请求新增 group_id", _add_group_id),
+    Migration(3, "审核请求新增 notified_at", _add_notified_at, backfill=_backfill_notified_at),
+    Migration(4, "审核请求新增 url_hash", _add_url_hash, backfill=_backfill_url_hash),
+    Migration(5, "去掉 UNIQUE(cdn_url) 约束", _drop_url_unique.apply,
+              backfill=_drop_url_unique.backfill, finalize=_drop_url_unique.finalize),
+    Migration(6, "创建剧集分组表", _create_review_groups),
+    Migration(7, "审核请求索引", _create_review_requests_indexes),
+    Migration(8, "创建审核消息表", _create_review_messages),
+    Migration(9, "墓碑改为按 url_hash 索引", _create_review_tombstones,
+              backfill=_backfill_review_tombstones, finalize=_drop_old_review_tombstones,
+              table="review_tombstones_old", key="rowid"),
+    Migration(10, "全文索引", _create_search_index, backfill=_backfill_search_index),
+    Migration(11, "创建预热记录表", _create_preheat_history),
+    Migration(12, "创建预热队列表", _create_preheat_queue),
+    Migration(13, "预热队列新增媒体库", _add_preheat_queue_library),
+    Migration(14, "预热队列新增账号", _add_preheat_queue_account),
+    Migration(15, "创建文件签名表和刷新队列表", _create_file_replacement_tables),
+    Migration(16, "创建重试队列表", _create_retry_queue),
+]
+
 
-class ReviewDatabase:
-    """CDN 预热审核数据库"""
+def _connect_for_migration(db_file: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(db_file)
+    conn.create_function("url_hash", 1, url_hash, deterministic=True)
+    return conn
+
+
+class ReviewDatabase(ReviewStore):
+    """CDN 预热审核数据库（SQLite 引擎）"""
+
+    backend = "sqlite"
 
     def __init__(self, db_file: str = DB_FILE):
         self.db_file = db_file
@@ -42,44 +472,31 @@ class ReviewDatabase:
             raise
 
     def _init_database(self):
-        """初始化数据库表"""
+        """初始化数据库：执行尚未完成的结构迁移"""
         try:
-            with sqlite3.connect(self.db_file) as conn:
-                cursor = conn.cursor()
+            conn = sqlite3.connect(self.db_file)
+            try:
+                # 新数据库启用增量 VACUUM，归档删除数据后可以逐步归还空闲页
+                # （必须在建表前设置，已有数据库需停止服务后执行 python retention.py enable-incremental-vacuum）
+                conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
 
-                # 创建审核请求表
-                cursor.execute("""
-                    CREATE TABLE IF NOT EXISTS review_requests (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        cdn_url TEXT NOT NULL,
-                        media_name TEXT NOT NULL,
-                        media_type TEXT NOT NULL,
-                        emby_path TEXT,
-                        host_path TEXT,
-                        media_info TEXT,
-                        status TEXT DEFAULT 'pending',
-                        telegram_message_id INTEGER,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        reviewed_at TIMESTAMP,
-                        reviewed_by TEXT,
-                        review_action TEXT,
-                        UNIQUE(cdn_url)
-                    )
-                """)
+                # WAL 模式允许多个 worker 进程并发读写
+                conn.execute("PRAGMA journal_mode=WAL").fetchone()
+            finally:
+                conn.close()
 
-                # 创建索引
-                cursor.execute("""
-                    CREATE INDEX IF NOT EXISTS idx_status
-                    ON review_requests(status)
-                """)
+            # 回填按段提交，升级大数据库时不会长时间持有写锁
+            MigrationRunner(
+                self.db_file, MIGRATIONS,
+                batch_size=MIGRATION_BATCH_SIZE,
+                connect=_connect_for_migration
+            ).run()
 
-                cursor.execute("""
-                    CREATE INDEX IF NOT EXISTS idx_created_at
-                    ON review_requests(created_at)
-                """)
+            with sqlite3.connect(self.db_file) as conn:
+                # 媒体名称、路径的全文索引（SQLite 不支持 FTS5 时搜索使用 LIKE 扫描）
+                self.search_enabled = table_exists(conn.cursor(), "review_search")
 
-                conn.commit()
-                logger.info(f"数据库初始化完成: {self.db_file}")
+            logger.info(f"数据库初始化完成: {self.db_file}")
 
         except sqlite3.OperationalError as e:
             logger.error(f"数据库初始化失败: {str(e)}")
@@ -91,6 +508,16 @@ class ReviewDatabase:
             logger.error(f"数据库初始化失败（未知错误）: {str(e)}")
             raise
 
+    @staticmethod
+    def _url_exists(cursor: sqlite3.Cursor, table: str, normalized: str, hash_value: int) -> bool:
+        """按 url_hash 索引查找，再比较完整 URL（避免哈希碰撞误判）"""
+        cursor.execute(f"SELECT cdn_url FROM {table} WHERE url_hash = ?", (hash_value,))
+        return any(
+            row[0] == normalized or normalize_url(row[0]) == normalized
+            for row in cursor.fetchall()
+        )
+
+    @DB_QUERY_SECONDS.labels(operation="insert").time()
     def add_review_request(
         self,
         cdn_url: str,
@@ -98,7 +525,8 @@ class ReviewDatabase:
         media_type: str,
         emby_path: str = "",
         host_path: str = "",
-        media_info: Dict[str, Any] = None
+        media_info: Dict[str, Any] = None,
+        group_id: Optional[int] = None
     ) -> Optional[int]:
         """
         添加审核请求
@@ -110,34 +538,46 @@ class ReviewDatabase:
             emby_path: Emby 路径
             host_path: 宿主机路径
             media_info: 媒体详细信息
+            group_id: 所属剧集分组 ID（可选）
 
         Returns:
             请求 ID，如果失败返回 None
         """
         try:
+            normalized = normalize_url(cdn_url)
+            hash_value = _normalized_url_hash(normalized)
+            media_info_json = json.dumps(media_info or {}, ensure_ascii=False)
+
             with sqlite3.connect(self.db_file) as conn:
                 cursor = conn.cursor()
+                # 查重和写入在同一个写事务中完成，多个 worker 并发写入同一 URL 时不会重复
+                cursor.execute("BEGIN IMMEDIATE")
+
+                if self._url_exists(cursor, "review_requests", normalized, hash_value):
+                    logger.warning(f"审核请求已存在: {cdn_url}")
+                    return None
 
-                media_info_json = json.dumps(media_info or {}, ensure_ascii=False)
+                # 已归档的请求只在墓碑中保留 URL
+                if self._url_exists(cursor, "review_tombstones", normalized, hash_value):
+                    logger.warning(f"审核请求已存在（已归档）: {cdn_url}")
+                    return None
 
                 cursor.execute("""
                     INSERT INTO review_requests
-                    (cdn_url, media_name, media_type, emby_path, host_path, media_info)
-                    VALUES (?, ?, ?, ?, ?, ?)
-                """, (cdn_url, media_name, media_type, emby_path, host_path, media_info_json))
+                    (cdn_url, media_name, media_type, emby_path, host_path, media_info, group_id, url_hash)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                """, (cdn_url, media_name, media_type, emby_path, host_path, media_info_json, group_id, hash_value))
 
                 conn.commit()
                 request_id = cursor.lastrowid
                 logger.info(f"添加审核请求成功: ID={request_id}, URL={cdn_url}")
                 return request_id
 
-        except sqlite3.IntegrityError:
-            logger.warning(f"审核请求已存在: {cdn_url}")
-            return None
         except Exception as e:
             logger.error(f"添加审核请求失败: {str(e)}")
             return None
 
+    @DB_QUERY_SECONDS.labels(operation="update_message_id").time()
     def update_telegram_message_id(self, request_id: int, message_id: int):
         """更新 Telegram 消息 ID"""
         try:
@@ -153,6 +593,7 @@ class ReviewDatabase:
         except Exception as e:
             logger.error(f"更新消息 ID 失败: {str(e)}")
 
+    @DB_QUERY_SECONDS.labels(operation="approve").time()
     def approve_request(self, request_id: int, reviewed_by: str = "unknown"):
         """批准预热请求"""
         try:
@@ -171,6 +612,7 @@ class ReviewDatabase:
         except Exception as e:
             logger.error(f"批准请求失败: {str(e)}")
 
+    @DB_QUERY_SECONDS.labels(operation="reject").time()
     def reject_request(self, request_id: int, reviewed_by: str = "unknown"):
         """拒绝预热请求"""
         try:
@@ -189,6 +631,190 @@ class ReviewDatabase:
         except Exception as e:
             logger.error(f"拒绝请求失败: {str(e)}")
 
+    @DB_QUERY_SECONDS.labels(operation="count_unnotified").time()
+    def count_unnotified_requests(self) -> int:
+        """统计尚未推送到 Telegram 的请求数（不含收集中的剧集分组）"""
+        try:
+            with sqlite3.connect(self.db_file) as conn:
+                cursor = conn.cursor()
+                cursor.execute(f"""
+                    SELECT COUNT(*) FROM review_requests
+                    WHERE {UNNOTIFIED_CONDITION}
+                """)
+                return cursor.fetchone()[0]
+        except Exception as e:
+            logger.error(f"统计待推送请求失败: {str(e)}")
+            return 0
+
+    @DB_QUERY_SECONDS.labels(operation="claim_unnotified").time()
+    def claim_unnotified_requests(self, limit: int) -> List[Dict[str, Any]]:
+        """
+        取出一批尚未推送的请求并标记为已推送（同一事务内完成，避免重复推送）
+
+        Args:
+            limit: 最多取出的数量
+
+        Returns:
+            请求列表，按创建顺序排列
+        """
+        try:
+            with sqlite3.connect(self.db_file) as conn:
+                conn.row_factory = sqlite3.Row
+                cursor = conn.cursor()
+                cursor.execute("BEGIN IMMEDIATE")
+                cursor.execute(f"""
+                    SELECT * FROM review_requests
+                    WHERE {UNNOTIFIED_CONDITION}
+                    ORDER BY id
+                    LIMIT ?
+                """, (limit,))
+                rows = [dict(row) for row in cursor.fetchall()]
+
+                if rows:
+                    ids = [row['id'] for row in rows]
+                    marks = ",".join("?" * len(ids))
+                    cursor.execute(
+                        f"UPDATE review_requests SET notified_at = ? WHERE id IN ({marks})",
+                        [datetime.now().isoformat(), *ids]
+                    )
+                conn.commit()
+                return rows
+        except Exception as e:
+            logger.error(f"取出待推送请求失败: {str(e)}")
+            return []
+
+    def release_unnotified_requests(self, request_ids: List[int]):
+        """推送失败时撤销已推送标记，下一轮重新推送"""
+        if not request_ids:
+            return
+        try:
+            with sqlite3.connect(self.db_file) as conn:
+                marks = ",".join("?" * len(request_ids))
+                conn.execute(
+                    f"UPDATE review_requests SET notified_at = NULL WHERE id IN ({marks})",
+                    request_ids
+                )
+                conn.commit()
+        except Exception as e:
+            logger.error(f"撤销推送标记失败: {str(e)}")
+
+    def add_review_messages(self, chat_id: int, message_id: int, request_ids: List[int], kind: str = "batch"):
+        """
+        记录一条审核消息包含的请求
+
+        Args:
+            chat_id: 管理员 Chat ID
+            message_id: Telegram 消息 ID
+            request_ids: 消息中包含的请求 ID
+            kind: 消息类型，batch（逐项审核）或 group（剧集分组整组审核）
+        """
+        try:
+            with sqlite3.connect(self.db_file) as conn:
+                conn.executemany("""
+                    INSERT OR IGNORE INTO review_messages (chat_id, message_id, request_id, kind)
+                    VALUES (?, ?, ?, ?)
+                """, [(chat_id, message_id, request_id, kind) for request_id in request_ids])
+                conn.commit()
+        except Exception as e:
+            logger.error(f"记录审核消息失败: {str(e)}")
+
+    @DB_QUERY_SECONDS.labels(operation="expire").time()
+    def expire_overdue_requests(self, timeout_seconds: int, limit: int = 500) -> List[Dict[str, Any]]:
+        """
+        把超过审核时限仍未处理的请求标记为已过期（单个事务内完成一批）
+
+        沿 (status, created_at) 索引从最早的待审核请求开始读取，每次最多处理 limit 行，
+        调用方循环调用直到返回数量小于 limit。
+
+        Args:
+            timeout_seconds: 审核时限（秒）
+            limit: 本批最多处理的数量
+
+        Returns:
+            本批过期的请求列表
+        """
+        try:
+            with sqlite3.connect(self.db_file) as conn:
+                conn.row_factory = sqlite3.Row
+                cursor = conn.cursor()
+                cursor.execute("BEGIN IMMEDIATE")
+                # created_at 由 CURRENT_TIMESTAMP 写入（UTC），截止时间同样使用 UTC
+                cursor.execute("""
+                    SELECT id, media_name, media_type, cdn_url, created_at FROM review_requests
+                    WHERE status = 'pending' AND created_at < datetime('now', ?)
+                    ORDER BY created_at
+                    LIMIT ?
+                """, (f"-{int(timeout_seconds)} seconds", limit))
+                rows = [dict(row) for row in cursor.fetchall()]
+
+                if rows:
+                    ids = [row['id'] for row in rows]
+                    marks = ",".join("?" * len(ids))
+                    now = datetime.now().isoformat()
+                    # 尚未推送的请求不再推送
+                    cursor.execute(f"""
+                        UPDATE review_requests
+                        SET status = 'expired',
+                            reviewed_at = ?,
+                            reviewed_by = 'system',
+                            review_action = 'expire',
+                            notified_at = COALESCE(notified_at, ?)
+                        WHERE id IN ({marks})
+                    """, [now, now, *ids])
+                conn.commit()
+                return rows
+        except Exception as e:
+            logger.error(f"标记过期请求失败: {str(e)}")
+            return []
+
+    def get_review_messages(self, request_ids: List[int]) -> List[Dict[str, Any]]:
+        """
+        获取包含指定请求的审核消息，以及每条消息中所有请求的当前状态
+
+        Returns:
+            [{"chat_id", "message_id", "kind", "requests": [请求, ...]}, ...]
+        """
+        if not request_ids:
+            return []
+        try:
+            with sqlite3.connect(self.db_file) as conn:
+                conn.row_factory = sqlite3.Row
+                cursor = conn.cursor()
+                marks = ",".join("?" * len(request_ids))
+                cursor.execute(f"""
+                    SELECT m.chat_id, m.message_id, m.kind,
+                           r.id, r.media_name, r.media_type, r.status
+                    FROM review_messages m
+                    JOIN review_requests r ON r.id = m.request_id
+                    WHERE (m.chat_id, m.message_id) IN (
+                        SELECT chat_id, message_id FROM review_messages
+                        WHERE request_id IN ({marks})
+                    )
+                    ORDER BY m.chat_id, m.message_id, r.id
+                """, request_ids)
+
+                messages: Dict[tuple, Dict[str, Any]] = {}
+                for row in cursor.fetchall():
+                    key = (row['chat_id'], row['message_id'])
+                    if key not in messages:
+                        messages[key] = {
+                            "chat_id": row['chat_id'],
+                            "message_id": row['message_id'],
+                            "kind": row['kind'],
+                            "requests": []
+                        }
+                    messages[key]["requests"].append({
+                        "request_id": row['id'],
+                        "media_name": row['media_name'],
+                        "media_type": row['media_type'],
+                        "status": row['status']
+                    })
+                return list(messages.values())
+        except Exception as e:
+            logger.error(f"获取审核消息失败: {str(e)}")
+            return []
+
+    @DB_QUERY_SECONDS.labels(operation="get_by_id").time()
     def get_request_by_id(self, request_id: int) -> Optional[Dict[str, Any]]:
         """根据 ID 获取请求"""
         try:
@@ -206,6 +832,7 @@ class ReviewDatabase:
             logger.error(f"获取请求失败: {str(e)}")
             return None
 
+    @DB_QUERY_SECONDS.labels(operation="list_pending").time()
     def get_pending_requests(self, limit: int = 100) -> List[Dict[str, Any]]:
         """获取待审核的请求"""
         try:
@@ -223,6 +850,7 @@ class ReviewDatabase:
             logger.error(f"获取待审核请求失败: {str(e)}")
             return []
 
+    @DB_QUERY_SECONDS.labels(operation="list_approved").time()
     def get_approved_requests(self, limit: int = 100) -> List[Dict[str, Any]]:
         """获取已批准的请求"""
         try:
@@ -240,34 +868,485 @@ class ReviewDatabase:
             logger.error(f"获取已批准请求失败: {str(e)}")
             return []
 
-    def get_statistics(self) -> Dict[str, int]:
-        """获取统计信息"""
+    @DB_QUERY_SECONDS.labels(operation="list_page").time()
+    def get_requests_page(
+        self,
+        status: str = "pending",
+        limit: int = 10,
+        cursor: Optional[int] = None,
+        direction: str = "next"
+    ) -> Dict[str, Any]:
+        """
+        按创建时间倒序分页获取请求（键集分页）
+
+        以 (created_at, id) 作为定位键，从上一页的边界行继续向后/向前查找，
+        每一页都只读取索引中相邻的 limit 行，翻到多深耗时都相同（不使用 OFFSET）。
+
+        Args:
+            status: 请求状态
+            limit: 每页数量
+            cursor: 边界行的请求 ID（next 为上一页最后一行，prev 为上一页第一行），为空表示第一页
+            direction: 翻页方向，next（更早）或 prev（更新）
+
+        Returns:
+            {"items": [...], "next_cursor": ID 或 None, "prev_cursor": ID 或 None}
+
+        Raises:
+            ValueError: 翻页方向无效或游标对应的请求不存在
+        """
+        if direction not in ("next", "prev"):
+            raise ValueError(f"无效的翻页方向: {direction}")
+
         try:
             with sqlite3.connect(self.db_file) as conn:
-                cursor = conn.cursor()
+                conn.row_factory = sqlite3.Row
+                db_cursor = conn.cursor()
+
+                if cursor is None:
+                    direction = "next"
+                    db_cursor.execute("""
+                        SELECT * FROM review_requests
+                        WHERE status = ?
+                        ORDER BY created_at DESC, id DESC
+                        LIMIT ?
+                    """, (status, limit + 1))
+                else:
+                    db_cursor.execute("SELECT created_at FROM review_requests WHERE id = ?", (cursor,))
+                    row = db_cursor.fetchone()
+                    if row is None:
+                        raise ValueError(f"无效的分页游标: {cursor}")
+
+                    if direction == "next":
+                        db_cursor.execute("""
+                            SELECT * FROM review_requests
+                            WHERE status = ? AND (created_at, id) < (?, ?)
+                            ORDER BY created_at DESC, id DESC
+                            LIMIT ?
+                        """, (status, row['created_at'], cursor, limit + 1))
+                    else:
+                        db_cursor.execute("""
+                            SELECT * FROM review_requests
+                            WHERE status = ? AND (created_at, id) > (?, ?)
+                            ORDER BY created_at, id
+                            LIMIT ?
+                        """, (status, row['created_at'], cursor, limit + 1))
+
+                items = [dict(row) for row in db_cursor.fetchall()]
+        except ValueError:
+            raise
+        except Exception as e:
+            logger.error(f"分页获取请求失败: {str(e)}")
+            return {"items": [], "next_cursor": None, "prev_cursor": None}
+
+        # 多取一行用于判断当前方向上是否还有下一页
+        has_more = len(items) > limit
+        items = items[:limit]
+        if direction == "prev":
+            if not items:
+                # 游标之前已没有更新的请求（例如最新的请求已被审核），回到第一页
+                return self.get_requests_page(status, limit)
+            items.reverse()
+            has_next, has_prev = cursor is not None, has_more
+        else:
+            has_next, has_prev = has_more, cursor is not None
+
+        return {
+            "items": items,
+            "next_cursor": items[-1]['id'] if items and has_next else None,
+            "prev_cursor": items[0]['id'] if items and has_prev else None
+        }
+
+    @DB_QUERY_SECONDS.labels(operation="search").time()
+    def search_requests(
+        self,
+        query: str,
+        status: Optional[str] = None,
+        limit: int = 10,
+        offset: int = 0
+    ) -> Dict[str, Any]:
+        """
+        按媒体名称、Emby 路径和 CDN URL 搜索请求
+
+        以空白分隔的多个关键词需要同时匹配。长度不少于 3 个字符的关键词通过全文索引查找，
+        结果按相关度排序（媒体名称命中权重最高）；只有更短的关键词时无法使用 trigram 索引，
+        退化为 LIKE 扫描并按创建时间倒序。
+
+        Args:
+            query: 搜索关键词
+            status: 只返回该状态的请求，为空表示全部
+            limit: 每页数量
+            offset: 跳过的结果数量
 
-                cursor.execute("SELECT COUNT(*) FROM review_requests WHERE status = 'pending'")
-                pending_count = cursor.fetchone()[0]
+        Returns:
+            {"items": [...], "next_offset": 下一页的 offset 或 None}
+        """
+        terms = query.split()
+        if not terms:
+            return {"items": [], "next_offset": None}
+
+        if self.search_enabled:
+            indexed = [term for term in terms if len(term) >= SEARCH_MIN_TERM_LENGTH]
+            scanned = [term for term in terms if len(term) < SEARCH_MIN_TERM_LENGTH]
+        else:
+            indexed, scanned = [], terms
+
+        conditions, params = [], []
+        for term in scanned:
+            pattern = "%" + re.sub(r"([\\%_])", r"\\\1", term) + "%"
+            conditions.append(
+                "(r.media_name LIKE ? ESCAPE '\\' OR r.emby_path LIKE ? ESCAPE '\\' OR r.cdn_url LIKE ? ESCAPE '\\')"
+            )
+            params.extend([pattern] * 3)
+        if status:
+            conditions.append("r.status = ?")
+            params.append(status)
+
+        if indexed:
+            # 每个关键词作为一个短语，避免其中的符号被当作 FTS5 查询语法
+            match = " AND ".join('"' + term.replace('"', '""') + '"' for term in indexed)
+            where = " AND ".join(["review_search MATCH ?"] + conditions)
+            sql = f"""
+                SELECT r.*, bm25(review_search, 10.0, 2.0, 1.0) AS rank
+                FROM review_search JOIN review_requests r ON r.id = review_search.rowid
+                WHERE {where}
+                ORDER BY rank
+                LIMIT ? OFFSET ?
+            """
+            params = [match] + params
+        else:
+            sql = f"""
+                SELECT r.* FROM review_requests r
+                WHERE {" AND ".join(conditions)}
+                ORDER BY r.created_at DESC, r.id DESC
+                LIMIT ? OFFSET ?
+            """
+
+        try:
+            with sqlite3.connect(self.db_file) as conn:
+                conn.row_factory = sqlite3.Row
+                rows = conn.execute(sql, params + [limit + 1, offset]).fetchall()
+        except Exception as e:
+            logger.error(f"搜索请求失败: {str(e)}")
+            return {"items": [], "next_offset": None}
 
-                cursor.execute("SELECT COUNT(*) FROM review_requests WHERE status = 'approved'")
-                approved_count = cursor.fetchone()[0]
+        items = [dict(row) for row in rows[:limit]]
+        return {
+            "items": items,
+            "next_offset": offset + limit if len(rows) > limit else None
+        }
 
-                cursor.execute("SELECT COUNT(*) FROM review_requests WHERE status = 'rejected'")
-                rejected_count = cursor.fetchone()[0]
+    @DB_QUERY_SECONDS.labels(operation="statistics").time()
+    def get_statistics(self) -> Dict[str, int]:
+        """获取统计信息"""
+        try:
+            with sqlite3.connect(self.db_file) as conn:
+                cursor = conn.cursor()
 
-                cursor.execute("SELECT COUNT(*) FROM review_requests")
-                total_count = cursor.fetchone()[0]
+                # 一次扫描状态索引完成所有计数
+                cursor.execute("""
+                    SELECT status, COUNT(*) FROM review_requests
+                    GROUP BY status
+                """)
+                counts = dict(cursor.fetchall())
 
                 return {
-                    "pending": pending_count,
-                    "approved": approved_count,
-                    "rejected": rejected_count,
-                    "total": total_count
+                    "pending": counts.get("pending", 0),
+                    "approved": counts.get("approved", 0),
+                    "rejected": counts.get("rejected", 0),
+                    "expired": counts.get("expired", 0),
+                    "total": sum(counts.values())
                 }
         except Exception as e:
             logger.error(f"获取统计信息失败: {str(e)}")
-            return {"pending": 0, "approved": 0, "rejected": 0, "total": 0}
+            return {"pending": 0, "approved": 0, "rejected": 0, "expired": 0, "total": 0}
+
+    # ==================== 剧集分组审核 ====================
+
+    @DB_QUERY_SECONDS.labels(operation="group_upsert").time()
+    def get_or_create_review_group(
+        self,
+        group_key: str,
+        title: str,
+        media_type: str,
+        window_seconds: int
+    ) -> Optional[int]:
+        """
+        获取仍在收集中的分组，不存在则新建
+
+        Args:
+            group_key: 分组键（剧集/季所在目录）
+            title: 分组标题
+            media_type: 媒体类型
+            window_seconds: 分组收集窗口（秒）
+
+        Returns:
+            分组 ID，如果失败返回 None
+        """
+        try:
+            with sqlite3.connect(self.db_file) as conn:
+                cursor = conn.cursor()
+                # 查找和新建在同一个写事务中完成，多个 worker 同时收到同一季的剧集时只建一个分组
+                cursor.execute("BEGIN IMMEDIATE")
+                cursor.execute("""
+                    SELECT id FROM review_groups
+                    WHERE group_key = ? AND status = 'open'
+                    ORDER BY id DESC
+                    LIMIT 1
+                """, (group_key,))
+                row = cursor.fetchone()
+                if row:
+                    return row[0]
+
+                cursor.execute("""
+                    INSERT INTO review_groups (group_key, title, media_type, closes_at)
+                    VALUES (?, ?, ?, ?)
+                """, (group_key, title, media_type, time.time() + window_seconds))
+                conn.commit()
+                group_id = cursor.lastrowid
+                logger.info(f"创建剧集分组: ID={group_id}, 标题={title}")
+                return group_id
+        except Exception as e:
+            logger.error(f"创建剧集分组失败: {str(e)}")
+            return None
+
+    def get_review_group_by_id(self, group_id: int) -> Optional[Dict[str, Any]]:
+        """根据 ID 获取分组"""
+        try:
+            with sqlite3.connect(self.db_file) as conn:
+                conn.row_factory = sqlite3.Row
+                cursor = conn.cursor()
+                cursor.execute("SELECT * FROM review_groups WHERE id = ?", (group_id,))
+                row = cursor.fetchone()
+                return dict(row) if row else None
+        except Exception as e:
+            logger.error(f"获取分组失败: {str(e)}")
+            return None
+
+    @DB_QUERY_SECONDS.labels(operation="group_list_due").time()
+    def get_due_review_groups(self, limit: int = 50) -> List[Dict[str, Any]]:
+        """获取收集窗口已结束、等待推送审核的分组"""
+        try:
+            with sqlite3.connect(self.db_file) as conn:
+                conn.row_factory = sqlite3.Row
+                cursor = conn.cursor()
+                cursor.execute("""
+                    SELECT * FROM review_groups
+                    WHERE status = 'open' AND closes_at <= ?
+                    ORDER BY closes_at
+                    LIMIT ?
+                """, (time.time(), limit))
+                return [dict(row) for row in cursor.fetchall()]
+        except Exception as e:
+            logger.error(f"获取到期分组失败: {str(e)}")
+            return []
+
+    def close_review_group(self, group_id: int) -> bool:
+        """结束分组收集，进入待审核状态；返回是否由本次调用关闭"""
+        try:
+            with sqlite3.connect(self.db_file) as conn:
+                cursor = conn.cursor()
+                cursor.execute("""
+                    UPDATE review_groups SET status = 'pending'
+                    WHERE id = ? AND status = 'open'
+                """, (group_id,))
+                closed = cursor.rowcount > 0
+                if closed:
+                    # 分组内的请求随分组消息一起推送
+                    cursor.execute("""
+                        UPDATE review_requests SET notified_at = ?
+                        WHERE group_id = ? AND notified_at IS NULL
+                    """, (datetime.now().isoformat(), group_id))
+                conn.commit()
+                return closed
+        except Exception as e:
+            logger.error(f"关闭分组失败: {str(e)}")
+            return False
+
+    def reopen_review_group(self, group_id: int) -> bool:
+        """
+        分组消息没有发送给任何管理员时撤销关闭，下一轮重新推送
+
+        同一目录已有新的收集中分组时，把待审核的请求移入该分组；返回是否撤销成功
+        """
+        try:
+            with sqlite3.connect(self.db_file) as conn:
+                cursor = conn.cursor()
+                cursor.execute("BEGIN IMMEDIATE")
+                cursor.execute(
+                    "SELECT group_key FROM review_groups WHERE id = ? AND status = 'pending'", (group_id,)
+                )
+                row = cursor.fetchone()
+                if not row:
+                    return False
+
+                cursor.execute("""
+                    SELECT id FROM review_groups
+                    WHERE group_key = ? AND status = 'open'
+                    ORDER BY id DESC
+                    LIMIT 1
+                """, (row[0],))
+                open_group = cursor.fetchone()
+                if open_group:
+                    cursor.execute("""
+                        UPDATE review_requests SET group_id = ?, notified_at = NULL
+                        WHERE group_id = ? AND status = 'pending'
+                    """, (open_group[0], group_id))
+                else:
+                    cursor.execute("UPDATE review_groups SET status = 'open' WHERE id = ?", (group_id,))
+                    cursor.execute("""
+                        UPDATE review_requests SET notified_at = NULL
+                        WHERE group_id = ? AND status = 'pending'
+                    """, (group_id,))
+                conn.commit()
+                return True
+        except Exception as e:
+            logger.error(f"撤销分组关闭失败: {str(e)}")
+            return False
+
+    def get_group_requests(self, group_id: int, status: Optional[str] = None) -> List[Dict[str, Any]]:
+        """获取分组内的审核请求"""
+        try:
+            with sqlite3.connect(self.db_file) as conn:
+                conn.row_factory = sqlite3.Row
+                cursor = conn.cursor()
+                if status:
+                    cursor.execute("""
+                        SELECT * FROM review_requests
+                        WHERE group_id = ? AND status = ?
+                        ORDER BY host_path
+                    """, (group_id, status))
+                else:
+                    cursor.execute("""
+                        SELECT * FROM review_requests
+                        WHERE group_id = ?
+                        ORDER BY host_path
+                    """, (group_id,))
+                return [dict(row) for row in cursor.fetchall()]
+        except Exception as e:
+            logger.error(f"获取分组请求失败: {str(e)}")
+            return []
+
+    def update_group_telegram_message_id(self, group_id: int, message_id: int):
+        """更新分组的 Telegram 消息 ID"""
+        try:
+            with sqlite3.connect(self.db_file) as conn:
+                conn.execute("""
+                    UPDATE review_groups SET telegram_message_id = ? WHERE id = ?
+                """, (message_id, group_id))
+                conn.commit()
+        except Exception as e:
+            logger.error(f"更新分组消息 ID 失败: {str(e)}")
+
+    def _review_group(self, group_id: int, status: str, action: str, reviewed_by: str) -> List[Dict[str, Any]]:
+        """在一个事务中审核分组及其所有待审核请求，返回被处理的请求"""
+        reviewed_at = datetime.now().isoformat()
+        with sqlite3.connect(self.db_file) as conn:
+            conn.row_factory = sqlite3.Row
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT * FROM review_requests
+                WHERE group_id = ? AND status = 'pending'
+                ORDER BY host_path
+            """, (group_id,))
+            rows = [dict(row) for row in cursor.fetchall()]
+
+            cursor.execute("""
+                UPDATE review_requests
+                SET status = ?,
+                    reviewed_at = ?,
+                    reviewed_by = ?,
+                    review_action = ?
+                WHERE group_id = ? AND status = 'pending'
+            """, (status, reviewed_at, reviewed_by, action, group_id))
+
+            cursor.execute("""
+                UPDATE review_groups
+                SET status = ?, reviewed_at = ?, reviewed_by = ?
+                WHERE id = ?
+            """, (status, reviewed_at, reviewed_by, group_id))
+            conn.commit()
+        return rows
+
+    @DB_QUERY_SECONDS.labels(operation="group_approve").time()
+    def approve_review_group(self, group_id: int, reviewed_by: str = "unknown") -> List[Dict[str, Any]]:
+        """批准分组内所有待审核请求，返回被批准的请求"""
+        try:
+            rows = self._review_group(group_id, 'approved', 'approve', reviewed_by)
+            logger.info(f"分组已批准: ID={group_id}, 共 {len(rows)} 项, 审核人={reviewed_by}")
+            return rows
+        except Exception as e:
+            logger.error(f"批准分组失败: {str(e)}")
+            return []
+
+    @DB_QUERY_SECONDS.labels(operation="group_reject").time()
+    def reject_review_group(self, group_id: int, reviewed_by: str = "unknown") -> List[Dict[str, Any]]:
+        """拒绝分组内所有待审核请求，返回被拒绝的请求"""
+        try:
+            rows = self._review_group(group_id, 'rejected', 'reject', reviewed_by)
+            logger.info(f"分组已拒绝: ID={group_id}, 共 {len(rows)} 项, 审核人={reviewed_by}")
+            return rows
+        except Exception as e:
+            logger.error(f"拒绝分组失败: {str(e)}")
+            return []
+
+
+def create_store(backend: str = DB_BACKEND) -> ReviewStore:
+    """
+    按引擎名称创建审核存储
+
+    Args:
+        backend: sqlite 或 memory
+
+    Raises:
+        ValueError: 未知的引擎名称
+    """
+    if backend == "sqlite":
+        return ReviewDatabase()
+    if backend == "memory":
+        from memory_store import MemoryReviewStore
+        logger.warning("⚠️  使用内存存储引擎，服务重启后审核数据会丢失")
+        return MemoryReviewStore()
+    raise ValueError(f"未知的存储引擎: {backend}")
+
+
+_db_instance: Optional[ReviewStore] = None
+_db_lock = threading.Lock()
+
+
+def get_db() -> ReviewStore:
+    """
+    获取全局审核存储实例
+
+    首次调用时才按 DB_BACKEND 创建实例（建表、升级表结构），之后复用同一个实例。
+    升级大数据库时回填可能持续较长时间，期间其他调用方阻塞在 _db_lock 上；
+    事件循环中先用 store_ready() 判断，未就绪时放到线程池中执行或稍后重试。
+    """
+    global _db_instance
+    if _db_instance is None:
+        with _db_lock:
+            if _db_instance is None:
+                _db_instance = create_store()
+    return _db_instance
+
+
+def store_ready() -> bool:
+    """全局审核存储是否已创建（包括结构迁移已完成），不获取 _db_lock"""
+    return _db_instance is not None
+
+
+def use_store(store: ReviewStore):
+    """替换全局审核存储实例（压测和测试中切换引擎）"""
+    global _db_instance
+    with _db_lock:
+        _db_instance = store
+
+
+class _LazyDatabase:
+    """全局审核存储的延迟代理：导入模块时不执行建表，首次访问属性时才初始化"""
+
+    def __getattr__(self, name: str):
+        return getattr(get_db(), name)
 
 
-# 全局数据库实例
-db = ReviewDatabase()
+# 全局审核存储实例
+db = _LazyDatabase()
@@ -0,0 +1,91 @@
+"""
+多进程 Leader 选举
+多个 uvicorn worker 通过文件锁选出唯一的 Leader，由它负责 Telegram 轮询、
+批量推送和 CDN 提交；其余 worker 只接收 Webhook 并写入数据库。
+
+文件锁（flock）在持有进程退出时由内核自动释放，其他 worker 定期重试即可接管。
+"""
+import asyncio
+import logging
+import os
+from pathlib import Path
+from typing import Awaitable, Callable, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows 没有 fcntl，只能单进程运行
+    fcntl = None
+
+import config
+
+logger = logging.getLogger(__name__)
+
+
+class LeaderElection:
+    """基于文件锁的 Leader 选举"""
+
+    def __init__(self, lock_file: str = config.LEADER_LOCK_FILE, retry_interval: float = None):
+        self.lock_file = lock_file
+        self.retry_interval = config.LEADER_RETRY_INTERVAL if retry_interval is None else retry_interval
+        self._fd: Optional[int] = None
+
+    @property
+    def is_leader(self) -> bool:
+        return self._fd is not None
+
+    def try_acquire(self) -> bool:
+        """尝试成为 Leader（非阻塞），成功返回 True"""
+        if self.is_leader:
+            return True
+
+        if fcntl is None:
+            # 不支持文件锁的平台上视为单进程部署
+            self._fd = -1
+            return True
+
+        lock_dir = Path(self.lock_file).parent
+        if lock_dir.name != '.':
+            lock_dir.mkdir(parents=True, exist_ok=True)
+
+        fd = os.open(self.lock_file, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+
+        # 记录当前 Leader 的 PID，便于排查
+        os.ftruncate(fd, 0)
+        os.write(fd, f"{os.getpid()}\n".encode())
+        self._fd = fd
+        return True
+
+    def release(self):
+        """放弃 Leader 身份"""
+        if self._fd is None:
+            return
+        if self._fd >= 0:
+            try:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+            finally:
+                os.close(self._fd)
+        self._fd = None
+
+    async def run(self, on_elected: Callable[[], Awaitable[None]]):
+        """
+        后台任务：直到成为 Leader 前定期重试，成为 Leader 后调用 on_elected
+
+        Args:
+            on_elected: 成为 Leader 时执行的协程函数（启动 Leader 专属服务）
+        """
+        announced = False
+        while True:
+            if self.try_acquire():
+                logger.info(f"👑 当前进程成为 Leader (pid={os.getpid()})")
+                await on_elected()
+                return
+
+            if not announced:
+                logger.info(f"当前进程作为 Webhook worker 运行 (pid={os.getpid()})，等待接管 Leader")
+                announced = True
+            await asyncio.sleep(self.retry_interval)
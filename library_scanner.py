@@ -0,0 +1,346 @@
+"""
+媒体库增量扫描模块
+维护持久化的文件清单（路径、大小、修改时间、inode），
+只重新列出修改时间发生变化的目录，作为 Emby 漏发 Webhook 的兜底
+"""
+import os
+import re
+import sqlite3
+import logging
+import time
+from pathlib import Path
+from typing import Optional, List, Dict, Any, Iterable
+
+import config
+
+logger = logging.getLogger(__name__)
+
+# 剧集文件名特征：S01E02 / 第3集
+EPISODE_PATTERN = re.compile(r"(S\d{1,2}E\d{1,4})|(第\s*\d+\s*[集话話])", re.IGNORECASE)
+
+# 目录修改时间距今小于该值（纳秒）时不记录，避免同一秒内新增的文件被漏掉
+_MTIME_SETTLE_NS = 2 * 1_000_000_000
+
+# 每处理多少个目录提交一次事务
+_COMMIT_EVERY_DIRS = 500
+
+
+def guess_media_type(path: str) -> str:
+    """
+    根据文件路径猜测 Emby 媒体类型
+
+    Args:
+        path: 文件路径
+
+    Returns:
+        "Episode" 或 "Movie"
+    """
+    normalized = path.replace('\\', '/')
+    if EPISODE_PATTERN.search(os.path.basename(normalized)):
+        return "Episode"
+    if "/剧集/" in normalized or re.search(r"/Season\s*\d+/", normalized, re.IGNORECASE):
+        return "Episode"
+    return "Movie"
+
+
+class LibraryManifest:
+    """
+    媒体库文件清单
+
+    目录路径只存一次，文件按 (目录 ID, 文件名) 存储，
+    大小、修改时间、inode 均为整数，尽量保持数据库紧凑
+    """
+
+    def __init__(self, db_file: str = config.LIBRARY_MANIFEST_DB_FILE):
+        self.db_file = db_file
+        db_dir = Path(self.db_file).parent
+        if db_dir.name != '.':
+            db_dir.mkdir(parents=True, exist_ok=True)
+        self._init_database()
+
+    def _init_database(self):
+        """初始化清单表"""
+        with sqlite3.connect(self.db_file) as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS manifest_dirs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    parent_id INTEGER,
+                    path TEXT NOT NULL UNIQUE,
+                    mtime_ns INTEGER NOT NULL
+                )
+            """)
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_manifest_dirs_parent
+                ON manifest_dirs(parent_id)
+            """)
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS manifest_files (
+                    dir_id INTEGER NOT NULL,
+                    name TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    mtime_ns INTEGER NOT NULL,
+                    inode INTEGER NOT NULL,
+                    PRIMARY KEY (dir_id, name)
+                ) WITHOUT ROWID
+            """)
+            conn.commit()
+
+    def connect(self) -> sqlite3.Connection:
+        """打开一个扫描期间复用的连接"""
+        return sqlite3.connect(self.db_file)
+
+    @staticmethod
+    def get_dir(conn: sqlite3.Connection, path: str) -> Optional[tuple]:
+        """返回 (id, mtime_ns)，不存在返回 None"""
+        return conn.execute(
+            "SELECT id, mtime_ns FROM manifest_dirs WHERE path = ?", (path,)
+        ).fetchone()
+
+    @staticmethod
+    def get_child_dirs(conn: sqlite3.Connection, dir_id: int) -> List[tuple]:
+        """返回子目录 [(id, path)]"""
+        return conn.execute(
+            "SELECT id, path FROM manifest_dirs WHERE parent_id = ?", (dir_id,)
+        ).fetchall()
+
+    @staticmethod
+    def get_files(conn: sqlite3.Connection, dir_id: int) -> Dict[str, tuple]:
+        """返回目录下已记录的文件 {name: (size, mtime_ns, inode)}"""
+        rows = conn.execute(
+            "SELECT name, size, mtime_ns, inode FROM manifest_files WHERE dir_id = ?",
+            (dir_id,)
+        )
+        return {name: (size, mtime_ns, inode) for name, size, mtime_ns, inode in rows}
+
+    @staticmethod
+    def upsert_dir(conn: sqlite3.Connection, path: str, parent_id: Optional[int], mtime_ns: int) -> int:
+        """写入目录记录，返回目录 ID"""
+        conn.execute("""
+            INSERT INTO manifest_dirs (parent_id, path, mtime_ns) VALUES (?, ?, ?)
+            ON CONFLICT(path) DO UPDATE SET parent_id = excluded.parent_id, mtime_ns = excluded.mtime_ns
+        """, (parent_id, path, mtime_ns))
+        return conn.execute("SELECT id FROM manifest_dirs WHERE path = ?", (path,)).fetchone()[0]
+
+    @staticmethod
+    def upsert_files(conn: sqlite3.Connection, dir_id: int, files: Iterable[tuple]):
+        """批量写入文件记录 [(name, size, mtime_ns, inode)]"""
+        conn.executemany("""
+            INSERT OR REPLACE INTO manifest_files (dir_id, name, size, mtime_ns, inode)
+            VALUES (?, ?, ?, ?, ?)
+        """, [(dir_id, *f) for f in files])
+
+    @staticmethod
+    def delete_files(conn: sqlite3.Connection, dir_id: int, names: Iterable[str]):
+        """删除目录下的文件记录"""
+        conn.executemany(
+            "DELETE FROM manifest_files WHERE dir_id = ? AND name = ?",
+            [(dir_id, name) for name in names]
+        )
+
+    @staticmethod
+    def delete_dir_tree(conn: sqlite3.Connection, dir_id: int) -> int:
+        """删除目录及其所有子目录、文件记录，返回删除的文件数"""
+        ids = [row[0] for row in conn.execute("""
+            WITH RECURSIVE tree(id) AS (
+                SELECT ?
+                UNION ALL
+                SELECT d.id FROM manifest_dirs d JOIN tree t ON d.parent_id = t.id
+            )
+            SELECT id FROM tree
+        """, (dir_id,))]
+        removed = 0
+        for chunk_start in range(0, len(ids), 500):
+            chunk = ids[chunk_start:chunk_start + 500]
+            marks = ",".join("?" * len(chunk))
+            removed += conn.execute(
+                f"DELETE FROM manifest_files WHERE dir_id IN ({marks})", chunk
+            ).rowcount
+            conn.execute(f"DELETE FROM manifest_dirs WHERE id IN ({marks})", chunk)
+        return removed
+
+    def get_statistics(self) -> Dict[str, int]:
+        """获取清单统计信息"""
+        with sqlite3.connect(self.db_file) as conn:
+            dirs = conn.execute("SELECT COUNT(*) FROM manifest_dirs").fetchone()[0]
+            files = conn.execute("SELECT COUNT(*) FROM manifest_files").fetchone()[0]
+            return {"dirs": dirs, "files": files}
+
+
+class IncrementalScanner:
+    """
+    增量扫描器
+
+    目录的修改时间只在其直接子项增删/改名时变化，因此：
+    - 修改时间未变的目录不做 listdir，只 stat 清单中记录的子目录继续下探
+    - 修改时间变化的目录重新列出，与清单比对得到新增/变化的文件
+
+    原地覆写文件内容不会改变目录修改时间，这类变化不在增量扫描的覆盖范围内
+    （替换文件通常是写临时文件再改名，会产生新的 inode 与目录修改时间）。
+    """
+
+    def __init__(self, manifest: LibraryManifest, extensions: Optional[List[str]] = None):
+        self.manifest = manifest
+        exts = config.LIBRARY_SCAN_EXTENSIONS if extensions is None else extensions
+        self.extensions = tuple(ext.lower() for ext in exts)
+
+    def _is_media_file(self, name: str) -> bool:
+        return not self.extensions or name.lower().endswith(self.extensions)
+
+    def scan(self, root: str) -> Dict[str, Any]:
+        """
+        扫描一个根目录
+
+        Args:
+            root: 宿主机上的媒体根目录
+
+        Returns:
+            扫描结果字典，changes 为新增/变化的文件列表
+        """
+        started = time.monotonic()
+        root = os.path.normpath(root)
+        result = {
+            "root": root,
+            "changes": [],
+            "first_scan": False,
+            "dirs_checked": 0,
+            "dirs_listed": 0,
+            "files_seen": 0,
+            "files_removed": 0,
+            "elapsed": 0.0,
+        }
+
+        try:
+            root_stat = os.stat(root)
+        except OSError as e:
+            logger.error(f"无法访问扫描根目录 {root}: {str(e)}")
+            return result
+
+        conn = self.manifest.connect()
+        try:
+            result["first_scan"] = self.manifest.get_dir(conn, root) is None
+            visited = set()
+            # (目录路径, 目录 stat, 父目录 ID)
+            stack = [(root, root_stat, None)]
+            dirs_since_commit = 0
+
+            while stack:
+                path, st, parent_id = stack.pop()
+
+                # 防止软链接目录形成环
+                key = (st.st_dev, st.st_ino)
+                if key in visited:
+                    continue
+                visited.add(key)
+                result["dirs_checked"] += 1
+
+                known = self.manifest.get_dir(conn, path)
+                if known and known[1] == st.st_mtime_ns:
+                    # 目录未变化：只沿清单记录的子目录下探
+                    for child_id, child_path in self.manifest.get_child_dirs(conn, known[0]):
+                        try:
+                            stack.append((child_path, os.stat(child_path), known[0]))
+                        except OSError:
+                            result["files_removed"] += self.manifest.delete_dir_tree(conn, child_id)
+                    continue
+
+                self._scan_changed_dir(conn, path, st, parent_id, known, stack, result)
+
+                dirs_since_commit += 1
+                if dirs_since_commit >= _COMMIT_EVERY_DIRS:
+                    conn.commit()
+                    dirs_since_commit = 0
+
+            conn.commit()
+        finally:
+            conn.close()
+
+        result["elapsed"] = time.monotonic() - started
+        logger.info(
+            f"📁 增量扫描完成: {root}, 检查目录 {result['dirs_checked']} 个, "
+            f"列出目录 {result['dirs_listed']} 个, 发现变化 {len(result['changes'])} 个, "
+            f"耗时 {result['elapsed']:.2f} 秒"
+        )
+        return result
+
+    def _scan_changed_dir(self, conn, path, st, parent_id, known, stack, result):
+        """重新列出一个已变化（或新出现）的目录"""
+        result["dirs_listed"] += 1
+
+        # 刚刚修改过的目录暂不记录修改时间，下次扫描会再列出一次
+        mtime_ns = st.st_mtime_ns
+        if time.time_ns() - mtime_ns < _MTIME_SETTLE_NS:
+            mtime_ns = -1
+        dir_id = self.manifest.upsert_dir(conn, path, parent_id, mtime_ns)
+
+        old_files = self.manifest.get_files(conn, dir_id) if known else {}
+        old_children = dict(
+            (child_path, child_id)
+            for child_id, child_path in self.manifest.get_child_dirs(conn, dir_id)
+        ) if known else {}
+
+        current_files = []
+        seen_children = set()
+        try:
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir():
+                            seen_children.add(entry.path)
+                            stack.append((entry.path, entry.stat(), dir_id))
+                        elif entry.is_file() and self._is_media_file(entry.name):
+                            file_stat = entry.stat()
+                            current_files.append(
+                                (entry.name, file_stat.st_size, file_stat.st_mtime_ns, file_stat.st_ino)
+                            )
+                    except OSError as e:
+                        logger.warning(f"跳过无法访问的条目 {entry.path}: {str(e)}")
+        except OSError as e:
+            logger.error(f"列出目录失败 {path}: {str(e)}")
+            return
+
+        result["files_seen"] += len(current_files)
+
+        changed = []
+        for name, size, file_mtime, inode in current_files:
+            old = old_files.pop(name, None)
+            if old == (size, file_mtime, inode):
+                continue
+            changed.append((name, size, file_mtime, inode))
+            result["changes"].append({
+                "path": os.path.join(path, name),
+                "size": size,
+                "mtime_ns": file_mtime,
+                "inode": inode,
+                "is_new": old is None,
+            })
+
+        if changed:
+            self.manifest.upsert_files(conn, dir_id, changed)
+        if old_files:
+            self.manifest.delete_files(conn, dir_id, old_files.keys())
+            result["files_removed"] += len(old_files)
+
+        for child_path, child_id in old_children.items():
+            if child_path not in seen_children:
+                result["files_removed"] += self.manifest.delete_dir_tree(conn, child_id)
+
+
+def build_item_data(change: Dict[str, Any], emby_path: str) -> Dict[str, Any]:
+    """
+    把扫描发现的文件转换为与 Emby Webhook Item 相同结构的数据
+
+    Args:
+        change: 扫描结果中的单个文件
+        emby_path: 该文件对应的 Emby 容器路径
+
+    Returns:
+        可直接交给 process_media_item 的媒体项目数据
+    """
+    return {
+        "Name": Path(change["path"]).stem,
+        "Type": guess_media_type(change["path"]),
+        "Path": emby_path,
+        "Id": "",
+        "Source": "library_scan",
+    }
@@ -0,0 +1,437 @@
+"""
+内存审核存储引擎
+数据保存在进程内的字典中，列表查询使用有序索引（bisect 维护），不访问磁盘。
+用于测试和压测，单独测量处理流程的吞吐量；服务重启后数据丢失，不用于生产
+"""
+import json
+import logging
+import threading
+import time
+from bisect import bisect_left, bisect_right, insort
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from database import normalize_url, url_hash
+from review_store import REVIEW_STATUSES, ReviewStore
+
+logger = logging.getLogger(__name__)
+
+# 与 SQLite CURRENT_TIMESTAMP 相同的格式（UTC），保证排序和过期判断一致
+_TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def _utc_timestamp(delta_seconds: float = 0) -> str:
+    return (datetime.now(timezone.utc) + timedelta(seconds=delta_seconds)).strftime(_TIMESTAMP_FORMAT)
+
+
+class MemoryReviewStore(ReviewStore):
+    """内存审核存储（字典 + 有序索引）"""
+
+    backend = "memory"
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._requests: Dict[int, Dict[str, Any]] = {}
+        self._groups: Dict[int, Dict[str, Any]] = {}
+        self._next_request_id = 1
+        self._next_group_id = 1
+
+        # 去重索引：规范化 URL -> 请求 ID
+        self._url_index: Dict[str, int] = {}
+        # 状态索引：状态 -> 按 (created_at, id) 排序的键
+        self._status_index: Dict[str, List[Tuple[str, int]]] = {status: [] for status in REVIEW_STATUSES}
+        # 尚未推送的请求 ID（有序）
+        self._unnotified: List[int] = []
+        # 收集中的分组：group_key -> 分组 ID
+        self._open_groups: Dict[str, int] = {}
+        # 审核消息：(chat_id, message_id) -> {"kind", "request_ids"}，以及请求 -> 消息
+        self._messages: Dict[Tuple[int, int], Dict[str, Any]] = {}
+        self._request_messages: Dict[int, List[Tuple[int, int]]] = {}
+
+    # ==================== 索引维护 ====================
+
+    def _set_status(self, row: Dict[str, Any], status: str):
+        key = (row['created_at'], row['id'])
+        index = self._status_index[row['status']]
+        position = bisect_left(index, key)
+        if position < len(index) and index[position] == key:
+            del index[position]
+        row['status'] = status
+        insort(self._status_index[status], key)
+
+    def _mark_notified(self, row: Dict[str, Any], notified_at: str):
+        if row['notified_at'] is None:
+            position = bisect_left(self._unnotified, row['id'])
+            if position < len(self._unnotified) and self._unnotified[position] == row['id']:
+                del self._unnotified[position]
+        row['notified_at'] = notified_at
+
+    def _is_unnotified(self, row: Dict[str, Any]) -> bool:
+        """与 SQLite 引擎的 UNNOTIFIED_CONDITION 相同：收集中分组内的请求不单独推送"""
+        group = self._groups.get(row['group_id']) if row['group_id'] is not None else None
+        return row['notified_at'] is None and not (group and group['status'] == 'open')
+
+    def _review(self, row: Dict[str, Any], status: str, action: str, reviewed_by: str, reviewed_at: str):
+        self._set_status(row, status)
+        row['reviewed_at'] = reviewed_at
+        row['reviewed_by'] = reviewed_by
+        row['review_action'] = action
+
+    # ==================== 审核请求 ====================
+
+    def add_review_request(
+        self,
+        cdn_url: str,
+        media_name: str,
+        media_type: str,
+        emby_path: str = "",
+        host_path: str = "",
+        media_info: Dict[str, Any] = None,
+        group_id: Optional[int] = None
+    ) -> Optional[int]:
+        normalized = normalize_url(cdn_url)
+        with self._lock:
+            if normalized in self._url_index:
+                logger.warning(f"审核请求已存在: {cdn_url}")
+                return None
+
+            request_id = self._next_request_id
+            self._next_request_id += 1
+            row = {
+                "id": request_id,
+                "cdn_url": cdn_url,
+                "media_name": media_name,
+                "media_type": media_type,
+                "emby_path": emby_path,
+                "host_path": host_path,
+                "media_info": json.dumps(media_info or {}, ensure_ascii=False),
+                "status": "pending",
+                "telegram_message_id": None,
+                "created_at": _utc_timestamp(),
+                "reviewed_at": None,
+                "reviewed_by": None,
+                "review_action": None,
+                "group_id": group_id,
+                "notified_at": None,
+                "url_hash": url_hash(cdn_url),
+            }
+            self._requests[request_id] = row
+            self._url_index[normalized] = request_id
+            insort(self._status_index["pending"], (row['created_at'], request_id))
+            # ID 递增，直接追加即保持有序
+            self._unnotified.append(request_id)
+            return request_id
+
+    def update_telegram_message_id(self, request_id: int, message_id: int):
+        with self._lock:
+            row = self._requests.get(request_id)
+            if row:
+                row['telegram_message_id'] = message_id
+
+    def approve_request(self, request_id: int, reviewed_by: str = "unknown"):
+        with self._lock:
+            row = self._requests.get(request_id)
+            if row:
+                self._review(row, 'approved', 'approve', reviewed_by, datetime.now().isoformat())
+
+    def reject_request(self, request_id: int, reviewed_by: str = "unknown"):
+        with self._lock:
+            row = self._requests.get(request_id)
+            if row:
+                self._review(row, 'rejected', 'reject', reviewed_by, datetime.now().isoformat())
+
+    def get_request_by_id(self, request_id: int) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._requests.get(request_id)
+            return dict(row) if row else None
+
+    def get_pending_requests(self, limit: int = 100) -> List[Dict[str, Any]]:
+        with self._lock:
+            index = self._status_index["pending"]
+            return [dict(self._requests[request_id]) for _, request_id in reversed(index[-limit:])]
+
+    def get_approved_requests(self, limit: int = 100) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = [self._requests[request_id] for _, request_id in self._status_index["approved"]]
+            rows.sort(key=lambda row: row['reviewed_at'] or "", reverse=True)
+            return [dict(row) for row in rows[:limit]]
+
+    def get_requests_page(
+        self,
+        status: str = "pending",
+        limit: int = 10,
+        cursor: Optional[int] = None,
+        direction: str = "next"
+    ) -> Dict[str, Any]:
+        if direction not in ("next", "prev"):
+            raise ValueError(f"无效的翻页方向: {direction}")
+
+        with self._lock:
+            index = self._status_index.get(status, [])
+            if cursor is None:
+                direction = "next"
+                keys = index[-(limit + 1):][::-1]
+            else:
+                row = self._requests.get(cursor)
+                if row is None:
+                    raise ValueError(f"无效的分页游标: {cursor}")
+                key = (row['created_at'], cursor)
+                if direction == "next":
+                    end = bisect_left(index, key)
+                    keys = index[max(0, end - limit - 1):end][::-1]
+                else:
+                    start = bisect_right(index, key)
+                    keys = index[start:start + limit + 1]
+            items = [dict(self._requests[request_id]) for _, request_id in keys]
+
+        has_more = len(items) > limit
+        items = items[:limit]
+        if direction == "prev":
+            if not items:
+                return self.get_requests_page(status, limit)
+            items.reverse()
+            has_next, has_prev = cursor is not None, has_more
+        else:
+            has_next, has_prev = has_more, cursor is not None
+
+        return {
+            "items": items,
+            "next_cursor": items[-1]['id'] if items and has_next else None,
+            "prev_cursor": items[0]['id'] if items and has_prev else None
+        }
+
+    def search_requests(
+        self,
+        query: str,
+        status: Optional[str] = None,
+        limit: int = 10,
+        offset: int = 0
+    ) -> Dict[str, Any]:
+        """逐行做子串匹配（不区分大小写），媒体名称命中的排在前面，其余按创建时间倒序"""
+        terms = [term.lower() for term in query.split()]
+        if not terms:
+            return {"items": [], "next_offset": None}
+
+        with self._lock:
+            matches = []
+            for row in self._requests.values():
+                if status and row['status'] != status:
+                    continue
+                name = row['media_name'].lower()
+                text = " ".join((name, (row['emby_path'] or "").lower(), row['cdn_url'].lower()))
+                if all(term in text for term in terms):
+                    matches.append((sum(term in name for term in terms), row))
+
+            # 先按创建时间倒序，再按名称命中数稳定排序
+            matches.sort(key=lambda match: (match[1]['created_at'], match[1]['id']), reverse=True)
+            matches.sort(key=lambda match: match[0], reverse=True)
+            page = [dict(row) for _, row in matches[offset:offset + limit]]
+
+        return {
+            "items": page,
+            "next_offset": offset + limit if len(matches) > offset + limit else None
+        }
+
+    def get_statistics(self) -> Dict[str, int]:
+        with self._lock:
+            counts = {status: len(index) for status, index in self._status_index.items()}
+        counts["total"] = sum(counts.values())
+        return counts
+
+    # ==================== 推送队列 ====================
+
+    def count_unnotified_requests(self) -> int:
+        with self._lock:
+            return sum(1 for request_id in self._unnotified if self._is_unnotified(self._requests[request_id]))
+
+    def claim_unnotified_requests(self, limit: int) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = []
+            for request_id in self._unnotified:
+                row = self._requests[request_id]
+                if self._is_unnotified(row):
+                    rows.append(row)
+                    if len(rows) >= limit:
+                        break
+
+            claimed = [dict(row) for row in rows]
+            now = datetime.now().isoformat()
+            for row in rows:
+                self._mark_notified(row, now)
+            return claimed
+
+    def release_unnotified_requests(self, request_ids: List[int]):
+        with self._lock:
+            for request_id in request_ids:
+                row = self._requests.get(request_id)
+                if row and row['notified_at'] is not None:
+                    row['notified_at'] = None
+                    insort(self._unnotified, request_id)
+
+    def expire_overdue_requests(self, timeout_seconds: int, limit: int = 500) -> List[Dict[str, Any]]:
+        cutoff = _utc_timestamp(-int(timeout_seconds))
+        with self._lock:
+            index = self._status_index["pending"]
+            overdue = [self._requests[request_id] for created_at, request_id in index[:limit] if created_at < cutoff]
+
+            expired = [
+                {key: row[key] for key in ("id", "media_name", "media_type", "cdn_url", "created_at")}
+                for row in overdue
+            ]
+            now = datetime.now().isoformat()
+            for row in overdue:
+                self._review(row, 'expired', 'expire', 'system', now)
+                if row['notified_at'] is None:
+                    self._mark_notified(row, now)
+            return expired
+
+    # ==================== 审核消息 ====================
+
+    def add_review_messages(self, chat_id: int, message_id: int, request_ids: List[int], kind: str = "batch"):
+        key = (chat_id, message_id)
+        with self._lock:
+            message = self._messages.setdefault(key, {"kind": kind, "request_ids": []})
+            for request_id in request_ids:
+                if request_id not in message["request_ids"]:
+                    insort(message["request_ids"], request_id)
+                    self._request_messages.setdefault(request_id, []).append(key)
+
+    def get_review_messages(self, request_ids: List[int]) -> List[Dict[str, Any]]:
+        with self._lock:
+            keys = sorted({key for request_id in request_ids for key in self._request_messages.get(request_id, [])})
+            messages = []
+            for chat_id, message_id in keys:
+                message = self._messages[(chat_id, message_id)]
+                messages.append({
+                    "chat_id": chat_id,
+                    "message_id": message_id,
+                    "kind": message["kind"],
+                    "requests": [
+                        {
+                            "request_id": request_id,
+                            "media_name": self._requests[request_id]['media_name'],
+                            "media_type": self._requests[request_id]['media_type'],
+                            "status": self._requests[request_id]['status']
+                        }
+                        for request_id in message["request_ids"] if request_id in self._requests
+                    ]
+                })
+            return messages
+
+    # ==================== 剧集分组审核 ====================
+
+    def get_or_create_review_group(
+        self,
+        group_key: str,
+        title: str,
+        media_type: str,
+        window_seconds: int
+    ) -> Optional[int]:
+        with self._lock:
+            group_id = self._open_groups.get(group_key)
+            if group_id is not None:
+                return group_id
+
+            group_id = self._next_group_id
+            self._next_group_id += 1
+            self._groups[group_id] = {
+                "id": group_id,
+                "group_key": group_key,
+                "title": title,
+                "media_type": media_type,
+                "status": "open",
+                "telegram_message_id": None,
+                "created_at": _utc_timestamp(),
+                "closes_at": time.time() + window_seconds,
+                "reviewed_at": None,
+                "reviewed_by": None,
+            }
+            self._open_groups[group_key] = group_id
+            logger.info(f"创建剧集分组: ID={group_id}, 标题={title}")
+            return group_id
+
+    def get_review_group_by_id(self, group_id: int) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            group = self._groups.get(group_id)
+            return dict(group) if group else None
+
+    def get_due_review_groups(self, limit: int = 50) -> List[Dict[str, Any]]:
+        now = time.time()
+        with self._lock:
+            due = [self._groups[group_id] for group_id in self._open_groups.values()
+                   if self._groups[group_id]['closes_at'] <= now]
+            due.sort(key=lambda group: group['closes_at'])
+            return [dict(group) for group in due[:limit]]
+
+    def close_review_group(self, group_id: int) -> bool:
+        with self._lock:
+            group = self._groups.get(group_id)
+            if not group or group['status'] != 'open':
+                return False
+            group['status'] = 'pending'
+            self._open_groups.pop(group['group_key'], None)
+
+            now = datetime.now().isoformat()
+            for row in self._group_rows(group_id):
+                if row['notified_at'] is None:
+                    self._mark_notified(row, now)
+            return True
+
+    def reopen_review_group(self, group_id: int) -> bool:
+        with self._lock:
+            group = self._groups.get(group_id)
+            if not group or group['status'] != 'pending':
+                return False
+
+            open_group_id = self._open_groups.get(group['group_key'])
+            if open_group_id is None:
+                group['status'] = 'open'
+                self._open_groups[group['group_key']] = group_id
+            for row in self._group_rows(group_id, 'pending'):
+                if open_group_id is not None:
+                    row['group_id'] = open_group_id
+                if row['notified_at'] is not None:
+                    row['notified_at'] = None
+                    insort(self._unnotified, row['id'])
+            return True
+
+    def _group_rows(self, group_id: int, status: Optional[str] = None) -> List[Dict[str, Any]]:
+        rows = [row for row in self._requests.values()
+                if row['group_id'] == group_id and (status is None or row['status'] == status)]
+        rows.sort(key=lambda row: row['host_path'] or "")
+        return rows
+
+    def get_group_requests(self, group_id: int, status: Optional[str] = None) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [dict(row) for row in self._group_rows(group_id, status)]
+
+    def update_group_telegram_message_id(self, group_id: int, message_id: int):
+        with self._lock:
+            group = self._groups.get(group_id)
+            if group:
+                group['telegram_message_id'] = message_id
+
+    def _review_group(self, group_id: int, status: str, action: str, reviewed_by: str) -> List[Dict[str, Any]]:
+        reviewed_at = datetime.now().isoformat()
+        with self._lock:
+            rows = self._group_rows(group_id, 'pending')
+            reviewed = [dict(row) for row in rows]
+            for row in rows:
+                self._review(row, status, action, reviewed_by, reviewed_at)
+
+            group = self._groups.get(group_id)
+            if group:
+                group.update(status=status, reviewed_at=reviewed_at, reviewed_by=reviewed_by)
+                self._open_groups.pop(group['group_key'], None)
+            return reviewed
+
+    def approve_review_group(self, group_id: int, reviewed_by: str = "unknown") -> List[Dict[str, Any]]:
+        rows = self._review_group(group_id, 'approved', 'approve', reviewed_by)
+        logger.info(f"分组已批准: ID={group_id}, 共 {len(rows)} 项, 审核人={reviewed_by}")
+        return rows
+
+    def reject_review_group(self, group_id: int, reviewed_by: str = "unknown") -> List[Dict[str, Any]]:
+        rows = self._review_group(group_id, 'rejected', 'reject', reviewed_by)
+        logger.info(f"分组已拒绝: ID={group_id}, 共 {len(rows)} 项, 审核人={reviewed_by}")
+        return rows
+
@@ -0,0 +1,354 @@
+"""
+运行指标模块
+进程内的轻量计数器、仪表和直方图，以 Prometheus 文本格式输出，不依赖外部服务
+"""
+import bisect
+import functools
+import inspect
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+# 默认直方图分桶（秒），覆盖从亚毫秒级的路径映射到秒级的外部 API 调用
+DEFAULT_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0
+)
+
+
+def _escape_label_value(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{name}="{_escape_label_value(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Timer:
+    """计时器，既可作为上下文管理器也可作为装饰器使用"""
+
+    def __init__(self, observe: Callable[[float], None]):
+        self._observe = observe
+        self._start = 0.0
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._observe(time.perf_counter() - self._start)
+        return False
+
+    def __call__(self, func):
+        observe = self._observe
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    observe(time.perf_counter() - start)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                observe(time.perf_counter() - start)
+        return wrapper
+
+
+class _Metric:
+    """指标基类，负责标签子指标的管理"""
+
+    metric_type = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._children: Dict[Tuple[str, ...], "_Metric"] = {}
+
+    def _new_child(self) -> "_Metric":
+        raise NotImplementedError
+
+    def labels(self, **labels) -> "_Metric":
+        """获取指定标签值的子指标"""
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def _samples(self) -> List[Tuple[Tuple[str, ...], "_Metric"]]:
+        if self.labelnames:
+            with self._lock:
+                return sorted(self._children.items())
+        return [((), self)]
+
+    def render(self) -> List[str]:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.metric_type}",
+        ]
+        for label_values, child in self._samples():
+            lines.extend(child._render_child(self.name, self.labelnames, label_values))
+        return lines
+
+    def _render_child(self, name, labelnames, label_values) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """只增不减的计数器"""
+
+    metric_type = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._value = 0.0
+
+    def _new_child(self) -> "Counter":
+        return Counter(self.name, self.documentation)
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self._value += amount
+
+    @property
+    def value(self) -> float:
+        return self._value
+
+    def _render_child(self, name, labelnames, label_values):
+        return [f"{name}{_format_labels(labelnames, label_values)} {_format_value(self._value)}"]
+
+
+class Gauge(_Metric):
+    """可增可减的仪表，也可以绑定一个取值函数在输出时读取"""
+
+    metric_type = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._value = 0.0
+        self._function: Optional[Callable[[], float]] = None
+
+    def _new_child(self) -> "Gauge":
+        return Gauge(self.name, self.documentation)
+
+    def set(self, value: float):
+        with self._lock:
+            self._value = float(value)
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self._value += amount
+
+    def dec(self, amount: float = 1.0):
+        with self._lock:
+            self._value -= amount
+
+    def set_function(self, function: Callable[[], float]):
+        """输出时调用 function 获取当前值（用于队列深度等）"""
+        self._function = function
+
+    @property
+    def value(self) -> float:
+        if self._function is not None:
+            try:
+                return float(self._function())
+            except Exception:
+                return float("nan")
+        return self._value
+
+    def _render_child(self, name, labelnames, label_values):
+        return [f"{name}{_format_labels(labelnames, label_values)} {_format_value(self.value)}"]
+
+
+class Histogram(_Metric):
+    """直方图，记录观测值的分布（分桶计数、总和、次数）"""
+
+    metric_type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ):
+        super().__init__(name, documentation, labelnames)
+        self._upper_bounds = tuple(sorted(buckets))
+        self._bucket_counts = [0] * (len(self._upper_bounds) + 1)
+        self._sum = 0.0
+        self._count = 0
+
+    def _new_child(self) -> "Histogram":
+        return Histogram(self.name, self.documentation, buckets=self._upper_bounds)
+
+    def observe(self, value: float):
+        index = bisect.bisect_left(self._upper_bounds, value)
+        with self._lock:
+            self._bucket_counts[index] += 1
+            self._sum += value
+            self._count += 1
+
+    def time(self) -> _Timer:
+        """计时上下文管理器 / 装饰器"""
+        return _Timer(self.observe)
+
+    @property
+    def count(self) -> int:
+        return self._count
+
+    @property
+    def sum(self) -> float:
+        return self._sum
+
+    def _render_child(self, name, labelnames, label_values):
+        with self._lock:
+            counts = list(self._bucket_counts)
+            total, count = self._sum, self._count
+
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip(self._upper_bounds + (float("inf"),), counts):
+            cumulative += bucket_count
+            le = f'le="{_format_value(bound)}"'
+            lines.append(f"{name}_bucket{_format_labels(labelnames, label_values, le)} {cumulative}")
+        labels = _format_labels(labelnames, label_values)
+        lines.append(f"{name}_sum{labels} {_format_value(total)}")
+        lines.append(f"{name}_count{labels} {count}")
+        return lines
+
+
+class Registry:
+    """指标注册表"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"指标已注册: {metric.name}")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        """输出 Prometheus 文本格式（text/plain; version=0.0.4）"""
+        lines = []
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+# 全局注册表
+REGISTRY = Registry()
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+# ==================== 应用指标 ====================
+
+WEBHOOK_REQUESTS = REGISTRY.register(Counter(
+    "emby_webhook_requests_total", "收到的 Webhook 请求数", ["result"]
+))
+WEBHOOK_PARSE_SECONDS = REGISTRY.register(Histogram(
+    "emby_webhook_parse_seconds", "Webhook 请求体 JSON 解析耗时"
+))
+WEBHOOK_HANDLE_SECONDS = REGISTRY.register(Histogram(
+    "emby_webhook_handle_seconds", "Webhook 请求处理总耗时"
+))
+RESOLVE_STEP_SECONDS = REGISTRY.register(Histogram(
+    "resolve_media_path_step_seconds", "路径解析各步骤耗时", ["step"]
+))
+STRM_READ_SECONDS = REGISTRY.register(Histogram(
+    "strm_read_seconds", "读取 STRM 文件耗时"
+))
+DB_QUERY_SECONDS = REGISTRY.register(Histogram(
+    "db_query_seconds", "数据库操作耗时", ["operation"]
+))
+TELEGRAM_SEND_SECONDS = REGISTRY.register(Histogram(
+    "telegram_send_seconds", "Telegram 消息发送耗时", ["kind"]
+))
+TELEGRAM_SEND_ERRORS = REGISTRY.register(Counter(
+    "telegram_send_errors_total", "Telegram 消息发送失败次数", ["kind"]
+))
+REVIEW_QUEUE_DEPTH = REGISTRY.register(Gauge(
+    "review_queue_depth", "等待推送到 Telegram 的审核请求数"
+))
+CDN_API_SECONDS = REGISTRY.register(Histogram(
+    "cdn_api_seconds", "CDN API 调用耗时", ["operation"]
+))
+CDN_API_ERRORS = REGISTRY.register(Counter(
+    "cdn_api_errors_total", "CDN API 调用失败次数（按错误码）", ["operation", "code"]
+))
+CDN_URLS_SUBMITTED = REGISTRY.register(Counter(
+    "cdn_urls_submitted_total", "成功提交预热的 URL 数量"
+))
+CDN_URLS_SKIPPED = REGISTRY.register(Counter(
+    "cdn_urls_skipped_total", "最近已提交过、跳过重复预热的 URL 数量"
+))
+CDN_EDGE_WARM = REGISTRY.register(Counter(
+    "cdn_edge_warm_total", "直接请求边缘节点预热的 URL 数量（按缓存状态）", ["cache_status"]
+))
+CDN_EDGE_WARM_BYTES = REGISTRY.register(Counter(
+    "cdn_edge_warm_bytes_total", "直接请求边缘节点预热读取的字节数"
+))
+CDN_EDGE_WARM_SECONDS = REGISTRY.register(Histogram(
+    "cdn_edge_warm_seconds", "直接请求边缘节点预热单个 URL 的耗时"
+))
+PREHEAT_QUEUE_DEPTH = REGISTRY.register(Gauge(
+    "preheat_queue_depth", "等待按配额提交预热的 URL 数量"
+))
+FILES_REPLACED = REGISTRY.register(Counter(
+    "files_replaced_total", "检测到在原路径被替换的文件数"
+))
+CDN_URLS_PURGED = REGISTRY.register(Counter(
+    "cdn_urls_purged_total", "成功刷新缓存的 URL 数量"
+))
+PURGE_QUEUE_DEPTH = REGISTRY.register(Gauge(
+    "purge_queue_depth", "等待刷新缓存的 URL 数量"
+))
+CDN_CIRCUIT_STATE = REGISTRY.register(Gauge(
+    "cdn_circuit_state", "CDN API 熔断器状态（0 关闭，1 半开，2 打开，按 CDN 账号）", ["account"]
+))
+RETRY_QUEUE_DEPTH = REGISTRY.register(Gauge(
+    "cdn_retry_queue_depth", "因 API 故障等待重试预热的 URL 数量"
+))
+CDN_PUSH_QUOTA_REMAINING = REGISTRY.register(Gauge(
+    "cdn_push_quota_remaining", "当日剩余的预热配额（查询结果减去本地已提交数量，按 CDN 账号）", ["account"]
+))
+REVIEW_EXPIRED = REGISTRY.register(Counter(
+    "review_expired_total", "超过审核时限被标记为过期的请求数"
+))
+EXPIRY_SWEEP_LAST_ROWS = REGISTRY.register(Gauge(
+    "review_expiry_sweep_last_rows", "最近一次过期清理处理的请求数"
+))
+EXPIRY_SWEEP_SECONDS = REGISTRY.register(Histogram(
+    "review_expiry_sweep_seconds", "每次过期清理的耗时"
+))
+REVIEW_ARCHIVED = REGISTRY.register(Counter(
+    "review_archived_total", "移入归档库的审核请求数"
+))
@@ -0,0 +1,321 @@
+"""
+数据库结构迁移
+迁移按版本号顺序执行，执行进度记录在 schema_version 表中。
+
+每个迁移分为三步：
+1. apply: 在一个短事务中修改结构（新增列、表、触发器），返回是否需要回填数据
+2. backfill: 按主键分段回填已有数据，每段一个事务，并在同一事务中记录回填进度
+3. finalize: 回填完成后在一个短事务中收尾（建索引、替换表）
+
+写锁每次只持有一段的时间，其他 worker 的 Webhook 写入可以在段之间穿插；
+进程中途退出后，下次启动从记录的进度继续。多个 worker 同时启动时，
+每段开始前都在写事务中重新读取进度，同一段不会被重复执行。
+"""
+import logging
+import sqlite3
+import time
+from typing import Callable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+SCHEMA_VERSION_TABLE = """
+    CREATE TABLE IF NOT EXISTS schema_version (
+        version INTEGER PRIMARY KEY,
+        description TEXT NOT NULL,
+        started_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        backfill_cursor INTEGER,
+        backfill_end INTEGER,
+        applied_at TIMESTAMP
+    )
+"""
+
+# 每回填多少段输出一次进度日志
+_PROGRESS_LOG_EVERY = 20
+
+
+class Migration:
+    """一个结构迁移"""
+
+    def __init__(
+        self,
+        version: int,
+        description: str,
+        apply: Callable[[sqlite3.Cursor], Optional[bool]],
+        backfill: Optional[Callable[[sqlite3.Cursor, int, int], None]] = None,
+        finalize: Optional[Callable[[sqlite3.Cursor], None]] = None,
+        table: str = "review_requests",
+        key: str = "id"
+    ):
+        """
+        Args:
+            version: 版本号（递增，发布后不可修改）
+            description: 说明
+            apply: 修改结构，返回 True 表示需要回填（必须可重复执行：已有数据库可能已手动升级过）
+            backfill: 回填 key 在 (start, end] 范围内的行
+            finalize: 回填完成后执行
+            table: 回填按哪张表分段
+            key: 分段使用的整数列（通常为主键）
+        """
+        self.version = version
+        self.description = description
+        self.apply = apply
+        self.backfill = backfill
+        self.finalize = finalize
+        self.table = table
+        self.key = key
+
+
+class MigrationRunner:
+    """按顺序执行尚未完成的迁移"""
+
+    def __init__(
+        self,
+        db_file: str,
+        migrations: List[Migration],
+        batch_size: int = 5000,
+        pause: float = 0.005,
+        connect: Optional[Callable[[str], sqlite3.Connection]] = None
+    ):
+        """
+        Args:
+            db_file: 数据库文件
+            migrations: 迁移列表（按版本号升序）
+            batch_size: 回填时每段的 key 跨度
+            pause: 段之间的间隔（秒），让出写锁
+            connect: 创建连接的函数（用于注册迁移中使用的 SQL 函数）
+        """
+        self.db_file = db_file
+        self.migrations = sorted(migrations, key=lambda migration: migration.version)
+        self.batch_size = batch_size
+        self.pause = pause
+        self._connect_func = connect or sqlite3.connect
+
+    def _connect(self) -> sqlite3.Connection:
+        # 手动控制事务（BEGIN IMMEDIATE / COMMIT）
+        conn = self._connect_func(self.db_file)
+        conn.isolation_level = None
+        return conn
+
+    def applied_versions(self) -> List[int]:
+        """已完成的迁移版本"""
+        with self._connect() as conn:
+            conn.execute(SCHEMA_VERSION_TABLE)
+            return [row[0] for row in conn.execute(
+                "SELECT version FROM schema_version WHERE applied_at IS NOT NULL ORDER BY version"
+            )]
+
+    def run(self) -> List[int]:
+        """
+        执行所有未完成的迁移
+
+        Returns:
+            本次完成的迁移版本
+        """
+        conn = self._connect()
+        try:
+            conn.execute(SCHEMA_VERSION_TABLE)
+            done = []
+            for migration in self.migrations:
+                row = conn.execute(
+                    "SELECT applied_at FROM schema_version WHERE version = ?", (migration.version,)
+                ).fetchone()
+                if row and row[0]:
+                    continue
+
+                started = time.time()
+                if row is None and not self._apply(conn, migration):
+                    # 另一个 worker 已完成该迁移
+                    continue
+                self._backfill(conn, migration)
+                self._finalize(conn, migration)
+                done.append(migration.version)
+                logger.info(
+                    f"🛠️  数据库迁移 v{migration.version} 完成: {migration.description}"
+                    f"（耗时 {time.time() - started:.1f} 秒）"
+                )
+            return done
+        finally:
+            conn.close()
+
+    def _apply(self, conn: sqlite3.Connection, migration: Migration) -> bool:
+        """修改结构并记录迁移；返回该迁移是否仍需后续步骤"""
+        cursor = conn.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            cursor.execute(
+                "SELECT applied_at FROM schema_version WHERE version = ?", (migration.version,)
+            )
+            row = cursor.fetchone()
+            if row:
+                cursor.execute("COMMIT")
+                return row[0] is None
+
+            needs_backfill = bool(migration.apply(cursor)) and migration.backfill is not None
+            backfill_end = None
+            if needs_backfill:
+                cursor.execute(f"SELECT COALESCE(MAX({migration.key}), 0) FROM {migration.table}")
+                backfill_end = cursor.fetchone()[0]
+
+            cursor.execute("""
+                INSERT INTO schema_version (version, description, backfill_cursor, backfill_end)
+                VALUES (?, ?, ?, ?)
+            """, (migration.version, migration.description, 0 if needs_backfill else None, backfill_end))
+            cursor.execute("COMMIT")
+            return True
+        except Exception:
+            cursor.execute("ROLLBACK")
+            raise
+
+    def _backfill(self, conn: sqlite3.Connection, migration: Migration):
+        """分段回填，每段一个写事务"""
+        cursor = conn.cursor()
+        chunks = 0
+        while True:
+            cursor.execute("BEGIN IMMEDIATE")
+            try:
+                cursor.execute(
+                    "SELECT backfill_cursor, backfill_end FROM schema_version WHERE version = ?",
+                    (migration.version,)
+                )
+                position, end = cursor.fetchone()
+                if position is None or position >= end:
+                    cursor.execute("COMMIT")
+                    return
+
+                upto = min(position + self.batch_size, end)
+                migration.backfill(cursor, position, upto)
+                cursor.execute(
+                    "UPDATE schema_version SET backfill_cursor = ? WHERE version = ?",
+                    (upto, migration.version)
+                )
+                cursor.execute("COMMIT")
+            except Exception:
+                cursor.execute("ROLLBACK")
+                raise
+
+            chunks += 1
+            if chunks % _PROGRESS_LOG_EVERY == 0:
+                logger.info(f"🛠️  数据库迁移 v{migration.version} 回填进度: {upto}/{end}")
+            time.sleep(self.pause)
+
+    def _finalize(self, conn: sqlite3.Connection, migration: Migration):
+        """收尾并标记迁移完成"""
+        cursor = conn.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            cursor.execute(
+                "SELECT applied_at FROM schema_version WHERE version = ?", (migration.version,)
+            )
+            if cursor.fetchone()[0] is None:
+                if migration.finalize:
+                    migration.finalize(cursor)
+                cursor.execute(
+                    "UPDATE schema_version SET applied_at = CURRENT_TIMESTAMP WHERE version = ?",
+                    (migration.version,)
+                )
+            cursor.execute("COMMIT")
+        except Exception:
+            cursor.execute("ROLLBACK")
+            raise
+
+
+# ==================== 迁移中常用的操作 ====================
+
+def table_exists(cursor: sqlite3.Cursor, name: str) -> bool:
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE name = ?", (name,))
+    return cursor.fetchone() is not None
+
+
+def table_columns(cursor: sqlite3.Cursor, table: str) -> List[str]:
+    cursor.execute(f"PRAGMA table_info({table})")
+    return [row[1] for row in cursor.fetchall()]
+
+
+def ensure_column(cursor: sqlite3.Cursor, table: str, column: str, column_type: str) -> bool:
+    """为旧版本数据库补充缺失的列（只修改表结构，不重写数据），返回是否新增了该列"""
+    if column in table_columns(cursor, table):
+        return False
+    cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {column_type}")
+    logger.info(f"数据库升级: {table} 新增列 {column}")
+    return True
+
+
+class OnlineTableRebuild:
+    """
+    在线重建表（SQLite 不支持删除约束，只能新建表后替换）
+
+    apply 时创建新表和同步触发器，backfill 分段复制，finalize 复制剩余的新行并替换原表。
+    复制期间原表上的更新、删除由触发器同步到已复制的行，新插入的行在 finalize 时复制。
+    """
+
+    def __init__(self, table: str, schema: str, needs_rebuild: Callable[[sqlite3.Cursor], bool]):
+        """
+        Args:
+            table: 表名
+            schema: 建表语句模板（包含 {table} 占位符）
+            needs_rebuild: 判断是否需要重建
+        """
+        self.table = table
+        self.schema = schema
+        self.needs_rebuild = needs_rebuild
+        self.rebuild_table = f"{table}_rebuild"
+
+    def _columns(self, cursor: sqlite3.Cursor) -> str:
+        new_columns = set(table_columns(cursor, self.rebuild_table))
+        return ", ".join(column for column in table_columns(cursor, self.table) if column in new_columns)
+
+    def apply(self, cursor: sqlite3.Cursor) -> bool:
+        if not self.needs_rebuild(cursor):
+            return False
+
+        cursor.execute(f"DROP TABLE IF EXISTS {self.rebuild_table}")
+        cursor.execute(self.schema.format(table=self.rebuild_table))
+        columns = self._columns(cursor)
+        new_columns = ", ".join(f"new.{column}" for column in columns.split(", "))
+
+        # 只同步已复制的行；未复制的行由后续分段复制读取最新数据
+        cursor.execute(f"""
+            CREATE TRIGGER {self.rebuild_table}_update AFTER UPDATE ON {self.table}
+            WHEN EXISTS (SELECT 1 FROM {self.rebuild_table} WHERE id = new.id)
+            BEGIN
+                INSERT OR REPLACE INTO {self.rebuild_table} ({columns}) VALUES ({new_columns});
+            END
+        """)
+        cursor.execute(f"""
+            CREATE TRIGGER {self.rebuild_table}_delete AFTER DELETE ON {self.table}
+            BEGIN
+                DELETE FROM {self.rebuild_table} WHERE id = old.id;
+            END
+        """)
+        return True
+
+    def backfill(self, cursor: sqlite3.Cursor, start: int, end: int):
+        columns = self._columns(cursor)
+        cursor.execute(f"""
+            INSERT OR REPLACE INTO {self.rebuild_table} ({columns})
+            SELECT {columns} FROM {self.table}
+            WHERE id > ? AND id <= ?
+        """, (start, end))
+
+    def finalize(self, cursor: sqlite3.Cursor):
+        if not table_exists(cursor, self.rebuild_table):
+            return
+
+        columns = self._columns(cursor)
+        cursor.execute(f"""
+            INSERT OR REPLACE INTO {self.rebuild_table} ({columns})
+            SELECT {columns} FROM {self.table}
+            WHERE id > (SELECT COALESCE(MAX(id), 0) FROM {self.rebuild_table})
+        """)
+
+        # 删除原表会同时删除其自增序列，保留下来避免复用已删除的 ID
+        cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = ?", (self.table,))
+        row = cursor.fetchone()
+        sequence = row[0] if row else 0
+
+        # 删除原表时其上的触发器一并删除
+        cursor.execute(f"DROP TABLE {self.table}")
+        cursor.execute(f"ALTER TABLE {self.rebuild_table} RENAME TO {self.table}")
+        cursor.execute("UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = ?", (sequence, self.table))
+        if cursor.rowcount == 0 and sequence:
+            cursor.execute("INSERT INTO sqlite_sequence (name, seq) VALUES (?, ?)", (self.table, sequence))
@@ -0,0 +1,395 @@
+#!/usr/bin/env python3
+"""
+本地模拟 CDN 服务
+按腾讯云 API 的请求/响应格式（X-TC-Action 请求头 + JSON，结果在 Response 中）模拟
+PushUrlsCache / DescribePushTasks / DescribePushQuota / PurgeUrlsCache，可以设置：
+
+- 响应延迟（固定延迟 + 随机抖动）
+- 频率限制：每秒请求数超过限制时返回 RequestLimitExceeded
+- 每日配额：预热/刷新的 URL 数量超过配额时返回 LimitExceeded.CdnPushExceedDayLimit / CdnPurgeExceedDayLimit
+- 单次提交上限：超过时返回 InvalidParameter.CdnUrlExceedBatchLimit
+- 故障率：按比例返回 InternalError，模拟 API 故障
+
+配合 CDN_PROVIDER=mock 和 CDN_MOCK_ENDPOINT 在本地联调，或由压测脚本在进程内启动。
+
+用法:
+    python mock_cdn.py --port 9900 --latency-ms 50 --rate 20 --quota 10000
+"""
+import argparse
+import json
+import logging
+import random
+import threading
+import time
+import uuid
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+import config
+from cdn_provider import CDNProvider
+
+logger = logging.getLogger(__name__)
+
+
+class MockCDNError(Exception):
+    """模拟的 API 错误"""
+
+    def __init__(self, code: str, message: str):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+
+
+class MockCDNState:
+    """模拟的 CDN 账号：配额、频率限制和预热任务"""
+
+    def __init__(
+        self,
+        daily_quota: int = 10000,
+        purge_quota: int = 10000,
+        batch_limit: int = 20,
+        rate_limit: int = 20,
+        latency: float = 0.05,
+        jitter: float = 0.0,
+        task_seconds: float = 5.0,
+        error_rate: float = 0.0,
+        reset_utc_offset: int = config.PREHEAT_QUOTA_RESET_UTC_OFFSET
+    ):
+        """
+        Args:
+            daily_quota: 每日预热 URL 配额
+            purge_quota: 每日刷新 URL 配额
+            batch_limit: 单次提交的 URL 上限
+            rate_limit: 每秒最多请求数，0 表示不限制
+            latency: 响应延迟（秒）
+            jitter: 在延迟上随机增加的最大时间（秒）
+            task_seconds: 预热任务从提交到完成的时间（秒）
+            error_rate: 返回 InternalError 的请求比例（0~1），1 表示 API 完全不可用
+            reset_utc_offset: 配额每日零点重置所在时区（UTC 偏移小时数）
+        """
+        self.daily_quota = daily_quota
+        self.purge_quota = purge_quota
+        self.batch_limit = batch_limit
+        self.rate_limit = rate_limit
+        self.latency = latency
+        self.jitter = jitter
+        self.task_seconds = task_seconds
+        self.error_rate = error_rate
+        self.reset_utc_offset = reset_utc_offset
+
+        self._lock = threading.Lock()
+        self._recent = deque()
+        self._day = None
+        self.pushed = 0
+        self.purged = 0
+        self.tasks: Dict[str, Dict[str, Any]] = {}
+        self.counts: Dict[str, int] = {}
+
+    def delay(self):
+        """模拟网络和服务端耗时（在锁外调用，并发请求互不阻塞）"""
+        seconds = self.latency + random.uniform(0, self.jitter)
+        if seconds > 0:
+            time.sleep(seconds)
+
+    def _reset_if_new_day(self, now: float):
+        day = int((now + self.reset_utc_offset * 3600) // 86400)
+        if day != self._day:
+            self._day = day
+            self.pushed = 0
+            self.purged = 0
+
+    def _throttle(self, now: float):
+        if not self.rate_limit:
+            return
+        while self._recent and now - self._recent[0] >= 1.0:
+            self._recent.popleft()
+        if len(self._recent) >= self.rate_limit:
+            raise MockCDNError("RequestLimitExceeded", "请求的次数超过了频率限制")
+        self._recent.append(now)
+
+    def _count(self, key: str):
+        self.counts[key] = self.counts.get(key, 0) + 1
+
+    def handle(self, action: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        处理一次 API 调用
+
+        Returns:
+            Response 的内容（不含 RequestId）
+
+        Raises:
+            MockCDNError: 模拟的 API 错误
+        """
+        now = time.time()
+        with self._lock:
+            self._count(action)
+            try:
+                self._reset_if_new_day(now)
+                self._throttle(now)
+                if self.error_rate and random.random() < self.error_rate:
+                    raise MockCDNError("InternalError", "内部错误")
+                handler = getattr(self, f"_action_{action}", None)
+                if handler is None:
+                    raise MockCDNError("InvalidAction", f"未知的接口: {action}")
+                return handler(params, now)
+            except MockCDNError as e:
+                self._count(e.code)
+                raise
+
+    def _submit(self, params: Dict[str, Any], now: float, kind: str) -> Dict[str, Any]:
+        urls = params.get("Urls") or []
+        if not urls:
+            raise MockCDNError("InvalidParameter.CdnParamError", "Urls 不能为空")
+        if len(urls) > self.batch_limit:
+            raise MockCDNError("InvalidParameter.CdnUrlExceedBatchLimit", f"单次最多提交 {self.batch_limit} 个 URL")
+
+        if kind == "push":
+            if self.pushed + len(urls) > self.daily_quota:
+                raise MockCDNError("LimitExceeded.CdnPushExceedDayLimit", "预热 URL 超出每日限额")
+            self.pushed += len(urls)
+        else:
+            if self.purged + len(urls) > self.purge_quota:
+                raise MockCDNError("LimitExceeded.CdnPurgeExceedDayLimit", "刷新 URL 超出每日限额")
+            self.purged += len(urls)
+
+        task_id = f"mock-{kind}-{uuid.uuid4().hex[:12]}"
+        self.tasks[task_id] = {"kind": kind, "urls": list(urls), "created_at": now}
+        return {"TaskId": task_id}
+
+    def _action_PushUrlsCache(self, params, now):
+        return self._submit(params, now, "push")
+
+    def _action_PurgeUrlsCache(self, params, now):
+        return self._submit(params, now, "purge")
+
+    def _action_DescribePushTasks(self, params, now):
+        task = self.tasks.get(params.get("TaskId"))
+        if task is None or task["kind"] != "push":
+            return {"PushLogs": [], "TotalCount": 0}
+
+        elapsed = now - task["created_at"]
+        percent = 100 if not self.task_seconds else min(100, int(elapsed / self.task_seconds * 100))
+        created = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(task["created_at"]))
+        updated = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(now))
+        logs = [{
+            "TaskId": params["TaskId"],
+            "Url": url,
+            "Status": "done" if percent >= 100 else "process",
+            "Percent": percent,
+            "CreateTime": created,
+            "UpdateTime": updated,
+        } for url in task["urls"]]
+        return {"PushLogs": logs, "TotalCount": len(logs)}
+
+    def _action_DescribePushQuota(self, params, now):
+        quota = {
+            "Batch": self.batch_limit,
+            "Total": self.daily_quota,
+            "Available": max(0, self.daily_quota - self.pushed),
+            "Area": "mainland",
+        }
+        return {"UrlPush": [quota], "UrlPurge": [], "PathPurge": []}
+
+    def stats(self) -> Dict[str, Any]:
+        """调用次数、错误次数和当日已用配额"""
+        with self._lock:
+            return {"counts": dict(self.counts), "pushed": self.pushed, "purged": self.purged}
+
+
+def _handler_for(state: MockCDNState):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            action = self.headers.get("X-TC-Action", "")
+            response: Dict[str, Any] = {"RequestId": str(uuid.uuid4())}
+            try:
+                params = json.loads(self.rfile.read(length) or b"{}")
+                state.delay()
+                response.update(state.handle(action, params))
+            except MockCDNError as e:
+                response["Error"] = {"Code": e.code, "Message": e.message}
+            except json.JSONDecodeError:
+                response["Error"] = {"Code": "InvalidParameter", "Message": "请求体不是合法的 JSON"}
+
+            body = json.dumps({"Response": response}, ensure_ascii=False).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            logger.debug("模拟 CDN: " + format % args)
+
+    return Handler
+
+
+class MockCDNServer:
+    """在后台线程中运行的模拟 CDN HTTP 服务"""
+
+    def __init__(self, state: Optional[MockCDNState] = None, host: str = "127.0.0.1", port: int = 0):
+        """
+        Args:
+            state: 模拟的 CDN 账号，默认使用默认参数
+            host: 监听地址
+            port: 监听端口，0 表示随机端口
+        """
+        self.state = state or MockCDNState()
+        self._server = ThreadingHTTPServer((host, port), _handler_for(self.state))
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def endpoint(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> str:
+        """启动服务，返回访问地址"""
+        self._thread = threading.Thread(target=self._server.serve_forever, name="mock-cdn", daemon=True)
+        self._thread.start()
+        return self.endpoint
+
+    def serve_forever(self):
+        """在当前线程中运行，直到被中断"""
+        try:
+            self._server.serve_forever()
+        finally:
+            self._server.server_close()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread:
+            self._thread.join()
+
+    def __enter__(self) -> "MockCDNServer":
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+
+class MockCDNProvider(CDNProvider):
+    """通过 HTTP 调用模拟 CDN 服务的服务商（CDN_PROVIDER=mock）"""
+
+    name = "mock"
+
+    def __init__(self, endpoint: str = None, timeout: float = 10.0):
+        """
+        Args:
+            endpoint: 模拟服务地址，默认使用 CDN_MOCK_ENDPOINT
+            timeout: 请求超时（秒）
+        """
+        import httpx
+
+        self.endpoint = endpoint or config.CDN_MOCK_ENDPOINT
+        self._client = httpx.Client(base_url=self.endpoint, timeout=timeout)
+
+    def _call(self, action: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        调用接口
+
+        Raises:
+            MockCDNError: 接口返回错误或请求失败
+        """
+        try:
+            resp = self._client.post("/", json=params, headers={"X-TC-Action": action})
+            resp.raise_for_status()
+            response = resp.json()["Response"]
+        except Exception as e:
+            raise MockCDNError(type(e).__name__, f"调用 API 失败: {str(e)}")
+        if "Error" in response:
+            raise MockCDNError(response["Error"]["Code"], f"模拟 CDN 错误: {response['Error']['Message']}")
+        return response
+
+    @staticmethod
+    def _error(e: MockCDNError, **fields) -> Dict[str, Any]:
+        logger.error(e.message)
+        return {"success": False, "message": e.message, "error_code": e.code, **fields}
+
+    def push_urls(self, urls: List[str]) -> Dict[str, Any]:
+        try:
+            response = self._call("PushUrlsCache", {"Urls": urls})
+            return {"success": True, "message": "预热任务已提交", "urls": urls, "task_id": response["TaskId"]}
+        except MockCDNError as e:
+            return self._error(e, urls=urls, task_id=None)
+
+    def describe_push_task(self, task_id: str) -> Dict[str, Any]:
+        try:
+            logs = self._call("DescribePushTasks", {"TaskId": task_id})["PushLogs"]
+        except MockCDNError as e:
+            return self._error(e)
+        if not logs:
+            return {"success": False, "message": "未找到任务信息"}
+        log = logs[0]
+        return {
+            "success": True,
+            "task_id": task_id,
+            "status": log["Status"],
+            "percent": log["Percent"],
+            "create_time": log["CreateTime"],
+            "update_time": log["UpdateTime"]
+        }
+
+    def describe_push_quota(self, area: str) -> Dict[str, Any]:
+        try:
+            quotas = self._call("DescribePushQuota", {})["UrlPush"]
+        except MockCDNError as e:
+            return self._error(e)
+        quota = next((q for q in quotas if q["Area"] == area), quotas[0] if quotas else None)
+        if quota is None:
+            return {"success": False, "message": "未返回预热配额"}
+        return {
+            "success": True,
+            "area": quota["Area"],
+            "total": quota["Total"],
+            "available": quota["Available"],
+            "batch": quota["Batch"]
+        }
+
+    def purge_urls(self, urls: List[str]) -> Dict[str, Any]:
+        try:
+            response = self._call("PurgeUrlsCache", {"Urls": urls})
+            return {"success": True, "message": "刷新任务已提交", "urls": urls, "task_id": response["TaskId"]}
+        except MockCDNError as e:
+            return self._error(e, urls=urls, task_id=None)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地模拟 CDN 服务")
+    parser.add_argument("--host", default="127.0.0.1", help="监听地址")
+    parser.add_argument("--port", type=int, default=9900, help="监听端口")
+    parser.add_argument("--latency-ms", type=float, default=50, help="响应延迟（毫秒）")
+    parser.add_argument("--jitter-ms", type=float, default=0, help="随机增加的最大延迟（毫秒）")
+    parser.add_argument("--rate", type=int, default=20, help="每秒最多请求数，0 表示不限制")
+    parser.add_argument("--quota", type=int, default=10000, help="每日预热 URL 配额")
+    parser.add_argument("--purge-quota", type=int, default=10000, help="每日刷新 URL 配额")
+    parser.add_argument("--batch", type=int, default=20, help="单次提交的 URL 上限")
+    parser.add_argument("--task-seconds", type=float, default=5, help="预热任务完成所需时间（秒）")
+    parser.add_argument("--error-rate", type=float, default=0, help="返回 InternalError 的请求比例（0~1）")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    state = MockCDNState(
+        daily_quota=args.quota, purge_quota=args.purge_quota, batch_limit=args.batch,
+        rate_limit=args.rate, latency=args.latency_ms / 1000, jitter=args.jitter_ms / 1000,
+        task_seconds=args.task_seconds, error_rate=args.error_rate
+    )
+    server = MockCDNServer(state, args.host, args.port)
+    print(f"🧪 模拟 CDN 服务已启动: {server.endpoint}（Ctrl+C 退出）")
+    print(f"   设置 CDN_PROVIDER=mock CDN_MOCK_ENDPOINT={server.endpoint} 即可联调")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(f"📊 {json.dumps(state.stats(), ensure_ascii=False)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+"""
+预热记录
+记录每个 URL 最近一次提交预热的时间和任务 ID，提交 PushUrlsCache 之前过滤掉
+PREHEAT_HISTORY_SECONDS 内已经提交过的 URL（元数据刷新、重复入库、多位管理员重复批准），节省预热配额
+
+记录保存在审核数据库的 preheat_history 表中（每个 URL 一行，按 url_hash 查找），
+最近查到或写入的记录同时缓存在进程内存中
+"""
+import logging
+import sqlite3
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import config
+from database import _normalized_url_hash, normalize_url
+
+logger = logging.getLogger(__name__)
+
+# 内存缓存的记录数
+HISTORY_CACHE_SIZE = 10000
+
+# 每条 IN 查询最多包含的 URL 数量（低于 SQLite 的参数个数上限）
+_QUERY_CHUNK = 500
+
+
+class PreheatHistory:
+    """最近预热记录"""
+
+    def __init__(
+        self,
+        db_file: Optional[str],
+        freshness_seconds: int = config.PREHEAT_HISTORY_SECONDS,
+        cache_size: int = HISTORY_CACHE_SIZE
+    ):
+        """
+        Args:
+            db_file: 审核数据库文件（表由数据库迁移创建）；为 None 时只记录在内存中
+            freshness_seconds: 提交后多长时间内不再重复提交，0 表示不过滤
+            cache_size: 内存缓存的记录数
+        """
+        self.db_file = db_file
+        self.freshness_seconds = freshness_seconds
+        self.cache_size = cache_size
+        # url_hash -> (规范化 URL, 提交时间)
+        self._cache: "OrderedDict[int, Tuple[str, float]]" = OrderedDict()
+
+    def _remember(self, hash_value: int, normalized: str, pushed_at: float):
+        self._cache[hash_value] = (normalized, pushed_at)
+        self._cache.move_to_end(hash_value)
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def _load(self, hashes: List[int]) -> Dict[int, Tuple[str, float]]:
+        """批量读取缓存中没有的记录"""
+        found = {}
+        if not self.db_file or not hashes:
+            return found
+        with sqlite3.connect(self.db_file) as conn:
+            for start in range(0, len(hashes), _QUERY_CHUNK):
+                chunk = hashes[start:start + _QUERY_CHUNK]
+                marks = ",".join("?" * len(chunk))
+                for hash_value, cdn_url, pushed_at in conn.execute(
+                    f"SELECT url_hash, cdn_url, pushed_at FROM preheat_history WHERE url_hash IN ({marks})",
+                    chunk
+                ):
+                    found[hash_value] = (cdn_url, pushed_at)
+        return found
+
+    def filter_fresh(self, urls: List[str]) -> Tuple[List[str], List[str]]:
+        """
+        过滤掉最近已提交过的 URL 和本批中重复的 URL
+
+        Args:
+            urls: 待提交的 URL 列表
+
+        Returns:
+            (需要提交的 URL, 跳过的 URL)，保持输入顺序
+        """
+        if self.freshness_seconds <= 0:
+            return list(urls), []
+
+        try:
+            keys = []
+            missing = []
+            for url in urls:
+                normalized = normalize_url(url)
+                hash_value = _normalized_url_hash(normalized)
+                keys.append((normalized, hash_value))
+                if hash_value in self._cache:
+                    self._cache.move_to_end(hash_value)
+                else:
+                    missing.append(hash_value)
+
+            for hash_value, (cdn_url, pushed_at) in self._load(missing).items():
+                self._remember(hash_value, cdn_url, pushed_at)
+
+            cutoff = time.time() - self.freshness_seconds
+            to_push, skipped = [], []
+            seen = set()
+            for url, (normalized, hash_value) in zip(urls, keys):
+                entry = self._cache.get(hash_value)
+                # 哈希相同时比较完整 URL，碰撞不会误跳过
+                fresh = entry is not None and entry[0] == normalized and entry[1] >= cutoff
+                if fresh or normalized in seen:
+                    skipped.append(url)
+                else:
+                    seen.add(normalized)
+                    to_push.append(url)
+            return to_push, skipped
+
+        except Exception as e:
+            # 记录不可用时不影响预热
+            logger.error(f"读取预热记录失败: {str(e)}")
+            return list(urls), []
+
+    def record(self, urls: List[str], task_id: Optional[str] = None):
+        """
+        记录提交成功的 URL
+
+        Args:
+            urls: 已提交的 URL 列表
+            task_id: 预热任务 ID
+        """
+        if self.freshness_seconds <= 0 or not urls:
+            return
+
+        pushed_at = time.time()
+        rows = []
+        for url in urls:
+            normalized = normalize_url(url)
+            hash_value = _normalized_url_hash(normalized)
+            rows.append((hash_value, normalized, pushed_at, task_id))
+            self._remember(hash_value, normalized, pushed_at)
+
+        if not self.db_file:
+            return
+        try:
+            with sqlite3.connect(self.db_file) as conn:
+                conn.executemany("""
+                    INSERT OR REPLACE INTO preheat_history (url_hash, cdn_url, pushed_at, task_id)
+                    VALUES (?, ?, ?, ?)
+                """, rows)
+                conn.commit()
+        except Exception as e:
+            logger.error(f"写入预热记录失败: {str(e)}")
+
+    def forget(self, urls: List[str]):
+        """
+        删除 URL 的预热记录（文件被替换、缓存已刷新后需要重新预热）
+
+        Args:
+            urls: URL 列表
+        """
+        hashes = []
+        for url in urls:
+            normalized = normalize_url(url)
+            hash_value = _normalized_url_hash(normalized)
+            entry = self._cache.get(hash_value)
+            # 哈希碰撞时不删除其他 URL 的记录
+            if entry is None or entry[0] == normalized:
+                self._cache.pop(hash_value, None)
+                hashes.append((hash_value, normalized))
+
+        if not self.db_file or not hashes:
+            return
+        try:
+            with sqlite3.connect(self.db_file) as conn:
+                conn.executemany("DELETE FROM preheat_history WHERE url_hash = ? AND cdn_url = ?", hashes)
+                conn.commit()
+        except Exception as e:
+            logger.error(f"删除预热记录失败: {str(e)}")
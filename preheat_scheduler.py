@@ -0,0 +1,579 @@
+"""
+按配额调度的预热队列
+腾讯云 CDN 每个账号每天可以预热的 URL 数量有限，超出后 PushUrlsCache 直接报错。
+批准的 URL 先写入审核数据库中的 preheat_queue 表，由 Leader 定期按剩余配额匀速提交：
+
+- 剩余配额通过 DescribePushQuota 查询，缓存 PREHEAT_QUOTA_REFRESH_SECONDS，期间按本地提交数量扣减
+- 每次检查按“剩余配额 / 距离配额重置的时间”积累提交额度，把剩余配额平摊到当天剩下的时间里；
+  空闲时额度最多积累到 PREHEAT_QUEUE_BURST，新批准的少量 URL 可以立即提交
+- 配额用完（或 API 返回超出每日限额）时 URL 留在队列中，配额重置后继续提交
+- 入队时按媒体类型、入库时间、连载热度计算优先级分值（管理员可以用 /priority 再加分），
+  出队时各媒体库（CDN URL 的第一级目录）轮流，每一轮内按分值从高到低，
+  补录旧片库时新上线的剧集不必排在整个积压队列后面
+- 多域名 / 多账号（见 cdn_accounts.py）时，入队的是所有域名的 URL，按所属账号分别计算配额、并发提交
+- 在原路径被替换的文件（见 cache_purge.py）先写入刷新队列，每次检查时各账号先按相同的批次大小和间隔
+  刷新缓存，刷新成功后再以高优先级重新加入预热队列
+"""
+import asyncio
+import logging
+import sqlite3
+import time
+from datetime import datetime, timezone
+from itertools import zip_longest
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urlparse
+
+import config
+import metrics
+from cache_purge import PurgeQueue, purge_batches
+from circuit_breaker import is_circuit_open
+from cdn_accounts import DEFAULT_ACCOUNT, CDNTargets
+
+logger = logging.getLogger(__name__)
+
+# 普通优先级（数值越大越先提交）
+PRIORITY_NORMAL = 0
+
+
+def library_of(cdn_url: str) -> str:
+    """URL 所属的媒体库：CDN URL 路径的第一级目录（如 剧集、电影）"""
+    parts = urlparse(cdn_url).path.strip("/").split("/")
+    return parts[0] if len(parts) > 1 else ""
+
+
+def _age_seconds(created_at: Optional[str], now: float) -> Optional[float]:
+    """审核请求创建至今的秒数（created_at 为 UTC 时间 YYYY-MM-DD HH:MM:SS）"""
+    try:
+        created = datetime.strptime(created_at, "%Y-%m-%d %H:%M:%S").replace(tzinfo=timezone.utc)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, now - created.timestamp())
+
+
+def request_priority(request: Dict[str, Any], group_count: int = 1, now: Optional[float] = None) -> int:
+    """
+    计算审核请求的预热优先级分值
+
+    Args:
+        request: 审核请求
+        group_count: 同一季（分组键相同）形成过的剧集分组数量，连载中的剧集每次更新都会形成一个分组
+        now: 当前时间
+
+    Returns:
+        媒体类型分 + 新入库分 + 连载热度分
+    """
+    now = time.time() if now is None else now
+    score = config.PREHEAT_PRIORITY_TYPE_WEIGHTS.get(request.get("media_type"), 0)
+
+    window = config.PREHEAT_PRIORITY_RECENCY_DAYS * 86400
+    age = _age_seconds(request.get("created_at"), now)
+    if age is not None and window > 0:
+        score += round(config.PREHEAT_PRIORITY_RECENCY * max(0.0, 1 - age / window))
+
+    score += min(config.PREHEAT_PRIORITY_POPULARITY_MAX,
+                 config.PREHEAT_PRIORITY_POPULARITY_STEP * max(0, group_count - 1))
+    return score
+
+
+def is_quota_exceeded(result: Dict[str, Any]) -> bool:
+    """PushUrlsCache 是否因超出每日预热配额而失败（LimitExceeded.CdnPushExceedDayLimit）"""
+    return "ExceedDayLimit" in (result.get("error_code") or "")
+
+
+def is_throttled(result: Dict[str, Any]) -> bool:
+    """是否因 API 频率限制而失败（RequestLimitExceeded），稍后重试即可"""
+    return (result.get("error_code") or "").startswith("RequestLimitExceeded")
+
+
+class PreheatQueue:
+    """
+    持久化的预热队列（各媒体库轮流、媒体库内按优先级和入队顺序出队，同一 URL 只保留一条）
+
+    每条记录属于一个 CDN 账号，各账号分别出队
+    """
+
+    def __init__(self, db_file: str):
+        """
+        Args:
+            db_file: 审核数据库文件（表由数据库迁移创建）
+        """
+        self.db_file = db_file
+
+    def push(self, items: List[Tuple[str, int]], account: str = DEFAULT_ACCOUNT) -> int:
+        """
+        加入队列；已在队列中的 URL 只会提高优先级
+
+        Args:
+            items: (URL, 优先级分值) 列表
+            account: URL 所属的 CDN 账号
+
+        Returns:
+            新加入的 URL 数量
+        """
+        if not items:
+            return 0
+        now = time.time()
+        with sqlite3.connect(self.db_file) as conn:
+            before = conn.total_changes
+            conn.executemany(
+                "INSERT OR IGNORE INTO preheat_queue (cdn_url, account, library, priority, enqueued_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [(url, account, library_of(url), priority, now) for url, priority in items]
+            )
+            added = conn.total_changes - before
+            conn.executemany(
+                "UPDATE preheat_queue SET priority = ? WHERE cdn_url = ? AND priority < ?",
+                [(priority, url, priority) for url, priority in items]
+            )
+            conn.commit()
+        return added
+
+    def boost(self, cdn_url: str, amount: int) -> bool:
+        """提高队列中 URL 的优先级，返回 URL 是否在队列中"""
+        with sqlite3.connect(self.db_file) as conn:
+            cursor = conn.execute(
+                "UPDATE preheat_queue SET priority = priority + ? WHERE cdn_url = ?", (amount, cdn_url)
+            )
+            conn.commit()
+            return cursor.rowcount > 0
+
+    def peek(self, limit: int, account: str = DEFAULT_ACCOUNT) -> List[Dict[str, Any]]:
+        """
+        按出队顺序读取某个账号的最多 limit 条（不移出队列）
+
+        各媒体库沿 (account, library, priority, id) 索引各取前 limit 条，再轮流合并：
+        每一轮每个媒体库取一条，同一轮内按优先级排序
+        """
+        if limit <= 0:
+            return []
+        with sqlite3.connect(self.db_file) as conn:
+            conn.row_factory = sqlite3.Row
+            libraries = [
+                row[0] for row in
+                conn.execute("SELECT DISTINCT library FROM preheat_queue WHERE account = ?", (account,))
+            ]
+            per_library = [
+                conn.execute("""
+                    SELECT id, cdn_url, library, priority, attempts FROM preheat_queue
+                    WHERE account = ? AND library = ? ORDER BY priority DESC, id LIMIT ?
+                """, (account, library, limit)).fetchall()
+                for library in libraries
+            ]
+
+        entries = []
+        for round_rows in zip_longest(*per_library):
+            entries.extend(sorted(
+                (row for row in round_rows if row is not None),
+                key=lambda row: (-row["priority"], row["id"])
+            ))
+            if len(entries) >= limit:
+                break
+        return [dict(row) for row in entries[:limit]]
+
+    def remove(self, ids: List[int]):
+        """移出已提交的 URL"""
+        if not ids:
+            return
+        with sqlite3.connect(self.db_file) as conn:
+            conn.executemany("DELETE FROM preheat_queue WHERE id = ?", [(i,) for i in ids])
+            conn.commit()
+
+    def mark_failed(self, ids: List[int], max_attempts: int) -> List[str]:
+        """
+        记录一次提交失败，达到 max_attempts 次的 URL 移出队列
+
+        Returns:
+            移出队列的 URL
+        """
+        if not ids:
+            return []
+        marks = ",".join("?" * len(ids))
+        with sqlite3.connect(self.db_file) as conn:
+            conn.execute(f"UPDATE preheat_queue SET attempts = attempts + 1 WHERE id IN ({marks})", ids)
+            dropped = conn.execute(
+                f"SELECT cdn_url FROM preheat_queue WHERE id IN ({marks}) AND attempts >= ?",
+                [*ids, max_attempts]
+            ).fetchall()
+            conn.execute(f"DELETE FROM preheat_queue WHERE id IN ({marks}) AND attempts >= ?", [*ids, max_attempts])
+            conn.commit()
+        return [row[0] for row in dropped]
+
+    def depth(self, account: Optional[str] = None) -> int:
+        """队列中的 URL 数量（account 为 None 时统计所有账号）"""
+        with sqlite3.connect(self.db_file) as conn:
+            if account is None:
+                return conn.execute("SELECT COUNT(*) FROM preheat_queue").fetchone()[0]
+            return conn.execute("SELECT COUNT(*) FROM preheat_queue WHERE account = ?", (account,)).fetchone()[0]
+
+
+class PushQuota:
+    """每日预热配额：缓存查询结果，按本地提交数量扣减"""
+
+    def __init__(
+        self,
+        fallback_total: int = config.PREHEAT_DAILY_QUOTA,
+        refresh_seconds: int = config.PREHEAT_QUOTA_REFRESH_SECONDS,
+        reset_utc_offset: int = config.PREHEAT_QUOTA_RESET_UTC_OFFSET
+    ):
+        """
+        Args:
+            fallback_total: 查询失败时使用的每日配额
+            refresh_seconds: 查询结果的缓存时间（秒）
+            reset_utc_offset: 配额每日零点重置所在时区（UTC 偏移小时数）
+        """
+        self.fallback_total = fallback_total
+        self.refresh_seconds = refresh_seconds
+        self.reset_utc_offset = reset_utc_offset
+        self.total: Optional[int] = None
+        self.available = 0
+        self.batch: Optional[int] = None
+        self.used = 0
+        self.fetched_at: Optional[float] = None
+        self.reset_at: Optional[float] = None
+
+    def next_reset(self, now: float) -> float:
+        """now 之后的下一次配额重置时间"""
+        offset = self.reset_utc_offset * 3600
+        return ((now + offset) // 86400 + 1) * 86400 - offset
+
+    def stale(self, now: float) -> bool:
+        """是否需要重新查询"""
+        return (
+            self.fetched_at is None
+            or now - self.fetched_at >= self.refresh_seconds
+            or now >= self.reset_at
+        )
+
+    def update(self, info: Dict[str, Any], now: float):
+        """
+        更新查询结果
+
+        Args:
+            info: CDNPreheatService.get_push_quota 的返回值
+            now: 查询时间
+        """
+        if info.get("success"):
+            self.total = info["total"]
+            self.available = info["available"]
+            self.batch = info.get("batch")
+            self.used = 0
+        else:
+            logger.error(f"查询预热配额失败: {info.get('message')}")
+            if self.fetched_at is None or now >= self.reset_at:
+                # 从未查询成功或已经过了重置时间：按每日配额估算
+                self.total = self.total or self.fallback_total
+                self.available = self.total
+                self.used = 0
+            # 否则沿用上次的查询结果和本地扣减
+        self.fetched_at = now
+        self.reset_at = self.next_reset(now)
+
+    def remaining(self, now: float) -> int:
+        """当前剩余配额"""
+        if self.fetched_at is None:
+            return 0
+        if now >= self.reset_at:
+            # 已经重置，等待下次查询确认
+            return self.total or 0
+        return max(0, self.available - self.used)
+
+    def seconds_until_reset(self, now: float) -> float:
+        reset_at = self.reset_at if self.reset_at and now < self.reset_at else self.next_reset(now)
+        return max(1.0, reset_at - now)
+
+    def consume(self, count: int):
+        """扣减本地已提交的数量"""
+        self.used += count
+
+    def exhaust(self):
+        """API 报告配额已用完：当天不再提交，直到下次查询或重置"""
+        self.used = self.available
+
+
+class PreheatScheduler:
+    """按配额匀速提交预热队列（多账号时各账号的配额和提交额度相互独立）"""
+
+    def __init__(
+        self,
+        service,
+        queue: PreheatQueue,
+        quota: PushQuota,
+        burst: int = config.PREHEAT_QUEUE_BURST,
+        max_attempts: int = config.PREHEAT_QUEUE_MAX_ATTEMPTS,
+        pause: float = 1.0,
+        services: Optional[Dict[str, Any]] = None,
+        quotas: Optional[Dict[str, PushQuota]] = None,
+        targets: Optional[CDNTargets] = None,
+        purge_queue: Optional[PurgeQueue] = None,
+        purge_burst: int = config.PURGE_QUEUE_BURST
+    ):
+        """
+        Args:
+            service: 默认账号的 CDNPreheatService
+            queue: 预热队列
+            quota: 默认账号的预热配额
+            burst: 空闲时积累的提交额度上限（每个账号）
+            max_attempts: 非配额原因提交失败的 URL 最多尝试次数
+            pause: 同一次检查中各批提交之间的间隔（秒），避免触发 API 限流
+            services: 账号名称 → CDNPreheatService，默认只有默认账号
+            quotas: 其他账号的预热配额，未提供的账号按 PREHEAT_DAILY_QUOTA 估算
+            targets: 多域名展开与账号查找，默认按 CDN_URL_MAPPINGS / CDN_ACCOUNTS
+            purge_queue: 刷新队列，默认与预热队列使用同一个数据库
+            purge_burst: 每次检查每个账号最多刷新的 URL 数量
+        """
+        self.service = service
+        self.queue = queue
+        self.quota = quota
+        self.burst = burst
+        self.max_attempts = max_attempts
+        self.pause = pause
+        self.services = {DEFAULT_ACCOUNT: service, **(services or {})}
+        self.quotas = {**(quotas or {}), DEFAULT_ACCOUNT: quota}
+        for account in self.services:
+            self.quotas.setdefault(account, PushQuota())
+        self.targets = targets or CDNTargets()
+        self.purge_queue = purge_queue or PurgeQueue(queue.db_file)
+        self.purge_burst = purge_burst
+        # 启动时允许立即提交一批
+        self._credit = {account: float(burst) for account in self.services}
+        self._last_tick: Dict[str, Optional[float]] = {account: None for account in self.services}
+
+    def enqueue(self, urls: List[str], priority: int = PRIORITY_NORMAL) -> Dict[str, Any]:
+        """
+        以相同的优先级把 URL（及其在其他域名上的副本）加入预热队列，最近已提交过的 URL 直接跳过
+
+        Returns:
+            {"queued": 新加入的数量, "skipped": 跳过的 URL, "targets": 展开后的 URL 数量, "depth": 队列长度}
+        """
+        return self._push([(url, priority) for url in urls])
+
+    def enqueue_requests(self, requests: List[Dict[str, Any]], admin_priority: int = 0) -> Dict[str, Any]:
+        """
+        把批准的审核请求加入预热队列，按媒体类型、入库时间和连载热度计算优先级
+
+        Args:
+            requests: 审核请求
+            admin_priority: 管理员额外加的分
+
+        Returns:
+            同 enqueue
+        """
+        now = time.time()
+        group_counts = self._group_counts(r["group_id"] for r in requests if r.get("group_id"))
+        return self._push([
+            (r["cdn_url"], request_priority(r, group_counts.get(r.get("group_id"), 1), now) + admin_priority)
+            for r in requests
+        ])
+
+    def enqueue_purge(self, urls: List[str], repreheat: bool = True) -> int:
+        """
+        把被替换文件的 URL（及其在其他域名上的副本）加入刷新队列
+
+        Args:
+            urls: 主 URL 列表
+            repreheat: 刷新成功后是否重新预热
+
+        Returns:
+            新加入的 URL 数量
+        """
+        queued = sum(
+            self.purge_queue.push(account_urls, account, repreheat)
+            for account, account_urls in self.targets.group(urls).items()
+        )
+        metrics.PURGE_QUEUE_DEPTH.set(self.purge_queue.depth())
+        if queued:
+            logger.info(f"🧹 {queued} 个 URL 已加入刷新队列")
+        return queued
+
+    def boost(self, cdn_url: str, amount: int) -> bool:
+        """提高 URL 在所有域名上的副本的优先级，返回是否有副本在队列中"""
+        return any([self.queue.boost(url, amount) for url in self.targets.target_urls(cdn_url)])
+
+    def _group_counts(self, group_ids: Iterable[int]) -> Dict[int, int]:
+        """每个分组的分组键下形成过的分组数量"""
+        group_ids = list(set(group_ids))
+        if not group_ids:
+            return {}
+        marks = ",".join("?" * len(group_ids))
+        with sqlite3.connect(self.queue.db_file) as conn:
+            return dict(conn.execute(f"""
+                SELECT g.id, COUNT(*) FROM review_groups g
+                JOIN review_groups same ON same.group_key = g.group_key
+                WHERE g.id IN ({marks})
+                GROUP BY g.id
+            """, group_ids).fetchall())
+
+    def _push(self, items: List[Tuple[str, int]]) -> Dict[str, Any]:
+        expanded = [(target, priority) for url, priority in items for target in self.targets.target_urls(url)]
+        urls, skipped = self.service.filter_recent([url for url, _ in expanded])
+        fresh = set(urls)
+
+        by_account: Dict[str, List[Tuple[str, int]]] = {}
+        for url, priority in expanded:
+            if url in fresh:
+                by_account.setdefault(self.targets.account_of(url), []).append((url, priority))
+        queued = sum(self.queue.push(account_items, account) for account, account_items in by_account.items())
+
+        depth = self.queue.depth()
+        metrics.PREHEAT_QUEUE_DEPTH.set(depth)
+        if queued:
+            logger.info(f"📥 {queued} 个 URL 已加入预热队列，队列中共 {depth} 个")
+        return {"queued": queued, "skipped": skipped, "targets": len(expanded), "depth": depth}
+
+    def remaining_quota(self, now: Optional[float] = None) -> Dict[str, int]:
+        """各账号当前剩余的预热配额"""
+        now = time.time() if now is None else now
+        return {account: quota.remaining(now) for account, quota in self.quotas.items()}
+
+    def _accrue(self, account: str, now: float) -> int:
+        """按账号的剩余配额和距离重置的时间积累提交额度，返回本次最多提交的数量"""
+        quota = self.quotas[account]
+        remaining = quota.remaining(now)
+        increment = 0.0
+        if self._last_tick[account] is not None:
+            increment = remaining * (now - self._last_tick[account]) / quota.seconds_until_reset(now)
+        self._last_tick[account] = now
+        # 配额很多时每次的额度可以超过 burst，否则当天用不完
+        self._credit[account] = min(self._credit[account] + increment, max(self.burst, increment))
+        return min(int(self._credit[account]), remaining)
+
+    async def drain_once(self, now: Optional[float] = None) -> Dict[str, int]:
+        """
+        检查一次队列，各账号按自己的额度并发提交
+
+        Returns:
+            {"submitted": 提交数, "skipped": 最近已提交而跳过的数量, "failed": 失败数,
+             "dropped": 失败次数过多移出队列的数量, "purged": 刷新缓存的 URL 数量, "depth": 剩余队列长度}
+        """
+        now = time.time() if now is None else now
+        loop = asyncio.get_running_loop()
+
+        results = await asyncio.gather(*(self._drain_account(account, now) for account in self.services))
+        stats = {
+            key: sum(result[key] for result in results)
+            for key in ("submitted", "skipped", "failed", "dropped", "purged")
+        }
+
+        stats["depth"] = await loop.run_in_executor(None, self.queue.depth)
+        metrics.PREHEAT_QUEUE_DEPTH.set(stats["depth"])
+        metrics.PURGE_QUEUE_DEPTH.set(await loop.run_in_executor(None, self.purge_queue.depth))
+        for account, quota in self.quotas.items():
+            metrics.CDN_PUSH_QUOTA_REMAINING.labels(account=account).set(quota.remaining(now))
+        return stats
+
+    async def _drain_account(self, account: str, now: float) -> Dict[str, int]:
+        """按一个账号的额度提交该账号的队列"""
+        service = self.services[account]
+        quota = self.quotas[account]
+        loop = asyncio.get_running_loop()
+        stats = {"submitted": 0, "skipped": 0, "failed": 0, "dropped": 0, "purged": 0}
+
+        if quota.stale(now):
+            info = await loop.run_in_executor(None, service.get_push_quota)
+            quota.update(info, now)
+        batch_size = min(service.batch_size, quota.batch or service.batch_size)
+
+        # 先刷新被替换文件的旧缓存（刷新成功的 URL 以高优先级加入预热队列，本次即可提交）
+        calls, throttled = await self._purge_account(account, batch_size, stats)
+        if throttled:
+            return stats
+
+        # 服务商创建失败（如未配置 API 凭证）时 URL 留在队列中
+        allowance = self._accrue(account, now) if service.api_available else 0
+        entries = await loop.run_in_executor(None, self.queue.peek, allowance, account) if allowance else []
+
+        for start in range(0, len(entries), batch_size):
+            if start or calls:
+                await asyncio.sleep(self.pause)
+            chunk = entries[start:start + batch_size]
+            ids = [entry["id"] for entry in chunk]
+            result = await service.preheat_urls([entry["cdn_url"] for entry in chunk])
+
+            if result["success"]:
+                skipped = len(result.get("skipped", []))
+                pushed = len(chunk) - skipped
+                quota.consume(pushed)
+                self._credit[account] -= pushed
+                stats["submitted"] += pushed
+                stats["skipped"] += skipped
+                await loop.run_in_executor(None, self.queue.remove, ids)
+            elif is_quota_exceeded(result):
+                logger.warning(f"⚠️  预热配额已用完（账号 {account}），剩余 URL 留在队列中，配额重置后继续提交")
+                quota.exhaust()
+                break
+            elif is_throttled(result):
+                # 不计入失败次数，下次检查时重试
+                logger.warning(f"⚠️  CDN API 频率限制（账号 {account}），剩余 URL 下次检查时提交")
+                break
+            elif is_circuit_open(result):
+                # API 故障期间同样不计入失败次数，熔断器关闭后继续提交
+                logger.warning(f"⚠️  CDN API 已熔断（账号 {account}），剩余 URL 留在队列中")
+                break
+            else:
+                stats["failed"] += len(chunk)
+                dropped = await loop.run_in_executor(None, self.queue.mark_failed, ids, self.max_attempts)
+                for url in dropped:
+                    logger.error(f"❌ 预热连续失败 {self.max_attempts} 次，移出队列: {url}")
+                stats["dropped"] += len(dropped)
+                break
+
+        return stats
+
+    async def _purge_account(self, account: str, batch_size: int, stats: Dict[str, int]) -> Tuple[int, bool]:
+        """
+        按批次刷新一个账号的刷新队列
+
+        Returns:
+            (调用 API 的次数, 是否遇到 API 频率限制或熔断)
+        """
+        service = self.services[account]
+        loop = asyncio.get_running_loop()
+        entries = await loop.run_in_executor(None, self.purge_queue.peek, self.purge_burst, account) \
+            if service.api_available else []
+
+        async def requeue(chunk: List[Dict[str, Any]]):
+            repreheat = [
+                (entry["cdn_url"], config.PREHEAT_PRIORITY_REPLACED) for entry in chunk if entry["repreheat"]
+            ]
+            await loop.run_in_executor(None, self.queue.push, repreheat, account)
+
+        purged, calls, throttled = await purge_batches(
+            service, self.purge_queue, entries, batch_size, self.pause, self.max_attempts, requeue
+        )
+        stats["purged"] += purged
+        return calls, throttled
+
+
+_scheduler: Optional[PreheatScheduler] = None
+
+
+def get_scheduler() -> Optional[PreheatScheduler]:
+    """
+    全局预热调度器
+
+    Returns:
+        启用了预热、PREHEAT_QUEUE_ENABLED、使用预热接口（PREHEAT_MODE=api）且使用 SQLite 存储时
+        返回调度器，否则返回 None（直接提交）
+    """
+    global _scheduler
+    if _scheduler is None:
+        from cdn_accounts import get_fanout
+        from cdn_preheat import cdn_service
+        from database import get_db
+
+        if not config.PREHEAT_QUEUE_ENABLED or not cdn_service.enabled or cdn_service.mode == "edge":
+            return None
+        db_file = get_db().db_file
+        if db_file is None:
+            return None
+        # 与直接提交、重试队列共用各账号的服务（同一个客户端、熔断器和预热记录缓存）
+        fanout = get_fanout()
+        quotas = {
+            account: PushQuota(fallback_total=options.get("daily_quota", config.PREHEAT_DAILY_QUOTA))
+            for account, options in config.CDN_ACCOUNTS.items()
+        }
+        _scheduler = PreheatScheduler(
+            cdn_service, PreheatQueue(db_file), PushQuota(), services=fanout.services, quotas=quotas,
+            targets=fanout.targets
+        )
+    return _scheduler
@@ -0,0 +1,287 @@
+"""
+审核记录归档模块
+把审核完成且超过保留期的请求移到独立的归档库（media_info 压缩存储），
+热库只保留 URL 墓碑用于去重，并通过增量 VACUUM 归还空闲页，保持热库小而常驻页缓存
+
+新数据库建表时即启用增量 VACUUM；已有数据库需要停止服务后执行一次完整 VACUUM 切换模式：
+    python retention.py enable-incremental-vacuum
+"""
+import argparse
+import logging
+import sqlite3
+import sys
+import time
+import zlib
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+import config
+from metrics import DB_QUERY_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# 可以归档的最终状态
+ARCHIVABLE_STATUSES = ("approved", "rejected", "expired")
+
+# 每次增量 VACUUM 归还的页数（每步一个短事务，避免长时间持有写锁）
+_VACUUM_PAGES_PER_STEP = 1000
+
+# 热库与归档库共有的列（media_info 在归档库中压缩存储）
+_ARCHIVE_COLUMNS = (
+    "id", "cdn_url", "media_name", "media_type", "emby_path", "host_path", "media_info",
+    "status", "telegram_message_id", "created_at", "reviewed_at", "reviewed_by",
+    "review_action", "group_id",
+)
+
+
+def _compress(text: Optional[str]) -> Optional[bytes]:
+    if text is None:
+        return None
+    return zlib.compress(text.encode('utf-8'), 9)
+
+
+def _decompress(blob: Optional[bytes]) -> str:
+    if blob is None:
+        return '{}'
+    return zlib.decompress(blob).decode('utf-8')
+
+
+class ReviewArchive:
+    """审核记录归档（独立的 SQLite 文件）"""
+
+    def __init__(self, db_file: str, archive_file: str = config.ARCHIVE_DB_FILE):
+        """
+        Args:
+            db_file: 热库（审核数据库）文件
+            archive_file: 归档库文件
+        """
+        self.db_file = db_file
+        self.archive_file = archive_file
+        archive_dir = Path(self.archive_file).parent
+        if archive_dir.name != '.':
+            archive_dir.mkdir(parents=True, exist_ok=True)
+        self._init_archive()
+
+    def _init_archive(self):
+        """初始化归档表"""
+        with sqlite3.connect(self.archive_file) as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS archived_requests (
+                    id INTEGER PRIMARY KEY,
+                    cdn_url TEXT NOT NULL,
+                    media_name TEXT NOT NULL,
+                    media_type TEXT NOT NULL,
+                    emby_path TEXT,
+                    host_path TEXT,
+                    media_info BLOB,
+                    status TEXT NOT NULL,
+                    telegram_message_id INTEGER,
+                    created_at TIMESTAMP,
+                    reviewed_at TIMESTAMP,
+                    reviewed_by TEXT,
+                    review_action TEXT,
+                    group_id INTEGER,
+                    archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            conn.commit()
+
+    def _connect(self) -> sqlite3.Connection:
+        """连接热库并附加归档库"""
+        conn = sqlite3.connect(self.db_file)
+        conn.create_function("zcompress", 1, _compress, deterministic=True)
+        conn.execute("ATTACH DATABASE ? AS archive", (self.archive_file,))
+        return conn
+
+    @DB_QUERY_SECONDS.labels(operation="archive").time()
+    def archive_batch(self, cutoff: str, limit: int = 1000) -> int:
+        """
+        归档一批审核时间早于 cutoff 的请求
+
+        先在一个事务中复制到归档库，再在另一个事务中写墓碑并删除热库中的行。
+        WAL 模式下跨文件的事务不保证整体原子，分两步并使用 INSERT OR IGNORE，
+        中途失败时重新执行即可，不会丢失数据。
+
+        Args:
+            cutoff: 审核时间上限（ISO 格式）
+            limit: 本批最多归档的数量
+
+        Returns:
+            本批归档的数量
+        """
+        conn = self._connect()
+        try:
+            marks = ",".join("?" * len(ARCHIVABLE_STATUSES))
+            ids = [row[0] for row in conn.execute(f"""
+                SELECT id FROM review_requests
+                WHERE status IN ({marks}) AND reviewed_at < ?
+                LIMIT ?
+            """, (*ARCHIVABLE_STATUSES, cutoff, limit))]
+            if not ids:
+                return 0
+
+            id_marks = ",".join("?" * len(ids))
+            columns = ", ".join(_ARCHIVE_COLUMNS)
+            select_columns = columns.replace("media_info", "zcompress(media_info)")
+
+            with conn:
+                conn.execute(f"""
+                    INSERT OR IGNORE INTO archive.archived_requests ({columns})
+                    SELECT {select_columns} FROM review_requests
+                    WHERE id IN ({id_marks})
+                """, ids)
+
+            with conn:
+                # 只删除已确认写入归档库的行
+                archived = f"SELECT id FROM archive.archived_requests WHERE id IN ({id_marks})"
+                conn.execute(f"""
+                    INSERT INTO review_tombstones (url_hash, cdn_url, request_id, status)
+                    SELECT url_hash, cdn_url, id, status FROM review_requests
+                    WHERE id IN ({archived})
+                """, ids)
+                conn.execute(f"DELETE FROM review_messages WHERE request_id IN ({archived})", ids)
+                deleted = conn.execute(f"DELETE FROM review_requests WHERE id IN ({archived})", ids).rowcount
+
+            return deleted
+        finally:
+            conn.close()
+
+    def purge_groups(self, cutoff: str) -> int:
+        """删除审核完成且其中请求已全部归档的剧集分组"""
+        with sqlite3.connect(self.db_file) as conn:
+            deleted = conn.execute("""
+                DELETE FROM review_groups
+                WHERE status IN ('approved', 'rejected') AND reviewed_at < ?
+                  AND NOT EXISTS (
+                      SELECT 1 FROM review_requests r WHERE r.group_id = review_groups.id
+                  )
+            """, (cutoff,)).rowcount
+            conn.commit()
+            return deleted
+
+    def vacuum(self) -> int:
+        """
+        增量归还热库中的空闲页
+
+        只执行 incremental_vacuum，每步一个短事务。已有数据库未启用增量 VACUUM 时跳过，
+        切换模式需要完整 VACUUM（重写整个文件并持有排他锁），不在运行中的服务里自动执行，
+        见 enable_incremental_vacuum。
+
+        Returns:
+            归还的页数
+        """
+        conn = sqlite3.connect(self.db_file, isolation_level=None)
+        try:
+            if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+                logger.info(
+                    "🗜️  热库未启用增量 VACUUM，跳过空间回收（停止服务后执行 "
+                    "python retention.py enable-incremental-vacuum 切换）"
+                )
+                return 0
+
+            pages_before = conn.execute("PRAGMA page_count").fetchone()[0]
+            while conn.execute("PRAGMA freelist_count").fetchone()[0] > 0:
+                conn.execute(f"PRAGMA incremental_vacuum({_VACUUM_PAGES_PER_STEP})").fetchall()
+            return pages_before - conn.execute("PRAGMA page_count").fetchone()[0]
+        finally:
+            conn.close()
+
+    def run(self, retention_days: int, batch_size: int = 1000) -> Dict[str, Any]:
+        """
+        执行一次归档：分批归档超过保留期的请求，清理分组，归还空闲页
+
+        Args:
+            retention_days: 审核完成后在热库中保留的天数
+            batch_size: 每批归档的数量
+
+        Returns:
+            统计信息
+        """
+        started = time.time()
+        cutoff = (datetime.now() - timedelta(days=retention_days)).isoformat()
+
+        archived = 0
+        while True:
+            count = self.archive_batch(cutoff, batch_size)
+            archived += count
+            if count < batch_size:
+                break
+
+        groups_removed = self.purge_groups(cutoff)
+        pages_freed = self.vacuum()
+
+        return {
+            "archived": archived,
+            "groups_removed": groups_removed,
+            "pages_freed": pages_freed,
+            "elapsed": time.time() - started
+        }
+
+    def get_archived_request(self, request_id: int) -> Optional[Dict[str, Any]]:
+        """从归档库中获取请求（media_info 已解压）"""
+        try:
+            with sqlite3.connect(self.archive_file) as conn:
+                conn.row_factory = sqlite3.Row
+                row = conn.execute(
+                    "SELECT * FROM archived_requests WHERE id = ?", (request_id,)
+                ).fetchone()
+                if not row:
+                    return None
+                request = dict(row)
+                request['media_info'] = _decompress(request['media_info'])
+                return request
+        except Exception as e:
+            logger.error(f"获取归档请求失败: {str(e)}")
+            return None
+
+    def get_statistics(self) -> Dict[str, int]:
+        """归档库统计信息"""
+        with sqlite3.connect(self.archive_file) as conn:
+            return {"archived": conn.execute("SELECT COUNT(*) FROM archived_requests").fetchone()[0]}
+
+
+def enable_incremental_vacuum(db_file: str) -> int:
+    """
+    把已有数据库切换为增量 VACUUM（离线操作）
+
+    完整 VACUUM 会重写整个数据库文件，期间持有排他锁，所有写入都会被阻塞，需要先停止服务。
+
+    Returns:
+        归还的页数（已启用时返回 0）
+    """
+    conn = sqlite3.connect(db_file, isolation_level=None)
+    try:
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+            logger.info("✅ 数据库已启用增量 VACUUM，无需切换")
+            return 0
+
+        pages_before = conn.execute("PRAGMA page_count").fetchone()[0]
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        conn.execute("VACUUM")
+        # 切换后多出指针映射页，空库上可能比原来大
+        pages_freed = max(0, pages_before - conn.execute("PRAGMA page_count").fetchone()[0])
+        logger.info(f"🗜️  已切换为增量 VACUUM，归还 {pages_freed} 页")
+        return pages_freed
+    finally:
+        conn.close()
+
+
+def main():
+    from database import DB_FILE
+
+    parser = argparse.ArgumentParser(description="审核记录归档维护")
+    parser.add_argument("--db-file", default=DB_FILE, help=f"数据库文件（默认 {DB_FILE}）")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("enable-incremental-vacuum",
+                        help="执行一次完整 VACUUM，把已有数据库切换为增量 VACUUM（需先停止服务）")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s", stream=sys.stderr)
+
+    if args.command == "enable-incremental-vacuum":
+        enable_incremental_vacuum(args.db_file)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+"""
+预热重试队列
+没有预热队列（未启用 PREHEAT_QUEUE_ENABLED 或存储引擎不支持）时，批准后直接提交预热。CDN API 故障
+或熔断器打开导致提交失败的 URL 不再丢失，而是写入持久化的 retry_queue 表，按指数退避加随机抖动安排
+下次重试时间；Leader 定期检查，熔断器不处于打开状态时按账号分批重新提交到期的 URL
+"""
+import asyncio
+import logging
+import random
+import sqlite3
+import time
+from typing import Any, Dict, List, Optional
+
+import config
+import metrics
+from cdn_accounts import DEFAULT_ACCOUNT
+from circuit_breaker import OPEN, is_circuit_open, is_transient_error
+
+logger = logging.getLogger(__name__)
+
+
+def is_retryable(result: Dict[str, Any]) -> bool:
+    """提交失败是否应写入重试队列（API 故障或熔断器打开）"""
+    return not result.get("success") and (is_circuit_open(result) or is_transient_error(result))
+
+
+def backoff_delay(
+    attempts: int,
+    base: float = config.CDN_RETRY_BASE_SECONDS,
+    cap: float = config.CDN_RETRY_MAX_SECONDS,
+    rand=random.random
+) -> float:
+    """
+    第 attempts 次重试前等待的秒数
+
+    指数退避 base * 2^attempts（不超过 cap）的 50%~100%，同时故障的大量 URL 不会在同一时刻一起重试
+    """
+    delay = min(cap, base * 2 ** attempts)
+    return delay / 2 + rand() * delay / 2
+
+
+class RetryQueue:
+    """持久化的重试队列（同一 URL 只保留一条，每条记录属于一个 CDN 账号）"""
+
+    def __init__(self, db_file: str):
+        """
+        Args:
+            db_file: 审核数据库文件（表由数据库迁移创建）
+        """
+        self.db_file = db_file
+
+    def push(self, urls: List[str], account: str = DEFAULT_ACCOUNT, error: Optional[str] = None,
+             now: Optional[float] = None) -> int:
+        """
+        加入队列，第一次重试安排在 backoff_delay(0) 秒后；已在队列中的 URL 保持原来的重试时间
+
+        Returns:
+            新加入的 URL 数量
+        """
+        if not urls:
+            return 0
+        now = time.time() if now is None else now
+        with sqlite3.connect(self.db_file) as conn:
+            before = conn.total_changes
+            conn.executemany("""
+                INSERT OR IGNORE INTO retry_queue (cdn_url, account, next_attempt_at, last_error, enqueued_at)
+                VALUES (?, ?, ?, ?, ?)
+            """, [(url, account, now + backoff_delay(0), error, now) for url in urls])
+            added = conn.total_changes - before
+            conn.commit()
+        return added
+
+    def due(self, limit: int, account: str = DEFAULT_ACCOUNT, now: Optional[float] = None) -> List[Dict[str, Any]]:
+        """读取某个账号已到重试时间的最多 limit 条（按重试时间顺序，不移出队列）"""
+        if limit <= 0:
+            return []
+        now = time.time() if now is None else now
+        with sqlite3.connect(self.db_file) as conn:
+            conn.row_factory = sqlite3.Row
+            rows = conn.execute("""
+                SELECT id, cdn_url, attempts FROM retry_queue
+                WHERE account = ? AND next_attempt_at <= ? ORDER BY next_attempt_at, id LIMIT ?
+            """, (account, now, limit)).fetchall()
+        return [dict(row) for row in rows]
+
+    def remove(self, ids: List[int]):
+        """移出已提交的 URL"""
+        if not ids:
+            return
+        with sqlite3.connect(self.db_file) as conn:
+            conn.executemany("DELETE FROM retry_queue WHERE id = ?", [(i,) for i in ids])
+            conn.commit()
+
+    def reschedule(self, entries: List[Dict[str, Any]], error: Optional[str], max_attempts: int,
+                   now: Optional[float] = None) -> List[str]:
+        """
+        记录一次重试失败并按退避时间安排下次重试，达到 max_attempts 次的 URL 移出队列
+
+        Returns:
+            移出队列的 URL
+        """
+        if not entries:
+            return []
+        now = time.time() if now is None else now
+        dropped = [entry for entry in entries if entry["attempts"] + 1 >= max_attempts]
+        retry = [entry for entry in entries if entry["attempts"] + 1 < max_attempts]
+        with sqlite3.connect(self.db_file) as conn:
+            conn.executemany(
+                "UPDATE retry_queue SET attempts = attempts + 1, next_attempt_at = ?, last_error = ? WHERE id = ?",
+                [(now + backoff_delay(entry["attempts"] + 1), error, entry["id"]) for entry in retry]
+            )
+            conn.executemany("DELETE FROM retry_queue WHERE id = ?", [(entry["id"],) for entry in dropped])
+            conn.commit()
+        return [entry["cdn_url"] for entry in dropped]
+
+    def depth(self, account: Optional[str] = None) -> int:
+        """队列中的 URL 数量（account 为 None 时统计所有账号）"""
+        with sqlite3.connect(self.db_file) as conn:
+            if account is None:
+                return conn.execute("SELECT COUNT(*) FROM retry_queue").fetchone()[0]
+            return conn.execute("SELECT COUNT(*) FROM retry_queue WHERE account = ?", (account,)).fetchone()[0]
+
+
+class RetryDrainer:
+    """按账号分批重新提交重试队列中到期的 URL（熔断器打开的账号等到半开后再试）"""
+
+    def __init__(
+        self,
+        services: Dict[str, Any],
+        queue: RetryQueue,
+        burst: int = config.CDN_RETRY_BURST,
+        max_attempts: int = config.CDN_RETRY_MAX_ATTEMPTS,
+        pause: float = 1.0
+    ):
+        """
+        Args:
+            services: 账号名称 → CDNPreheatService
+            queue: 重试队列
+            burst: 每次检查每个账号最多重试的 URL 数量
+            max_attempts: 最多重试次数
+            pause: 各批提交之间的间隔（秒），避免触发 API 限流
+        """
+        self.services = services
+        self.queue = queue
+        self.burst = burst
+        self.max_attempts = max_attempts
+        self.pause = pause
+
+    async def drain_once(self, now: Optional[float] = None) -> Dict[str, int]:
+        """
+        检查一次重试队列，各账号并发提交
+
+        Returns:
+            {"submitted": 提交数, "retried": 再次失败等待下次重试的数量,
+             "dropped": 重试次数过多移出队列的数量, "depth": 剩余队列长度}
+        """
+        now = time.time() if now is None else now
+        loop = asyncio.get_running_loop()
+
+        results = await asyncio.gather(*(self._drain_account(account, now) for account in self.services))
+        stats = {key: sum(result[key] for result in results) for key in ("submitted", "retried", "dropped")}
+        stats["depth"] = await loop.run_in_executor(None, self.queue.depth)
+        metrics.RETRY_QUEUE_DEPTH.set(stats["depth"])
+        return stats
+
+    async def _drain_account(self, account: str, now: float) -> Dict[str, int]:
+        """分批重新提交一个账号到期的 URL"""
+        service = self.services[account]
+        loop = asyncio.get_running_loop()
+        stats = {"submitted": 0, "retried": 0, "dropped": 0}
+
+        # 熔断器打开期间不重试；半开时第一批作为试探调用
+        if not service.api_available or service.breaker.state == OPEN:
+            return stats
+        entries = await loop.run_in_executor(None, self.queue.due, self.burst, account, now)
+
+        for start in range(0, len(entries), service.batch_size):
+            if start:
+                await asyncio.sleep(self.pause)
+            chunk = entries[start:start + service.batch_size]
+            result = await service.preheat_urls([entry["cdn_url"] for entry in chunk])
+
+            if result["success"]:
+                stats["submitted"] += len(chunk) - len(result.get("skipped", []))
+                await loop.run_in_executor(None, self.queue.remove, [entry["id"] for entry in chunk])
+                continue
+
+            # 这一批推迟到下次重试，剩余的批次保持原来的重试时间
+            dropped = await loop.run_in_executor(
+                None, self.queue.reschedule, chunk, result.get("error_code") or result["message"],
+                self.max_attempts, now
+            )
+            for url in dropped:
+                logger.error(f"❌ 预热重试 {self.max_attempts} 次仍失败，移出重试队列: {url}")
+            stats["dropped"] += len(dropped)
+            stats["retried"] += len(chunk) - len(dropped)
+            break
+
+        if stats["submitted"]:
+            logger.info(f"🔁 重试队列（账号 {account}）: 重新提交 {stats['submitted']} 个 URL")
+        return stats
+
+
+_drainer: Optional[RetryDrainer] = None
+
+
+def get_drainer() -> Optional[RetryDrainer]:
+    """
+    全局重试队列
+
+    Returns:
+        启用了预热且使用 SQLite 存储时返回，否则返回 None
+    """
+    global _drainer
+    if _drainer is None:
+        from cdn_accounts import get_fanout
+        from database import get_db
+
+        if not config.PREHEAT_ENABLED:
+            return None
+        db_file = get_db().db_file
+        if db_file is None:
+            return None
+        _drainer = RetryDrainer(get_fanout().services, RetryQueue(db_file))
+    return _drainer
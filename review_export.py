@@ -0,0 +1,385 @@
+"""
+审核记录导出 / 导入
+导出按 ID 分批读取 review_requests（NDJSON 或 CSV，可选 gzip），边读边写，不把整表加载到内存；
+导入按批写入，每批一个写事务，并按 URL 去重，用于迁移主机和生成压测数据
+
+命令行用法:
+    python review_export.py export -o requests.ndjson.gz --status approved --since 2026-01-01
+    python review_export.py import requests.ndjson.gz
+"""
+import argparse
+import csv
+import gzip
+import io
+import json
+import logging
+import sqlite3
+import sys
+import time
+import zlib
+from typing import Any, Dict, Iterator, Optional, TextIO, Tuple
+
+from database import DB_FILE, ReviewDatabase, _normalized_url_hash, normalize_url
+from review_store import REVIEW_STATUSES
+
+logger = logging.getLogger(__name__)
+
+# 导出的列（url_hash 由导入方重新计算）
+EXPORT_COLUMNS = (
+    "id", "cdn_url", "media_name", "media_type", "emby_path", "host_path", "media_info",
+    "status", "telegram_message_id", "created_at", "reviewed_at", "reviewed_by",
+    "review_action", "group_id", "notified_at",
+)
+
+# 导入时写入的列（剧集分组不随请求导出，导入后 group_id 为空）
+_IMPORT_COLUMNS = (
+    "cdn_url", "media_name", "media_type", "emby_path", "host_path", "media_info",
+    "status", "telegram_message_id", "created_at", "reviewed_at", "reviewed_by",
+    "review_action", "notified_at",
+)
+
+# CSV 中以文本读入、导入时需要转换的整数列
+_INTEGER_COLUMNS = ("telegram_message_id",)
+
+# 应用写入空字符串（而不是 NULL）的列
+_CSV_EMPTY_STRING_COLUMNS = ("emby_path", "host_path")
+
+EXPORT_FORMATS = ("ndjson", "csv")
+
+# 每批读取 / 写入的行数
+BATCH_SIZE = 1000
+
+# 导入时最多记录多少条无效行的详情
+_INVALID_LOG_LIMIT = 5
+
+
+def detect_format(path: str) -> Tuple[str, bool]:
+    """根据文件名判断格式和是否 gzip 压缩（无法判断时为 NDJSON）"""
+    name = path.lower()
+    compressed = name.endswith(".gz")
+    if compressed:
+        name = name[:-3]
+    return ("csv" if name.endswith(".csv") else "ndjson"), compressed
+
+
+# ==================== 导出 ====================
+
+def iter_requests(
+    db_file: str,
+    status: Optional[str] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    batch_size: int = BATCH_SIZE
+) -> Iterator[Dict[str, Any]]:
+    """
+    按 ID 顺序逐行读取审核请求
+
+    每批是一次独立的短查询（WHERE id > 上一批最后的 ID），不会长时间占用读事务而阻止 WAL 检查点。
+
+    Args:
+        db_file: 数据库文件
+        status: 只导出该状态
+        since: 创建时间下限（含），如 2026-01-01 或 2026-01-01 08:00:00（UTC）
+        until: 创建时间上限（不含）
+        batch_size: 每批读取的行数
+    """
+    conditions = ["id > ?"]
+    params = []
+    if status:
+        conditions.append("status = ?")
+        params.append(status)
+    if since:
+        conditions.append("created_at >= ?")
+        params.append(since)
+    if until:
+        conditions.append("created_at < ?")
+        params.append(until)
+
+    sql = f"""
+        SELECT {", ".join(EXPORT_COLUMNS)} FROM review_requests
+        WHERE {" AND ".join(conditions)}
+        ORDER BY id
+        LIMIT ?
+    """
+
+    last_id = 0
+    with sqlite3.connect(db_file) as conn:
+        conn.row_factory = sqlite3.Row
+        while True:
+            rows = conn.execute(sql, (last_id, *params, batch_size)).fetchall()
+            for row in rows:
+                yield dict(row)
+            if len(rows) < batch_size:
+                return
+            last_id = rows[-1]["id"]
+
+
+def _encode_ndjson(rows) -> str:
+    lines = []
+    for row in rows:
+        record = dict(row)
+        # media_info 以 JSON 对象导出，便于分析工具直接读取
+        try:
+            record["media_info"] = json.loads(record["media_info"]) if record["media_info"] else {}
+        except ValueError:
+            pass
+        lines.append(json.dumps(record, ensure_ascii=False) + "\n")
+    return "".join(lines)
+
+
+def iter_export(
+    db_file: str,
+    fmt: str = "ndjson",
+    status: Optional[str] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    compress: bool = False,
+    batch_size: int = BATCH_SIZE
+) -> Iterator[bytes]:
+    """
+    流式导出，逐批生成编码后的字节块（写文件和 HTTP 流式响应共用）
+
+    Args:
+        fmt: ndjson 或 csv
+        compress: 是否输出 gzip
+        其余参数见 iter_requests
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"无效的导出格式: {fmt}")
+
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS) if compress else None
+
+    def encode(text: str) -> bytes:
+        data = text.encode('utf-8')
+        return compressor.compress(data) if compressor else data
+
+    buffer = io.StringIO()
+    writer = None
+    if fmt == "csv":
+        writer = csv.DictWriter(buffer, fieldnames=EXPORT_COLUMNS, lineterminator="\n")
+        writer.writeheader()
+
+    batch = []
+    for row in iter_requests(db_file, status, since, until, batch_size):
+        batch.append(row)
+        if len(batch) < batch_size:
+            continue
+        if writer:
+            writer.writerows(batch)
+        else:
+            buffer.write(_encode_ndjson(batch))
+        batch = []
+        chunk = encode(buffer.getvalue())
+        buffer.seek(0)
+        buffer.truncate()
+        if chunk:
+            yield chunk
+
+    if writer:
+        writer.writerows(batch)
+    else:
+        buffer.write(_encode_ndjson(batch))
+    chunk = encode(buffer.getvalue())
+    if compressor:
+        chunk += compressor.flush()
+    if chunk:
+        yield chunk
+
+
+def export_requests(
+    db_file: str,
+    output: str,
+    fmt: Optional[str] = None,
+    status: Optional[str] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    compress: Optional[bool] = None
+) -> Dict[str, Any]:
+    """
+    导出到文件（output 为 - 时写到标准输出）
+
+    Args:
+        fmt / compress: 不指定时根据文件名判断（.ndjson / .csv，.gz 结尾表示压缩）
+
+    Returns:
+        {"bytes": 写入字节数, "elapsed": 耗时（秒）}
+    """
+    detected_fmt, detected_compress = detect_format(output)
+    fmt = fmt or detected_fmt
+    compress = detected_compress if compress is None else compress
+
+    started = time.time()
+    written = 0
+    stream = sys.stdout.buffer if output == "-" else open(output, "wb")
+    try:
+        for chunk in iter_export(db_file, fmt, status, since, until, compress):
+            stream.write(chunk)
+            written += len(chunk)
+    finally:
+        if stream is not sys.stdout.buffer:
+            stream.close()
+
+    return {"bytes": written, "elapsed": time.time() - started}
+
+
+# ==================== 导入 ====================
+
+def _open_input(path: str) -> TextIO:
+    if path == "-":
+        return io.TextIOWrapper(sys.stdin.buffer, encoding="utf-8")
+    with open(path, "rb") as f:
+        magic = f.read(2)
+    if magic == b"\x1f\x8b":
+        return gzip.open(path, "rt", encoding="utf-8", newline="")
+    return open(path, "r", encoding="utf-8", newline="")
+
+
+def _read_records(stream: TextIO, fmt: str) -> Iterator[Any]:
+    if fmt == "csv":
+        for record in csv.DictReader(stream):
+            # CSV 无法区分空字符串和 NULL：路径列按应用写入时的默认值还原为空字符串，其余还原为 NULL
+            yield {
+                key: None if value == "" and key not in _CSV_EMPTY_STRING_COLUMNS else value
+                for key, value in record.items()
+            }
+        return
+
+    # NDJSON 在 _prepare 中解析，单行格式错误只跳过该行
+    for line in stream:
+        if line.strip():
+            yield line
+
+
+def _prepare(record: Any, keep_ids: bool) -> tuple:
+    """校验并转换为插入参数，格式错误、缺少必填字段或状态无效时抛出 ValueError"""
+    if isinstance(record, str):
+        record = json.loads(record)
+    for column in ("cdn_url", "media_name", "media_type"):
+        if not record.get(column):
+            raise ValueError(f"缺少 {column}")
+    status = record.get("status") or "pending"
+    if status not in REVIEW_STATUSES:
+        raise ValueError(f"无效的状态: {status}")
+
+    values = {column: record.get(column) for column in _IMPORT_COLUMNS}
+    values["status"] = status
+    media_info = values["media_info"]
+    if media_info is None or not isinstance(media_info, str):
+        values["media_info"] = json.dumps(media_info or {}, ensure_ascii=False)
+    for column in _INTEGER_COLUMNS:
+        if values[column] is not None:
+            values[column] = int(values[column])
+
+    params = tuple(values[column] for column in _IMPORT_COLUMNS)
+    if keep_ids:
+        params = (int(record["id"]),) + params
+    return params
+
+
+def import_requests(
+    db_file: str,
+    source: str,
+    fmt: Optional[str] = None,
+    batch_size: int = BATCH_SIZE,
+    keep_ids: bool = False
+) -> Dict[str, Any]:
+    """
+    从导出文件导入审核请求（gzip 根据文件内容自动识别）
+
+    每批一个写事务，批之间 Webhook 可以正常写入。URL 已存在（包括已归档）的请求跳过；
+    keep_ids 为 True 时保留原 ID（用于迁移到新主机的空数据库），ID 已被占用的请求跳过。
+
+    Returns:
+        {"imported": 导入数, "skipped": 跳过数, "invalid": 无效行数, "elapsed": 耗时（秒）}
+    """
+    fmt = fmt or detect_format(source)[0]
+    # 确保表结构存在且已升级到最新版本
+    ReviewDatabase(db_file)
+
+    columns = (("id",) if keep_ids else ()) + _IMPORT_COLUMNS + ("url_hash",)
+    sql = f"""
+        INSERT OR IGNORE INTO review_requests ({", ".join(columns)})
+        VALUES ({", ".join("?" for _ in columns)})
+    """
+
+    result = {"imported": 0, "skipped": 0, "invalid": 0}
+    started = time.time()
+
+    def flush(conn: sqlite3.Connection, batch: list):
+        cursor = conn.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        # 没有归档过的数据库不需要逐条查墓碑
+        cursor.execute("SELECT 1 FROM review_tombstones LIMIT 1")
+        has_tombstones = cursor.fetchone() is not None
+        for params in batch:
+            cdn_url = params[1] if keep_ids else params[0]
+            normalized = normalize_url(cdn_url)
+            hash_value = _normalized_url_hash(normalized)
+            if ReviewDatabase._url_exists(cursor, "review_requests", normalized, hash_value) or \
+                    (has_tombstones and
+                     ReviewDatabase._url_exists(cursor, "review_tombstones", normalized, hash_value)):
+                result["skipped"] += 1
+                continue
+            cursor.execute(sql, params + (hash_value,))
+            if cursor.rowcount:
+                result["imported"] += 1
+            else:
+                result["skipped"] += 1
+        conn.commit()
+
+    with _open_input(source) as stream, sqlite3.connect(db_file) as conn:
+        batch = []
+        for line_no, record in enumerate(_read_records(stream, fmt), start=1):
+            try:
+                batch.append(_prepare(record, keep_ids))
+            except (ValueError, TypeError, KeyError) as e:
+                result["invalid"] += 1
+                if result["invalid"] <= _INVALID_LOG_LIMIT:
+                    logger.warning(f"跳过无效记录（第 {line_no} 条）: {str(e)}")
+                continue
+            if len(batch) >= batch_size:
+                flush(conn, batch)
+                batch = []
+        if batch:
+            flush(conn, batch)
+
+    result["elapsed"] = time.time() - started
+    logger.info(
+        f"📥 导入完成: 新增 {result['imported']} 个，跳过 {result['skipped']} 个，"
+        f"无效 {result['invalid']} 个，耗时 {result['elapsed']:.1f} 秒"
+    )
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="审核记录导出 / 导入")
+    parser.add_argument("--db-file", default=DB_FILE, help=f"数据库文件（默认 {DB_FILE}）")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = commands.add_parser("export", help="导出审核请求")
+    export_parser.add_argument("-o", "--output", default="-", help="输出文件，- 为标准输出（默认）")
+    export_parser.add_argument("--format", choices=EXPORT_FORMATS, help="导出格式（默认根据文件名判断）")
+    export_parser.add_argument("--gzip", action="store_true", default=None, help="gzip 压缩（.gz 文件名自动启用）")
+    export_parser.add_argument("--status", choices=REVIEW_STATUSES, help="只导出该状态")
+    export_parser.add_argument("--since", help="创建时间下限（含，UTC），如 2026-01-01")
+    export_parser.add_argument("--until", help="创建时间上限（不含，UTC）")
+
+    import_parser = commands.add_parser("import", help="导入审核请求")
+    import_parser.add_argument("source", help="导入文件，- 为标准输入")
+    import_parser.add_argument("--format", choices=EXPORT_FORMATS, help="文件格式（默认根据文件名判断）")
+    import_parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="每个事务写入的行数")
+    import_parser.add_argument("--keep-ids", action="store_true", help="保留原请求 ID")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s", stream=sys.stderr)
+
+    if args.command == "export":
+        result = export_requests(args.db_file, args.output, args.format, args.status,
+                                 args.since, args.until, args.gzip)
+        logger.info(f"📤 导出完成: {result['bytes']} 字节，耗时 {result['elapsed']:.1f} 秒")
+    else:
+        import_requests(args.db_file, args.source, args.format, args.batch_size, args.keep_ids)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+"""
+审核存储接口
+定义审核请求、剧集分组和审核消息的存储操作，SQLite 引擎（database.ReviewDatabase）
+和内存引擎（memory_store.MemoryReviewStore）都实现该接口，调用方只依赖这里的方法
+"""
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional
+
+# 审核请求的所有状态
+REVIEW_STATUSES = ("pending", "approved", "rejected", "expired")
+
+
+class ReviewStore(ABC):
+    """
+    审核存储
+
+    请求以字典返回，字段与 review_requests 表的列一致（media_info 为 JSON 字符串）。
+    写操作失败时记录日志并返回 None / 空列表 / False，不向调用方抛出异常
+    （get_requests_page 的参数错误除外）。
+    """
+
+    # 引擎名称（DB_BACKEND 的取值）
+    backend: str = ""
+
+    # SQLite 引擎的数据库文件，其他引擎为 None（归档等只适用于 SQLite 的功能据此跳过）
+    db_file: Optional[str] = None
+
+    # ==================== 审核请求 ====================
+
+    @abstractmethod
+    def add_review_request(
+        self,
+        cdn_url: str,
+        media_name: str,
+        media_type: str,
+        emby_path: str = "",
+        host_path: str = "",
+        media_info: Dict[str, Any] = None,
+        group_id: Optional[int] = None
+    ) -> Optional[int]:
+        """添加审核请求，URL 已存在（包括已归档）时返回 None"""
+
+    @abstractmethod
+    def update_telegram_message_id(self, request_id: int, message_id: int):
+        """更新 Telegram 消息 ID"""
+
+    @abstractmethod
+    def approve_request(self, request_id: int, reviewed_by: str = "unknown"):
+        """批准预热请求"""
+
+    @abstractmethod
+    def reject_request(self, request_id: int, reviewed_by: str = "unknown"):
+        """拒绝预热请求"""
+
+    @abstractmethod
+    def get_request_by_id(self, request_id: int) -> Optional[Dict[str, Any]]:
+        """根据 ID 获取请求"""
+
+    @abstractmethod
+    def get_pending_requests(self, limit: int = 100) -> List[Dict[str, Any]]:
+        """获取待审核的请求（按创建时间倒序）"""
+
+    @abstractmethod
+    def get_approved_requests(self, limit: int = 100) -> List[Dict[str, Any]]:
+        """获取已批准的请求（按审核时间倒序）"""
+
+    @abstractmethod
+    def get_requests_page(
+        self,
+        status: str = "pending",
+        limit: int = 10,
+        cursor: Optional[int] = None,
+        direction: str = "next"
+    ) -> Dict[str, Any]:
+        """
+        按 (created_at, id) 倒序键集分页
+
+        Returns:
+            {"items": [...], "next_cursor": ID 或 None, "prev_cursor": ID 或 None}
+
+        Raises:
+            ValueError: 翻页方向无效或游标对应的请求不存在
+        """
+
+    @abstractmethod
+    def search_requests(
+        self,
+        query: str,
+        status: Optional[str] = None,
+        limit: int = 10,
+        offset: int = 0
+    ) -> Dict[str, Any]:
+        """
+        按媒体名称、Emby 路径和 CDN URL 搜索（空白分隔的关键词需同时匹配，媒体名称命中优先）
+
+        Returns:
+            {"items": [...], "next_offset": 下一页的 offset 或 None}
+        """
+
+    @abstractmethod
+    def get_statistics(self) -> Dict[str, int]:
+        """各状态的请求数量及总数"""
+
+    # ==================== 推送队列 ====================
+
+    @abstractmethod
+    def count_unnotified_requests(self) -> int:
+        """统计尚未推送到 Telegram 的请求数（不含收集中的剧集分组）"""
+
+    @abstractmethod
+    def claim_unnotified_requests(self, limit: int) -> List[Dict[str, Any]]:
+        """取出一批尚未推送的请求（按 ID 顺序）并标记为已推送"""
+
+    @abstractmethod
+    def release_unnotified_requests(self, request_ids: List[int]):
+        """推送失败时撤销已推送标记，下一轮重新推送"""
+
+    @abstractmethod
+    def expire_overdue_requests(self, timeout_seconds: int, limit: int = 500) -> List[Dict[str, Any]]:
+        """把创建超过 timeout_seconds 秒仍待审核的请求标记为已过期（每次最多 limit 个，最早的优先）"""
+
+    # ==================== 审核消息 ====================
+
+    @abstractmethod
+    def add_review_messages(self, chat_id: int, message_id: int, request_ids: List[int], kind: str = "batch"):
+        """记录一条审核消息包含的请求"""
+
+    @abstractmethod
+    def get_review_messages(self, request_ids: List[int]) -> List[Dict[str, Any]]:
+        """
+        获取包含指定请求的审核消息，以及每条消息中所有请求的当前状态
+
+        Returns:
+            [{"chat_id", "message_id", "kind", "requests": [请求, ...]}, ...]
+        """
+
+    # ==================== 剧集分组审核 ====================
+
+    @abstractmethod
+    def get_or_create_review_group(
+        self,
+        group_key: str,
+        title: str,
+        media_type: str,
+        window_seconds: int
+    ) -> Optional[int]:
+        """获取仍在收集中的分组，不存在则新建"""
+
+    @abstractmethod
+    def get_review_group_by_id(self, group_id: int) -> Optional[Dict[str, Any]]:
+        """根据 ID 获取分组"""
+
+    @abstractmethod
+    def get_due_review_groups(self, limit: int = 50) -> List[Dict[str, Any]]:
+        """获取收集窗口已结束、等待推送审核的分组"""
+
+    @abstractmethod
+    def close_review_group(self, group_id: int) -> bool:
+        """结束分组收集，进入待审核状态；返回是否由本次调用关闭"""
+
+    @abstractmethod
+    def reopen_review_group(self, group_id: int) -> bool:
+        """
+        分组消息没有发送给任何管理员时撤销关闭，下一轮重新推送
+
+        同一目录已有新的收集中分组时，把待审核的请求移入该分组；返回是否撤销成功
+        """
+
+    @abstractmethod
+    def get_group_requests(self, group_id: int, status: Optional[str] = None) -> List[Dict[str, Any]]:
+        """获取分组内的审核请求（按宿主机路径排序）"""
+
+    @abstractmethod
+    def update_group_telegram_message_id(self, group_id: int, message_id: int):
+        """更新分组的 Telegram 消息 ID"""
+
+    @abstractmethod
+    def approve_review_group(self, group_id: int, reviewed_by: str = "unknown") -> List[Dict[str, Any]]:
+        """批准分组内所有待审核请求，返回被批准的请求"""
+
+    @abstractmethod
+    def reject_review_group(self, group_id: int, reviewed_by: str = "unknown") -> List[Dict[str, Any]]:
+        """拒绝分组内所有待审核请求，返回被拒绝的请求"""
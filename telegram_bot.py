@@ -4,6 +4,8 @@ Telegram Bot 审核模块
 支持批量推送以避免触发 Telegram 速率限制
 """
 import asyncio
+import html
+import json
 import logging
 import time
 from typing import Optional, Dict, Any, List
@@ -11,11 +13,28 @@ from telegram import Bot, InlineKeyboardButton, InlineKeyboardMarkup, Update
 from telegram.ext import Application, CallbackQueryHandler, CommandHandler, ContextTypes
 from telegram.error import TelegramError
 import config
+import metrics
 from database import db
+from cdn_accounts import get_fanout
 from cdn_preheat import cdn_service
+from preheat_scheduler import get_scheduler
+from retry_queue import get_drainer
 
 logger = logging.getLogger(__name__)
 
+# 过期清理时每段并发编辑的消息数量
+EXPIRY_EDIT_CHUNK = 20
+
+# 每个聊天保留的搜索关键词数量（用于搜索结果翻页）
+SEARCH_QUERIES_KEPT = 20
+
+STATUS_EMOJI = {
+    'pending': '⏳',
+    'approved': '✅',
+    'rejected': '❌',
+    'expired': '⌛'
+}
+
 
 class TelegramReviewBot:
     """Telegram 审核 Bot - 支持批量推送"""
@@ -26,11 +45,13 @@ class TelegramReviewBot:
         self.application: Optional[Application] = None
         self.bot: Optional[Bot] = None
 
-        # 批量推送相关
-        self.review_queue: asyncio.Queue = asyncio.Queue()
+        # 批量推送相关（待推送的请求保存在数据库中，notified_at 为空）
         self.batch_worker_task: Optional[asyncio.Task] = None
         self.last_push_time: float = 0
 
+        # 正在后台执行的边缘节点预热（保持引用，避免被垃圾回收）
+        self.edge_tasks = set()
+
     async def initialize(self):
         """初始化 Bot"""
         if not self.bot_token:
@@ -61,6 +82,12 @@ class TelegramReviewBot:
             self.application.add_handler(
                 CommandHandler("detail", self._handle_detail_command)
             )
+            self.application.add_handler(
+                CommandHandler("search", self._handle_search_command)
+            )
+            self.application.add_handler(
+                CommandHandler("priority", self._handle_priority_command)
+            )
 
             # 启动 Bot（非阻塞）
             await self.application.initialize()
@@ -89,6 +116,9 @@ class TelegramReviewBot:
             except asyncio.CancelledError:
                 pass
 
+        for task in list(self.edge_tasks):
+            task.cancel()
+
         if self.application:
             try:
                 await self.application.updater.stop()
@@ -98,58 +128,15 @@ class TelegramReviewBot:
             except Exception as e:
                 logger.error(f"关闭 Telegram Bot 失败: {str(e)}")
 
-    async def add_to_queue(
-        self,
-        request_id: int,
-        media_name: str,
-        media_type: str,
-        cdn_url: str,
-        emby_path: str = "",
-        host_path: str = "",
-        media_info: Dict[str, Any] = None
-    ):
-        """
-        添加审核请求到队列（批量推送）
-
-        Args:
-            request_id: 请求 ID
-            media_name: 媒体名称
-            media_type: 媒体类型
-            cdn_url: CDN URL
-            emby_path: Emby 路径
-            host_path: 宿主机路径
-            media_info: 媒体详细信息
-        """
-        if not self.bot:
-            logger.error("Telegram Bot 未初始化")
-            return
-
-        request_data = {
-            'request_id': request_id,
-            'media_name': media_name,
-            'media_type': media_type,
-            'cdn_url': cdn_url,
-            'emby_path': emby_path,
-            'host_path': host_path,
-            'media_info': media_info or {}
-        }
-
-        await self.review_queue.put(request_data)
-        queue_size = self.review_queue.qsize()
-        logger.info(f"📥 审核请求已加入队列: ID={request_id}, 队列大小={queue_size}")
-
-        # 如果队列达到最大数量，立即触发推送
-        if queue_size >= config.BATCH_PUSH_SIZE:
-            logger.info(f"🚀 队列达到最大数量 ({config.BATCH_PUSH_SIZE})，触发立即推送")
-            # 通过设置时间戳来触发推送
-            self.last_push_time = 0
-
     async def _batch_push_worker(self):
         """
-        后台任务：定期检查队列并批量推送
+        后台任务：定期检查数据库中待推送的请求并批量推送
         触发条件：
         1. 距离上次推送超过 BATCH_PUSH_INTERVAL 秒
-        2. 队列大小达到 BATCH_PUSH_SIZE
+        2. 待推送数量达到 BATCH_PUSH_SIZE
+
+        Webhook 只负责写入数据库，因此多个 worker 进程接收的请求
+        都由运行本任务的 Leader 进程统一推送
         """
         logger.info("📡 批量推送后台任务已启动")
         self.last_push_time = time.time()
@@ -158,7 +145,10 @@ class TelegramReviewBot:
             try:
                 await asyncio.sleep(5)  # 每 5 秒检查一次
 
-                queue_size = self.review_queue.qsize()
+                # 推送收集窗口已结束的剧集分组
+                await self._flush_due_groups()
+
+                queue_size = db.count_unnotified_requests()
                 if queue_size == 0:
                     continue
 
@@ -178,7 +168,7 @@ class TelegramReviewBot:
 
                 if should_push:
                     logger.info(f"🔔 触发批量推送: {reason}, 队列大小={queue_size}")
-                    await self._push_batch_from_queue()
+                    await self._push_batch_from_db()
                     self.last_push_time = time.time()
 
             except asyncio.CancelledError:
@@ -188,20 +178,13 @@ class TelegramReviewBot:
                 logger.error(f"批量推送任务出错: {str(e)}", exc_info=True)
                 await asyncio.sleep(10)  # 出错后等待 10 秒再继续
 
-    async def _push_batch_from_queue(self):
-        """从队列中取出请求并批量推送"""
+    async def _push_batch_from_db(self):
+        """从数据库中取出待推送的请求并批量推送"""
         try:
-            # 从队列中取出所有待推送的请求
-            requests = []
-            while not self.review_queue.empty() and len(requests) < config.BATCH_PUSH_SIZE:
-                try:
-                    request_data = await asyncio.wait_for(
-                        self.review_queue.get(),
-                        timeout=0.1
-                    )
-                    requests.append(request_data)
-                except asyncio.TimeoutError:
-                    break
+            requests = [
+                self._to_request_data(row)
+                for row in db.claim_unnotified_requests(config.BATCH_PUSH_SIZE)
+            ]
 
             if not requests:
                 return
@@ -212,7 +195,9 @@ class TelegramReviewBot:
             max_per_message = config.MAX_ITEMS_PER_MESSAGE
             for i in range(0, len(requests), max_per_message):
                 batch = requests[i:i + max_per_message]
-                await self._send_batch_reviews(batch)
+                if not await self._send_batch_reviews(batch):
+                    # 所有管理员都没有收到，撤销标记等待下一轮重试
+                    db.release_unnotified_requests([req['request_id'] for req in batch])
 
                 # 批次间短暂延迟，避免速率限制
                 if i + max_per_message < len(requests):
@@ -223,15 +208,118 @@ class TelegramReviewBot:
         except Exception as e:
             logger.error(f"批量推送失败: {str(e)}", exc_info=True)
 
-    async def _send_batch_reviews(self, requests: List[Dict[str, Any]]):
+    @staticmethod
+    def _to_request_data(row: Dict[str, Any]) -> Dict[str, Any]:
+        """把数据库行转换为推送消息使用的请求数据"""
+        try:
+            media_info = json.loads(row.get('media_info') or '{}')
+        except (TypeError, ValueError):
+            media_info = {}
+
+        return {
+            'request_id': row['id'],
+            'media_name': row['media_name'],
+            'media_type': row['media_type'],
+            'cdn_url': row['cdn_url'],
+            'emby_path': row.get('emby_path') or '',
+            'host_path': row.get('host_path') or '',
+            'media_info': media_info
+        }
+
+    async def _flush_due_groups(self):
+        """推送收集窗口已结束的剧集分组（每组一条审核消息）"""
+        for group in db.get_due_review_groups():
+            # 先关闭分组，避免推送失败时反复重发
+            if not db.close_review_group(group['id']):
+                continue
+
+            requests = db.get_group_requests(group['id'], status='pending')
+            if not requests:
+                continue
+
+            logger.info(f"🔔 推送剧集分组审核: {group['title']}, 共 {len(requests)} 集")
+            if not await self._send_group_review(group, requests):
+                # 所有管理员都没有收到，撤销关闭等待下一轮重试
+                db.reopen_review_group(group['id'])
+
+    async def _send_group_review(self, group: Dict[str, Any], requests: List[Dict[str, Any]]) -> bool:
+        """
+        发送剧集分组审核请求（整组一键批准/拒绝）
+
+        Args:
+            group: 分组信息
+            requests: 分组内待审核的请求列表
+
+        Returns:
+            是否至少成功发送给一位管理员
+        """
+        sent = False
+
+        try:
+            message_text = f"📺 <b>剧集分组审核请求</b>（共 {len(requests)} 集）\n\n"
+            message_text += f"🎞 <b>{group['title']}</b>\n"
+            message_text += f"📂 目录: <code>{group['group_key']}</code>\n\n"
+
+            # 只列出文件名，避免超出 Telegram 消息长度限制
+            max_listed = 30
+            for idx, req in enumerate(requests[:max_listed], 1):
+                filename = (req.get('host_path') or req['cdn_url']).split('/')[-1]
+                message_text += f"{idx}. <code>{filename}</code> (ID: {req['id']})\n"
+            if len(requests) > max_listed:
+                message_text += f"... 等共 {len(requests)} 集\n"
+
+            message_text += f"\n💡 批准后将一次性提交整组 CDN 预热\n"
+            message_text += f"ℹ️ 使用 /detail ID 单独查看或审核某一集"
+
+            keyboard = [[
+                InlineKeyboardButton(
+                    f"✅ 全部批准 ({len(requests)} 集)",
+                    callback_data=f"approvegroup_{group['id']}"
+                ),
+                InlineKeyboardButton(
+                    "❌ 全部拒绝",
+                    callback_data=f"rejectgroup_{group['id']}"
+                )
+            ]]
+            reply_markup = InlineKeyboardMarkup(keyboard)
+
+            for chat_id in self.admin_chat_ids:
+                try:
+                    with metrics.TELEGRAM_SEND_SECONDS.labels(kind="group").time():
+                        message = await self.bot.send_message(
+                            chat_id=chat_id,
+                            text=message_text,
+                            reply_markup=reply_markup,
+                            parse_mode='HTML'
+                        )
+                    db.update_group_telegram_message_id(group['id'], message.message_id)
+                    db.add_review_messages(chat_id, message.message_id, [req['id'] for req in requests], kind="group")
+                    sent = True
+                    logger.info(f"✅ 分组消息发送成功: chat_id={chat_id}, 分组={group['id']}")
+                except TelegramError as e:
+                    metrics.TELEGRAM_SEND_ERRORS.labels(kind="group").inc()
+                    logger.error(f"发送分组消息到 {chat_id} 失败: {str(e)}")
+                    continue
+
+        except Exception as e:
+            logger.error(f"发送分组审核请求失败: {str(e)}", exc_info=True)
+
+        return sent
+
+    async def _send_batch_reviews(self, requests: List[Dict[str, Any]]) -> bool:
         """
         发送一批审核请求（合并成一条消息）
 
         Args:
             requests: 请求列表
+
+        Returns:
+            是否至少成功发送给一位管理员
         """
         if not requests:
-            return
+            return True
+
+        sent = False
 
         try:
             # 构建批量消息文本
@@ -276,51 +364,128 @@ class TelegramReviewBot:
             message_text += f"📝 批准后将立即提交 CDN 预热\n"
             message_text += f"ℹ️ 使用 /detail ID 查看完整路径信息"
 
-            # 创建按钮（每个请求一行，最多显示配置的数量）
-            keyboard = []
-            for req in requests:
-                request_id = req['request_id']
-                media_name = req['media_name']
-                # 截断名称以适应按钮宽度
-                short_name = media_name[:15] + "..." if len(media_name) > 15 else media_name
-
-                keyboard.append([
-                    InlineKeyboardButton(
-                        f"✅ {short_name}",
-                        callback_data=f"approve_{request_id}"
-                    ),
-                    InlineKeyboardButton(
-                        f"❌",
-                        callback_data=f"reject_{request_id}"
-                    )
-                ])
-
-            reply_markup = InlineKeyboardMarkup(keyboard)
+            reply_markup = self._build_batch_keyboard(requests)
 
             # 发送消息给所有管理员
             for chat_id in self.admin_chat_ids:
                 try:
-                    message = await self.bot.send_message(
-                        chat_id=chat_id,
-                        text=message_text,
-                        reply_markup=reply_markup,
-                        parse_mode='HTML'
-                    )
+                    with metrics.TELEGRAM_SEND_SECONDS.labels(kind="batch").time():
+                        message = await self.bot.send_message(
+                            chat_id=chat_id,
+                            text=message_text,
+                            reply_markup=reply_markup,
+                            parse_mode='HTML'
+                        )
 
                     # 更新数据库中的消息 ID（使用第一个请求的 ID）
                     if requests:
                         first_request_id = requests[0]['request_id']
                         db.update_telegram_message_id(first_request_id, message.message_id)
+                    db.add_review_messages(chat_id, message.message_id, [req['request_id'] for req in requests])
 
+                    sent = True
                     logger.info(f"✅ 批量消息发送成功: chat_id={chat_id}, 包含 {len(requests)} 个请求")
 
                 except TelegramError as e:
+                    metrics.TELEGRAM_SEND_ERRORS.labels(kind="batch").inc()
                     logger.error(f"发送批量消息到 {chat_id} 失败: {str(e)}")
                     continue
 
         except Exception as e:
             logger.error(f"发送批量审核请求失败: {str(e)}", exc_info=True)
 
+        return sent
+
+    @staticmethod
+    def _build_batch_keyboard(requests: List[Dict[str, Any]]) -> InlineKeyboardMarkup:
+        """创建批量消息的按钮（每个请求一行）"""
+        keyboard = []
+        for req in requests:
+            request_id = req['request_id']
+            media_name = req['media_name']
+            # 截断名称以适应按钮宽度
+            short_name = media_name[:15] + "..." if len(media_name) > 15 else media_name
+
+            keyboard.append([
+                InlineKeyboardButton(
+                    f"✅ {short_name}",
+                    callback_data=f"approve_{request_id}"
+                ),
+                InlineKeyboardButton(
+                    f"❌",
+                    callback_data=f"reject_{request_id}"
+                )
+            ])
+
+        return InlineKeyboardMarkup(keyboard)
+
+    async def mark_expired_messages(self, request_ids: List[int]) -> int:
+        """
+        批量编辑包含已过期请求的审核消息
+
+        - 消息中仍有待审核的请求：只保留这些请求的按钮
+        - 消息中已没有待审核的请求：替换为超时说明，移除按钮
+
+        Args:
+            request_ids: 本次过期的请求 ID
+
+        Returns:
+            成功编辑的消息数量
+        """
+        if not self.bot or not request_ids:
+            return 0
+
+        edits = []
+        for message in db.get_review_messages(request_ids):
+            pending = [req for req in message['requests'] if req['status'] == 'pending']
+            if not pending:
+                edits.append(self._edit_expired_message(message))
+            elif message['kind'] == 'batch':
+                edits.append(self._edit_message_keyboard(message, self._build_batch_keyboard(pending)))
+            # 剧集分组的整组按钮只作用于仍待审核的剧集，无需修改
+
+        edited = 0
+        for i in range(0, len(edits), EXPIRY_EDIT_CHUNK):
+            results = await asyncio.gather(*edits[i:i + EXPIRY_EDIT_CHUNK])
+            edited += sum(1 for ok in results if ok)
+            # 分段编辑，避免触发 Telegram 速率限制
+            if i + EXPIRY_EDIT_CHUNK < len(edits):
+                await asyncio.sleep(1)
+        return edited
+
+    async def _edit_expired_message(self, message: Dict[str, Any]) -> bool:
+        """把审核消息替换为超时说明"""
+        status_emoji = {'approved': '✅', 'rejected': '❌', 'expired': '⌛'}
+        text = f"⌛ <b>审核已超时</b>（共 {len(message['requests'])} 项）\n\n"
+        for req in message['requests']:
+            text += f"{status_emoji.get(req['status'], '❓')} {req['media_name']} (ID: {req['request_id']})\n"
+        text += f"\nℹ️ 超过 {config.REVIEW_TIMEOUT_SECONDS} 秒未审核的请求不会预热"
+
+        try:
+            await self.bot.edit_message_text(
+                chat_id=message['chat_id'],
+                message_id=message['message_id'],
+                text=text,
+                parse_mode='HTML'
+            )
+            return True
+        except TelegramError as e:
+            logger.warning(f"编辑超时消息失败: chat_id={message['chat_id']}, message_id={message['message_id']}, {str(e)}")
+            return False
+
+    async def _edit_message_keyboard(self, message: Dict[str, Any], reply_markup: InlineKeyboardMarkup) -> bool:
+        """更新审核消息的按钮"""
+        try:
+            await self.bot.edit_message_reply_markup(
+                chat_id=message['chat_id'],
+                message_id=message['message_id'],
+                reply_markup=reply_markup
+            )
+            return True
+        except TelegramError as e:
+            logger.warning(f"更新消息按钮失败: chat_id={message['chat_id']}, message_id={message['message_id']}, {str(e)}")
+            return False
+
     def _build_review_message(
         self,
         request_id: int,
@@ -368,13 +533,28 @@ class TelegramReviewBot:
 
         # 解析回调数据
         callback_data = query.data
-        action, request_id = callback_data.split("_")
+        action, _, request_id = callback_data.partition("_")
         request_id = int(request_id)
 
+        # 待审核列表翻页（request_id 为分页游标）
+        if action in ("pendnext", "pendprev"):
+            await self._handle_pending_page_callback(query, action, request_id)
+            return
+
+        # 搜索结果翻页（request_id 为结果偏移量）
+        if action == "search":
+            await self._handle_search_page_callback(query, context, request_id)
+            return
+
         # 获取用户信息
         user = query.from_user
         reviewed_by = f"{user.first_name} (@{user.username})" if user.username else user.first_name
 
+        # 剧集分组整组审核
+        if action in ("approvegroup", "rejectgroup"):
+            await self._handle_group_callback(query, action, request_id, reviewed_by)
+            return
+
         # 获取请求信息
         request = db.get_request_by_id(request_id)
         if not request:
@@ -393,6 +573,7 @@ class TelegramReviewBot:
             return
 
         # 执行操作
+        edge_urls = None
         if action == "approve":
             db.approve_request(request_id, reviewed_by)
             result_emoji = "✅"
@@ -403,14 +584,31 @@ class TelegramReviewBot:
             logger.info(f"开始 CDN 预热: {cdn_url}")
 
             try:
-                preheat_result = await cdn_service.preheat_url(cdn_url)
-
-                if preheat_result['success']:
-                    result_action = f"CDN 预热已提交\n任务 ID: {preheat_result['task_id']}"
-                    logger.info(f"✅ CDN 预热成功: task_id={preheat_result['task_id']}")
-                else:
-                    result_action = f"CDN 预热失败: {preheat_result['message']}"
-                    logger.error(f"❌ CDN 预热失败: {preheat_result['message']}")
+                result_action = self._enqueue_preheat([request])
+                if result_action is None and cdn_service.mode == "edge":
+                    # 边缘节点预热在回复之后于后台执行
+                    edge_urls = [cdn_url]
+                    result_action = "已开始边缘节点预热，完成后更新结果"
+                elif result_action is None:
+                    # 没有预热队列时直接提交
+                    preheat_result = await get_fanout().preheat_urls([cdn_url], media_type=request.get('media_type'))
+
+                    if preheat_result['success'] and not preheat_result['urls']:
+                        result_action = "最近已提交过预热，跳过重复提交"
+                        logger.info(f"⏭️  CDN 预热跳过（最近已提交）: {cdn_url}")
+                    elif preheat_result['success']:
+                        result_action = f"CDN 预热已提交\n任务 ID: {preheat_result['task_id']}"
+                        logger.info(f"✅ CDN 预热成功: task_id={preheat_result['task_id']}")
+                    elif preheat_result.get('parked'):
+                        # API 故障或已熔断：URL 已写入重试队列，不会丢失
+                        result_action = (
+                            f"CDN API 暂时不可用，已加入重试队列，恢复后自动提交\n"
+                            f"原因: {preheat_result['message']}"
+                        )
+                        logger.warning(f"🔁 CDN 预热失败，已加入重试队列: {cdn_url}")
+                    else:
+                        result_action = f"CDN 预热失败: {preheat_result['message']}"
+                        logger.error(f"❌ CDN 预热失败: {preheat_result['message']}")
             except Exception as e:
                 result_action = f"CDN 预热出错: {str(e)}"
                 logger.error(f"❌ CDN 预热异常: {str(e)}", exc_info=True)
@@ -426,7 +624,22 @@ class TelegramReviewBot:
             return
 
         # 更新消息
-        updated_message = (
+        await query.edit_message_text(
+            text=self._request_result_message(result_emoji, result_text, request, reviewed_by, result_action),
+            parse_mode='HTML'
+        )
+
+        if edge_urls:
+            self._warm_in_background(
+                query, edge_urls, request.get('media_type'),
+                lambda action: self._request_result_message(result_emoji, result_text, request, reviewed_by, action)
+            )
+
+    @staticmethod
+    def _request_result_message(result_emoji: str, result_text: str, request: Dict[str, Any],
+                                reviewed_by: str, result_action: str) -> str:
+        """单个请求审核后的消息"""
+        return (
             f"{result_emoji} <b>{result_text}</b>\n\n"
             f"🎞 <b>媒体:</b> {request['media_name']}\n"
             f"🔗 <b>URL:</b> <code>{request['cdn_url']}</code>\n\n"
@@ -434,11 +647,158 @@ class TelegramReviewBot:
             f"📝 <b>结果:</b> {result_action}"
         )
 
+    @staticmethod
+    def _group_result_message(result_emoji: str, result_text: str, group: Dict[str, Any],
+                              reviewed_by: str, result_action: str) -> str:
+        """剧集分组审核后的消息"""
+        return (
+            f"{result_emoji} <b>{result_text}</b>\n\n"
+            f"📺 <b>分组:</b> {group['title']}\n"
+            f"📂 <b>目录:</b> <code>{group['group_key']}</code>\n\n"
+            f"👤 <b>审核人:</b> {reviewed_by}\n"
+            f"📝 <b>结果:</b> {result_action}"
+        )
+
+    def _warm_in_background(self, query, urls: List[str], media_type: Optional[str], render):
+        """
+        在后台执行边缘节点预热，完成后用 render(结果说明) 更新审核消息
+
+        edge 模式要下载整个文件（或开头/结尾），一季剧集可能持续很久；Bot 按顺序处理更新，
+        在回调中等待会让其他按钮和命令一直排队。必须在回复审核结果之后调用，
+        否则预热很快完成时最终结果会被“已开始”覆盖
+        """
+        async def warm():
+            try:
+                result_action = self._describe_edge_results(
+                    await get_fanout().preheat_batch(urls, media_type=media_type)
+                )
+            except Exception as e:
+                result_action = f"边缘节点预热出错: {str(e)}"
+                logger.error(f"❌ 边缘节点预热异常: {str(e)}", exc_info=True)
+            try:
+                await query.edit_message_text(text=render(result_action), parse_mode='HTML')
+            except TelegramError as e:
+                logger.error(f"更新边缘节点预热结果失败: {str(e)}")
+
+        task = asyncio.create_task(warm())
+        self.edge_tasks.add(task)
+        task.add_done_callback(self.edge_tasks.discard)
+        logger.info(f"🌡️  边缘节点预热已在后台开始: {len(urls)} 个 URL")
+
+    @staticmethod
+    def _describe_edge_results(results: List[Dict[str, Any]]) -> str:
+        """边缘节点预热结果说明"""
+        warmed = sum(len(r.get('warmed', [])) for r in results)
+        skipped = sum(len(r.get('skipped', [])) for r in results)
+        failed = [r for r in results if not r['success']]
+        if not failed and not warmed:
+            return "最近已提交过预热，跳过重复提交"
+
+        if failed:
+            result_action = f"边缘节点预热部分失败（{len(failed)}/{len(results)} 批）: {failed[0]['message']}"
+        else:
+            read_mb = sum(r.get('bytes', 0) for r in results) / 1024 / 1024
+            hits = sum(r.get('cache', {}).get('hit', 0) for r in results)
+            misses = sum(r.get('cache', {}).get('miss', 0) for r in results)
+            result_action = (
+                f"边缘节点预热完成: {warmed} 个文件，命中 {hits}，未命中 {misses}，读取 {read_mb:.1f} MB"
+            )
+        if skipped:
+            result_action += f"\n跳过最近已预热: {skipped} 个"
+        return result_action
+
+    @staticmethod
+    def _enqueue_preheat(requests: List[Dict[str, Any]]) -> Optional[str]:
+        """
+        预热队列可用时把批准的请求加入队列，按优先级和每日配额匀速提交
+
+        Returns:
+            审核结果说明；预热队列不可用时返回 None，由调用方直接提交
+        """
+        scheduler = get_scheduler()
+        if scheduler is None:
+            return None
+
+        queued = scheduler.enqueue_requests(requests)
+        if queued['skipped'] and len(queued['skipped']) == queued['targets']:
+            return "最近已提交过预热，跳过重复提交"
+        result_action = f"已加入预热队列，按每日配额依次提交\n队列中共 {queued['depth']} 个 URL"
+        if queued['skipped']:
+            result_action += f"\n跳过最近已预热: {len(queued['skipped'])} 个"
+        return result_action
+
+    async def _handle_group_callback(self, query, action: str, group_id: int, reviewed_by: str):
+        """处理剧集分组的整组批准/拒绝"""
+        group = db.get_review_group_by_id(group_id)
+        if not group:
+            await query.edit_message_text(text=f"❌ 分组不存在: ID={group_id}")
+            return
+
+        if group['status'] not in ('open', 'pending'):
+            await query.edit_message_text(
+                text=f"⚠️ 该分组已经被处理过\n"
+                     f"状态: {group['status']}\n"
+                     f"审核人: {group['reviewed_by']}"
+            )
+            return
+
+        edge_urls = None
+        if action == "approvegroup":
+            approved = db.approve_review_group(group_id, reviewed_by)
+            result_emoji = "✅"
+            result_text = f"已同意预热 {len(approved)} 集"
+
+            urls = [req['cdn_url'] for req in approved]
+            if not urls:
+                result_action = "分组内没有待审核的剧集"
+            else:
+                logger.info(f"开始分组 CDN 预热: 分组={group_id}, 共 {len(urls)} 个 URL")
+                try:
+                    result_action = self._enqueue_preheat(approved)
+                    if result_action is None and cdn_service.mode == "edge":
+                        # 边缘节点预热在回复之后于后台执行
+                        edge_urls = urls
+                        result_action = f"已开始边缘节点预热（{len(urls)} 集），完成后更新结果"
+                    elif result_action is None:
+                        # 没有预热队列时直接提交，不超过 PREHEAT_BATCH_SIZE 时整组只调用一次 PushUrlsCache
+                        results = await get_fanout().preheat_batch(urls, media_type=approved[0].get('media_type'))
+                        task_ids = [str(r['task_id']) for r in results if r['success'] and r['task_id']]
+                        skipped = sum(len(r.get('skipped', [])) for r in results)
+                        failed = [r for r in results if not r['success']]
+                        if not failed and not task_ids:
+                            result_action = "最近已提交过预热，跳过重复提交"
+                        elif not failed:
+                            result_action = f"CDN 预热已提交\n任务 ID: {', '.join(task_ids)}"
+                            if skipped:
+                                result_action += f"\n跳过最近已预热: {skipped} 集"
+                        else:
+                            result_action = (
+                                f"CDN 预热部分失败（{len(failed)}/{len(results)} 批）: "
+                                f"{failed[0]['message']}"
+                            )
+                            parked = sum(r.get('parked', 0) for r in failed)
+                            if parked:
+                                result_action += f"\n{parked} 个 URL 已加入重试队列，CDN API 恢复后自动提交"
+                except Exception as e:
+                    result_action = f"CDN 预热出错: {str(e)}"
+                    logger.error(f"❌ 分组 CDN 预热异常: {str(e)}", exc_info=True)
+        else:
+            rejected = db.reject_review_group(group_id, reviewed_by)
+            result_emoji = "❌"
+            result_text = f"已拒绝 {len(rejected)} 集"
+            result_action = "不会进行预热"
+
         await query.edit_message_text(
-            text=updated_message,
+            text=self._group_result_message(result_emoji, result_text, group, reviewed_by, result_action),
             parse_mode='HTML'
         )
 
+        if edge_urls:
+            self._warm_in_background(
+                query, edge_urls, approved[0].get('media_type'),
+                lambda action: self._group_result_message(result_emoji, result_text, group, reviewed_by, action)
+            )
+
     async def _handle_stats_command(
         self,
         update: Update,
@@ -452,8 +812,20 @@ class TelegramReviewBot:
             f"⏳ 待审核: {stats['pending']}\n"
             f"✅ 已批准: {stats['approved']}\n"
             f"❌ 已拒绝: {stats['rejected']}\n"
+            f"⌛ 已过期: {stats['expired']}\n"
             f"📝 总计: {stats['total']}\n"
         )
+        scheduler = get_scheduler()
+        if scheduler:
+            message += f"📤 预热队列: {scheduler.queue.depth()}\n"
+        drainer = get_drainer()
+        if drainer:
+            retry_depth = drainer.queue.depth()
+            if retry_depth:
+                message += f"🔁 重试队列: {retry_depth}\n"
+            tripped = [account for account, service in drainer.services.items() if service.breaker.opened_at]
+            if tripped:
+                message += f"⚡ CDN API 已熔断: {', '.join(tripped)}\n"
 
         await update.message.reply_text(message, parse_mode='HTML')
 
@@ -462,16 +834,38 @@ class TelegramReviewBot:
         update: Update,
         context: ContextTypes.DEFAULT_TYPE
     ):
-        """处理 /pending 命令 - 显示待审核列表"""
-        pending_requests = db.get_pending_requests(limit=10)
+        """处理 /pending 命令 - 显示待审核列表（第一页）"""
+        page = db.get_requests_page("pending", limit=config.PENDING_PAGE_SIZE)
 
-        if not pending_requests:
+        if not page['items']:
             await update.message.reply_text("✅ 当前没有待审核的请求")
             return
 
-        message = f"⏳ <b>待审核列表</b>（最近 {len(pending_requests)} 条）\n\n"
+        message, reply_markup = self._build_pending_page(page)
+        await update.message.reply_text(message, parse_mode='HTML', reply_markup=reply_markup)
+
+    async def _handle_pending_page_callback(self, query, action: str, cursor: int):
+        """处理待审核列表的翻页按钮"""
+        direction = "next" if action == "pendnext" else "prev"
+        try:
+            page = db.get_requests_page("pending", limit=config.PENDING_PAGE_SIZE, cursor=cursor, direction=direction)
+        except ValueError:
+            # 游标对应的请求已不存在，从第一页重新开始
+            page = db.get_requests_page("pending", limit=config.PENDING_PAGE_SIZE)
+
+        if not page['items']:
+            await query.edit_message_text(text="✅ 当前没有待审核的请求")
+            return
+
+        message, reply_markup = self._build_pending_page(page)
+        await query.edit_message_text(text=message, parse_mode='HTML', reply_markup=reply_markup)
+
+    def _build_pending_page(self, page: Dict[str, Any]):
+        """构建待审核列表的一页消息和翻页按钮"""
+        total = db.get_statistics()['pending']
+        message = f"⏳ <b>待审核列表</b>（共 {total} 条，本页 {len(page['items'])} 条）\n\n"
 
-        for req in pending_requests:
+        for req in page['items']:
             # 截断 URL 显示
             cdn_url = req['cdn_url']
             if len(cdn_url) > 50:
@@ -486,7 +880,91 @@ class TelegramReviewBot:
 
         message += "💡 使用 /detail ID 查看完整信息"
 
-        await update.message.reply_text(message, parse_mode='HTML')
+        # 翻页按钮携带边界行的 ID 作为游标
+        buttons = []
+        if page['prev_cursor'] is not None:
+            buttons.append(InlineKeyboardButton("⬅️ 上一页", callback_data=f"pendprev_{page['prev_cursor']}"))
+        if page['next_cursor'] is not None:
+            buttons.append(InlineKeyboardButton("下一页 ➡️", callback_data=f"pendnext_{page['next_cursor']}"))
+        reply_markup = InlineKeyboardMarkup([buttons]) if buttons else None
+
+        return message, reply_markup
+
+    async def _handle_search_command(
+        self,
+        update: Update,
+        context: ContextTypes.DEFAULT_TYPE
+    ):
+        """处理 /search 命令 - 按媒体名称、路径搜索请求"""
+        if not context.args:
+            await update.message.reply_text(
+                "❌ 用法: /search 关键词\n"
+                "示例: /search 流浪地球\n"
+                "多个关键词以空格分隔，需要同时匹配"
+            )
+            return
+
+        search_query = " ".join(context.args)
+        result = db.search_requests(search_query, limit=config.PENDING_PAGE_SIZE)
+        if not result['items']:
+            await update.message.reply_text(f"🔍 未找到匹配「{search_query}」的请求")
+            return
+
+        message, reply_markup = self._build_search_page(search_query, result, 0)
+        sent = await update.message.reply_text(message, parse_mode='HTML', reply_markup=reply_markup)
+
+        # 回调数据长度有限，关键词按消息保存在聊天数据中
+        queries = context.chat_data.setdefault("search_queries", {})
+        queries[sent.message_id] = search_query
+        while len(queries) > SEARCH_QUERIES_KEPT:
+            queries.pop(next(iter(queries)))
+
+    async def _handle_search_page_callback(self, query, context: ContextTypes.DEFAULT_TYPE, offset: int):
+        """处理搜索结果的翻页按钮"""
+        search_query = context.chat_data.get("search_queries", {}).get(query.message.message_id)
+        if search_query is None:
+            await query.edit_message_text(text="⚠️ 搜索结果已失效，请重新使用 /search 搜索")
+            return
+
+        result = db.search_requests(search_query, limit=config.PENDING_PAGE_SIZE, offset=offset)
+        if not result['items']:
+            await query.edit_message_text(text=f"🔍 未找到匹配「{search_query}」的请求")
+            return
+
+        message, reply_markup = self._build_search_page(search_query, result, offset)
+        await query.edit_message_text(text=message, parse_mode='HTML', reply_markup=reply_markup)
+
+    @staticmethod
+    def _build_search_page(search_query: str, result: Dict[str, Any], offset: int):
+        """构建搜索结果的一页消息和翻页按钮"""
+        items = result['items']
+        message = (
+            f"🔍 <b>搜索: {html.escape(search_query)}</b>"
+            f"（第 {offset + 1}-{offset + len(items)} 条）\n\n"
+        )
+
+        for req in items:
+            emby_path = req['emby_path'] or req['cdn_url']
+            if len(emby_path) > 50:
+                emby_path = "..." + emby_path[-47:]
+
+            message += (
+                f"{STATUS_EMOJI.get(req['status'], '❓')} ID: {req['id']}\n"
+                f"🎞 {html.escape(req['media_name'])} ({req['media_type']})\n"
+                f"📍 <code>{html.escape(emby_path)}</code>\n\n"
+            )
+
+        message += "💡 使用 /detail ID 查看完整信息"
+
+        buttons = []
+        if offset > 0:
+            prev_offset = max(0, offset - config.PENDING_PAGE_SIZE)
+            buttons.append(InlineKeyboardButton("⬅️ 上一页", callback_data=f"search_{prev_offset}"))
+        if result['next_offset'] is not None:
+            buttons.append(InlineKeyboardButton("下一页 ➡️", callback_data=f"search_{result['next_offset']}"))
+        reply_markup = InlineKeyboardMarkup([buttons]) if buttons else None
+
+        return message, reply_markup
 
     async def _handle_detail_command(
         self,
@@ -508,16 +986,16 @@ class TelegramReviewBot:
             return
 
         request = db.get_request_by_id(request_id)
+        if not request and db.db_file:
+            # 超过保留期的请求已移入归档库
+            from retention import ReviewArchive
+            request = ReviewArchive(db.db_file).get_archived_request(request_id)
         if not request:
             await update.message.reply_text(f"❌ 未找到请求 ID: {request_id}")
             return
 
         # 构建详细消息
-        status_emoji = {
-            'pending': '⏳',
-            'approved': '✅',
-            'rejected': '❌'
-        }.get(request['status'], '❓')
+        status_emoji = STATUS_EMOJI.get(request['status'], '❓')
 
         message = (
             f"{status_emoji} <b>请求详情</b>\n\n"
@@ -556,6 +1034,44 @@ class TelegramReviewBot:
         else:
             await update.message.reply_text(message, parse_mode='HTML')
 
+    async def _handle_priority_command(
+        self,
+        update: Update,
+        context: ContextTypes.DEFAULT_TYPE
+    ):
+        """处理 /priority 命令 - 提高已批准请求在预热队列中的优先级"""
+        if not context.args:
+            await update.message.reply_text(
+                "❌ 用法: /priority 请求ID [加分]\n"
+                f"示例: /priority 123（默认加 {config.PREHEAT_PRIORITY_ADMIN} 分）"
+            )
+            return
+
+        try:
+            request_id = int(context.args[0])
+            amount = int(context.args[1]) if len(context.args) > 1 else config.PREHEAT_PRIORITY_ADMIN
+        except ValueError:
+            await update.message.reply_text("❌ 无效的请求 ID 或分值")
+            return
+
+        scheduler = get_scheduler()
+        if scheduler is None:
+            await update.message.reply_text("⚠️ 预热队列未启用，批准后会直接提交预热")
+            return
+
+        request = db.get_request_by_id(request_id)
+        if not request:
+            await update.message.reply_text(f"❌ 未找到请求 ID: {request_id}")
+            return
+
+        if scheduler.boost(request['cdn_url'], amount):
+            logger.info(f"⚡ 预热优先级已提高: ID={request_id}, +{amount}")
+            await update.message.reply_text(f"⚡ 已提高预热优先级: {request['media_name']}（+{amount}）")
+        elif request['status'] == 'pending':
+            await update.message.reply_text("⚠️ 该请求尚未批准，批准后才会加入预热队列")
+        else:
+            await update.message.reply_text("⚠️ 该请求不在预热队列中（可能已经提交或未批准）")
+
 
 # 全局 Bot 实例
 telegram_bot = TelegramReviewBot()
@@ -0,0 +1,119 @@
+"""
+腾讯云 CDN 服务商
+通过 tencentcloud-sdk-python 调用 PushUrlsCache / DescribePushTasks / DescribePushQuota / PurgeUrlsCache。
+SDK 导入较慢，只在创建实例时导入
+"""
+import logging
+from typing import Any, Dict, List
+
+import config
+from cdn_provider import CDNProvider
+
+logger = logging.getLogger(__name__)
+
+
+class TencentCDNProvider(CDNProvider):
+    """腾讯云 CDN"""
+
+    name = "tencent"
+
+    def __init__(self, secret_id: str = None, secret_key: str = None):
+        """
+        Args:
+            secret_id: API 密钥 ID，默认使用 TENCENT_SECRET_ID
+            secret_key: API 密钥，默认使用 TENCENT_SECRET_KEY
+
+        Raises:
+            ValueError: 未配置 API 凭证
+        """
+        from tencentcloud.common import credential
+        from tencentcloud.common.exception.tencent_cloud_sdk_exception import TencentCloudSDKException
+        from tencentcloud.cdn.v20180606 import cdn_client, models
+
+        secret_id = config.TENCENT_SECRET_ID if secret_id is None else secret_id
+        secret_key = config.TENCENT_SECRET_KEY if secret_key is None else secret_key
+        if not secret_id or not secret_key:
+            raise ValueError("未配置腾讯云 API 凭证")
+        if secret_id == "your_secret_id_here":
+            raise ValueError("腾讯云 API 凭证未设置")
+
+        self._sdk_exception = TencentCloudSDKException
+        self._models = models
+        self.client = cdn_client.CdnClient(credential.Credential(secret_id, secret_key), "")
+
+    def _error(self, e: Exception, **fields) -> Dict[str, Any]:
+        """把 SDK 异常转换为失败结果"""
+        if isinstance(e, self._sdk_exception):
+            message = f"腾讯云 API 错误: {e.get_message()}"
+            code = e.get_code()
+        else:
+            message = f"调用 API 失败: {str(e)}"
+            code = type(e).__name__
+        logger.error(message)
+        return {"success": False, "message": message, "error_code": code, **fields}
+
+    def push_urls(self, urls: List[str]) -> Dict[str, Any]:
+        try:
+            req = self._models.PushUrlsCacheRequest()
+            req.Urls = urls
+            resp = self.client.PushUrlsCache(req)
+            return {
+                "success": True,
+                "message": "预热任务已提交",
+                "urls": urls,
+                "task_id": getattr(resp, 'TaskId', None)
+            }
+        except Exception as e:
+            return self._error(e, urls=urls, task_id=None)
+
+    def describe_push_task(self, task_id: str) -> Dict[str, Any]:
+        try:
+            req = self._models.DescribePushTasksRequest()
+            req.TaskId = task_id
+            resp = self.client.DescribePushTasks(req)
+
+            if getattr(resp, 'PushLogs', None):
+                log = resp.PushLogs[0]
+                return {
+                    "success": True,
+                    "task_id": task_id,
+                    "status": log.Status,
+                    "percent": log.Percent,
+                    "create_time": log.CreateTime,
+                    "update_time": log.UpdateTime
+                }
+            return {"success": False, "message": "未找到任务信息"}
+        except Exception as e:
+            return self._error(e)
+
+    def describe_push_quota(self, area: str) -> Dict[str, Any]:
+        try:
+            resp = self.client.DescribePushQuota(self._models.DescribePushQuotaRequest())
+
+            quotas = getattr(resp, 'UrlPush', None) or []
+            quota = next((q for q in quotas if q.Area == area), quotas[0] if quotas else None)
+            if quota is None:
+                return {"success": False, "message": "未返回预热配额"}
+            return {
+                "success": True,
+                "area": quota.Area,
+                "total": quota.Total,
+                "available": quota.Available,
+                "batch": quota.Batch
+            }
+        except Exception as e:
+            return self._error(e)
+
+    def purge_urls(self, urls: List[str]) -> Dict[str, Any]:
+        try:
+            req = self._models.PurgeUrlsCacheRequest()
+            req.Urls = urls
+            resp = self.client.PurgeUrlsCache(req)
+            return {
+                "success": True,
+                "message": "刷新任务已提交",
+                "urls": urls,
+                "task_id": getattr(resp, 'TaskId', None)
+            }
+        except Exception as e:
+            return self._error(e, urls=urls, task_id=None)
@@ -0,0 +1,52 @@
+"""
+测试 Webhook 回放压测工具（小规模冒烟测试）
+"""
+import json
+import os
+import sys
+import tempfile
+
+from benchmark_webhook import generate_payloads, load_payloads, make_unique, run_benchmark
+
+
+def test_load_captured_payloads():
+    """采集文件中的 body 字段和直接的 Webhook JSON 都能读取"""
+    payload = {"Event": "library.new", "Item": {"Name": "测试", "Type": "Movie", "Path": "/media/电影/a.mkv"}}
+    with tempfile.NamedTemporaryFile("w", suffix=".jsonl", delete=False, encoding="utf-8") as f:
+        f.write(json.dumps({"captured_at": "now", "path": "/emby", "body": json.dumps(payload)}) + "\n")
+        f.write(json.dumps(payload, ensure_ascii=False) + "\n")
+        f.write("not json\n")
+        path = f.name
+
+    try:
+        bodies = load_payloads(path)
+    finally:
+        os.remove(path)
+
+    assert len(bodies) == 2
+    assert all(json.loads(body) == payload for body in bodies)
+
+    unique = json.loads(make_unique(bodies[0], 7))
+    assert unique["Item"]["Path"] == "/media/电影/a.r7.mkv"
+    print("✅ 采集文件读取测试通过")
+
+
+def test_replay_smoke():
+    """在进程内回放少量请求"""
+    result = run_benchmark(generate_payloads(30), concurrency=4, alloc_sample=5, warmup=2)
+    print(f"\n📊 {result}")
+    assert result["requests"] == 30
+    assert result["status_counts"] == {200: 30}
+    assert result["p50_ms"] <= result["p95_ms"] <= result["p99_ms"]
+    assert result["throughput_rps"] > 0
+    print("✅ 回放冒烟测试通过")
+
+
+if __name__ == "__main__":
+    try:
+        test_load_captured_payloads()
+        test_replay_smoke()
+    except AssertionError:
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
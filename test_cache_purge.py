@@ -0,0 +1,315 @@
+"""
+测试文件替换后刷新缓存：按文件大小和修改时间判定替换、刷新队列按账号分批刷新并与预热共用
+批次和限流处理、刷新成功后清除预热记录并重新加入预热队列、没有预热队列时由 PurgeDrainer 分批刷新并重新预热
+
+CDN 使用进程内的模拟 CDN 服务（mock_cdn.py），使用临时数据库
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+_tmp_dir = tempfile.mkdtemp()
+os.environ.setdefault("DB_FILE", os.path.join(_tmp_dir, "preheat_review.db"))
+
+import config
+import database
+from cache_purge import FileSignatures, PurgeDrainer, PurgeQueue, file_signature, was_approved
+from cdn_accounts import DEFAULT_ACCOUNT, CDNTargets
+from cdn_preheat import CDNPreheatService
+from database import ReviewDatabase
+from mock_cdn import MockCDNProvider, MockCDNServer, MockCDNState
+from preheat_history import PreheatHistory
+from preheat_scheduler import PreheatQueue, PreheatScheduler, PushQuota
+
+MAPPINGS = {"/media/": ["https://a.example.com/", "https://b.example.com/"]}
+URLS = [f"https://a.example.com/电影/某片 {i}/某片 {i}.mkv" for i in range(1, 5)]
+
+
+def _service(db_file: str, endpoint: str) -> CDNPreheatService:
+    service = CDNPreheatService(provider_name="mock")
+    service.enabled = True
+    service.provider = MockCDNProvider(endpoint)
+    service._history = PreheatHistory(db_file, freshness_seconds=3600)
+    return service
+
+
+def test_file_signatures():
+    """第一次看到的 URL 不算替换，大小或修改时间变化才算；只有大小时不比较修改时间"""
+    db = ReviewDatabase(os.path.join(tempfile.mkdtemp(), "review.db"))
+    signatures = FileSignatures(db.db_file)
+
+    assert not signatures.observe(URLS[0], 1000, 100.0)
+    assert not signatures.observe(URLS[0], 1000, 100.0)
+    assert signatures.observe(URLS[0], 1000, 200.0)
+    assert signatures.observe(URLS[0], 2000, 200.0)
+    assert not signatures.observe(URLS[0], 2000, 0.0)
+    assert signatures.observe(URLS[0], 3000, 0.0)
+    # URL 编码不同视为同一文件
+    assert not signatures.observe(URLS[0].replace(" ", "%20"), 3000, 200.0)
+
+    path = os.path.join(tempfile.mkdtemp(), "a.mkv")
+    with open(path, "wb") as f:
+        f.write(b"\0" * 10)
+    assert file_signature(path)[0] == 10
+    assert file_signature("/nonexistent/a.mkv", {"Size": 42}) == (42, 0.0)
+    assert file_signature("/nonexistent/a.mkv", {}) is None
+    print("✅ 文件签名测试通过")
+
+
+def test_was_approved():
+    """只有已批准的审核请求才重新预热"""
+    db = ReviewDatabase(os.path.join(tempfile.mkdtemp(), "review.db"))
+    approved = db.add_review_request(URLS[0], "某片 1", "Movie")
+    rejected = db.add_review_request(URLS[1], "某片 2", "Movie")
+    db.add_review_request(URLS[2], "某片 3", "Movie")
+    db.approve_request(approved, "admin")
+    db.reject_request(rejected, "admin")
+
+    assert was_approved(db.db_file, URLS[0])
+    assert not was_approved(db.db_file, URLS[1])
+    assert not was_approved(db.db_file, URLS[2])
+    assert not was_approved(db.db_file, URLS[3])
+    print("✅ 审核状态测试通过")
+
+
+def test_scheduler_purges_then_repreheats():
+    """刷新队列按批次刷新所有域名，成功后清除预热记录并以高优先级重新预热已批准的 URL"""
+    db = ReviewDatabase(os.path.join(tempfile.mkdtemp(), "review.db"))
+    state = MockCDNState(daily_quota=100, rate_limit=0, latency=0)
+    with MockCDNServer(state) as server:
+        service = _service(db.db_file, server.endpoint)
+        service.batch_size = 3
+        queue = PreheatQueue(db.db_file)
+        scheduler = PreheatScheduler(service, queue, PushQuota(), burst=20, pause=0,
+                                     targets=CDNTargets(MAPPINGS, {}))
+
+        # 先预热过一次，预热记录会让重新预热被跳过
+        scheduler.enqueue(URLS[:2])
+        assert asyncio.run(scheduler.drain_once())["submitted"] == 4
+        assert state.stats()["pushed"] == 4
+
+        assert scheduler.enqueue_purge(URLS[:1]) == 2
+        assert scheduler.enqueue_purge(URLS[1:2], repreheat=False) == 2
+        assert scheduler.purge_queue.depth() == 4
+
+        stats = asyncio.run(scheduler.drain_once())
+        assert stats["purged"] == 4 and stats["submitted"] == 2 and stats["depth"] == 0
+        assert state.stats()["purged"] == 4 and state.stats()["pushed"] == 6
+        assert state.stats()["counts"]["PurgeUrlsCache"] == 2
+        assert scheduler.purge_queue.depth() == 0
+    print("✅ 刷新后重新预热测试通过")
+
+
+def test_purge_quota_and_throttling():
+    """刷新配额用完时继续提交预热；频率限制时本次检查不再提交，下次继续"""
+    db = ReviewDatabase(os.path.join(tempfile.mkdtemp(), "review.db"))
+    state = MockCDNState(daily_quota=100, purge_quota=1, rate_limit=0, latency=0)
+    with MockCDNServer(state) as server:
+        service = _service(db.db_file, server.endpoint)
+        queue = PreheatQueue(db.db_file)
+        purge_queue = PurgeQueue(db.db_file)
+        scheduler = PreheatScheduler(service, queue, PushQuota(), burst=20, pause=0,
+                                     targets=CDNTargets({}, {}), purge_queue=purge_queue)
+
+        scheduler.enqueue_purge(URLS[:2])
+        scheduler.enqueue(URLS[2:3])
+        stats = asyncio.run(scheduler.drain_once())
+        assert stats["purged"] == 0 and stats["submitted"] == 1 and purge_queue.depth() == 2
+        assert purge_queue.peek(10)[0]["attempts"] == 0
+
+        state.purge_quota = 10
+        state.rate_limit = 1
+        scheduler.enqueue(URLS[3:4])
+        time.sleep(1.1)
+        # 配额查询结果已缓存，刷新 1 批后触发频率限制，本次不再提交预热
+        stats = asyncio.run(scheduler.drain_once())
+        assert stats["purged"] == 2 and stats["submitted"] == 0 and stats["depth"] == 3
+
+        state.rate_limit = 0
+        stats = asyncio.run(scheduler.drain_once())
+        assert stats["submitted"] == 3 and stats["depth"] == 0
+    print("✅ 刷新配额与频率限制测试通过")
+
+
+def test_purge_drainer():
+    """没有预热队列时刷新队列同样按批次刷新，成功后跳过预热记录只重新预热已批准的 URL"""
+    db = ReviewDatabase(os.path.join(tempfile.mkdtemp(), "review.db"))
+    state = MockCDNState(daily_quota=100, rate_limit=0, latency=0)
+    with MockCDNServer(state) as server:
+        service = _service(db.db_file, server.endpoint)
+        asyncio.run(service.preheat_urls(URLS[:1]))
+        purge_queue = PurgeQueue(db.db_file)
+        drainer = PurgeDrainer({DEFAULT_ACCOUNT: service}, purge_queue, pause=0)
+
+        purge_queue.push(URLS[:1])
+        purge_queue.push(URLS[1:3], repreheat=False)
+        stats = asyncio.run(drainer.drain_once())
+        assert stats == {"purged": 3, "repreheated": 1, "depth": 0}
+        # 多个被替换的文件合并为一次 PurgeUrlsCache 调用
+        assert state.stats()["counts"]["PurgeUrlsCache"] == 1
+        assert state.stats()["purged"] == 3 and state.stats()["pushed"] == 2
+
+        state.purge_quota = 0
+        purge_queue.push(URLS[3:4])
+        stats = asyncio.run(drainer.drain_once())
+        assert stats["purged"] == 0 and stats["depth"] == 1
+        assert purge_queue.peek(10)[0]["attempts"] == 0
+        assert state.stats()["pushed"] == 2
+    print("✅ 刷新队列（无预热队列）测试通过")
+
+
+def test_webhook_detects_replacement():
+    """同一路径的文件变化时 Webhook 把 URL 加入刷新队列，不会再创建审核请求"""
+    import preheat_scheduler
+    import webhook_server
+    from cdn_preheat import cdn_service
+
+    media_dir = tempfile.mkdtemp()
+    path = os.path.join(media_dir, "某片.mkv")
+    with open(path, "wb") as f:
+        f.write(b"\0" * 10)
+
+    saved = (config.PREHEAT_ENABLED, config.EMBY_CONTAINER_MAPPINGS, config.CDN_URL_MAPPINGS,
+             config.TELEGRAM_REVIEW_ENABLED, cdn_service.enabled, cdn_service.provider)
+    state = MockCDNState(rate_limit=0, latency=0)
+    original = database._db_instance
+    db = ReviewDatabase(os.path.join(tempfile.mkdtemp(), "review.db"))
+    database.use_store(db)
+    try:
+        config.PREHEAT_ENABLED = True
+        config.TELEGRAM_REVIEW_ENABLED = True
+        config.EMBY_CONTAINER_MAPPINGS = {}
+        config.CDN_URL_MAPPINGS = {media_dir + "/": "https://a.example.com/电影/"}
+        with MockCDNServer(state) as server:
+            cdn_service.enabled = True
+            cdn_service.provider = MockCDNProvider(server.endpoint)
+            scheduler = preheat_scheduler.get_scheduler()
+            assert scheduler is not None
+
+            item = {"Name": "某片", "Type": "Movie", "Path": path}
+            total = db.get_statistics()["total"]
+            first = webhook_server.process_media_item(item)
+            assert not first["replaced"] and first["cdn_url"]
+            request_id = next(row["id"] for row in db.get_pending_requests() if row["cdn_url"] == first["cdn_url"])
+            db.approve_request(request_id, "admin")
+
+            assert not webhook_server.process_media_item(item)["replaced"]
+            with open(path, "ab") as f:
+                f.write(b"\0" * 10)
+            assert webhook_server.process_media_item(item)["replaced"]
+            assert scheduler.purge_queue.peek(10)[0]["repreheat"] == 1
+            assert db.get_statistics()["total"] == total + 1
+
+            stats = asyncio.run(scheduler.drain_once())
+            assert stats["purged"] == 1 and stats["submitted"] == 1
+    finally:
+        (config.PREHEAT_ENABLED, config.EMBY_CONTAINER_MAPPINGS, config.CDN_URL_MAPPINGS,
+         config.TELEGRAM_REVIEW_ENABLED, cdn_service.enabled, cdn_service.provider) = saved
+        preheat_scheduler._scheduler = None
+        database.use_store(original)
+    print("✅ Webhook 替换检测测试通过")
+
+
+def test_webhook_queues_purge_without_scheduler():
+    """没有预热队列时 Webhook 同样只把 URL 写入刷新队列，不直接调用 CDN API"""
+    import preheat_scheduler
+    import webhook_server
+    from cdn_preheat import cdn_service
+
+    media_dir = tempfile.mkdtemp()
+    path = os.path.join(media_dir, "某片.mkv")
+    with open(path, "wb") as f:
+        f.write(b"\0" * 10)
+
+    saved = (config.PREHEAT_ENABLED, config.PREHEAT_QUEUE_ENABLED, config.EMBY_CONTAINER_MAPPINGS,
+             config.CDN_URL_MAPPINGS, cdn_service.enabled, cdn_service.provider)
+    state = MockCDNState(rate_limit=0, latency=0)
+    original = database._db_instance
+    db = ReviewDatabase(os.path.join(tempfile.mkdtemp(), "review.db"))
+    database.use_store(db)
+    try:
+        config.PREHEAT_ENABLED = True
+        config.PREHEAT_QUEUE_ENABLED = False
+        config.EMBY_CONTAINER_MAPPINGS = {}
+        config.CDN_URL_MAPPINGS = {media_dir + "/": "https://a.example.com/电影/"}
+        with MockCDNServer(state) as server:
+            cdn_service.enabled = True
+            cdn_service.provider = MockCDNProvider(server.endpoint)
+            assert preheat_scheduler.get_scheduler() is None
+
+            item = {"Name": "某片", "Type": "Movie", "Path": path}
+            assert not webhook_server.process_media_item(item)["replaced"]
+            with open(path, "ab") as f:
+                f.write(b"\0" * 10)
+            assert webhook_server.process_media_item(item)["replaced"]
+            assert PurgeQueue(db.db_file).depth() == 1
+            assert state.stats()["purged"] == 0
+    finally:
+        (config.PREHEAT_ENABLED, config.PREHEAT_QUEUE_ENABLED, config.EMBY_CONTAINER_MAPPINGS,
+         config.CDN_URL_MAPPINGS, cdn_service.enabled, cdn_service.provider) = saved
+        preheat_scheduler._scheduler = None
+        database.use_store(original)
+    print("✅ 无预热队列时 Webhook 替换检测测试通过")
+
+
+def test_edge_mode_without_credentials():
+    """edge 模式没有 API 凭证时不写入刷新队列、不启动刷新任务，也不关闭边缘节点预热"""
+    import cache_purge
+    import webhook_server
+    from cache_purge import get_purge_drainer
+    from cdn_preheat import cdn_service
+
+    media_dir = tempfile.mkdtemp()
+    path = os.path.join(media_dir, "某片.mkv")
+    with open(path, "wb") as f:
+        f.write(b"\0" * 10)
+
+    saved = (config.PREHEAT_ENABLED, config.EMBY_CONTAINER_MAPPINGS, config.CDN_URL_MAPPINGS,
+             config.TENCENT_SECRET_ID, cdn_service.enabled, cdn_service.mode, cdn_service.provider_name,
+             cdn_service.provider, cdn_service.provider_error)
+    original = database._db_instance
+    db = ReviewDatabase(os.path.join(tempfile.mkdtemp(), "review.db"))
+    database.use_store(db)
+    try:
+        config.PREHEAT_ENABLED = True
+        config.EMBY_CONTAINER_MAPPINGS = {}
+        config.CDN_URL_MAPPINGS = {media_dir + "/": "https://a.example.com/电影/"}
+        config.TENCENT_SECRET_ID = ""
+        cdn_service.enabled = True
+        cdn_service.mode = "edge"
+        cdn_service.provider_name = "tencent"
+        cdn_service.provider = cdn_service.provider_error = None
+
+        item = {"Name": "某片", "Type": "Movie", "Path": path}
+        webhook_server.process_media_item(item)
+        with open(path, "ab") as f:
+            f.write(b"\0" * 10)
+        assert not webhook_server.process_media_item(item)["replaced"]
+        assert PurgeQueue(db.db_file).depth() == 0
+        assert get_purge_drainer() is None
+        assert cdn_service.enabled and cdn_service.provider_error
+    finally:
+        (config.PREHEAT_ENABLED, config.EMBY_CONTAINER_MAPPINGS, config.CDN_URL_MAPPINGS,
+         config.TENCENT_SECRET_ID, cdn_service.enabled, cdn_service.mode, cdn_service.provider_name,
+         cdn_service.provider, cdn_service.provider_error) = saved
+        cache_purge._drainer = None
+        database.use_store(original)
+    print("✅ edge 模式无 API 凭证测试通过")
+
+
+if __name__ == "__main__":
+    try:
+        test_file_signatures()
+        test_was_approved()
+        test_scheduler_purges_then_repreheats()
+        test_purge_quota_and_throttling()
+        test_purge_drainer()
+        test_webhook_detects_replacement()
+        test_webhook_queues_purge_without_scheduler()
+        test_edge_mode_without_credentials()
+    except AssertionError:
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
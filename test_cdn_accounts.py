@@ -0,0 +1,170 @@
+"""
+测试多域名 / 多账号 CDN 预热：主 URL 展开为所有域名、按域名找到账号、各账号并发提交并汇总结果、
+预热队列按账号分别计算配额
+
+每个账号使用一个进程内的模拟 CDN 服务（mock_cdn.py），使用临时数据库
+"""
+import asyncio
+import os
+import sys
+import tempfile
+
+_tmp_dir = tempfile.mkdtemp()
+os.environ.setdefault("DB_FILE", os.path.join(_tmp_dir, "preheat_review.db"))
+
+from cdn_accounts import DEFAULT_ACCOUNT, CDNFanout, CDNTargets, merge_results
+from cdn_preheat import CDNPreheatService
+from database import ReviewDatabase
+from mock_cdn import MockCDNProvider, MockCDNServer, MockCDNState
+from preheat_history import PreheatHistory
+from preheat_scheduler import PreheatQueue, PreheatScheduler, PushQuota
+
+MAPPINGS = {
+    "/media/": ["https://a.example.com/", "https://b.example.com/", "https://c.example.net/"],
+    "/media/电影/": "https://movies.example.com/",
+}
+ACCOUNTS = {"backup": {"domains": ["C.example.net"]}}
+URLS = [f"https://a.example.com/剧集/某剧/Season 01/某剧 S01E{i:02d}.mkv" for i in range(1, 7)]
+
+
+def _mirror(url: str, host: str) -> str:
+    return url.replace("a.example.com", host)
+
+
+def _service(account: str, db_file: str, endpoint: str) -> CDNPreheatService:
+    service = CDNPreheatService(provider_name="mock", account=account)
+    service.enabled = True
+    service.provider = MockCDNProvider(endpoint)
+    service._history = PreheatHistory(db_file)
+    return service
+
+
+def test_targets():
+    """多个目标的映射展开为所有域名，域名按配置归属账号（不区分大小写），其余属于默认账号"""
+    targets = CDNTargets(MAPPINGS, ACCOUNTS)
+    url = URLS[0]
+    assert targets.target_urls(url) == [url, _mirror(url, "b.example.com"), _mirror(url, "c.example.net")]
+    assert targets.target_urls("https://movies.example.com/电影/a.mkv") == ["https://movies.example.com/电影/a.mkv"]
+
+    assert targets.account_of(_mirror(url, "c.example.net")) == "backup"
+    assert targets.account_of(url) == DEFAULT_ACCOUNT
+    groups = targets.group(URLS[:2] + URLS[:1])
+    assert groups == {
+        DEFAULT_ACCOUNT: [URLS[0], _mirror(URLS[0], "b.example.com"), URLS[1], _mirror(URLS[1], "b.example.com")],
+        "backup": [_mirror(URLS[0], "c.example.net"), _mirror(URLS[1], "c.example.net")],
+    }
+
+    from webhook_server import apply_path_mapping
+    assert apply_path_mapping("/media/剧集/a.mkv", MAPPINGS) == "https://a.example.com/剧集/a.mkv"
+    print("✅ 多域名展开测试通过")
+
+
+def test_merge_results():
+    """各账号的结果汇总：全部成功才算成功，任务 ID 合并"""
+    ok = {"success": True, "message": "预热任务已提交", "urls": ["u1"], "task_id": "t1", "skipped": []}
+    failed = {"success": False, "message": "超出每日限额", "urls": ["u2"], "task_id": None,
+              "error_code": "LimitExceeded.CdnPushExceedDayLimit"}
+    assert merge_results({DEFAULT_ACCOUNT: ok}) is ok
+
+    merged = merge_results({DEFAULT_ACCOUNT: ok, "backup": failed})
+    assert not merged["success"] and merged["task_id"] == "t1" and merged["urls"] == ["u1", "u2"]
+    assert merged["error_code"] == "LimitExceeded.CdnPushExceedDayLimit"
+    assert merged["accounts"]["backup"] is failed and "backup: 超出每日限额" in merged["message"]
+    print("✅ 结果汇总测试通过")
+
+
+def test_fanout_submits_per_account():
+    """每个账号通过自己的客户端并发提交，配额相互独立，结果汇总到同一个审核请求"""
+    db = ReviewDatabase(os.path.join(tempfile.mkdtemp(), "review.db"))
+    main_state = MockCDNState(daily_quota=100, rate_limit=0, latency=0.05)
+    backup_state = MockCDNState(daily_quota=1, rate_limit=0, latency=0.05)
+    with MockCDNServer(main_state) as main, MockCDNServer(backup_state) as backup:
+        fanout = CDNFanout(
+            {DEFAULT_ACCOUNT: _service(DEFAULT_ACCOUNT, db.db_file, main.endpoint),
+             "backup": _service("backup", db.db_file, backup.endpoint)},
+            CDNTargets(MAPPINGS, ACCOUNTS)
+        )
+
+        result = asyncio.run(fanout.preheat_urls(URLS[:1]))
+        assert result["success"] and len(result["task_id"].split(", ")) == 2
+        assert main_state.stats()["pushed"] == 2 and backup_state.stats()["pushed"] == 1
+
+        # 备用账号配额用完不影响默认账号
+        result = asyncio.run(fanout.preheat_urls(URLS[1:2]))
+        assert not result["success"] and result["error_code"] == "LimitExceeded.CdnPushExceedDayLimit"
+        assert result["accounts"][DEFAULT_ACCOUNT]["success"] and main_state.stats()["pushed"] == 4
+
+        # 分批提交：各账号按自己的批次大小分批，结果标注账号
+        fanout.services[DEFAULT_ACCOUNT].batch_size = 3
+        results = asyncio.run(fanout.preheat_batch(URLS[2:4]))
+        assert [(r["account"], len(r["urls"])) for r in results] == [
+            (DEFAULT_ACCOUNT, 3), (DEFAULT_ACCOUNT, 1), ("backup", 2)
+        ]
+    print("✅ 多账号并发提交测试通过")
+
+
+def test_scheduler_quota_per_account():
+    """队列中保存所有域名的 URL，各账号按自己的配额出队"""
+    db = ReviewDatabase(os.path.join(tempfile.mkdtemp(), "review.db"))
+    main_state = MockCDNState(daily_quota=100, rate_limit=0, latency=0)
+    backup_state = MockCDNState(daily_quota=2, rate_limit=0, latency=0)
+    with MockCDNServer(main_state) as main, MockCDNServer(backup_state) as backup:
+        services = {DEFAULT_ACCOUNT: _service(DEFAULT_ACCOUNT, db.db_file, main.endpoint),
+                    "backup": _service("backup", db.db_file, backup.endpoint)}
+        queue = PreheatQueue(db.db_file)
+        scheduler = PreheatScheduler(services[DEFAULT_ACCOUNT], queue, PushQuota(), burst=20, pause=0,
+                                     services=services, targets=CDNTargets(MAPPINGS, ACCOUNTS))
+
+        queued = scheduler.enqueue_requests([{"cdn_url": url, "media_type": "Episode"} for url in URLS[:3]])
+        assert queued["queued"] == 9 and queued["targets"] == 9
+        assert queue.depth(DEFAULT_ACCOUNT) == 6 and queue.depth("backup") == 3
+
+        # 管理员提高优先级时所有域名的副本一起提高
+        assert scheduler.boost(URLS[2], 1000)
+        assert queue.peek(1, "backup")[0]["cdn_url"] == _mirror(URLS[2], "c.example.net")
+
+        stats = asyncio.run(scheduler.drain_once())
+        assert stats["submitted"] == 8 and stats["depth"] == 1
+        assert scheduler.remaining_quota() == {DEFAULT_ACCOUNT: 94, "backup": 0}
+        assert queue.depth("backup") == 1 and backup_state.stats()["pushed"] == 2
+    print("✅ 按账号计算配额测试通过")
+
+
+def test_global_scheduler_shares_services():
+    """全局预热调度器与全局多账号入口使用同一组服务，每个账号只有一个客户端和熔断器"""
+    import cdn_accounts
+    import config
+    import preheat_scheduler
+    from cdn_preheat import cdn_service
+
+    saved = (config.CDN_ACCOUNTS, config.PREHEAT_QUEUE_ENABLED, cdn_service.enabled,
+             cdn_accounts._fanout, preheat_scheduler._scheduler)
+    try:
+        config.CDN_ACCOUNTS = ACCOUNTS
+        config.PREHEAT_QUEUE_ENABLED = True
+        cdn_service.enabled = True
+        cdn_accounts._fanout = None
+        preheat_scheduler._scheduler = None
+
+        fanout = cdn_accounts.get_fanout()
+        scheduler = preheat_scheduler.get_scheduler()
+        assert set(scheduler.services) == {DEFAULT_ACCOUNT, "backup"}
+        assert all(scheduler.services[account] is fanout.services[account] for account in fanout.services)
+        assert scheduler.targets is fanout.targets
+    finally:
+        (config.CDN_ACCOUNTS, config.PREHEAT_QUEUE_ENABLED, cdn_service.enabled,
+         cdn_accounts._fanout, preheat_scheduler._scheduler) = saved
+    print("✅ 全局调度器共用服务测试通过")
+
+
+if __name__ == "__main__":
+    try:
+        test_targets()
+        test_merge_results()
+        test_fanout_submits_per_account()
+        test_scheduler_quota_per_account()
+        test_global_scheduler_shares_services()
+    except AssertionError:
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
@@ -0,0 +1,151 @@
+"""
+测试 CDN 服务商接口与本地模拟 CDN 服务：预热/刷新/任务状态/配额查询、
+频率限制和配额错误、预热服务通过服务商提交、频率限制不计入失败次数
+
+在进程内启动模拟服务，不依赖腾讯云 API，使用临时数据库
+"""
+import asyncio
+import os
+import sys
+import tempfile
+
+_tmp_dir = tempfile.mkdtemp()
+os.environ.setdefault("DB_FILE", os.path.join(_tmp_dir, "preheat_review.db"))
+
+from benchmark_cdn_provider import run_benchmark
+from cdn_preheat import CDNPreheatService
+from cdn_provider import create_provider
+from database import ReviewDatabase
+from mock_cdn import MockCDNProvider, MockCDNServer, MockCDNState
+from preheat_history import PreheatHistory
+from preheat_scheduler import PreheatQueue, PreheatScheduler, PushQuota, is_quota_exceeded, is_throttled
+
+URLS = [f"https://cdn.example.com/剧集/某剧/Season 01/某剧 S01E{i:02d}.mkv" for i in range(1, 11)]
+
+
+def _service(db_file: str, endpoint: str) -> CDNPreheatService:
+    service = CDNPreheatService(provider_name="mock")
+    service.enabled = True
+    service.provider = MockCDNProvider(endpoint)
+    service._history = PreheatHistory(db_file)
+    return service
+
+
+def test_mock_provider_operations():
+    """模拟服务按腾讯云接口格式返回预热任务、任务进度、配额和刷新结果"""
+    state = MockCDNState(daily_quota=100, batch_limit=5, rate_limit=0, latency=0, task_seconds=0)
+    with MockCDNServer(state) as server:
+        provider = MockCDNProvider(server.endpoint)
+        assert provider.name == "mock"
+
+        result = provider.push_urls(URLS[:3])
+        assert result["success"] and result["task_id"].startswith("mock-push-")
+        status = provider.describe_push_task(result["task_id"])
+        assert status["success"] and status["status"] == "done" and status["percent"] == 100
+        assert not provider.describe_push_task("mock-push-unknown")["success"]
+
+        quota = provider.describe_push_quota("mainland")
+        assert quota == {"success": True, "area": "mainland", "total": 100, "available": 97, "batch": 5}
+
+        assert provider.purge_urls(URLS[:2])["success"]
+        assert state.stats()["pushed"] == 3 and state.stats()["purged"] == 2
+    print("✅ 模拟 CDN 接口测试通过")
+
+
+def test_mock_errors():
+    """超过单次上限、频率限制和每日配额时返回对应的错误码"""
+    state = MockCDNState(daily_quota=6, batch_limit=5, rate_limit=3, latency=0)
+    with MockCDNServer(state) as server:
+        provider = MockCDNProvider(server.endpoint)
+
+        too_many = provider.push_urls(URLS[:6])
+        assert too_many["error_code"] == "InvalidParameter.CdnUrlExceedBatchLimit"
+        assert provider.push_urls(URLS[:5])["success"]
+        exceeded = provider.push_urls(URLS[5:7])
+        assert is_quota_exceeded(exceeded) and not is_throttled(exceeded)
+
+        throttled = provider.push_urls(URLS[:1])
+        assert is_throttled(throttled) and not throttled["success"]
+        assert state.stats()["counts"]["RequestLimitExceeded"] == 1
+
+    # 服务未启动：请求失败也以结果字典返回
+    assert not MockCDNProvider(server.endpoint, timeout=1).push_urls(URLS[:1])["success"]
+    print("✅ 模拟 CDN 错误测试通过")
+
+
+def test_create_provider():
+    """按名称创建服务商，未知名称报错"""
+    provider = create_provider("mock")
+    assert isinstance(provider, MockCDNProvider)
+    try:
+        create_provider("unknown")
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("未知的服务商应该报错")
+    print("✅ 创建服务商测试通过")
+
+
+def test_service_uses_provider():
+    """预热服务通过服务商提交已编码的 URL、查询配额和刷新缓存"""
+    db = ReviewDatabase(os.path.join(tempfile.mkdtemp(), "review.db"))
+    state = MockCDNState(daily_quota=100, rate_limit=0, latency=0, task_seconds=0)
+    with MockCDNServer(state) as server:
+        service = _service(db.db_file, server.endpoint)
+
+        result = asyncio.run(service.preheat_urls(URLS[:3]))
+        assert result["success"] and result["urls"] == service.encode_urls(URLS[:3])
+        assert service.get_preheat_status(result["task_id"])["status"] == "done"
+        assert service.get_push_quota()["available"] == 97
+
+        # 已预热过的 URL 跳过，刷新不受影响
+        again = asyncio.run(service.preheat_urls(URLS[:3]))
+        assert again["success"] and again["task_id"] is None and state.stats()["pushed"] == 3
+        purged = asyncio.run(service.purge_urls(URLS[:3]))
+        assert purged["success"] and purged["urls"] == service.encode_urls(URLS[:3])
+    print("✅ 预热服务调用服务商测试通过")
+
+
+def test_scheduler_retries_throttled_batches():
+    """频率限制不计入失败次数，URL 留在队列中下次提交"""
+    db = ReviewDatabase(os.path.join(tempfile.mkdtemp(), "review.db"))
+    state = MockCDNState(daily_quota=100, batch_limit=2, rate_limit=2, latency=0)
+    with MockCDNServer(state) as server:
+        service = _service(db.db_file, server.endpoint)
+        service.batch_size = 2
+        scheduler = PreheatScheduler(service, PreheatQueue(db.db_file), PushQuota(), burst=10,
+                                     max_attempts=1, pause=0)
+        scheduler.enqueue(URLS[:6])
+
+        # 查询配额占用 1 次请求，提交 1 批后触发频率限制
+        stats = asyncio.run(scheduler.drain_once())
+        assert stats["submitted"] == 2 and stats["failed"] == 0 and stats["dropped"] == 0
+        assert stats["depth"] == 4
+
+        state.rate_limit = 0
+        stats = asyncio.run(scheduler.drain_once())
+        assert stats["submitted"] == 4 and stats["depth"] == 0
+    print("✅ 频率限制重试测试通过")
+
+
+def test_benchmark_smoke():
+    """压测脚本：全部提交，延迟统计有效"""
+    result = run_benchmark(requests=100, latency_ms=1, rate=0, interval=0.01, timeout=30)
+    assert result["submitted"] == 100 and result["left_in_queue"] == 0
+    assert result["api_calls"] >= 5 and result["throttled"] == 0 and result["quota_errors"] == 0
+    assert 0 <= result["latency_p50_ms"] <= result["latency_p99_ms"]
+    print("✅ 批准到提交压测测试通过")
+
+
+if __name__ == "__main__":
+    try:
+        test_mock_provider_operations()
+        test_mock_errors()
+        test_create_provider()
+        test_service_uses_provider()
+        test_scheduler_retries_throttled_batches()
+        test_benchmark_smoke()
+    except AssertionError:
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
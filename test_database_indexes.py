@@ -0,0 +1,88 @@
+"""
+测试审核列表查询的索引：查询计划与旧数据库升级
+"""
+import os
+import sqlite3
+import sys
+import tempfile
+
+_tmp_dir = tempfile.mkdtemp()
+os.environ.setdefault("DB_FILE", os.path.join(_tmp_dir, "preheat_review.db"))
+
+from database import ReviewDatabase
+from benchmark_database import PLAN_QUERIES, query_plans, run_benchmark
+
+
+def _indexes(db_file: str) -> set:
+    with sqlite3.connect(db_file) as conn:
+        return {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+
+
+def test_list_queries_use_composite_indexes():
+    """列表查询按索引顺序读取，不再使用临时排序"""
+    db_file = os.path.join(tempfile.mkdtemp(), "review.db")
+    ReviewDatabase(db_file)
+    plans = query_plans(db_file)
+    print(f"\n📋 {plans}")
+
+    assert "idx_status_created_at" in " ".join(plans["list_pending"])
+    assert "idx_status_reviewed_at" in " ".join(plans["list_approved"])
+    assert "COVERING INDEX" in " ".join(plans["statistics"])
+    for name in PLAN_QUERIES:
+        assert not any("TEMP B-TREE" in step for step in plans[name]), name
+    print("✅ 查询计划测试通过")
+
+
+def test_upgrade_replaces_single_column_index():
+    """旧数据库升级后新增复合索引并删除多余的 idx_status"""
+    db_file = os.path.join(tempfile.mkdtemp(), "review.db")
+    with sqlite3.connect(db_file) as conn:
+        conn.execute("""
+            CREATE TABLE review_requests (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                cdn_url TEXT NOT NULL,
+                media_name TEXT NOT NULL,
+                media_type TEXT NOT NULL,
+                emby_path TEXT,
+                host_path TEXT,
+                media_info TEXT,
+                status TEXT DEFAULT 'pending',
+                telegram_message_id INTEGER,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                reviewed_at TIMESTAMP,
+                reviewed_by TEXT,
+                review_action TEXT,
+                UNIQUE(cdn_url)
+            )
+        """)
+        conn.execute("CREATE INDEX idx_status ON review_requests(status)")
+
+    db = ReviewDatabase(db_file)
+    indexes = _indexes(db_file)
+    assert "idx_status" not in indexes
+    assert {"idx_status_created_at", "idx_status_reviewed_at"} <= indexes
+
+    db.add_review_request("https://cdn.example.com/a.mkv", "A", "Movie")
+    db.add_review_request("https://cdn.example.com/b.mkv", "B", "Movie")
+    db.approve_request(1, "tester")
+    assert db.get_statistics() == {"pending": 1, "approved": 1, "rejected": 0, "expired": 0, "total": 2}
+    print("✅ 索引升级测试通过")
+
+
+def test_benchmark_smoke():
+    """小规模运行查询压测"""
+    result = run_benchmark(rows=2000, repeat=2)
+    assert result["rows"] == 2000
+    assert set(result["legacy"]["timings"]) == set(result["current"]["timings"])
+    print("✅ 查询压测冒烟测试通过")
+
+
+if __name__ == "__main__":
+    try:
+        test_list_queries_use_composite_indexes()
+        test_upgrade_replaces_single_column_index()
+        test_benchmark_smoke()
+    except AssertionError:
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
@@ -0,0 +1,327 @@
+"""
+测试直接请求边缘节点预热：流式读取丢弃响应体、只预热开头/结尾的 Range 请求、缓存状态响应头、
+同一域名并发限制、连接复用，预热服务的 edge 模式（按媒体库/媒体类型的规则、每次读取的字节数），
+以及 Telegram 批准后在后台预热
+
+在进程内启动本地 HTTP 服务模拟 CDN 边缘节点，使用临时数据库
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+_tmp_dir = tempfile.mkdtemp()
+os.environ.setdefault("DB_FILE", os.path.join(_tmp_dir, "preheat_review.db"))
+
+from cdn_preheat import MB, CDNPreheatService, EdgeWarmer, cache_status
+from database import ReviewDatabase
+from preheat_history import PreheatHistory
+
+FILE_SIZE = 256 * 1024
+
+
+class _Edge:
+    """模拟的边缘节点：第一次请求某个路径未命中，之后命中；记录并发数和连接数"""
+
+    def __init__(self, delay: float = 0.0, honor_range: bool = True):
+        self.delay = delay
+        self.honor_range = honor_range
+        self.cached = set()
+        self.requests = []
+        self.connections = set()
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+
+        edge = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _respond(self, with_body: bool):
+                with edge._lock:
+                    edge.active += 1
+                    edge.max_active = max(edge.max_active, edge.active)
+                    edge.connections.add(self.client_address)
+                    edge.requests.append((self.command, self.path, self.headers.get("Range")))
+                    hit = self.path in edge.cached
+                    edge.cached.add(self.path)
+                try:
+                    if edge.delay:
+                        time.sleep(edge.delay)
+                    if "missing" in self.path:
+                        self.send_response(404)
+                        self.send_header("Content-Length", "0")
+                        self.end_headers()
+                        return
+
+                    start, end = 0, FILE_SIZE - 1
+                    requested = self.headers.get("Range")
+                    if requested and edge.honor_range:
+                        first, _, last = requested[len("bytes="):].partition("-")
+                        if first:
+                            start, end = int(first), min(int(last), FILE_SIZE - 1)
+                        else:
+                            start = max(0, FILE_SIZE - int(last))
+                        self.send_response(206)
+                        self.send_header("Content-Range", f"bytes {start}-{end}/{FILE_SIZE}")
+                    else:
+                        self.send_response(200)
+                    self.send_header("Content-Length", str(end - start + 1))
+                    self.send_header("X-Cache-Lookup", "Hit From MemCache" if hit else "Cache Miss")
+                    self.end_headers()
+                    if with_body:
+                        self.wfile.write(b"\0" * (end - start + 1))
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+                finally:
+                    with edge._lock:
+                        edge.active -= 1
+
+            def do_GET(self):
+                self._respond(True)
+
+            def do_HEAD(self):
+                self._respond(False)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.base = f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def urls(self, count: int):
+        return [f"{self.base}/tv/show/E{i:02d}.mkv" for i in range(count)]
+
+
+def test_cache_status():
+    """按常见 CDN 的响应头判断命中状态"""
+    assert cache_status({"x-cache-lookup": "Hit From MemCache"}) == ("hit", "Hit From MemCache")
+    assert cache_status({"x-cache-lookup": "Hit From Upstream"})[0] == "miss"
+    assert cache_status({"x-cache-lookup": "Cache Miss"})[0] == "miss"
+    assert cache_status({"cf-cache-status": "HIT"})[0] == "hit"
+    assert cache_status({"cf-cache-status": "DYNAMIC"}) == ("unknown", "DYNAMIC")
+    assert cache_status({}) == ("unknown", "")
+    print("✅ 缓存状态响应头测试通过")
+
+
+def test_get_streams_and_reports_cache_status():
+    """GET 读取完整文件，第二次请求命中缓存；HEAD 不读取响应体"""
+    with _Edge() as edge:
+        warmer = EdgeWarmer(method="get", head_bytes=0)
+        urls = edge.urls(3)
+
+        async def run():
+            first = await warmer.warm_urls(urls)
+            second = await warmer.warm_urls(urls)
+            await warmer.aclose()
+            return first, second
+
+        first, second = asyncio.run(run())
+        assert [r["url"] for r in first] == urls
+        assert all(r["success"] and r["bytes"] == FILE_SIZE and r["cache_status"] == "miss" for r in first)
+        assert all(r["size"] == FILE_SIZE for r in first)
+        assert all(r["cache_status"] == "hit" and r["cache_header"] == "Hit From MemCache" for r in second)
+
+        head = asyncio.run(EdgeWarmer(method="head").warm_urls(urls[:1]))[0]
+        assert head["success"] and head["bytes"] == 0 and edge.requests[-1][0] == "HEAD"
+
+        missing = asyncio.run(warmer.warm_urls([f"{edge.base}/missing.mkv"]))[0]
+        assert not missing["success"] and missing["status_code"] == 404
+
+    # 边缘节点不可达
+    failed = asyncio.run(EdgeWarmer(timeout=1).warm_urls([f"{edge.base}/gone.mkv"]))[0]
+    assert not failed["success"] and failed["cache_status"] == "error"
+    print("✅ 流式读取与缓存状态测试通过")
+
+
+def test_head_and_tail_ranges():
+    """只请求开头 head_bytes 字节和结尾 tail_bytes 字节；服务器不支持 Range 时读够后断开"""
+    with _Edge() as edge:
+        url = edge.urls(1)[0]
+
+        result = asyncio.run(EdgeWarmer(head_bytes=1000).warm_urls([url]))[0]
+        assert result["status_code"] == 206 and result["bytes"] == 1000 and result["size"] == FILE_SIZE
+        assert edge.requests[-1][2] == "bytes=0-999"
+
+        result = asyncio.run(EdgeWarmer(head_bytes=1000, tail_bytes=500).warm_urls([url]))[0]
+        assert result["success"] and result["bytes"] == 1500
+        assert [r[2] for r in edge.requests[-2:]] == ["bytes=0-999", "bytes=-500"]
+
+        # 结尾与开头重叠时只请求剩下的部分；文件比开头部分小时不再请求结尾
+        result = asyncio.run(EdgeWarmer(head_bytes=FILE_SIZE - 100, tail_bytes=500).warm_urls([url]))[0]
+        assert result["bytes"] == FILE_SIZE and edge.requests[-1][2] == "bytes=-100"
+        count = len(edge.requests)
+        result = asyncio.run(EdgeWarmer(head_bytes=FILE_SIZE * 2, tail_bytes=500).warm_urls([url]))[0]
+        assert result["bytes"] == FILE_SIZE and len(edge.requests) == count + 1
+
+        # 每个 URL 单独指定范围
+        results = asyncio.run(EdgeWarmer().warm_urls(edge.urls(2), [(100, 0), (0, 0)]))
+        assert [r["bytes"] for r in results] == [100, FILE_SIZE]
+
+    with _Edge(honor_range=False) as edge:
+        result = asyncio.run(EdgeWarmer(head_bytes=1000).warm_urls(edge.urls(1)))[0]
+        assert result["success"] and result["status_code"] == 200
+        assert 1000 <= result["bytes"] < FILE_SIZE
+    print("✅ 开头/结尾 Range 请求测试通过")
+
+
+def test_per_host_limit_and_keep_alive():
+    """同一域名的并发数不超过 per_host，连接在请求之间复用"""
+    with _Edge(delay=0.05) as a, _Edge(delay=0.05) as b:
+        warmer = EdgeWarmer(concurrency=8, per_host=2)
+        urls = [url for pair in zip(a.urls(10), b.urls(10)) for url in pair]
+
+        results = asyncio.run(warmer.warm_urls(urls))
+        assert all(r["success"] for r in results)
+        assert a.max_active == 2 and b.max_active == 2
+        assert len(a.connections) <= 2 and len(b.connections) <= 2
+    print("✅ 并发限制与连接复用测试通过")
+
+
+def test_partial_rules():
+    """媒体库规则优先于媒体类型规则，都没有时使用默认值"""
+    service = CDNPreheatService(mode="edge")
+    service._warmer = EdgeWarmer(head_bytes=0, tail_bytes=0)
+    service.partial_rules = {"电影": (64, 16), "Episode": (32, 0)}
+
+    assert service.partial_range("https://cdn.example.com/电影/某片/某片.mkv", "Movie") == (64 * MB, 16 * MB)
+    assert service.partial_range("https://cdn.example.com/电影/某片/某片.mkv", "Episode") == (64 * MB, 16 * MB)
+    assert service.partial_range("https://cdn.example.com/剧集/某剧/E01.mkv", "Episode") == (32 * MB, 0)
+    assert service.partial_range("https://cdn.example.com/剧集/某剧/E01.mkv") == (0, 0)
+    print("✅ 部分预热规则测试通过")
+
+
+def test_service_edge_mode():
+    """edge 模式下预热服务直接请求 URL，只记录成功的 URL，不需要服务商"""
+    db = ReviewDatabase(os.path.join(tempfile.mkdtemp(), "review.db"))
+    with _Edge() as edge:
+        service = CDNPreheatService(mode="edge")
+        service.enabled = True
+        service._history = PreheatHistory(db.db_file, freshness_seconds=3600)
+        urls = edge.urls(2) + [f"{edge.base}/missing.mkv"]
+
+        result = asyncio.run(service.preheat_urls(urls))
+        assert not result["success"] and result["task_id"] is None and service.provider is None
+        assert result["warmed"] == urls[:2] and result["cache"] == {"miss": 2, "unknown": 1}
+        assert "成功 2/3" in result["message"]
+
+        # 成功的 URL 记入预热历史，失败的下次重试
+        again = asyncio.run(service.preheat_urls(urls))
+        assert again["skipped"] == urls[:2] and again["urls"] == urls[2:]
+
+        # 剧集只预热开头 64KB 和结尾 32KB，记录本次读取的字节数和文件总大小
+        service.partial_rules = {"Episode": (1 / 16, 1 / 32)}
+        urls = [f"{edge.base}/tv/other/E{i:02d}.mkv" for i in range(2)]
+        result = asyncio.run(service.preheat_urls(urls, media_type="Episode"))
+        assert result["success"] and result["bytes"] == 2 * 96 * 1024
+        assert result["file_bytes"] == 2 * FILE_SIZE and "文件共 0.5 MB" in result["message"]
+    print("✅ 预热服务 edge 模式测试通过")
+
+
+def test_edge_mode_without_credentials():
+    """edge 模式不需要 API 凭证：刷新缓存因服务商不可用而失败，但不会关闭边缘节点预热"""
+    db = ReviewDatabase(os.path.join(tempfile.mkdtemp(), "review.db"))
+    with _Edge() as edge:
+        service = CDNPreheatService(mode="edge", provider_options={"secret_id": "", "secret_key": ""})
+        service.enabled = True
+        service._history = PreheatHistory(db.db_file, freshness_seconds=3600)
+        urls = edge.urls(2)
+
+        result = asyncio.run(service.purge_urls(urls[:1]))
+        assert not result["success"] and "CDN API 不可用" in result["message"]
+        assert service.enabled and service.provider_error and not service.api_available
+
+        result = asyncio.run(service.preheat_urls(urls))
+        assert result["success"] and result["warmed"] == urls
+    print("✅ edge 模式无 API 凭证测试通过")
+
+
+class _Query:
+    """Telegram 回调查询桩，记录消息编辑"""
+
+    class _User:
+        first_name = "admin"
+        username = None
+
+    def __init__(self, data: str):
+        self.data = data
+        self.from_user = self._User()
+        self.texts = []
+
+    async def answer(self):
+        return True
+
+    async def edit_message_text(self, text, **kwargs):
+        self.texts.append(text)
+        return True
+
+
+class _Update:
+    def __init__(self, query):
+        self.callback_query = query
+
+
+def test_approval_warms_in_background():
+    """edge 模式批准后立即回复，预热在后台执行，完成后更新审核消息"""
+    import telegram_bot as bot_module
+    from cdn_preheat import cdn_service
+
+    db = ReviewDatabase(os.path.join(tempfile.mkdtemp(), "review.db"))
+    saved = (bot_module.db, cdn_service.mode, cdn_service.enabled, cdn_service._history, cdn_service._warmer)
+    with _Edge(delay=0.5) as edge:
+        try:
+            bot_module.db = db
+            cdn_service.mode = "edge"
+            cdn_service.enabled = True
+            cdn_service._history = PreheatHistory(db.db_file, freshness_seconds=3600)
+            cdn_service._warmer = EdgeWarmer()
+            request_id = db.add_review_request(edge.urls(1)[0], "某剧 E00", "Episode")
+            bot = bot_module.TelegramReviewBot()
+            query = _Query(f"approve_{request_id}")
+
+            async def main():
+                started = time.perf_counter()
+                await bot._handle_button_callback(_Update(query), None)
+                replied = time.perf_counter() - started
+                replied_text = query.texts[-1]
+                await asyncio.gather(*bot.edge_tasks)
+                return replied, replied_text
+
+            replied, replied_text = asyncio.run(main())
+            assert replied < 0.5 and "已开始边缘节点预热" in replied_text
+            assert db.get_request_by_id(request_id)["status"] == "approved"
+            assert len(query.texts) == 2 and "边缘节点预热完成: 1 个文件，命中 0，未命中 1" in query.texts[-1]
+            assert not bot.edge_tasks
+        finally:
+            (bot_module.db, cdn_service.mode, cdn_service.enabled, cdn_service._history,
+             cdn_service._warmer) = saved
+    print("✅ 后台边缘节点预热测试通过")
+
+
+if __name__ == "__main__":
+    try:
+        test_cache_status()
+        test_get_streams_and_reports_cache_status()
+        test_head_and_tail_ranges()
+        test_partial_rules()
+        test_per_host_limit_and_keep_alive()
+        test_service_edge_mode()
+        test_edge_mode_without_credentials()
+        test_approval_warms_in_background()
+    except AssertionError:
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
@@ -0,0 +1,135 @@
+"""
+测试审核过期清理：分批过期、查询计划与 Telegram 消息批量编辑
+
+不依赖运行中的服务，使用临时数据库
+"""
+import asyncio
+import os
+import sqlite3
+import sys
+import tempfile
+
+_tmp_dir = tempfile.mkdtemp()
+os.environ.setdefault("DB_FILE", os.path.join(_tmp_dir, "preheat_review.db"))
+
+from database import ReviewDatabase
+
+
+class RecordingBot:
+    """记录编辑操作的 Telegram Bot 桩"""
+
+    def __init__(self):
+        self.edited_text = []
+        self.edited_markup = []
+
+    async def edit_message_text(self, **kwargs):
+        self.edited_text.append(kwargs)
+        return True
+
+    async def edit_message_reply_markup(self, **kwargs):
+        self.edited_markup.append(kwargs)
+        return True
+
+
+def _backdate(db: ReviewDatabase, request_ids, seconds: int):
+    with sqlite3.connect(db.db_file) as conn:
+        marks = ",".join("?" * len(request_ids))
+        conn.execute(
+            f"UPDATE review_requests SET created_at = datetime('now', ?) WHERE id IN ({marks})",
+            [f"-{seconds} seconds", *request_ids]
+        )
+
+
+def test_sweep_in_batches():
+    """超时的待审核请求分批过期，未超时和已审核的请求不受影响"""
+    import database
+    import metrics
+    import webhook_server
+
+    # 使用独立的全局存储，其他测试留下的待审核请求不影响断言
+    original = database._db_instance
+    db = ReviewDatabase(os.path.join(tempfile.mkdtemp(), "review.db"))
+    database.use_store(db)
+    try:
+        ids = [db.add_review_request(f"https://cdn.example.com/过期/{i}.mkv", f"过期{i}", "Movie") for i in range(7)]
+        db.approve_request(ids[0], "tester")
+        _backdate(db, ids[:6], 7200)
+
+        batches = []
+
+        async def on_expired(request_ids):
+            batches.append(request_ids)
+
+        total = asyncio.run(webhook_server.run_expiry_sweep(3600, 2, on_expired))
+        assert total == 5
+        assert [len(batch) for batch in batches] == [2, 2, 1]
+        assert sorted(i for batch in batches for i in batch) == ids[1:6]
+        assert metrics.EXPIRY_SWEEP_LAST_ROWS.value == 5
+
+        assert db.get_request_by_id(ids[0])['status'] == 'approved'
+        assert db.get_request_by_id(ids[1])['status'] == 'expired'
+        assert db.get_request_by_id(ids[6])['status'] == 'pending'
+        # 过期的请求不会再推送到 Telegram
+        claimed = [row['id'] for row in db.claim_unnotified_requests(10)]
+        assert ids[6] in claimed and not set(claimed) & set(ids[1:6])
+
+        assert asyncio.run(webhook_server.run_expiry_sweep(3600, 2)) == 0
+    finally:
+        database.use_store(original)
+    print("✅ 分批过期测试通过")
+
+
+def test_expiry_query_plan():
+    """过期查询沿 (status, created_at) 索引读取，不排序"""
+    db = ReviewDatabase(os.path.join(tempfile.mkdtemp(), "review.db"))
+    with sqlite3.connect(db.db_file) as conn:
+        plan = " ".join(row[3] for row in conn.execute("""
+            EXPLAIN QUERY PLAN
+            SELECT id FROM review_requests
+            WHERE status = 'pending' AND created_at < datetime('now', '-60 seconds')
+            ORDER BY created_at
+            LIMIT 500
+        """))
+    assert "idx_status_created_at" in plan
+    assert "TEMP B-TREE" not in plan
+    print("✅ 过期查询计划测试通过")
+
+
+def test_edit_expired_messages():
+    """全部过期的消息替换为说明，部分过期的批量消息只保留剩余按钮"""
+    import telegram_bot as bot_module
+    db = ReviewDatabase(os.path.join(tempfile.mkdtemp(), "review.db"))
+    original_db = bot_module.db
+    bot_module.db = db
+    try:
+        ids = [db.add_review_request(f"https://cdn.example.com/消息/{i}.mkv", f"消息{i}", "Movie") for i in range(3)]
+        db.add_review_messages(100, 1, ids[:2])
+        db.add_review_messages(200, 1, ids[:2])
+        db.add_review_messages(100, 2, [ids[2]])
+        _backdate(db, [ids[0], ids[2]], 7200)
+        expired = [row['id'] for row in db.expire_overdue_requests(3600)]
+        assert sorted(expired) == [ids[0], ids[2]]
+
+        bot = bot_module.TelegramReviewBot()
+        bot.bot = RecordingBot()
+        edited = asyncio.run(bot.mark_expired_messages(expired))
+    finally:
+        bot_module.db = original_db
+
+    assert edited == 3
+    assert [(e['chat_id'], e['message_id']) for e in bot.bot.edited_text] == [(100, 2)]
+    assert sorted(e['chat_id'] for e in bot.bot.edited_markup) == [100, 200]
+    buttons = bot.bot.edited_markup[0]['reply_markup'].inline_keyboard
+    assert [row[0].callback_data for row in buttons] == [f"approve_{ids[1]}"]
+    print("✅ 消息批量编辑测试通过")
+
+
+if __name__ == "__main__":
+    try:
+        test_sweep_in_batches()
+        test_expiry_query_plan()
+        test_edit_expired_messages()
+    except AssertionError:
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
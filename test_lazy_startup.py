@@ -0,0 +1,148 @@
+"""
+测试冷启动优化：延迟导入、延迟建库与健康检查
+
+在子进程中导入服务，避免受当前进程已导入模块的影响
+"""
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from benchmark_startup import _isolated_env, measure_import, parse_importtime
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def _run_in_subprocess(code: str, extra: dict = None) -> dict:
+    with tempfile.TemporaryDirectory() as work_dir:
+        proc = subprocess.run(
+            [sys.executable, "-c", code],
+            cwd=work_dir,
+            env=_isolated_env(work_dir, extra),
+            capture_output=True,
+            text=True,
+            timeout=60
+        )
+    assert proc.returncode == 0, proc.stderr
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def test_import_is_lazy():
+    """导入 webhook_server 不导入 SDK，也不创建数据库"""
+    result = measure_import(top=5)
+    print(f"\n📊 导入耗时 {result['import_ms']:.1f} ms，共 {result['modules_imported']} 个模块")
+    assert result["heavy_modules"] == []
+    assert not result["db_created_at_import"]
+    print("✅ 延迟导入测试通过")
+
+
+def test_lifespan_warms_up_in_background():
+    """生命周期启动后健康检查立即可用，数据库在后台初始化完成"""
+    result = _run_in_subprocess(
+        "import json, os, time\n"
+        "from fastapi.testclient import TestClient\n"
+        "import webhook_server\n"
+        "with TestClient(webhook_server.app) as client:\n"
+        "    first = client.get('/')\n"
+        "    deadline = time.time() + 10\n"
+        "    while not client.get('/').json()['ready'] and time.time() < deadline:\n"
+        "        time.sleep(0.01)\n"
+        "    print(json.dumps({'status': first.status_code,\n"
+        "                      'ready': client.get('/').json()['ready'],\n"
+        "                      'db_created': os.path.exists(os.environ['DB_FILE']),\n"
+        "                      'leader': webhook_server.leader_election.is_leader}))\n"
+    )
+    assert result == {"status": 200, "ready": True, "db_created": True, "leader": True}
+    print("✅ 后台预热测试通过")
+
+
+def test_requests_during_migration():
+    """数据库升级期间健康检查和指标不阻塞，查询接口返回 503，Webhook 在升级完成后写入"""
+    result = _run_in_subprocess(
+        "import json, threading, time\n"
+        "from fastapi.testclient import TestClient\n"
+        "import database, webhook_server\n"
+        "migrating = threading.Event()\n"
+        "create_store = database.create_store\n"
+        "def slow_create_store(*args):\n"
+        "    migrating.wait(10)\n"
+        "    return create_store(*args)\n"
+        "database.create_store = slow_create_store\n"
+        "payload = {'Event': 'library.new', 'Item': {'Name': '升级中', 'Type': 'Movie',\n"
+        "           'Path': '/media/电影/升级中/升级中.mkv'}}\n"
+        "with TestClient(webhook_server.app) as client:\n"
+        "    webhook = {}\n"
+        "    sender = threading.Thread(target=lambda: webhook.update(r=client.post('/emby', json=payload)))\n"
+        "    sender.start()\n"
+        "    time.sleep(0.2)\n"
+        "    started = time.perf_counter()\n"
+        "    health = client.get('/').json()\n"
+        "    metrics = client.get('/metrics').status_code\n"
+        "    listing = client.get('/api/requests').status_code\n"
+        "    elapsed = time.perf_counter() - started\n"
+        "    pending = sender.is_alive()\n"
+        "    migrating.set()\n"
+        "    sender.join(10)\n"
+        "    print(json.dumps({'ready': health['ready'], 'metrics': metrics, 'listing': listing,\n"
+        "                      'fast': elapsed < 1, 'pending': pending,\n"
+        "                      'webhook': webhook['r'].status_code,\n"
+        "                      'stored': database.get_db().get_statistics()['total']}))\n",
+        extra={"TELEGRAM_REVIEW_ENABLED": "true", "TELEGRAM_BOT_TOKEN": ""}
+    )
+    assert result == {"ready": False, "metrics": 200, "listing": 503, "fast": True, "pending": True,
+                      "webhook": 200, "stored": 1}
+    print("✅ 升级期间请求测试通过")
+
+
+def test_warm_up_failure_is_reported():
+    """数据库初始化失败时健康检查、查询接口和 Webhook 返回 503，不参与 Leader 选举"""
+    result = _run_in_subprocess(
+        "import json, time\n"
+        "from fastapi.testclient import TestClient\n"
+        "import webhook_server\n"
+        "payload = {'Event': 'library.new', 'Item': {'Name': '失败', 'Type': 'Movie',\n"
+        "           'Path': '/media/电影/失败/失败.mkv'}}\n"
+        "with TestClient(webhook_server.app) as client:\n"
+        "    deadline = time.time() + 10\n"
+        "    while not webhook_server.leader_task.done() and time.time() < deadline:\n"
+        "        time.sleep(0.01)\n"
+        "    health = client.get('/')\n"
+        "    print(json.dumps({'health': health.status_code, 'status': health.json()['status'],\n"
+        "                      'error': bool(webhook_server.warmup_state['error']),\n"
+        "                      'listing': client.get('/api/requests').status_code,\n"
+        "                      'webhook': client.post('/emby', json=payload).status_code,\n"
+        "                      'leader': webhook_server.leader_election.is_leader}))\n",
+        extra={"DB_FILE": "/dev/null/review.db"}
+    )
+    assert result == {"health": 503, "status": "error", "error": True, "listing": 503, "webhook": 503,
+                      "leader": False}
+    print("✅ 初始化失败测试通过")
+
+
+def test_parse_importtime():
+    """解析 -X importtime 输出"""
+    output = (
+        "import time: self [us] | cumulative | imported package\n"
+        "import time:       120 |        120 |   _io\n"
+        "import time:      3000 |       3120 | database\n"
+    )
+    records = parse_importtime(output)
+    assert records == [
+        {"module": "_io", "self_us": 120, "cumulative_us": 120, "depth": 1},
+        {"module": "database", "self_us": 3000, "cumulative_us": 3120, "depth": 0},
+    ]
+    print("✅ importtime 解析测试通过")
+
+
+if __name__ == "__main__":
+    try:
+        test_import_is_lazy()
+        test_lifespan_warms_up_in_background()
+        test_requests_during_migration()
+        test_warm_up_failure_is_reported()
+        test_parse_importtime()
+    except AssertionError:
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
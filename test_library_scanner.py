@@ -0,0 +1,126 @@
+"""
+测试媒体库增量扫描
+
+不依赖运行中的服务，在临时目录中构造媒体库进行测试
+"""
+import os
+import sys
+import time
+import tempfile
+
+_tmp_dir = tempfile.mkdtemp()
+os.environ.setdefault("DB_FILE", os.path.join(_tmp_dir, "preheat_review.db"))
+
+from library_scanner import LibraryManifest, IncrementalScanner, guess_media_type
+
+
+def _touch(path: str, content: bytes = b"x"):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(content)
+
+
+def _age(path: str, seconds: int = 60):
+    """把目录的修改时间调到过去，模拟"已稳定"的目录"""
+    past = time.time() - seconds
+    os.utime(path, (past, past))
+
+
+def _age_tree(root: str, seconds: int = 60):
+    for dirpath, _, _ in os.walk(root):
+        _age(dirpath, seconds)
+
+
+def test_incremental_scan():
+    """首次扫描建立清单，之后只列出变化的目录"""
+    with tempfile.TemporaryDirectory() as tmp:
+        library = os.path.join(tmp, "media")
+        _touch(os.path.join(library, "电影", "流浪地球 (2019)", "流浪地球.mkv"))
+        _touch(os.path.join(library, "剧集", "黑镜", "Season 01", "黑镜 - S01E01.mp4"))
+        _touch(os.path.join(library, "剧集", "黑镜", "Season 01", "poster.jpg"))
+        _age_tree(library)
+
+        scanner = IncrementalScanner(LibraryManifest(os.path.join(tmp, "manifest.db")))
+
+        print("\n🧪 首次扫描...")
+        first = scanner.scan(library)
+        assert first["first_scan"]
+        assert sorted(os.path.basename(c["path"]) for c in first["changes"]) == [
+            "流浪地球.mkv", "黑镜 - S01E01.mp4"
+        ]
+
+        print("🧪 无变化时再次扫描...")
+        second = scanner.scan(library)
+        assert not second["first_scan"]
+        assert second["changes"] == []
+        assert second["dirs_listed"] == 0
+        assert second["dirs_checked"] == first["dirs_checked"]
+
+        print("🧪 新增一集后扫描...")
+        season_dir = os.path.join(library, "剧集", "黑镜", "Season 01")
+        _touch(os.path.join(season_dir, "黑镜 - S01E02.mp4"))
+        _age(season_dir)
+        third = scanner.scan(library)
+        assert [os.path.basename(c["path"]) for c in third["changes"]] == ["黑镜 - S01E02.mp4"]
+        assert third["changes"][0]["is_new"]
+        assert third["dirs_listed"] == 1
+
+        print("🧪 删除目录后扫描...")
+        for name in os.listdir(season_dir):
+            os.remove(os.path.join(season_dir, name))
+        os.rmdir(season_dir)
+        _age(os.path.dirname(season_dir))
+        fourth = scanner.scan(library)
+        assert fourth["changes"] == []
+        assert fourth["files_removed"] == 2
+        assert scanner.manifest.get_statistics()["files"] == 1
+
+    print("✅ 增量扫描测试通过")
+
+
+def test_scan_processes_items_off_event_loop():
+    """扫描发现的文件在线程池中处理，不阻塞事件循环"""
+    import asyncio
+    import threading
+
+    import config
+    import webhook_server
+
+    with tempfile.TemporaryDirectory() as tmp:
+        library = os.path.join(tmp, "media")
+        for episode in range(1, 4):
+            _touch(os.path.join(library, "剧集", "黑镜", "Season 01", f"黑镜 - S01E0{episode}.mp4"))
+        _age_tree(library)
+        scanner = IncrementalScanner(LibraryManifest(os.path.join(tmp, "manifest.db")))
+
+        threads = []
+        saved = (config.LIBRARY_SCAN_ROOTS, config.LIBRARY_SCAN_EMIT_INITIAL, webhook_server.process_media_item)
+        try:
+            config.LIBRARY_SCAN_ROOTS = [library]
+            config.LIBRARY_SCAN_EMIT_INITIAL = True
+            webhook_server.process_media_item = lambda item: threads.append(threading.get_ident())
+
+            assert asyncio.run(webhook_server.run_library_scan(scanner)) == 3
+        finally:
+            config.LIBRARY_SCAN_ROOTS, config.LIBRARY_SCAN_EMIT_INITIAL, webhook_server.process_media_item = saved
+        assert len(threads) == 3 and threading.get_ident() not in threads
+    print("✅ 扫描结果在线程池中处理测试通过")
+
+
+def test_guess_media_type():
+    """剧集/电影类型猜测"""
+    assert guess_media_type("/media/剧集/黑镜/Season 01/黑镜 - S01E01.mp4") == "Episode"
+    assert guess_media_type("/media/动漫/海贼王/第1000集.mkv") == "Episode"
+    assert guess_media_type("/media/电影/流浪地球 (2019)/流浪地球.mkv") == "Movie"
+    print("✅ 媒体类型猜测测试通过")
+
+
+if __name__ == "__main__":
+    try:
+        test_incremental_scan()
+        test_scan_processes_items_off_event_loop()
+        test_guess_media_type()
+    except AssertionError:
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
@@ -0,0 +1,73 @@
+"""
+测试运行指标模块（Prometheus 文本格式输出）
+"""
+import asyncio
+import sys
+
+from metrics import Counter, Gauge, Histogram, Registry
+
+
+def test_counter_and_gauge_render():
+    """计数器和仪表的文本输出"""
+    registry = Registry()
+    requests_total = registry.register(Counter("demo_requests_total", "请求数", ["result"]))
+    depth = registry.register(Gauge("demo_queue_depth", "队列深度"))
+
+    requests_total.labels(result="ok").inc()
+    requests_total.labels(result="ok").inc(2)
+    requests_total.labels(result='bad"value').inc()
+    depth.set_function(lambda: 7)
+
+    output = registry.render()
+    print("\n" + output)
+    assert "# TYPE demo_requests_total counter" in output
+    assert 'demo_requests_total{result="ok"} 3' in output
+    assert 'demo_requests_total{result="bad\\"value"} 1' in output
+    assert "demo_queue_depth 7" in output
+    print("✅ 计数器/仪表测试通过")
+
+
+def test_histogram_buckets_and_timer():
+    """直方图分桶累计、计时器装饰器"""
+    registry = Registry()
+    latency = registry.register(Histogram("demo_seconds", "耗时", ["step"], buckets=(0.1, 1.0)))
+
+    child = latency.labels(step="parse")
+    for value in (0.05, 0.1, 0.5, 3.0):
+        child.observe(value)
+
+    output = registry.render()
+    print("\n" + output)
+    assert 'demo_seconds_bucket{step="parse",le="0.1"} 2' in output
+    assert 'demo_seconds_bucket{step="parse",le="1"} 3' in output
+    assert 'demo_seconds_bucket{step="parse",le="+Inf"} 4' in output
+    assert 'demo_seconds_count{step="parse"} 4' in output
+
+    @latency.labels(step="sync").time()
+    def work():
+        return 1
+
+    @latency.labels(step="async").time()
+    async def async_work():
+        await asyncio.sleep(0)
+        return 2
+
+    assert work() == 1
+    assert asyncio.run(async_work()) == 2
+    with latency.labels(step="block").time():
+        pass
+
+    assert latency.labels(step="sync").count == 1
+    assert latency.labels(step="async").count == 1
+    assert latency.labels(step="block").count == 1
+    print("✅ 直方图测试通过")
+
+
+if __name__ == "__main__":
+    try:
+        test_counter_and_gauge_render()
+        test_histogram_buckets_and_timer()
+    except AssertionError:
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
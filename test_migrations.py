@@ -0,0 +1,260 @@
+"""
+测试数据库结构迁移：版本记录、分段回填、中断后继续、在线重建期间的并发写入
+
+不依赖运行中的服务，使用临时数据库
+"""
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+
+_tmp_dir = tempfile.mkdtemp()
+os.environ.setdefault("DB_FILE", os.path.join(_tmp_dir, "preheat_review.db"))
+
+import migrations
+from database import MIGRATIONS, ReviewDatabase, _connect_for_migration, url_hash
+from migrations import Migration, MigrationRunner
+
+# v1.1.1 的表结构：UNIQUE(cdn_url)、单列状态索引，没有后来新增的列
+LEGACY_SCHEMA = """
+    CREATE TABLE review_requests (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        cdn_url TEXT NOT NULL,
+        media_name TEXT NOT NULL,
+        media_type TEXT NOT NULL,
+        emby_path TEXT,
+        host_path TEXT,
+        media_info TEXT,
+        status TEXT DEFAULT 'pending',
+        telegram_message_id INTEGER,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        reviewed_at TIMESTAMP,
+        reviewed_by TEXT,
+        review_action TEXT,
+        UNIQUE(cdn_url)
+    )
+"""
+
+LEGACY_ROWS = 40
+BATCH_SIZE = 7
+
+
+def _legacy_db() -> str:
+    """旧版本数据库：40 个请求（最后一个已删除）和旧格式的墓碑"""
+    db_file = os.path.join(tempfile.mkdtemp(), "review.db")
+    with sqlite3.connect(db_file) as conn:
+        conn.execute(LEGACY_SCHEMA)
+        conn.execute("CREATE INDEX idx_status ON review_requests(status)")
+        for i in range(LEGACY_ROWS):
+            conn.execute(
+                "INSERT INTO review_requests (cdn_url, media_name, media_type, emby_path, created_at) "
+                "VALUES (?, ?, 'Movie', ?, ?)",
+                (f"https://cdn.example.com/旧/{i}.mkv", f"旧片{i:02d}", f"/media/旧/{i}.mkv",
+                 f"2025-01-01 00:00:{i:02d}")
+            )
+        conn.execute("DELETE FROM review_requests WHERE id = ?", (LEGACY_ROWS,))
+        conn.execute("""
+            CREATE TABLE review_tombstones (
+                cdn_url TEXT PRIMARY KEY,
+                request_id INTEGER NOT NULL,
+                status TEXT NOT NULL,
+                archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        for i in range(10):
+            conn.execute(
+                "INSERT INTO review_tombstones (cdn_url, request_id, status) VALUES (?, ?, 'approved')",
+                (f"https://cdn.example.com/已归档/{i}.mkv", 100 + i)
+            )
+    return db_file
+
+
+def _runner(db_file: str, migration_list=MIGRATIONS) -> MigrationRunner:
+    return MigrationRunner(db_file, migration_list, batch_size=BATCH_SIZE, pause=0,
+                           connect=_connect_for_migration)
+
+
+def _schema_version(db_file: str) -> dict:
+    with sqlite3.connect(db_file) as conn:
+        return {row[0]: row[1:] for row in conn.execute(
+            "SELECT version, backfill_cursor, backfill_end, applied_at FROM schema_version"
+        )}
+
+
+def _assert_upgraded(db_file: str):
+    """旧数据全部回填，约束和索引已更新"""
+    with sqlite3.connect(db_file) as conn:
+        rows = conn.execute(
+            "SELECT id, cdn_url, url_hash, notified_at, created_at FROM review_requests ORDER BY id"
+        ).fetchall()
+        assert [row[0] for row in rows] == list(range(1, LEGACY_ROWS))
+        assert all(row[2] == url_hash(row[1]) for row in rows)
+        assert all(row[3] == row[4] for row in rows)
+
+        names = {row[0] for row in conn.execute("SELECT name FROM sqlite_master")}
+        assert not any(name.startswith("sqlite_autoindex_review_requests") for name in names)
+        assert "idx_status" not in names and "idx_url_hash" in names
+        assert not {"review_requests_rebuild", "review_tombstones_old"} & names
+        assert conn.execute("SELECT COUNT(*) FROM review_tombstones").fetchone()[0] == 10
+        assert conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'review_requests'").fetchone()[0] \
+            == LEGACY_ROWS
+
+
+def test_fresh_database_records_versions():
+    """新数据库记录全部版本，再次初始化不重复执行"""
+    db = ReviewDatabase(os.path.join(tempfile.mkdtemp(), "review.db"))
+    versions = [migration.version for migration in MIGRATIONS]
+    assert versions == sorted(set(versions))
+
+    runner = _runner(db.db_file)
+    assert runner.applied_versions() == versions
+    assert runner.run() == []
+    assert all(row[0] is None for row in _schema_version(db.db_file).values())
+    print("✅ 版本记录测试通过")
+
+
+def test_legacy_upgrade_in_batches():
+    """旧数据库分段升级：每段不超过 batch_size 行，升级后功能正常"""
+    db_file = _legacy_db()
+    ranges = []
+
+    def tracked(migration: Migration) -> Migration:
+        def backfill(cursor, start, end):
+            ranges.append((migration.version, start, end))
+            migration.backfill(cursor, start, end)
+        return Migration(migration.version, migration.description, migration.apply,
+                         backfill if migration.backfill else None, migration.finalize,
+                         migration.table, migration.key)
+
+    _runner(db_file, [tracked(migration) for migration in MIGRATIONS]).run()
+    _assert_upgraded(db_file)
+
+    assert all(end - start <= BATCH_SIZE for _, start, end in ranges)
+    # notified_at、url_hash、重建表和全文索引按请求 ID 分段，墓碑按 rowid 分段
+    assert sorted({version for version, _, _ in ranges}) == [3, 4, 5, 9, 10]
+    assert [end for version, _, end in ranges if version == 4][-1] == LEGACY_ROWS - 1
+
+    db = ReviewDatabase(db_file)
+    assert db.search_enabled
+    assert [row["media_name"] for row in db.search_requests("旧片07")["items"]] == ["旧片07"]
+    assert db.add_review_request("https://cdn.example.com/旧/3.mkv", "重复", "Movie") is None
+    assert db.add_review_request("https://cdn.example.com/已归档/3.mkv", "已归档", "Movie") is None
+    assert db.add_review_request("https://cdn.example.com/新.mkv", "新", "Movie") == LEGACY_ROWS + 1
+    assert db.count_unnotified_requests() == 1
+    print("✅ 分段升级测试通过")
+
+
+def test_resume_after_interruption():
+    """回填中途退出后，下次启动从记录的进度继续，已完成的段不再执行"""
+    db_file = _legacy_db()
+    calls = []
+
+    def crashing_backfill(cursor, start, end):
+        if len(calls) == 2:
+            raise RuntimeError("模拟进程退出")
+        calls.append(start)
+        MIGRATIONS[3].backfill(cursor, start, end)
+
+    crashing = list(MIGRATIONS)
+    crashing[3] = Migration(4, MIGRATIONS[3].description, MIGRATIONS[3].apply, crashing_backfill)
+    try:
+        _runner(db_file, crashing).run()
+        assert False
+    except RuntimeError:
+        pass
+
+    assert _schema_version(db_file)[4] == (2 * BATCH_SIZE, LEGACY_ROWS - 1, None)
+    with sqlite3.connect(db_file) as conn:
+        hashed = conn.execute("SELECT COUNT(*) FROM review_requests WHERE url_hash IS NOT NULL").fetchone()[0]
+    assert hashed == 2 * BATCH_SIZE
+
+    resumed = []
+
+    def resumed_backfill(cursor, start, end):
+        resumed.append(start)
+        MIGRATIONS[3].backfill(cursor, start, end)
+
+    crashing[3] = Migration(4, MIGRATIONS[3].description, MIGRATIONS[3].apply, resumed_backfill)
+    _runner(db_file, crashing).run()
+    assert resumed[0] == 2 * BATCH_SIZE
+    _assert_upgraded(db_file)
+    print("✅ 中断后继续测试通过")
+
+
+def test_writes_during_online_rebuild():
+    """重建表的分段之间其他连接写入：已复制行的修改、删除和新插入的行都保留"""
+    db_file = _legacy_db()
+    state = {"done": False}
+
+    def webhook_writes(seconds):
+        # 段之间让出写锁时，模拟其他 worker 的写入
+        if state["done"]:
+            return
+        with sqlite3.connect(db_file) as conn:
+            copied = conn.execute(
+                "SELECT COUNT(*) FROM sqlite_master WHERE name = 'review_requests_rebuild'"
+            ).fetchone()[0] and conn.execute("SELECT COUNT(*) FROM review_requests_rebuild").fetchone()[0]
+            if not copied:
+                return
+            conn.execute("UPDATE review_requests SET status = 'approved', reviewed_by = 'tester' WHERE id = 1")
+            conn.execute("DELETE FROM review_requests WHERE id = 2")
+            conn.execute("UPDATE review_requests SET status = 'rejected' WHERE id = 30")
+            conn.execute(
+                "INSERT INTO review_requests (cdn_url, media_name, media_type, url_hash, notified_at) "
+                "VALUES (?, '新片', 'Movie', ?, CURRENT_TIMESTAMP)",
+                ("https://cdn.example.com/新片.mkv", url_hash("https://cdn.example.com/新片.mkv"))
+            )
+        state["done"] = True
+
+    original_sleep = migrations.time.sleep
+    migrations.time.sleep = webhook_writes
+    try:
+        _runner(db_file).run()
+    finally:
+        migrations.time.sleep = original_sleep
+
+    assert state["done"]
+    db = ReviewDatabase(db_file)
+    assert db.get_request_by_id(1)["reviewed_by"] == "tester"
+    assert db.get_request_by_id(2) is None
+    assert db.get_request_by_id(30)["status"] == "rejected"
+    assert db.get_request_by_id(LEGACY_ROWS + 1)["media_name"] == "新片"
+    assert db.get_statistics() == {"pending": 37, "approved": 1, "rejected": 1, "expired": 0, "total": 39}
+    print("✅ 在线重建并发写入测试通过")
+
+
+def test_concurrent_workers():
+    """多个 worker 同时启动时共同完成迁移，每段只执行一次"""
+    db_file = _legacy_db()
+    errors = []
+
+    def worker():
+        try:
+            _runner(db_file).run()
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    _assert_upgraded(db_file)
+    assert all(row[2] for row in _schema_version(db_file).values())
+    print("✅ 多 worker 并发迁移测试通过")
+
+
+if __name__ == "__main__":
+    try:
+        test_fresh_database_records_versions()
+        test_legacy_upgrade_in_batches()
+        test_resume_after_interruption()
+        test_writes_during_online_rebuild()
+        test_concurrent_workers()
+    except AssertionError:
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
@@ -0,0 +1,97 @@
+"""
+测试多 worker 部署：Leader 选举与数据库推送队列
+
+不依赖运行中的服务，使用临时文件
+"""
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+_tmp_dir = tempfile.mkdtemp()
+os.environ.setdefault("DB_FILE", os.path.join(_tmp_dir, "preheat_review.db"))
+
+from database import ReviewDatabase
+from leader import LeaderElection
+
+
+def test_only_one_leader():
+    """同一把锁只能被一个选举者持有，释放后其他人可以接管"""
+    lock_file = os.path.join(tempfile.mkdtemp(), "leader.lock")
+    first = LeaderElection(lock_file, retry_interval=0.1)
+    second = LeaderElection(lock_file, retry_interval=0.1)
+
+    assert first.try_acquire()
+    assert not second.try_acquire()
+    assert first.is_leader and not second.is_leader
+
+    first.release()
+    assert second.try_acquire()
+    second.release()
+    print("\n✅ Leader 互斥测试通过")
+
+
+def test_failover_when_leader_dies():
+    """Leader 进程退出后锁自动释放"""
+    lock_file = os.path.join(tempfile.mkdtemp(), "leader.lock")
+    holder = subprocess.Popen(
+        [sys.executable, "-c",
+         "import sys, time; from leader import LeaderElection; "
+         f"assert LeaderElection({lock_file!r}).try_acquire(); print('ok', flush=True); time.sleep(60)"],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        stdout=subprocess.PIPE
+    )
+    try:
+        assert holder.stdout.readline().strip() == b"ok"
+        follower = LeaderElection(lock_file, retry_interval=0.1)
+        assert not follower.try_acquire()
+
+        holder.kill()
+        holder.wait()
+        deadline = time.time() + 5
+        while not follower.try_acquire() and time.time() < deadline:
+            time.sleep(0.1)
+        assert follower.is_leader
+        follower.release()
+    finally:
+        if holder.poll() is None:
+            holder.kill()
+    print("✅ Leader 故障接管测试通过")
+
+
+def test_database_push_queue():
+    """Webhook 只写数据库，Leader 按批取出且不会重复推送"""
+    db = ReviewDatabase(os.path.join(tempfile.mkdtemp(), "review.db"))
+    for i in range(5):
+        db.add_review_request(f"https://cdn.example.com/电影/{i}.mkv", f"电影{i}", "Movie")
+
+    # 收集中的剧集分组不参与普通推送
+    group_id = db.get_or_create_review_group("/media/剧集/黑镜/Season 01", "黑镜", "Episode", 300)
+    db.add_review_request("https://cdn.example.com/剧集/黑镜/S01E01.mkv", "黑镜", "Episode", group_id=group_id)
+
+    assert db.count_unnotified_requests() == 5
+    first = db.claim_unnotified_requests(3)
+    assert [r['media_name'] for r in first] == ["电影0", "电影1", "电影2"]
+    assert db.count_unnotified_requests() == 2
+
+    db.release_unnotified_requests([first[0]['id']])
+    second = db.claim_unnotified_requests(10)
+    assert [r['media_name'] for r in second] == ["电影0", "电影3", "电影4"]
+    assert db.claim_unnotified_requests(10) == []
+
+    # 分组关闭后其中的剧集随分组消息推送，不再单独推送
+    assert db.close_review_group(group_id)
+    assert db.count_unnotified_requests() == 0
+    print("✅ 数据库推送队列测试通过")
+
+
+if __name__ == "__main__":
+    try:
+        test_only_one_leader()
+        test_failover_when_leader_dies()
+        test_database_push_queue()
+    except AssertionError:
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
@@ -0,0 +1,104 @@
+"""
+测试待审核列表的键集分页与分页 API
+
+不依赖运行中的服务，使用临时数据库
+"""
+import os
+import sqlite3
+import sys
+import tempfile
+
+_tmp_dir = tempfile.mkdtemp()
+os.environ.setdefault("DB_FILE", os.path.join(_tmp_dir, "preheat_review.db"))
+
+from database import ReviewDatabase
+
+
+def _new_db(pending: int = 25) -> ReviewDatabase:
+    db = ReviewDatabase(os.path.join(tempfile.mkdtemp(), "review.db"))
+    for i in range(pending):
+        db.add_review_request(f"https://cdn.example.com/电影/{i}.mkv", f"电影{i}", "Movie")
+    return db
+
+
+def test_walk_pages_forward_and_back():
+    """逐页向后翻到底再向前翻回，不重复、不遗漏（创建时间相同时按 ID 排序）"""
+    db = _new_db(25)
+    db.approve_request(5, "tester")
+
+    pages = [db.get_requests_page("pending", limit=10)]
+    while pages[-1]["next_cursor"] is not None:
+        pages.append(db.get_requests_page("pending", limit=10, cursor=pages[-1]["next_cursor"]))
+
+    ids = [item["id"] for page in pages for item in page["items"]]
+    assert ids == [i for i in range(25, 0, -1) if i != 5]
+    assert [len(page["items"]) for page in pages] == [10, 10, 4]
+    assert pages[0]["prev_cursor"] is None
+
+    back = db.get_requests_page("pending", limit=10, cursor=pages[2]["prev_cursor"], direction="prev")
+    assert back["items"] == pages[1]["items"]
+    back = db.get_requests_page("pending", limit=10, cursor=back["prev_cursor"], direction="prev")
+    assert back["items"] == pages[0]["items"]
+    assert back["prev_cursor"] is None
+    print("✅ 键集分页测试通过")
+
+
+def test_page_query_plan():
+    """翻页查询走 (status, created_at) 索引，不排序"""
+    db = _new_db(1)
+    with sqlite3.connect(db.db_file) as conn:
+        plan = " ".join(row[3] for row in conn.execute("""
+            EXPLAIN QUERY PLAN
+            SELECT * FROM review_requests
+            WHERE status = 'pending' AND (created_at, id) < ('2026-01-01', 1)
+            ORDER BY created_at DESC, id DESC
+            LIMIT 11
+        """))
+    assert "idx_status_created_at" in plan
+    assert "TEMP B-TREE" not in plan
+    print("✅ 分页查询计划测试通过")
+
+
+def test_invalid_cursor():
+    """游标不存在时报错"""
+    db = _new_db(3)
+    try:
+        db.get_requests_page("pending", cursor=999)
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("未对无效游标报错")
+    print("✅ 无效游标测试通过")
+
+
+def test_list_api():
+    """HTTP 分页接口"""
+    from fastapi.testclient import TestClient
+    import webhook_server
+
+    for i in range(5):
+        webhook_server.db.add_review_request(f"https://cdn.example.com/api/{i}.mkv", f"接口{i}", "Movie")
+
+    client = TestClient(webhook_server.app)
+    first = client.get("/api/requests", params={"limit": 2}).json()
+    assert first["count"] == 2 and first["next_cursor"] is not None
+
+    second = client.get("/api/requests", params={"limit": 2, "cursor": first["next_cursor"]}).json()
+    assert {i["id"] for i in first["items"]}.isdisjoint(i["id"] for i in second["items"])
+    assert second["prev_cursor"] == second["items"][0]["id"]
+
+    assert client.get("/api/requests", params={"status": "unknown"}).status_code == 400
+    assert client.get("/api/requests", params={"cursor": 999999}).status_code == 400
+    print("✅ 分页接口测试通过")
+
+
+if __name__ == "__main__":
+    try:
+        test_walk_pages_forward_and_back()
+        test_page_query_plan()
+        test_invalid_cursor()
+        test_list_api()
+    except AssertionError:
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
@@ -0,0 +1,126 @@
+"""
+测试预热记录：时间窗口内跳过重复提交、批内去重、持久化与内存缓存
+
+不依赖运行中的服务和腾讯云 API，使用临时数据库
+"""
+import asyncio
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+_tmp_dir = tempfile.mkdtemp()
+os.environ.setdefault("DB_FILE", os.path.join(_tmp_dir, "preheat_review.db"))
+
+from cdn_preheat import CDNPreheatService
+from database import ReviewDatabase, url_hash
+from preheat_history import PreheatHistory
+
+URLS = [f"https://cdn.example.com/剧集/某剧/Season 01/某剧 S01E{i:02d}.mkv" for i in range(1, 7)]
+
+
+def _new_db() -> ReviewDatabase:
+    return ReviewDatabase(os.path.join(tempfile.mkdtemp(), "review.db"))
+
+
+def test_filter_and_record():
+    """已记录的 URL 在窗口内跳过，批内重复的 URL 只提交一次"""
+    db = _new_db()
+    history = PreheatHistory(db.db_file, freshness_seconds=3600)
+    history.record(URLS[:2], "task-1")
+
+    batch = [URLS[0], URLS[2], URLS[2].replace("https://cdn", "HTTPS://CDN"), URLS[1], URLS[3]]
+    to_push, skipped = history.filter_fresh(batch)
+    assert to_push == [URLS[2], URLS[3]]
+    assert skipped == [batch[0], batch[2], batch[3]]
+
+    # 新实例（如 Leader 切换后）从数据库读取记录
+    restarted = PreheatHistory(db.db_file, freshness_seconds=3600)
+    assert restarted.filter_fresh(URLS[:3]) == ([URLS[2]], URLS[:2])
+    with sqlite3.connect(db.db_file) as conn:
+        assert conn.execute("SELECT task_id FROM preheat_history WHERE url_hash = ?",
+                            (url_hash(URLS[0]),)).fetchone() == ("task-1",)
+
+    # 超过时间窗口后重新提交
+    with sqlite3.connect(db.db_file) as conn:
+        conn.execute("UPDATE preheat_history SET pushed_at = ?", (time.time() - 7200,))
+    assert PreheatHistory(db.db_file, freshness_seconds=3600).filter_fresh(URLS[:2]) == (URLS[:2], [])
+
+    # 窗口为 0 时不过滤也不记录
+    disabled = PreheatHistory(db.db_file, freshness_seconds=0)
+    disabled.record(URLS[4:], "task-2")
+    assert disabled.filter_fresh([URLS[0], URLS[0]]) == ([URLS[0], URLS[0]], [])
+    print("✅ 预热记录过滤测试通过")
+
+
+def test_hash_collision_and_memory_only():
+    """哈希相同但 URL 不同的记录不会误跳过；没有数据库时只使用内存缓存"""
+    db = _new_db()
+    with sqlite3.connect(db.db_file) as conn:
+        conn.execute(
+            "INSERT INTO preheat_history (url_hash, cdn_url, pushed_at) VALUES (?, ?, ?)",
+            (url_hash(URLS[0]), "https://cdn.example.com/碰撞.mkv", time.time())
+        )
+    history = PreheatHistory(db.db_file, freshness_seconds=3600)
+    assert history.filter_fresh([URLS[0]]) == ([URLS[0]], [])
+
+    memory = PreheatHistory(None, freshness_seconds=3600, cache_size=2)
+    memory.record(URLS[:3])
+    # 缓存只保留最近的 2 条
+    assert memory.filter_fresh(URLS[:3]) == ([URLS[0]], URLS[1:3])
+    print("✅ 哈希碰撞与内存模式测试通过")
+
+
+def _service(db: ReviewDatabase):
+    """API 调用替换为记录提交内容的桩函数"""
+    service = CDNPreheatService()
+    service.enabled = True
+    service.provider = object()
+    service.batch_size = 2
+    service._history = PreheatHistory(db.db_file, freshness_seconds=3600)
+    calls = []
+
+    async def fake_api(urls):
+        calls.append(urls)
+        if any("fail" in url for url in urls):
+            return {"success": False, "message": "模拟失败", "urls": urls, "task_id": None}
+        return {"success": True, "message": "预热任务已提交", "urls": urls, "task_id": f"task-{len(calls)}"}
+
+    service._submit = fake_api
+    return service, calls
+
+
+def test_service_skips_recent_urls():
+    """预热服务在调用 PushUrlsCache 之前过滤重复提交，提交失败的 URL 不记录"""
+    service, calls = _service(_new_db())
+
+    first = asyncio.run(service.preheat_url(URLS[0]))
+    assert first["task_id"] == "task-1" and first["skipped"] == []
+
+    again = asyncio.run(service.preheat_url(URLS[0]))
+    assert again["success"] and again["task_id"] is None and again["skipped"] == [URLS[0]]
+    assert len(calls) == 1
+
+    # 分批之前整体过滤：已提交的 URL 和重复 URL 跳过，其余按批提交
+    results = asyncio.run(service.preheat_batch(URLS[:4] + [URLS[1]]))
+    assert results[0]["skipped"] == [URLS[0], URLS[1]]
+    assert calls[1:] == [service.encode_urls(URLS[1:3]), service.encode_urls([URLS[3]])]
+    assert [r["task_id"] for r in results] == [None, "task-2", "task-3"]
+
+    failed_url = "https://cdn.example.com/电影/fail.mkv"
+    assert not asyncio.run(service.preheat_url(failed_url))["success"]
+    assert not asyncio.run(service.preheat_url(failed_url))["success"]
+    assert calls[-2:] == [service.encode_urls([failed_url])] * 2
+    print("✅ 预热服务去重测试通过")
+
+
+if __name__ == "__main__":
+    try:
+        test_filter_and_record()
+        test_hash_collision_and_memory_only()
+        test_service_skips_recent_urls()
+    except AssertionError:
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
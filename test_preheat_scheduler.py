@@ -0,0 +1,247 @@
+"""
+测试按配额调度的预热队列：持久化队列、配额缓存与扣减、匀速提交、配额用完后顺延、
+优先级与媒体库轮流
+
+不依赖运行中的服务和腾讯云 API，使用临时数据库
+"""
+import asyncio
+import os
+import sys
+import sqlite3
+import tempfile
+import time
+from datetime import datetime, timezone
+
+_tmp_dir = tempfile.mkdtemp()
+os.environ.setdefault("DB_FILE", os.path.join(_tmp_dir, "preheat_review.db"))
+
+from cdn_preheat import CDNPreheatService
+from database import ReviewDatabase
+from preheat_history import PreheatHistory
+from preheat_scheduler import PreheatQueue, PreheatScheduler, PushQuota, library_of, request_priority
+
+URLS = [f"https://cdn.example.com/剧集/某剧/Season 01/某剧 S01E{i:02d}.mkv" for i in range(1, 41)]
+
+# 北京时间 2024-06-01 00:00（配额重置时间）
+RESET_AT = 1717171200
+
+
+def _new_db() -> ReviewDatabase:
+    return ReviewDatabase(os.path.join(tempfile.mkdtemp(), "review.db"))
+
+
+def _service(db: ReviewDatabase, quotas):
+    """API 调用替换为桩函数：quotas 依次作为 DescribePushQuota 的返回值"""
+    service = CDNPreheatService()
+    service.enabled = True
+    service.provider = object()
+    service.batch_size = 4
+    service._history = PreheatHistory(db.db_file, freshness_seconds=3600)
+    service.calls = []
+    service.quota_exceeded = False
+
+    def fake_quota(area="mainland"):
+        return quotas.pop(0)
+
+    async def fake_api(urls):
+        if service.quota_exceeded:
+            return {"success": False, "message": "超出每日限额", "urls": urls, "task_id": None,
+                    "error_code": "LimitExceeded.CdnPushExceedDayLimit"}
+        service.calls.append(urls)
+        if any("fail" in url for url in urls):
+            return {"success": False, "message": "模拟失败", "urls": urls, "task_id": None}
+        return {"success": True, "message": "预热任务已提交", "urls": urls, "task_id": f"task-{len(service.calls)}"}
+
+    service.get_push_quota = fake_quota
+    service._submit = fake_api
+    return service
+
+
+def _quota(total, available, batch=20):
+    return {"success": True, "area": "mainland", "total": total, "available": available, "batch": batch}
+
+
+def test_push_quota():
+    """配额按北京时间零点重置，缓存期内按本地提交数量扣减，查询失败时按每日配额估算"""
+    quota = PushQuota(fallback_total=500, refresh_seconds=600, reset_utc_offset=8)
+    assert quota.next_reset(RESET_AT - 1) == RESET_AT
+    assert quota.next_reset(RESET_AT) == RESET_AT + 86400
+    assert quota.stale(RESET_AT - 3600) and quota.remaining(RESET_AT - 3600) == 0
+
+    now = RESET_AT - 3600
+    quota.update(_quota(1000, 300), now)
+    quota.consume(100)
+    assert quota.remaining(now) == 200 and not quota.stale(now + 599)
+    assert quota.stale(now + 600)
+    assert quota.seconds_until_reset(now) == 3600
+
+    quota.exhaust()
+    assert quota.remaining(now) == 0
+    # 过了重置时间，重新查询前按每日总量计算
+    assert quota.stale(RESET_AT) and quota.remaining(RESET_AT) == 1000
+
+    # 查询失败：重置前沿用本地扣减，从未查询成功时使用 fallback_total
+    quota.update({"success": False, "message": "无权限"}, now + 60)
+    assert quota.remaining(now + 60) == 0
+    fresh = PushQuota(fallback_total=500, refresh_seconds=600, reset_utc_offset=8)
+    fresh.update({"success": False, "message": "无权限"}, now)
+    assert fresh.remaining(now) == 500
+    print("✅ 预热配额测试通过")
+
+
+def test_queue_persistence_and_order():
+    """队列保存在数据库中，按优先级和入队顺序出队，同一 URL 只保留一条"""
+    db = _new_db()
+    queue = PreheatQueue(db.db_file)
+    assert queue.push([(url, 0) for url in URLS[:3]]) == 3
+    assert queue.push([(url, 0) for url in URLS[1:4]]) == 1
+    assert queue.push([(URLS[2], 5), (URLS[0], -1)]) == 0
+
+    reopened = PreheatQueue(db.db_file)
+    entries = reopened.peek(10)
+    assert [e["cdn_url"] for e in entries] == [URLS[2], URLS[0], URLS[1], URLS[3]]
+    assert reopened.depth() == 4
+
+    ids = [entries[0]["id"]]
+    assert reopened.mark_failed(ids, max_attempts=2) == []
+    assert reopened.mark_failed(ids, max_attempts=2) == [URLS[2]]
+    reopened.remove([entries[1]["id"]])
+    assert [e["cdn_url"] for e in queue.peek(10)] == [URLS[1], URLS[3]]
+    print("✅ 预热队列持久化测试通过")
+
+
+def test_spreads_quota_across_day():
+    """启动时立即提交 burst 个，此后按剩余配额 / 距离重置的时间匀速提交"""
+    db = _new_db()
+    service = _service(db, [_quota(1000, 1000, batch=3)])
+    scheduler = PreheatScheduler(service, PreheatQueue(db.db_file), PushQuota(), burst=5, pause=0)
+    queued = scheduler.enqueue(URLS)
+    assert queued["queued"] == 40 and queued["depth"] == 40
+
+    # 距离重置 2.4 小时
+    now = RESET_AT - 8640
+    stats = asyncio.run(scheduler.drain_once(now))
+    assert stats["submitted"] == 5 and stats["depth"] == 35
+    # 单次提交数量不超过配额返回的 batch
+    assert [len(urls) for urls in service.calls] == [3, 2]
+
+    # 60 秒后：995 * 60 / 8580 ≈ 6.96 个
+    stats = asyncio.run(scheduler.drain_once(now + 60))
+    assert stats["submitted"] == 6 and scheduler.quota.remaining(now + 60) == 989
+
+    # 已提交的 URL 不会再次入队
+    assert scheduler.enqueue(URLS[:2]) == {"queued": 0, "skipped": URLS[:2], "targets": 2, "depth": 29}
+    print("✅ 匀速提交测试通过")
+
+
+def test_carry_over_after_quota_exhausted():
+    """配额用完时 URL 留在队列中，配额重置后继续提交；其他失败超过次数后移出队列"""
+    db = _new_db()
+    service = _service(db, [_quota(1000, 3), _quota(1000, 1000)])
+    scheduler = PreheatScheduler(service, PreheatQueue(db.db_file), PushQuota(), burst=10,
+                                 max_attempts=2, pause=0)
+    scheduler.enqueue(URLS[:8])
+
+    now = RESET_AT - 600
+    stats = asyncio.run(scheduler.drain_once(now))
+    assert stats["submitted"] == 3 and stats["depth"] == 5
+    # 配额用完后不再调用 API
+    stats = asyncio.run(scheduler.drain_once(now + 60))
+    assert stats["submitted"] == 0 and len(service.calls) == 1
+
+    # API 报告超出每日限额：不计失败次数，留到重置后
+    scheduler.quota.available = 100
+    service.quota_exceeded = True
+    stats = asyncio.run(scheduler.drain_once(now + 120))
+    assert stats == {"submitted": 0, "skipped": 0, "failed": 0, "dropped": 0, "purged": 0, "depth": 5}
+    assert scheduler.quota.remaining(now + 120) == 0
+
+    # 配额重置后重新查询，剩余的 URL 全部提交
+    service.quota_exceeded = False
+    stats = asyncio.run(scheduler.drain_once(RESET_AT + 60))
+    assert stats["submitted"] == 5 and stats["depth"] == 0
+    assert sum(service.calls, []) == service.encode_urls(URLS[:8])
+
+    # 非配额原因的失败：达到次数后移出队列
+    scheduler.enqueue(["https://cdn.example.com/电影/fail.mkv"])
+    assert asyncio.run(scheduler.drain_once(RESET_AT + 120))["failed"] == 1
+    stats = asyncio.run(scheduler.drain_once(RESET_AT + 180))
+    assert stats["dropped"] == 1 and stats["depth"] == 0
+    print("✅ 配额顺延测试通过")
+
+
+def _created_at(seconds_ago: float) -> str:
+    return datetime.fromtimestamp(time.time() - seconds_ago, timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def test_request_priority():
+    """媒体类型、入库时间、连载热度分别加分"""
+    now = time.time()
+    new_episode = {"media_type": "Episode", "created_at": _created_at(0)}
+    old_movie = {"media_type": "Movie", "created_at": _created_at(30 * 86400)}
+    assert request_priority(new_episode, now=now) == 20 + 50
+    assert request_priority({**new_episode, "created_at": _created_at(3.5 * 86400)}, now=now) == 20 + 25
+    assert request_priority(old_movie, now=now) == 10
+    assert request_priority({"media_type": "Audio", "created_at": None}, now=now) == 0
+    # 同一季第二次、第五次入库
+    assert request_priority(new_episode, group_count=2, now=now) == 20 + 50 + 10
+    assert request_priority(new_episode, group_count=5, now=now) == 20 + 50 + 30
+
+    assert library_of("https://cdn.example.com/剧集/某剧/a.mkv") == "剧集"
+    assert library_of("https://cdn.example.com/a.mkv") == ""
+    print("✅ 优先级分值测试通过")
+
+
+def test_priority_and_fair_sharing():
+    """新剧集排在旧片库补录前面，各媒体库轮流提交，管理员可以提升优先级"""
+    db = _new_db()
+    queue = PreheatQueue(db.db_file)
+    scheduler = PreheatScheduler(_service(db, []), queue, PushQuota(), pause=0)
+
+    backfill = [
+        {"cdn_url": f"https://cdn.example.com/电影/旧片{i}/旧片{i}.mkv", "media_type": "Movie",
+         "created_at": _created_at(60 * 86400)}
+        for i in range(6)
+    ]
+    scheduler.enqueue_requests(backfill)
+    scheduler.enqueue([f"https://cdn.example.com/纪录片/片{i}.mkv" for i in range(2)])
+
+    # 同一季第二次入库的新剧集
+    with sqlite3.connect(db.db_file) as conn:
+        for _ in range(2):
+            conn.execute("INSERT INTO review_groups (group_key, title, media_type, closes_at) "
+                         "VALUES ('/media/剧集/新剧/Season 01', '新剧', 'Episode', 0)")
+        group_id = conn.execute("SELECT MAX(id) FROM review_groups").fetchone()[0]
+    episodes = [
+        {"cdn_url": URLS[i], "media_type": "Episode", "created_at": _created_at(60), "group_id": group_id}
+        for i in range(3)
+    ]
+    scheduler.enqueue_requests(episodes)
+
+    order = [entry["cdn_url"] for entry in queue.peek(8)]
+    # 每一轮各媒体库取一条，轮内按分值排序：剧集(80) > 电影(10) > 纪录片(0)
+    assert order == [
+        URLS[0], backfill[0]["cdn_url"], "https://cdn.example.com/纪录片/片0.mkv",
+        URLS[1], backfill[1]["cdn_url"], "https://cdn.example.com/纪录片/片1.mkv",
+        URLS[2], backfill[2]["cdn_url"],
+    ]
+    assert [entry["priority"] for entry in queue.peek(2)] == [80, 10]
+
+    assert queue.boost(backfill[5]["cdn_url"], 1000)
+    assert not queue.boost("https://cdn.example.com/电影/不存在.mkv", 1000)
+    assert queue.peek(1)[0]["cdn_url"] == backfill[5]["cdn_url"]
+    print("✅ 优先级与媒体库轮流测试通过")
+
+
+if __name__ == "__main__":
+    try:
+        test_push_quota()
+        test_queue_persistence_and_order()
+        test_spreads_quota_across_day()
+        test_carry_over_after_quota_exhausted()
+        test_request_priority()
+        test_priority_and_fair_sharing()
+    except AssertionError:
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
@@ -0,0 +1,127 @@
+"""
+测试审核记录归档：移入归档库、墓碑去重与增量 VACUUM
+
+不依赖运行中的服务，使用临时数据库
+"""
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+_tmp_dir = tempfile.mkdtemp()
+os.environ.setdefault("DB_FILE", os.path.join(_tmp_dir, "preheat_review.db"))
+
+from database import ReviewDatabase
+from retention import ReviewArchive, enable_incremental_vacuum
+
+
+def _set_reviewed_at(db: ReviewDatabase, request_ids, days_ago: int):
+    reviewed_at = (datetime.now() - timedelta(days=days_ago)).isoformat()
+    with sqlite3.connect(db.db_file) as conn:
+        marks = ",".join("?" * len(request_ids))
+        conn.execute(f"UPDATE review_requests SET reviewed_at = ? WHERE id IN ({marks})", [reviewed_at, *request_ids])
+
+
+def _pragma(db_file: str, name: str) -> int:
+    with sqlite3.connect(db_file) as conn:
+        return conn.execute(f"PRAGMA {name}").fetchone()[0]
+
+
+def test_archive_old_reviewed_requests():
+    """超过保留期的已审核请求移入归档库，墓碑阻止重复创建"""
+    work_dir = tempfile.mkdtemp()
+    db = ReviewDatabase(os.path.join(work_dir, "review.db"))
+    archive = ReviewArchive(db.db_file, os.path.join(work_dir, "archive.db"))
+
+    media_info = {"production_year": 2024, "overview": "简介" * 50}
+    ids = [
+        db.add_review_request(f"https://cdn.example.com/归档/{i}.mkv", f"归档{i}", "Movie", media_info=media_info)
+        for i in range(6)
+    ]
+    for request_id in ids[:4]:
+        db.approve_request(request_id, "tester")
+    db.reject_request(ids[4], "tester")
+    db.add_review_messages(100, 1, ids[:2])
+    _set_reviewed_at(db, ids[:3] + [ids[4]], 120)
+
+    result = archive.run(retention_days=90, batch_size=2)
+    print(f"\n📊 {result}")
+    assert result["archived"] == 4
+    assert _pragma(db.db_file, "auto_vacuum") == 2
+    assert _pragma(db.db_file, "freelist_count") == 0
+
+    # 热库中只剩未超过保留期的已审核请求和待审核请求
+    assert db.get_request_by_id(ids[0]) is None
+    assert db.get_request_by_id(ids[3])['status'] == 'approved'
+    assert db.get_request_by_id(ids[5])['status'] == 'pending'
+    assert db.get_review_messages([ids[0]]) == []
+
+    archived = archive.get_archived_request(ids[4])
+    assert archived['status'] == 'rejected'
+    assert json.loads(archived['media_info']) == media_info
+    assert archive.get_statistics() == {"archived": 4}
+
+    # 归档后同一 URL 的 Webhook 不会再次创建审核请求
+    assert db.add_review_request("https://cdn.example.com/归档/0.mkv", "归档0", "Movie") is None
+
+    # 重复执行不会产生重复数据
+    assert archive.run(retention_days=90, batch_size=2)["archived"] == 0
+    print("✅ 归档测试通过")
+
+
+def test_vacuum_returns_free_pages():
+    """旧数据库归档时不执行完整 VACUUM；离线切换为增量 VACUUM 后归档删除可以归还空闲页"""
+    work_dir = tempfile.mkdtemp()
+    db_file = os.path.join(work_dir, "review.db")
+
+    # 模拟未启用增量 VACUUM 的旧数据库
+    with sqlite3.connect(db_file) as conn:
+        conn.execute("CREATE TABLE legacy_marker (id INTEGER)")
+    db = ReviewDatabase(db_file)
+    assert _pragma(db_file, "auto_vacuum") == 0
+
+    def add_requests(prefix: str):
+        ids = [
+            db.add_review_request(f"https://cdn.example.com/{prefix}/{i}.mkv", f"{prefix}{i}", "Movie",
+                                  media_info={"overview": "x" * 2000})
+            for i in range(300)
+        ]
+        for request_id in ids:
+            db.approve_request(request_id, "tester")
+        _set_reviewed_at(db, ids, 120)
+
+    add_requests("空间")
+    pages_before = _pragma(db_file, "page_count")
+
+    # 运行中的服务只做增量 VACUUM，不会重写旧数据库
+    archive = ReviewArchive(db_file, os.path.join(work_dir, "archive.db"))
+    result = archive.run(retention_days=90, batch_size=100)
+    assert result["archived"] == 300 and result["pages_freed"] == 0
+    assert _pragma(db_file, "auto_vacuum") == 0
+    assert _pragma(db_file, "page_count") >= pages_before
+    assert _pragma(db_file, "freelist_count") > 0
+
+    # 离线切换后空闲页立即归还，之后的归档使用增量 VACUUM
+    assert enable_incremental_vacuum(db_file) > 0
+    assert _pragma(db_file, "auto_vacuum") == 2
+    assert enable_incremental_vacuum(db_file) == 0
+
+    add_requests("回收")
+    pages_before = _pragma(db_file, "page_count")
+    result = archive.run(retention_days=90, batch_size=100)
+    assert result["archived"] == 300 and result["pages_freed"] > 0
+    assert _pragma(db_file, "page_count") < pages_before
+    assert _pragma(db_file, "freelist_count") == 0
+    print("✅ 增量 VACUUM 测试通过")
+
+
+if __name__ == "__main__":
+    try:
+        test_archive_old_reviewed_requests()
+        test_vacuum_returns_free_pages()
+    except AssertionError:
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
@@ -0,0 +1,217 @@
+"""
+测试 CDN API 熔断和重试队列：连续故障后熔断器打开并直接失败、半开时只放行一个试探调用、
+直接提交失败的 URL 写入重试队列、指数退避加随机抖动、熔断器关闭后按批次重新提交，
+以及预热队列在熔断期间不计入失败次数
+
+CDN 使用进程内的模拟 CDN 服务（mock_cdn.py），使用临时数据库
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+_tmp_dir = tempfile.mkdtemp()
+os.environ.setdefault("DB_FILE", os.path.join(_tmp_dir, "preheat_review.db"))
+
+from cdn_accounts import DEFAULT_ACCOUNT, CDNFanout, CDNTargets
+from cdn_preheat import CDNPreheatService
+from circuit_breaker import CIRCUIT_OPEN, CLOSED, HALF_OPEN, OPEN, CircuitBreaker, is_transient_error
+from database import ReviewDatabase
+from mock_cdn import MockCDNProvider, MockCDNServer, MockCDNState
+from preheat_history import PreheatHistory
+from preheat_scheduler import PreheatQueue, PreheatScheduler, PushQuota
+from retry_queue import RetryDrainer, RetryQueue, backoff_delay
+
+URLS = [f"https://cdn.example.com/剧集/某剧/Season 01/某剧 S01E{i:02d}.mkv" for i in range(1, 7)]
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def _service(db_file: str, endpoint: str, clock: _Clock) -> CDNPreheatService:
+    service = CDNPreheatService(provider_name="mock")
+    service.enabled = True
+    service.provider = MockCDNProvider(endpoint)
+    service._history = PreheatHistory(db_file, freshness_seconds=3600)
+    service._retry_queue = RetryQueue(db_file)
+    service.breaker = CircuitBreaker(failure_threshold=2, reset_seconds=60, clock=clock)
+    return service
+
+
+def test_breaker_states():
+    """连续失败达到阈值后打开，超时后半开只放行一个试探调用，试探失败重新打开，成功关闭"""
+    clock = _Clock()
+    breaker = CircuitBreaker(failure_threshold=3, reset_seconds=60, clock=clock)
+
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == CLOSED and breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == OPEN and not breaker.allow() and breaker.retry_after() == 60
+
+    clock.now += 60
+    assert breaker.state == HALF_OPEN
+    assert breaker.allow() and not breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == OPEN
+
+    clock.now += 60
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CLOSED and breaker.allow() and breaker.failures == 0
+    print("✅ 熔断器状态测试通过")
+
+
+def test_error_classification_and_backoff():
+    """服务端错误、网络错误和频率限制计入熔断，参数错误和配额用完不计入；退避时间加随机抖动"""
+    def failed(code):
+        return {"success": False, "message": "", "error_code": code}
+
+    assert is_transient_error(failed("InternalError"))
+    assert is_transient_error(failed("RequestLimitExceeded"))
+    assert is_transient_error(failed("ConnectError"))
+    assert not is_transient_error(failed("LimitExceeded.CdnPushExceedDayLimit"))
+    assert not is_transient_error(failed("InvalidParameter.CdnUrlExceedBatchLimit"))
+    assert not is_transient_error(failed("AuthFailure.SignatureFailure"))
+    assert not is_transient_error(failed(CIRCUIT_OPEN))
+    assert not is_transient_error({"success": False, "message": "未返回预热配额"})
+
+    assert backoff_delay(0, base=10, cap=100, rand=lambda: 0) == 5
+    assert backoff_delay(0, base=10, cap=100, rand=lambda: 1) == 10
+    assert backoff_delay(3, base=10, cap=100, rand=lambda: 1) == 80
+    assert backoff_delay(10, base=10, cap=100, rand=lambda: 0.5) == 75
+    print("✅ 错误分类与退避时间测试通过")
+
+
+def test_fail_fast_and_park():
+    """API 故障时熔断器打开后直接失败，不再请求 API；直接提交失败的 URL 写入重试队列"""
+    db = ReviewDatabase(os.path.join(tempfile.mkdtemp(), "review.db"))
+    clock = _Clock()
+    state = MockCDNState(rate_limit=0, latency=0, error_rate=1.0)
+    with MockCDNServer(state) as server:
+        service = _service(db.db_file, server.endpoint, clock)
+        fanout = CDNFanout({DEFAULT_ACCOUNT: service}, CDNTargets({}, {}))
+
+        for urls in (URLS[:2], URLS[2:3]):
+            result = asyncio.run(fanout.preheat_urls(urls))
+            assert not result["success"] and result["error_code"] == "InternalError"
+            assert result["parked"] == len(urls)
+        assert service.breaker.state == OPEN and state.stats()["counts"]["PushUrlsCache"] == 2
+
+        # 熔断期间直接失败，同样写入重试队列
+        started = time.monotonic()
+        result = asyncio.run(fanout.preheat_urls(URLS[3:4]))
+        assert result["error_code"] == CIRCUIT_OPEN and result["parked"] == 1 and result["urls"]
+        assert time.monotonic() - started < 0.5
+        assert state.stats()["counts"]["PushUrlsCache"] == 2
+        assert service.retry_queue.depth() == 4
+
+        # 预热队列自己会重试，不写入重试队列
+        result = asyncio.run(service.preheat_urls(URLS[4:5]))
+        assert "parked" not in result and service.retry_queue.depth() == 4
+    print("✅ 熔断直接失败与写入重试队列测试通过")
+
+
+def test_retry_queue_backoff():
+    """到期的 URL 才会读取；再次失败时按退避时间推迟，重试次数过多移出队列"""
+    db = ReviewDatabase(os.path.join(tempfile.mkdtemp(), "review.db"))
+    queue = RetryQueue(db.db_file)
+    now = 1000.0
+    assert queue.push(URLS[:3], now=now) == 3
+    assert queue.push(URLS[:1], now=now) == 0
+
+    # 第一次重试在 15~30 秒后（各 URL 的抖动不同）
+    assert queue.due(10, now=now) == []
+    entries = {entry["cdn_url"]: entry for entry in queue.due(10, now=now + 30)}
+    assert sorted(entries) == sorted(URLS[:3])
+
+    retry = [entries[URLS[0]], entries[URLS[1]]]
+    assert queue.reschedule(retry, "InternalError", max_attempts=2, now=now + 3600) == []
+    assert [entry["cdn_url"] for entry in queue.due(10, now=now + 3600)] == URLS[2:3]
+    entries = queue.due(10, now=now + 3600 + 60)
+    assert [entry["attempts"] for entry in entries] == [0, 1, 1]
+
+    dropped = queue.reschedule(entries, "InternalError", max_attempts=2, now=now + 7200)
+    assert sorted(dropped) == sorted(URLS[:2]) and queue.depth() == 1
+    print("✅ 重试队列退避测试通过")
+
+
+def test_drain_after_recovery():
+    """熔断器打开时不重试，进入半开后第一批作为试探，成功后分批提交剩余的 URL"""
+    db = ReviewDatabase(os.path.join(tempfile.mkdtemp(), "review.db"))
+    clock = _Clock()
+    state = MockCDNState(rate_limit=0, latency=0, error_rate=1.0)
+    with MockCDNServer(state) as server:
+        service = _service(db.db_file, server.endpoint, clock)
+        service.batch_size = 2
+        fanout = CDNFanout({DEFAULT_ACCOUNT: service}, CDNTargets({}, {}))
+        asyncio.run(fanout.preheat_batch(URLS[:5]))
+        assert service.retry_queue.depth() == 5 and service.breaker.state == OPEN
+
+        drainer = RetryDrainer({DEFAULT_ACCOUNT: service}, service.retry_queue, pause=0)
+        later = time.time() + 3600
+        stats = asyncio.run(drainer.drain_once(later))
+        assert stats == {"submitted": 0, "retried": 0, "dropped": 0, "depth": 5}
+
+        # 半开时试探失败：这一批推迟，熔断器重新打开
+        clock.now += 60
+        stats = asyncio.run(drainer.drain_once(later))
+        assert stats["retried"] == 2 and service.breaker.state == OPEN
+
+        state.error_rate = 0
+        clock.now += 60
+        stats = asyncio.run(drainer.drain_once(later))
+        assert stats["submitted"] == 3 and stats["depth"] == 2 and service.breaker.state == CLOSED
+        stats = asyncio.run(drainer.drain_once(later + 3600))
+        assert stats["submitted"] == 2 and stats["depth"] == 0
+        assert state.stats()["pushed"] == 5
+    print("✅ 恢复后重试测试通过")
+
+
+def test_scheduler_keeps_urls_while_open():
+    """预热队列在熔断期间不计入失败次数，URL 留在队列中"""
+    db = ReviewDatabase(os.path.join(tempfile.mkdtemp(), "review.db"))
+    clock = _Clock()
+    state = MockCDNState(rate_limit=0, latency=0, error_rate=1.0)
+    with MockCDNServer(state) as server:
+        service = _service(db.db_file, server.endpoint, clock)
+        service.batch_size = 1
+        queue = PreheatQueue(db.db_file)
+        scheduler = PreheatScheduler(service, queue, PushQuota(), burst=10, max_attempts=2, pause=0,
+                                     targets=CDNTargets({}, {}))
+        scheduler.enqueue(URLS[:3])
+
+        # 查询配额和第一批提交失败后熔断
+        for _ in range(3):
+            stats = asyncio.run(scheduler.drain_once())
+        assert service.breaker.state == OPEN and stats["failed"] == 0 and stats["depth"] == 3
+        assert max(entry["attempts"] for entry in queue.peek(10)) == 1
+
+        state.error_rate = 0
+        clock.now += 60
+        stats = asyncio.run(scheduler.drain_once())
+        assert stats["submitted"] == 3 and stats["depth"] == 0
+    print("✅ 预热队列熔断测试通过")
+
+
+if __name__ == "__main__":
+    try:
+        test_breaker_states()
+        test_error_classification_and_backoff()
+        test_fail_fast_and_park()
+        test_retry_queue_backoff()
+        test_drain_after_recovery()
+        test_scheduler_keeps_urls_while_open()
+    except AssertionError:
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
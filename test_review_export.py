@@ -0,0 +1,148 @@
+"""
+测试审核记录导出 / 导入：NDJSON、CSV、gzip 往返，过滤条件，分批流式输出与去重导入
+
+不依赖运行中的服务，使用临时数据库
+"""
+import gzip
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+
+_tmp_dir = tempfile.mkdtemp()
+os.environ.setdefault("DB_FILE", os.path.join(_tmp_dir, "preheat_review.db"))
+
+from database import ReviewDatabase, url_hash
+from review_export import EXPORT_COLUMNS, export_requests, import_requests, iter_export
+
+
+def _new_db(count: int = 12) -> ReviewDatabase:
+    db = ReviewDatabase(os.path.join(tempfile.mkdtemp(), "review.db"))
+    for i in range(count):
+        db.add_review_request(f"https://cdn.example.com/导出/{i}.mkv", f"导出,\"{i}\"", "Movie",
+                              emby_path=f"/media/导出/{i}.mkv", media_info={"year": 2000 + i})
+    db.approve_request(2, "tester")
+    db.reject_request(3, "tester")
+    db.update_telegram_message_id(4, 42)
+    with sqlite3.connect(db.db_file) as conn:
+        conn.execute("UPDATE review_requests SET created_at = '2025-12-31 23:00:00' WHERE id <= 5")
+    return db
+
+
+def _rows(db_file: str) -> list:
+    with sqlite3.connect(db_file) as conn:
+        columns = [column for column in EXPORT_COLUMNS if column != "group_id"]
+        return conn.execute(f"SELECT {', '.join(columns)} FROM review_requests ORDER BY id").fetchall()
+
+
+def test_round_trip():
+    """NDJSON / CSV、压缩 / 不压缩导出后导入到新数据库，保留 ID 时内容完全一致"""
+    source = _new_db()
+    for name in ("requests.ndjson", "requests.ndjson.gz", "requests.csv", "requests.csv.gz"):
+        path = os.path.join(tempfile.mkdtemp(), name)
+        export_requests(source.db_file, path)
+        with open(path, "rb") as f:
+            assert (f.read(2) == b"\x1f\x8b") == name.endswith(".gz"), name
+
+        target = os.path.join(tempfile.mkdtemp(), "review.db")
+        result = import_requests(target, path, keep_ids=True)
+        assert result["imported"] == 12 and result["skipped"] == 0, name
+        assert _rows(target) == _rows(source.db_file), name
+
+        # 导入的请求参与去重、搜索，url_hash 已计算
+        imported = ReviewDatabase(target)
+        assert imported.add_review_request("https://cdn.example.com/导出/0.mkv", "重复", "Movie") is None
+        assert imported.search_requests("导出/7")["items"][0]["id"] == 8
+        with sqlite3.connect(target) as conn:
+            row = conn.execute("SELECT cdn_url, url_hash FROM review_requests WHERE id = 1").fetchone()
+        assert row[1] == url_hash(row[0])
+    print("✅ 导出导入往返测试通过")
+
+
+def test_filters_and_streaming():
+    """按状态、创建时间过滤；按批生成输出块"""
+    db = _new_db()
+    chunks = list(iter_export(db.db_file, "ndjson", batch_size=5))
+    assert len(chunks) == 3
+    records = [json.loads(line) for line in b"".join(chunks).decode("utf-8").splitlines()]
+    assert [record["id"] for record in records] == list(range(1, 13))
+    assert records[0]["media_info"] == {"year": 2000}
+
+    def ids(**filters):
+        data = b"".join(iter_export(db.db_file, "ndjson", batch_size=2, **filters))
+        return [json.loads(line)["id"] for line in data.decode("utf-8").splitlines()]
+
+    assert ids(status="approved") == [2]
+    assert ids(until="2026-01-01") == [1, 2, 3, 4, 5]
+    assert ids(since="2026-01-01", status="pending") == list(range(6, 13))
+
+    csv_text = gzip.decompress(b"".join(iter_export(db.db_file, "csv", status="rejected", compress=True)))
+    lines = csv_text.decode("utf-8").splitlines()
+    assert lines[0] == ",".join(EXPORT_COLUMNS) and len(lines) == 2
+    print("✅ 过滤与流式输出测试通过")
+
+
+def test_import_dedupes_and_skips_invalid():
+    """已存在的 URL 跳过，无效记录跳过并计数，分批写入"""
+    source = _new_db()
+    path = os.path.join(tempfile.mkdtemp(), "requests.ndjson")
+    export_requests(source.db_file, path)
+    with open(path, "a", encoding="utf-8") as f:
+        f.write("不是 JSON\n")
+        f.write(json.dumps({"cdn_url": "https://cdn.example.com/无名.mkv", "media_type": "Movie"}) + "\n")
+        f.write(json.dumps({"cdn_url": "https://cdn.example.com/状态.mkv", "media_name": "状态",
+                            "media_type": "Movie", "status": "unknown"}) + "\n")
+        f.write(json.dumps({"cdn_url": "https://CDN.example.com/导出/1.mkv", "media_name": "重复",
+                            "media_type": "Movie"}) + "\n")
+        f.write(json.dumps({"cdn_url": "https://cdn.example.com/新增.mkv", "media_name": "新增",
+                            "media_type": "Movie"}) + "\n")
+
+    target = ReviewDatabase(os.path.join(tempfile.mkdtemp(), "review.db"))
+    target.add_review_request("https://cdn.example.com/导出/5.mkv", "已有", "Movie")
+    result = import_requests(target.db_file, path, batch_size=4)
+    assert (result["imported"], result["skipped"], result["invalid"]) == (12, 2, 3)
+
+    # 不保留 ID 时按导入顺序重新分配，状态和推送标记保留
+    assert target.get_request_by_id(2)["cdn_url"] == "https://cdn.example.com/导出/0.mkv"
+    assert target.get_request_by_id(3)["status"] == "approved"
+    assert target.get_request_by_id(13)["media_name"] == "新增"
+    assert target.get_request_by_id(13)["media_info"] == "{}"
+
+    again = import_requests(target.db_file, path)
+    assert again["imported"] == 0 and again["skipped"] == 14
+    print("✅ 去重导入测试通过")
+
+
+def test_export_api():
+    """HTTP 流式导出接口"""
+    from fastapi.testclient import TestClient
+    import webhook_server
+
+    webhook_server.db.add_review_request("https://cdn.example.com/接口/导出.mkv", "接口导出", "Movie")
+    client = TestClient(webhook_server.app)
+
+    response = client.get("/api/export", params={"format": "csv", "gzip": "true"})
+    assert response.status_code == 200
+    assert response.headers["content-disposition"] == 'attachment; filename="review_requests.csv.gz"'
+    assert "接口导出" in gzip.decompress(response.content).decode("utf-8")
+
+    response = client.get("/api/export", params={"status": "pending"})
+    assert response.headers["content-type"] == "application/x-ndjson"
+    assert all(json.loads(line)["status"] == "pending" for line in response.text.splitlines())
+
+    assert client.get("/api/export", params={"format": "xml"}).status_code == 400
+    assert client.get("/api/export", params={"status": "unknown"}).status_code == 400
+    print("✅ 导出接口测试通过")
+
+
+if __name__ == "__main__":
+    try:
+        test_round_trip()
+        test_filters_and_streaming()
+        test_import_dedupes_and_skips_invalid()
+        test_export_api()
+    except AssertionError:
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
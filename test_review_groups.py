@@ -0,0 +1,151 @@
+"""
+测试剧集分组审核
+
+不依赖运行中的服务，使用临时数据库
+"""
+import os
+import sys
+import tempfile
+
+_tmp_dir = tempfile.mkdtemp()
+os.environ.setdefault("DB_FILE", os.path.join(_tmp_dir, "preheat_review.db"))
+
+from database import ReviewDatabase
+
+
+def _new_db() -> ReviewDatabase:
+    return ReviewDatabase(os.path.join(tempfile.mkdtemp(), "review.db"))
+
+
+def test_group_lifecycle():
+    """同一季的剧集进入同一个分组，窗口结束后整组批准"""
+    db = _new_db()
+    season_dir = "/media/剧集/黑镜/Season 01"
+
+    group_id = db.get_or_create_review_group(season_dir, "黑镜 - Season 01", "Episode", window_seconds=0)
+    assert group_id
+    assert db.get_or_create_review_group(season_dir, "黑镜 - Season 01", "Episode", 0) == group_id
+
+    for episode in range(1, 4):
+        request_id = db.add_review_request(
+            cdn_url=f"https://cdn.example.com/剧集/黑镜/Season 01/S01E0{episode}.mkv",
+            media_name=f"黑镜 S01E0{episode}",
+            media_type="Episode",
+            host_path=f"{season_dir}/S01E0{episode}.mkv",
+            group_id=group_id
+        )
+        assert request_id
+
+    due = db.get_due_review_groups()
+    assert [g['id'] for g in due] == [group_id]
+
+    print("\n🧪 关闭分组后新剧集应进入新分组...")
+    assert db.close_review_group(group_id)
+    assert not db.close_review_group(group_id)
+    assert db.get_due_review_groups() == []
+    assert db.get_or_create_review_group(season_dir, "黑镜 - Season 01", "Episode", 300) != group_id
+
+    print("🧪 整组批准...")
+    approved = db.approve_review_group(group_id, "tester")
+    assert len(approved) == 3
+    assert all(r['status'] == 'pending' for r in approved)
+    assert db.get_group_requests(group_id, status='pending') == []
+    assert db.get_review_group_by_id(group_id)['status'] == 'approved'
+    assert db.get_statistics()['approved'] == 3
+
+    print("✅ 分组审核测试通过")
+
+
+def test_derive_review_group():
+    """从宿主机路径推导分组键和标题"""
+    from webhook_server import derive_review_group
+
+    assert derive_review_group("/media/剧集/黑镜/Season 01/黑镜 - S01E01.mkv") == (
+        "/media/剧集/黑镜/Season 01", "黑镜 - Season 01"
+    )
+    assert derive_review_group("/media/剧集/庆余年/第二季/01.mp4") == (
+        "/media/剧集/庆余年/第二季", "庆余年 - 第二季"
+    )
+    assert derive_review_group("/media/动漫/葬送的芙莉莲/01.mkv") == (
+        "/media/动漫/葬送的芙莉莲", "葬送的芙莉莲"
+    )
+    assert derive_review_group("") == (None, None)
+    print("✅ 分组推导测试通过")
+
+
+def test_concurrent_group_creation():
+    """多个 worker 同时收到同一季的剧集时只创建一个收集中的分组"""
+    import threading
+
+    db = _new_db()
+    season_dir = "/media/剧集/黑镜/Season 03"
+    barrier = threading.Barrier(8)
+    group_ids = []
+
+    def worker():
+        barrier.wait()
+        group_ids.append(db.get_or_create_review_group(season_dir, "黑镜 - Season 03", "Episode", 300))
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(group_ids) == 8 and len(set(group_ids)) == 1 and group_ids[0]
+    print("✅ 并发创建分组测试通过")
+
+
+def test_group_retried_after_telegram_outage():
+    """分组消息没有发送给任何管理员时撤销关闭，下一轮重新推送"""
+    import asyncio
+
+    import telegram_bot as bot_module
+    from telegram.error import NetworkError
+
+    class _Bot:
+        def __init__(self):
+            self.failing = True
+            self.sent = 0
+
+        async def send_message(self, **kwargs):
+            if self.failing:
+                raise NetworkError("模拟 Telegram 故障")
+            self.sent += 1
+            return type("Message", (), {"message_id": 42})()
+
+    db = _new_db()
+    group_id = db.get_or_create_review_group("/media/剧集/黑镜/Season 02", "黑镜 - Season 02", "Episode", 0)
+    db.add_review_request("https://cdn.example.com/剧集/黑镜/Season 02/S02E01.mkv", "黑镜 S02E01", "Episode",
+                          host_path="/media/剧集/黑镜/Season 02/S02E01.mkv", group_id=group_id)
+
+    saved = bot_module.db
+    try:
+        bot_module.db = db
+        bot = bot_module.TelegramReviewBot()
+        bot.bot = _Bot()
+        bot.admin_chat_ids = [1, 2]
+
+        asyncio.run(bot._flush_due_groups())
+        assert db.get_review_group_by_id(group_id)["status"] == "open"
+        assert [g["id"] for g in db.get_due_review_groups()] == [group_id]
+
+        bot.bot.failing = False
+        asyncio.run(bot._flush_due_groups())
+        assert bot.bot.sent == 2
+        assert db.get_review_group_by_id(group_id)["status"] == "pending"
+        assert db.get_due_review_groups() == []
+    finally:
+        bot_module.db = saved
+    print("✅ 分组推送失败重试测试通过")
+
+
+if __name__ == "__main__":
+    try:
+        test_group_lifecycle()
+        test_concurrent_group_creation()
+        test_group_retried_after_telegram_outage()
+        test_derive_review_group()
+    except AssertionError:
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
@@ -0,0 +1,278 @@
+"""
+审核存储接口的契约测试：同一组用例分别运行在 SQLite 引擎和内存引擎上
+
+不依赖运行中的服务，使用临时数据库
+"""
+import os
+import sys
+import tempfile
+import time
+
+_tmp_dir = tempfile.mkdtemp()
+os.environ.setdefault("DB_FILE", os.path.join(_tmp_dir, "preheat_review.db"))
+
+import database
+from database import ReviewDatabase, create_store
+from memory_store import MemoryReviewStore
+from review_store import ReviewStore
+
+ENGINES = {
+    "sqlite": lambda: ReviewDatabase(os.path.join(tempfile.mkdtemp(), "review.db")),
+    "memory": MemoryReviewStore,
+}
+
+
+def _stores():
+    for name, factory in ENGINES.items():
+        yield name, factory()
+
+
+def _add(store: ReviewStore, count: int, prefix: str = "契约", **kwargs) -> list:
+    return [
+        store.add_review_request(f"https://cdn.example.com/{prefix}/{i}.mkv", f"{prefix}{i}", "Movie",
+                                 emby_path=f"/media/{prefix}/{i}.mkv", host_path=f"/mnt/{prefix}/{i:03d}.mkv",
+                                 **kwargs)
+        for i in range(count)
+    ]
+
+
+def test_add_and_dedupe():
+    """新增请求、按规范化 URL 去重、按 ID 读取"""
+    for name, store in _stores():
+        ids = _add(store, 3, media_info={"production_year": 2024})
+        assert ids == [1, 2, 3], name
+        assert store.add_review_request("https://CDN.example.com/契约/0.mkv", "重复", "Movie") is None, name
+
+        request = store.get_request_by_id(ids[0])
+        assert request["status"] == "pending" and request["media_name"] == "契约0", name
+        assert request["media_info"] == '{"production_year": 2024}', name
+        assert request["notified_at"] is None and request["reviewed_at"] is None, name
+        assert store.get_request_by_id(999) is None, name
+    print("✅ 新增与去重契约通过")
+
+
+def test_review_and_statistics():
+    """审核、状态统计与列表"""
+    for name, store in _stores():
+        ids = _add(store, 4)
+        store.approve_request(ids[0], "tester")
+        store.reject_request(ids[1], "tester")
+        store.update_telegram_message_id(ids[2], 42)
+
+        assert store.get_request_by_id(ids[0])["review_action"] == "approve", name
+        assert store.get_request_by_id(ids[1])["reviewed_by"] == "tester", name
+        assert store.get_request_by_id(ids[2])["telegram_message_id"] == 42, name
+        assert store.get_statistics() == {
+            "pending": 2, "approved": 1, "rejected": 1, "expired": 0, "total": 4
+        }, name
+        assert [row["id"] for row in store.get_pending_requests(10)] == [ids[3], ids[2]], name
+        assert [row["id"] for row in store.get_approved_requests(10)] == [ids[0]], name
+    print("✅ 审核与统计契约通过")
+
+
+def test_keyset_pages():
+    """键集分页：向后翻到底再向前翻回，无效参数抛出 ValueError"""
+    for name, store in _stores():
+        _add(store, 7)
+        store.approve_request(3, "tester")
+
+        pages = [store.get_requests_page("pending", limit=2)]
+        while pages[-1]["next_cursor"] is not None:
+            pages.append(store.get_requests_page("pending", limit=2, cursor=pages[-1]["next_cursor"]))
+        assert [[row["id"] for row in page["items"]] for page in pages] == [[7, 6], [5, 4], [2, 1]], name
+        assert pages[0]["prev_cursor"] is None, name
+
+        back = store.get_requests_page("pending", limit=2, cursor=pages[2]["prev_cursor"], direction="prev")
+        assert [row["id"] for row in back["items"]] == [5, 4], name
+
+        for kwargs in ({"cursor": 999}, {"direction": "sideways"}):
+            try:
+                store.get_requests_page("pending", limit=2, **kwargs)
+                assert False, (name, kwargs)
+            except ValueError:
+                pass
+    print("✅ 键集分页契约通过")
+
+
+def test_search():
+    """搜索：多个关键词同时匹配，名称命中优先，按状态过滤并分页"""
+    for name, store in _stores():
+        store.add_review_request("https://cdn.example.com/电影/流浪地球.mkv", "流浪地球", "Movie",
+                                 emby_path="/media/电影/流浪地球.mkv")
+        store.add_review_request("https://cdn.example.com/纪录片/幕后.mkv", "幕后", "Movie",
+                                 emby_path="/media/纪录片/流浪地球幕后.mkv")
+        store.add_review_request("https://cdn.example.com/电视剧/三体.mkv", "三体", "Episode",
+                                 emby_path="/media/电视剧/三体.mkv")
+
+        assert [row["media_name"] for row in store.search_requests("流浪地球")["items"]] == ["流浪地球", "幕后"], name
+        assert [row["media_name"] for row in store.search_requests("流浪地球 纪录片")["items"]] == ["幕后"], name
+        assert store.search_requests("三体", status="approved")["items"] == [], name
+
+        first = store.search_requests("media", limit=2)
+        assert len(first["items"]) == 2 and first["next_offset"] == 2, name
+        last = store.search_requests("media", limit=2, offset=2)
+        assert len(last["items"]) == 1 and last["next_offset"] is None, name
+    print("✅ 搜索契约通过")
+
+
+def test_notify_queue():
+    """推送队列：按 ID 顺序取出、撤销后重新取出，收集中分组内的请求不单独推送"""
+    for name, store in _stores():
+        ids = _add(store, 3)
+        group_id = store.get_or_create_review_group("/mnt/剧集/S01", "剧集 S01", "Episode", 3600)
+        grouped = _add(store, 2, prefix="分组", group_id=group_id)
+
+        assert store.count_unnotified_requests() == 3, name
+        claimed = [row["id"] for row in store.claim_unnotified_requests(2)]
+        assert claimed == ids[:2], name
+        assert store.count_unnotified_requests() == 1, name
+
+        store.release_unnotified_requests(claimed)
+        assert [row["id"] for row in store.claim_unnotified_requests(10)] == ids, name
+        assert store.claim_unnotified_requests(10) == [], name
+
+        assert store.close_review_group(group_id), name
+        assert not store.close_review_group(group_id), name
+        assert store.count_unnotified_requests() == 0, name
+        assert [row["id"] for row in store.get_group_requests(group_id)] == grouped, name
+    print("✅ 推送队列契约通过")
+
+
+def test_reopen_review_group():
+    """分组消息没有发出时撤销关闭；同一目录已有新的收集中分组时把请求移入该分组"""
+    for name, store in _stores():
+        group_id = store.get_or_create_review_group("/mnt/剧集/S01", "剧集 S01", "Episode", 0)
+        grouped = _add(store, 2, prefix="重试", group_id=group_id)
+        assert store.close_review_group(group_id), name
+        assert store.reopen_review_group(group_id), name
+        assert not store.reopen_review_group(group_id), name
+        assert [group["id"] for group in store.get_due_review_groups()] == [group_id], name
+        assert store.count_unnotified_requests() == 0, name
+
+        assert store.close_review_group(group_id), name
+        newer = store.get_or_create_review_group("/mnt/剧集/S01", "剧集 S01", "Episode", 0)
+        assert newer != group_id and store.reopen_review_group(group_id), name
+        assert [row["id"] for row in store.get_group_requests(newer)] == grouped, name
+        assert [group["id"] for group in store.get_due_review_groups()] == [newer], name
+        assert store.count_unnotified_requests() == 0, name
+    print("✅ 撤销分组关闭契约通过")
+
+
+def test_review_groups():
+    """剧集分组：复用收集中的分组、到期查询、整组审核"""
+    for name, store in _stores():
+        group_id = store.get_or_create_review_group("/mnt/剧集/S01", "剧集 S01", "Episode", 0)
+        assert store.get_or_create_review_group("/mnt/剧集/S01", "剧集 S01", "Episode", 0) == group_id, name
+        grouped = _add(store, 3, prefix="整组", group_id=group_id)
+        store.reject_request(grouped[1], "tester")
+
+        assert [group["id"] for group in store.get_due_review_groups()] == [group_id], name
+        store.update_group_telegram_message_id(group_id, 77)
+        assert store.get_review_group_by_id(group_id)["telegram_message_id"] == 77, name
+
+        approved = store.approve_review_group(group_id, "tester")
+        assert [row["id"] for row in approved] == [grouped[0], grouped[2]], name
+        assert store.get_review_group_by_id(group_id)["status"] == "approved", name
+        assert store.get_group_requests(group_id, status="approved")[0]["reviewed_by"] == "tester", name
+        assert store.get_due_review_groups() == [], name
+        assert store.get_or_create_review_group("/mnt/剧集/S01", "剧集 S01", "Episode", 0) != group_id, name
+
+        other = store.get_or_create_review_group("/mnt/剧集/S02", "剧集 S02", "Episode", 3600)
+        assert store.reject_review_group(other, "tester") == [], name
+        assert store.get_review_group_by_id(999) is None, name
+    print("✅ 剧集分组契约通过")
+
+
+def test_review_messages():
+    """审核消息记录"""
+    for name, store in _stores():
+        ids = _add(store, 3)
+        store.add_review_messages(100, 1, ids[:2])
+        store.add_review_messages(100, 2, [ids[2]], kind="group")
+        store.approve_request(ids[1], "tester")
+
+        messages = store.get_review_messages([ids[0]])
+        assert [(m["chat_id"], m["message_id"], m["kind"]) for m in messages] == [(100, 1, "batch")], name
+        assert [(r["request_id"], r["status"]) for r in messages[0]["requests"]] == \
+            [(ids[0], "pending"), (ids[1], "approved")], name
+        assert store.get_review_messages([]) == [], name
+
+        assert store.expire_overdue_requests(3600) == [], name
+    print("✅ 审核消息契约通过")
+
+
+def test_expiry():
+    """超时的待审核请求按创建顺序分批过期，不再推送"""
+    stores = list(_stores())
+    for name, store in stores:
+        ids = _add(store, 3)
+        store.approve_request(ids[0], "tester")
+    # created_at 精确到秒，等待进入下一秒后以 0 秒时限过期
+    time.sleep(1.1)
+
+    for name, store in stores:
+        first = store.expire_overdue_requests(0, limit=1)
+        assert [row["id"] for row in first] == [2], name
+        assert set(first[0]) >= {"id", "media_name", "media_type", "cdn_url", "created_at"}, name
+        assert [row["id"] for row in store.expire_overdue_requests(0)] == [3], name
+
+        expired = store.get_request_by_id(2)
+        assert expired["status"] == "expired" and expired["reviewed_by"] == "system", name
+        assert expired["notified_at"] is not None, name
+        assert store.get_statistics()["expired"] == 2, name
+        assert store.count_unnotified_requests() == 1, name
+    print("✅ 超时过期契约通过")
+
+
+def test_backend_factory():
+    """按名称创建引擎，全局实例可替换"""
+    assert isinstance(create_store("memory"), MemoryReviewStore)
+    assert create_store("sqlite").backend == "sqlite"
+    try:
+        create_store("redis")
+        assert False
+    except ValueError:
+        pass
+
+    original = database.get_db()
+    store = MemoryReviewStore()
+    database.use_store(store)
+    try:
+        assert database.get_db() is store
+        assert database.db.backend == "memory" and database.db.db_file is None
+    finally:
+        database.use_store(original)
+    print("✅ 引擎工厂测试通过")
+
+
+def test_replay_on_memory_store():
+    """Webhook 回放压测可以使用内存引擎（不访问磁盘）"""
+    from benchmark_webhook import generate_payloads, run_benchmark
+
+    original = database.get_db()
+    result = run_benchmark(generate_payloads(20), concurrency=4, alloc_sample=0, warmup=0, backend="memory")
+    assert result["backend"] == "memory"
+    assert result["status_counts"] == {200: 20}
+    assert result["stored"] == 20
+    # 压测结束后恢复原来的全局存储
+    assert database.get_db() is original
+    print("✅ 内存引擎回放测试通过")
+
+
+if __name__ == "__main__":
+    try:
+        test_add_and_dedupe()
+        test_review_and_statistics()
+        test_keyset_pages()
+        test_search()
+        test_notify_queue()
+        test_reopen_review_group()
+        test_review_groups()
+        test_review_messages()
+        test_expiry()
+        test_backend_factory()
+        test_replay_on_memory_store()
+    except AssertionError:
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
@@ -0,0 +1,162 @@
+"""
+测试全文搜索：触发器同步、相关度排序、短关键词回退与搜索接口
+
+不依赖运行中的服务，使用临时数据库
+"""
+import os
+import sqlite3
+import sys
+import tempfile
+
+_tmp_dir = tempfile.mkdtemp()
+os.environ.setdefault("DB_FILE", os.path.join(_tmp_dir, "preheat_review.db"))
+
+from database import ReviewDatabase
+
+MEDIA = [
+    ("流浪地球", "/media/电影/流浪地球 (2019)/流浪地球.mkv"),
+    ("流浪地球2", "/media/电影/流浪地球2 (2023)/流浪地球2.mkv"),
+    ("三体 S01E01", "/media/电视剧/三体/Season 01/三体 S01E01.mkv"),
+    ("纪录片", "/media/纪录片/关于流浪地球的幕后.mkv"),
+    ("100%_done", "/media/其他/100%_done.mkv"),
+]
+
+
+def _new_db() -> ReviewDatabase:
+    db = ReviewDatabase(os.path.join(tempfile.mkdtemp(), "review.db"))
+    for name, path in MEDIA:
+        db.add_review_request(f"https://cdn.example.com{path}", name, "Movie", emby_path=path)
+    return db
+
+
+def _names(result) -> list:
+    return [item["media_name"] for item in result["items"]]
+
+
+def test_ranked_search():
+    """名称命中排在仅路径命中之前，多个关键词需同时匹配"""
+    db = _new_db()
+    assert db.search_enabled
+
+    names = _names(db.search_requests("流浪地球"))
+    assert set(names) == {"流浪地球", "流浪地球2", "纪录片"}
+    assert names[-1] == "纪录片"
+
+    assert _names(db.search_requests("流浪地球 2023")) == ["流浪地球2"]
+    assert _names(db.search_requests("season 01")) == ["三体 S01E01"]
+    assert _names(db.search_requests("不存在的片名")) == []
+    assert _names(db.search_requests("   ")) == []
+    # FTS5 查询语法中的符号按普通字符处理
+    assert _names(db.search_requests('流浪" OR "三体')) == []
+    print("✅ 相关度排序测试通过")
+
+
+def test_short_terms_and_status_filter():
+    """少于 3 个字符的关键词使用 LIKE 匹配，通配符按字面处理；可按状态过滤"""
+    db = _new_db()
+    assert _names(db.search_requests("三体")) == ["三体 S01E01"]
+    assert _names(db.search_requests("%_")) == ["100%_done"]
+    assert _names(db.search_requests("流浪 纪录")) == ["纪录片"]
+
+    db.approve_request(1, "tester")
+    assert _names(db.search_requests("流浪地球", status="approved")) == ["流浪地球"]
+    assert "流浪地球" not in _names(db.search_requests("流浪地球", status="pending"))
+    print("✅ 短关键词与状态过滤测试通过")
+
+
+def test_pagination():
+    """按 offset 翻页，结果不重复"""
+    db = _new_db()
+    first = db.search_requests("media", limit=2)
+    assert len(first["items"]) == 2 and first["next_offset"] == 2
+    second = db.search_requests("media", limit=2, offset=2)
+    third = db.search_requests("media", limit=2, offset=4)
+    assert third["next_offset"] is None
+    ids = [item["id"] for page in (first, second, third) for item in page["items"]]
+    assert sorted(ids) == [1, 2, 3, 4, 5]
+    print("✅ 搜索分页测试通过")
+
+
+def test_index_follows_changes():
+    """新增、修改、删除（归档）请求时索引由触发器同步"""
+    db = _new_db()
+    with sqlite3.connect(db.db_file) as conn:
+        conn.execute("UPDATE review_requests SET media_name = '球状闪电' WHERE id = 3")
+        conn.execute("DELETE FROM review_requests WHERE id = 1")
+
+    assert _names(db.search_requests("球状闪电")) == ["球状闪电"]
+    assert "流浪地球" not in _names(db.search_requests("流浪地球"))
+
+    db.add_review_request("https://cdn.example.com/media/电影/球状闪电/球状闪电.mkv", "球状闪电 4K", "Movie")
+    assert set(_names(db.search_requests("球状闪电"))) == {"球状闪电", "球状闪电 4K"}
+
+    with sqlite3.connect(db.db_file) as conn:
+        conn.execute("INSERT INTO review_search (review_search) VALUES ('integrity-check')")
+    print("✅ 索引同步测试通过")
+
+
+def test_existing_database_is_indexed():
+    """升级前已有的请求在第一次初始化时建立索引"""
+    db = _new_db()
+    with sqlite3.connect(db.db_file) as conn:
+        for trigger in ("review_search_insert", "review_search_delete", "review_search_update"):
+            conn.execute(f"DROP TRIGGER {trigger}")
+        conn.execute("DROP TABLE review_search")
+        # 模拟引入全文索引之前的数据库
+        conn.execute("DELETE FROM schema_version WHERE version = 10")
+
+    db = ReviewDatabase(db.db_file)
+    assert set(_names(db.search_requests("流浪地球"))) == {"流浪地球", "流浪地球2", "纪录片"}
+    print("✅ 已有数据建索引测试通过")
+
+
+def test_search_uses_fts_index():
+    """长关键词通过全文索引查找，不扫描请求表"""
+    db = _new_db()
+    with sqlite3.connect(db.db_file) as conn:
+        plan = " ".join(row[3] for row in conn.execute("""
+            EXPLAIN QUERY PLAN
+            SELECT r.* FROM review_search JOIN review_requests r ON r.id = review_search.rowid
+            WHERE review_search MATCH '"流浪地球"'
+            ORDER BY bm25(review_search)
+        """))
+    assert "VIRTUAL TABLE INDEX" in plan
+    assert "SEARCH r USING INTEGER PRIMARY KEY" in plan
+    print("✅ 搜索查询计划测试通过")
+
+
+def test_search_api_and_bot_page():
+    """HTTP 搜索接口与 Bot 搜索结果翻页按钮"""
+    from fastapi.testclient import TestClient
+    import webhook_server
+    from telegram_bot import TelegramReviewBot
+
+    for name, path in MEDIA:
+        webhook_server.db.add_review_request(f"https://cdn.example.com/api{path}", name, "Movie", emby_path=path)
+
+    client = TestClient(webhook_server.app)
+    body = client.get("/api/search", params={"q": "流浪地球", "limit": 2}).json()
+    assert body["count"] == 2 and body["next_offset"] == 2
+    assert body["items"][0]["media_name"].startswith("流浪地球")
+    assert client.get("/api/search", params={"q": " "}).status_code == 400
+    assert client.get("/api/search", params={"q": "流浪", "status": "unknown"}).status_code == 400
+
+    message, markup = TelegramReviewBot._build_search_page("<流浪>", body, 0)
+    assert "&lt;流浪&gt;" in message
+    assert [button.callback_data for button in markup.inline_keyboard[0]] == ["search_2"]
+    print("✅ 搜索接口测试通过")
+
+
+if __name__ == "__main__":
+    try:
+        test_ranked_search()
+        test_short_terms_and_status_filter()
+        test_pagination()
+        test_index_follows_changes()
+        test_existing_database_is_indexed()
+        test_search_uses_fts_index()
+        test_search_api_and_bot_page()
+    except AssertionError:
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
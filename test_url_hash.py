@@ -0,0 +1,151 @@
+"""
+测试 URL 哈希去重：哈希稳定性、碰撞回退比较与旧数据库升级
+
+不依赖运行中的服务，使用临时数据库
+"""
+import os
+import sqlite3
+import sys
+import tempfile
+
+_tmp_dir = tempfile.mkdtemp()
+os.environ.setdefault("DB_FILE", os.path.join(_tmp_dir, "preheat_review.db"))
+
+from database import ReviewDatabase, normalize_url, url_hash
+from benchmark_url_index import generate_urls, run_benchmark
+
+LEGACY_SCHEMA = """
+    CREATE TABLE review_requests (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        cdn_url TEXT NOT NULL,
+        media_name TEXT NOT NULL,
+        media_type TEXT NOT NULL,
+        emby_path TEXT,
+        host_path TEXT,
+        media_info TEXT,
+        status TEXT DEFAULT 'pending',
+        telegram_message_id INTEGER,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        reviewed_at TIMESTAMP,
+        reviewed_by TEXT,
+        review_action TEXT,
+        UNIQUE(cdn_url)
+    )
+"""
+
+
+def _new_db() -> ReviewDatabase:
+    return ReviewDatabase(os.path.join(tempfile.mkdtemp(), "review.db"))
+
+
+def test_hash_is_stable_signed_64bit():
+    """哈希为有符号 64 位整数；域名不区分大小写，路径区分大小写"""
+    url = "https://cdn.example.com/电影/流浪地球 (2019)/流浪地球.mkv"
+    value = url_hash(url)
+    assert -2 ** 63 <= value < 2 ** 63
+    assert value == url_hash(url)
+    assert url_hash("  HTTPS://CDN.Example.com/电影/流浪地球 (2019)/流浪地球.mkv ") == value
+    assert url_hash("https://cdn.example.com/电影/流浪地球 (2019)/流浪地球.MKV") != value
+    assert normalize_url("HTTPS://CDN.Example.com/A.mkv") == "https://cdn.example.com/A.mkv"
+    print("✅ 哈希稳定性测试通过")
+
+
+def test_duplicate_and_collision():
+    """相同 URL 被去重；哈希碰撞时比较完整 URL，不会误判为重复"""
+    db = _new_db()
+    first = db.add_review_request("https://cdn.example.com/碰撞/1.mkv", "碰撞1", "Movie")
+    assert first is not None
+    assert db.add_review_request("https://CDN.example.com/碰撞/1.mkv", "碰撞1", "Movie") is None
+
+    # 人为制造碰撞：让已有行的哈希等于另一个 URL 的哈希
+    other = "https://cdn.example.com/碰撞/2.mkv"
+    with sqlite3.connect(db.db_file) as conn:
+        conn.execute("UPDATE review_requests SET url_hash = ? WHERE id = ?", (url_hash(other), first))
+    second = db.add_review_request(other, "碰撞2", "Movie")
+    assert second is not None and second != first
+    assert db.add_review_request(other, "碰撞2", "Movie") is None
+    print("✅ 碰撞回退比较测试通过")
+
+
+def test_dedupe_lookup_uses_hash_index():
+    """查重沿 idx_url_hash 查找，不扫描全表"""
+    db = _new_db()
+    with sqlite3.connect(db.db_file) as conn:
+        for table, index in (("review_requests", "idx_url_hash"), ("review_tombstones", "idx_tombstones_url_hash")):
+            plan = " ".join(row[3] for row in conn.execute(
+                f"EXPLAIN QUERY PLAN SELECT cdn_url FROM {table} WHERE url_hash = ?", (1,)
+            ))
+            assert index in plan, plan
+    print("✅ 查重查询计划测试通过")
+
+
+def test_upgrade_from_unique_url_table():
+    """旧数据库升级：去掉 UNIQUE(cdn_url)，补算 url_hash，保留 ID 与自增序列，迁移墓碑"""
+    db_file = os.path.join(tempfile.mkdtemp(), "review.db")
+    with sqlite3.connect(db_file) as conn:
+        conn.execute(LEGACY_SCHEMA)
+        for i in range(5):
+            conn.execute(
+                "INSERT INTO review_requests (cdn_url, media_name, media_type) VALUES (?, ?, 'Movie')",
+                (f"https://cdn.example.com/旧/{i}.mkv", f"旧{i}")
+            )
+        conn.execute("DELETE FROM review_requests WHERE id = 5")
+        conn.execute("""
+            CREATE TABLE review_tombstones (
+                cdn_url TEXT PRIMARY KEY,
+                request_id INTEGER NOT NULL,
+                status TEXT NOT NULL,
+                archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        conn.execute(
+            "INSERT INTO review_tombstones (cdn_url, request_id, status) VALUES (?, 99, 'approved')",
+            ("https://cdn.example.com/已归档.mkv",)
+        )
+
+    db = ReviewDatabase(db_file)
+    with sqlite3.connect(db_file) as conn:
+        autoindexes = conn.execute("""
+            SELECT name FROM sqlite_master
+            WHERE tbl_name = 'review_requests' AND name LIKE 'sqlite_autoindex_%'
+        """).fetchall()
+        assert autoindexes == []
+        rows = conn.execute("SELECT id, cdn_url, url_hash FROM review_requests ORDER BY id").fetchall()
+        assert [row[0] for row in rows] == [1, 2, 3, 4]
+        assert all(row[2] == url_hash(row[1]) for row in rows)
+        tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        assert "review_tombstones_old" not in tables
+
+    # 旧数据仍参与去重，墓碑中的 URL 也不会重新创建
+    assert db.add_review_request("https://cdn.example.com/旧/0.mkv", "旧0", "Movie") is None
+    assert db.add_review_request("https://cdn.example.com/已归档.mkv", "已归档", "Movie") is None
+    # 新 ID 不会复用已删除的 ID
+    assert db.add_review_request("https://cdn.example.com/新.mkv", "新", "Movie") == 6
+
+    # 再次初始化不会重复升级
+    ReviewDatabase(db_file)
+    assert db.get_statistics()["total"] == 5
+    print("✅ 旧数据库升级测试通过")
+
+
+def test_benchmark_smoke():
+    """小规模运行去重索引压测"""
+    assert len(set(generate_urls(1000))) == 1000
+    result = run_benchmark(rows=3000, lookups=200)
+    for layout in ("unique_url", "url_hash"):
+        assert result[layout]["inserted"] == 3000
+        assert result[layout]["lookup_hits"] == 100
+    print("✅ 去重索引压测冒烟测试通过")
+
+
+if __name__ == "__main__":
+    try:
+        test_hash_is_stable_signed_64bit()
+        test_duplicate_and_collision()
+        test_dedupe_lookup_uses_hash_index()
+        test_upgrade_from_unique_url_table()
+        test_benchmark_smoke()
+    except AssertionError:
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
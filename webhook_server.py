@@ -3,22 +3,28 @@ Emby Webhook 接收服务
 监听 Emby 媒体库新增事件，并记录媒体文件路径
 """
 from fastapi import FastAPI, Request, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from contextlib import asynccontextmanager
 from datetime import datetime
 from typing import Dict, Any, Optional, Tuple
+import importlib
 import logging
 import json
+import re
+import time
 from pathlib import Path
-import uvicorn
 import os
 import asyncio
 
 # 导入配置
 import config
 
-# 导入数据库和 Telegram Bot
-from database import db
-from telegram_bot import telegram_bot
+# 导入数据库（延迟初始化）；Telegram Bot 和腾讯云 SDK 只在 Leader 进程中按需导入
+from cache_purge import handle_replacement
+from database import db, get_db, store_ready
+from library_scanner import LibraryManifest, IncrementalScanner, build_item_data
+from leader import LeaderElection
+import metrics
 
 # 配置日志
 logging.basicConfig(
@@ -31,20 +37,100 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="Emby CDN Preheat Webhook Service")
+# 季目录名：Season 01 / S01 / Specials / 第一季
+SEASON_DIR_PATTERN = re.compile(
+    r"^(season\s*\d+|s\d{1,2}|specials|第\s*[\d一二三四五六七八九十]+\s*季)$",
+    re.IGNORECASE
+)
+
+# 媒体库增量扫描后台任务
+library_scan_task: Optional[asyncio.Task] = None
+
+# 审核过期清理后台任务
+expiry_sweep_task: Optional[asyncio.Task] = None
+
+# 审核记录归档后台任务
+retention_task: Optional[asyncio.Task] = None
+
+# 预热队列后台任务
+preheat_queue_task: Optional[asyncio.Task] = None
+
+# 重试队列后台任务
+retry_queue_task: Optional[asyncio.Task] = None
+
+# 刷新队列后台任务（没有预热队列时处理被替换文件的刷新）
+purge_queue_task: Optional[asyncio.Task] = None
+
+# Leader 选举：多 worker 部署时只有 Leader 运行 Telegram 轮询、批量推送和 CDN 提交，
+# 其余 worker 只接收 Webhook 并写入数据库
+leader_election = LeaderElection()
+leader_task: Optional[asyncio.Task] = None
+
+# 启动预热状态：健康检查不等待预热完成，只在响应中标明；初始化失败时 error 为失败原因
+warmup_state: Dict[str, Any] = {"ready": False, "seconds": None, "error": None}
+
+# 数据库升级期间不等待初始化（输出 NaN），/metrics 不会阻塞事件循环
+metrics.REVIEW_QUEUE_DEPTH.set_function(
+    lambda: db.count_unnotified_requests() if store_ready() else float("nan")
+)
 
 
-# ==================== 应用生命周期事件 ====================
-@app.on_event("startup")
-async def startup_event():
-    """应用启动时初始化 Telegram Bot"""
+# ==================== 应用生命周期 ====================
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """应用生命周期：启动时在后台预热各子系统，关闭时清理资源"""
+    global leader_task
+
     logger.info("=" * 80)
     logger.info("启动 Emby CDN 预热服务")
     logger.info("=" * 80)
 
+    leader_task = asyncio.create_task(warm_up())
+    leader_task.add_done_callback(log_task_exception)
+    yield
+    await shutdown_services()
+
+
+def log_task_exception(task: asyncio.Task):
+    """后台任务异常退出时立即记录（否则异常留在任务中，直到任务被回收才输出）"""
+    if not task.cancelled() and task.exception() is not None:
+        logger.error(f"后台任务异常退出: {str(task.exception())}", exc_info=task.exception())
+
+
+async def warm_up():
+    """
+    后台预热：初始化数据库后参与 Leader 选举
+
+    建表/升级在线程池中执行，事件循环可以立即响应健康检查；升级期间收到的 Webhook
+    在线程池中等待初始化完成，查询接口返回 503。初始化失败（数据库不可写、迁移失败等）时
+    健康检查、查询接口和 Webhook 都返回 503，不参与 Leader 选举
+    """
+    started = time.perf_counter()
+    loop = asyncio.get_running_loop()
+    try:
+        await loop.run_in_executor(None, get_db)
+    except Exception as e:
+        warmup_state["error"] = str(e)
+        logger.error(f"❌ 数据库初始化失败，服务不可用: {str(e)}", exc_info=True)
+        return
+    warmup_state["ready"] = True
+    warmup_state["seconds"] = round(time.perf_counter() - started, 3)
+    logger.info(f"✅ 数据库初始化完成，耗时 {warmup_state['seconds']} 秒")
+
+    await leader_election.run(start_leader_services)
+
+
+async def start_leader_services():
+    """成为 Leader 后初始化 Telegram Bot 和后台任务"""
+    global library_scan_task, expiry_sweep_task, retention_task, preheat_queue_task, retry_queue_task, \
+        purge_queue_task
+
     if config.TELEGRAM_REVIEW_ENABLED:
         logger.info("Telegram 审核已启用，正在初始化 Bot...")
-        success = await telegram_bot.initialize()
+        # python-telegram-bot 导入较慢，放到线程池中执行
+        loop = asyncio.get_running_loop()
+        bot_module = await loop.run_in_executor(None, importlib.import_module, "telegram_bot")
+        success = await bot_module.telegram_bot.initialize()
         if success:
             logger.info("✅ Telegram Bot 初始化成功")
         else:
@@ -56,25 +142,59 @@ async def startup_event():
         else:
             logger.info("⚠️  自动批准模式未启用，所有请求将被忽略")
 
+    if config.LIBRARY_SCAN_ROOTS and config.LIBRARY_SCAN_INTERVAL > 0:
+        library_scan_task = asyncio.create_task(library_scan_worker())
+        logger.info(f"媒体库增量扫描已启用: 根目录={config.LIBRARY_SCAN_ROOTS}, 间隔={config.LIBRARY_SCAN_INTERVAL}秒")
+
+    if config.REVIEW_TIMEOUT_SECONDS > 0:
+        expiry_sweep_task = asyncio.create_task(expiry_sweeper_worker())
+
+    if config.RETENTION_DAYS > 0:
+        retention_task = asyncio.create_task(retention_worker())
+
+    if config.PREHEAT_QUEUE_ENABLED and config.PREHEAT_ENABLED:
+        preheat_queue_task = asyncio.create_task(preheat_queue_worker())
+
+    if config.PREHEAT_ENABLED:
+        retry_queue_task = asyncio.create_task(retry_queue_worker())
+
+    if config.PREHEAT_ENABLED and config.PURGE_ON_REPLACE:
+        purge_queue_task = asyncio.create_task(purge_queue_worker())
+
     logger.info("=" * 80)
 
 
-@app.on_event("shutdown")
-async def shutdown_event():
+async def shutdown_services():
     """应用关闭时清理资源"""
     logger.info("正在关闭服务...")
-    if config.TELEGRAM_REVIEW_ENABLED:
-        await telegram_bot.shutdown()
+    for task in (leader_task, library_scan_task, expiry_sweep_task, retention_task, preheat_queue_task,
+                 retry_queue_task, purge_queue_task):
+        if task:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+    if leader_election.is_leader:
+        if config.TELEGRAM_REVIEW_ENABLED:
+            from telegram_bot import telegram_bot
+            await telegram_bot.shutdown()
+        from cdn_accounts import get_fanout
+        await get_fanout().aclose()
+        leader_election.release()
     logger.info("服务已关闭")
 
 
+app = FastAPI(title="Emby CDN Preheat Webhook Service", lifespan=lifespan)
+
+
 def apply_path_mapping(path: str, mappings: Dict[str, str]) -> Optional[str]:
     """
     应用路径映射，按最长匹配优先
 
     Args:
         path: 原始路径
-        mappings: 路径映射字典
+        mappings: 路径映射字典（目标为列表时使用第一个，见 CDN_URL_MAPPINGS 的多域名配置）
 
     Returns:
         映射后的路径，如果没有匹配则返回 None
@@ -86,6 +206,8 @@ def apply_path_mapping(path: str, mappings: Dict[str, str]) -> Optional[str]:
     sorted_mappings = sorted(mappings.items(), key=lambda x: len(x[0]), reverse=True)
 
     for source_prefix, target_prefix in sorted_mappings:
+        if isinstance(target_prefix, (list, tuple)):
+            target_prefix = target_prefix[0]
         if path.startswith(source_prefix):
             mapped_path = path.replace(source_prefix, target_prefix, 1)
             logger.info(f"  🔄 应用映射规则: {source_prefix} → {target_prefix}")
@@ -156,6 +278,7 @@ def smart_match_cdn_url(path: str) -> Optional[str]:
         return None
 
 
+@metrics.STRM_READ_SECONDS.time()
 def read_strm_file(strm_path: str) -> Optional[str]:
     """
     读取 strm 文件内容，获取真实的媒体文件路径
@@ -190,6 +313,7 @@ def read_strm_file(strm_path: str) -> Optional[str]:
         return None
 
 
+@metrics.RESOLVE_STEP_SECONDS.labels(step="total").time()
 def resolve_media_path(emby_path: str) -> Tuple[Optional[str], Optional[str]]:
     """
     解析媒体文件路径，处理容器映射和 strm 文件
@@ -217,7 +341,8 @@ def resolve_media_path(emby_path: str) -> Tuple[Optional[str], Optional[str]]:
     logger.info("-" * 80)
     logger.info(f"  输入路径: {emby_path}")
 
-    host_path = apply_path_mapping(emby_path, config.EMBY_CONTAINER_MAPPINGS)
+    with metrics.RESOLVE_STEP_SECONDS.labels(step="container_mapping").time():
+        host_path = apply_path_mapping(emby_path, config.EMBY_CONTAINER_MAPPINGS)
     if not host_path:
         logger.warning(f"  ⚠️  未找到匹配的容器映射规则")
         logger.warning(f"  💡 提示：请检查 config.py 中的 EMBY_CONTAINER_MAPPINGS 配置")
@@ -242,7 +367,8 @@ def resolve_media_path(emby_path: str) -> Tuple[Optional[str], Optional[str]]:
         logger.info("【步骤 2.1/4】读取 STRM 文件内容")
         logger.info("-" * 80)
 
-        real_path = read_strm_file(host_path)
+        with metrics.RESOLVE_STEP_SECONDS.labels(step="strm_read").time():
+            real_path = read_strm_file(host_path)
         if not real_path:
             logger.error(f"  ❌ 无法读取 STRM 文件内容")
             logger.error(f"  💡 可能的原因:")
@@ -261,7 +387,8 @@ def resolve_media_path(emby_path: str) -> Tuple[Optional[str], Optional[str]]:
         logger.info("-" * 80)
         logger.info(f"  输入路径: {real_path}")
 
-        mapped_real_path = apply_path_mapping(real_path, config.STRM_MOUNT_MAPPINGS)
+        with metrics.RESOLVE_STEP_SECONDS.labels(step="strm_mapping").time():
+            mapped_real_path = apply_path_mapping(real_path, config.STRM_MOUNT_MAPPINGS)
         if mapped_real_path:
             logger.info(f"  ✅ 映射成功")
             logger.info(f"  输出路径: {mapped_real_path}")
@@ -282,7 +409,8 @@ def resolve_media_path(emby_path: str) -> Tuple[Optional[str], Optional[str]]:
     logger.info("-" * 80)
     logger.info(f"  输入路径: {host_path}")
 
-    cdn_url = apply_path_mapping(host_path, config.CDN_URL_MAPPINGS)
+    with metrics.RESOLVE_STEP_SECONDS.labels(step="cdn_mapping").time():
+        cdn_url = apply_path_mapping(host_path, config.CDN_URL_MAPPINGS)
     if not cdn_url:
         logger.warning(f"  ⚠️  未找到匹配的 CDN 映射规则")
         logger.warning(f"  💡 提示：请检查 config.py 中的 CDN_URL_MAPPINGS 配置")
@@ -292,7 +420,8 @@ def resolve_media_path(emby_path: str) -> Tuple[Optional[str], Optional[str]]:
             logger.info("")
             logger.info("  🔄 尝试智能 URL 匹配...")
             logger.info("")
-            cdn_url = smart_match_cdn_url(host_path)
+            with metrics.RESOLVE_STEP_SECONDS.labels(step="smart_match").time():
+                cdn_url = smart_match_cdn_url(host_path)
 
             if cdn_url:
                 logger.info(f"  ✅ 智能匹配成功")
@@ -320,6 +449,37 @@ def resolve_media_path(emby_path: str) -> Tuple[Optional[str], Optional[str]]:
     return (host_path, cdn_url)
 
 
+def derive_review_group(host_path: str) -> Tuple[Optional[str], Optional[str]]:
+    """
+    根据宿主机路径推导剧集分组
+
+    分组键为剧集文件所在目录；如果该目录是季目录（如 Season 01），
+    标题为"剧名 - 季目录名"，否则直接使用目录名
+
+    Args:
+        host_path: 宿主机路径
+
+    Returns:
+        (分组键, 分组标题) 元组，无法分组时返回 (None, None)
+    """
+    if not host_path:
+        return (None, None)
+
+    normalized_path = host_path.replace('\\', '/')
+    season_dir = os.path.dirname(normalized_path)
+    season_name = os.path.basename(season_dir)
+    if not season_name:
+        return (None, None)
+
+    if SEASON_DIR_PATTERN.match(season_name.strip()):
+        series_name = os.path.basename(os.path.dirname(season_dir))
+        title = f"{series_name} - {season_name}" if series_name else season_name
+    else:
+        title = season_name
+
+    return (season_dir, title)
+
+
 def process_media_item(item_data: Dict[str, Any]) -> Dict[str, str]:
     """
     处理媒体项目数据，提取关键信息
@@ -362,9 +522,25 @@ def process_media_item(item_data: Dict[str, Any]) -> Dict[str, str]:
         # 解析路径，处理容器映射和 strm 文件
         host_path, cdn_url = resolve_media_path(emby_path)
 
+        # 同一 URL 的文件被替换（大小或修改时间变化）时刷新 CDN 上的旧缓存，已批准的 URL 重新预热；
+        # 审核请求已存在，下面的 add_review_request 不会再创建新请求
+        replaced = bool(cdn_url) and handle_replacement(cdn_url, host_path, item_data, item_type)
+
         # 如果生成了 CDN URL，发送审核请求
         if cdn_url:
             if config.TELEGRAM_REVIEW_ENABLED:
+                # 剧集按季目录合并为一个审核项
+                group_id = None
+                if config.REVIEW_GROUP_ENABLED and item_type == 'Episode':
+                    group_key, group_title = derive_review_group(host_path)
+                    if group_key:
+                        group_id = db.get_or_create_review_group(
+                            group_key=group_key,
+                            title=group_title,
+                            media_type=item_type,
+                            window_seconds=config.REVIEW_GROUP_WINDOW
+                        )
+
                 # 添加到数据库
                 request_id = db.add_review_request(
                     cdn_url=cdn_url,
@@ -375,25 +551,17 @@ def process_media_item(item_data: Dict[str, Any]) -> Dict[str, str]:
                     media_info={
                         'production_year': production_year,
                         'id': item_id
-                    }
+                    },
+                    group_id=group_id
                 )
 
-                if request_id:
-                    logger.info(f"✅ 审核请求已创建: ID={request_id}")
-
-                    # 添加到批量推送队列（不阻塞响应）
-                    asyncio.create_task(
-                        telegram_bot.add_to_queue(
-                            request_id=request_id,
-                            media_name=item_name,
-                            media_type=item_type,
-                            cdn_url=cdn_url,
-                            emby_path=emby_path,
-                            host_path=host_path,
-                            media_info={'production_year': production_year}
-                        )
-                    )
-                    logger.info(f"📥 审核请求已加入批量推送队列")
+                if request_id and group_id:
+                    logger.info(f"✅ 审核请求已创建: ID={request_id}，已加入剧集分组 {group_id}")
+                elif request_id:
+                    # 数据库即批量推送队列，由 Leader 进程统一推送
+                    logger.info(f"✅ 审核请求已创建: ID={request_id}，等待批量推送")
+                elif replaced:
+                    logger.info(f"♻️  审核请求已存在，文件替换已转为刷新缓存")
                 else:
                     logger.warning(f"⚠️  审核请求创建失败或已存在")
 
@@ -412,6 +580,7 @@ def process_media_item(item_data: Dict[str, Any]) -> Dict[str, str]:
             'host_path': host_path,
             'cdn_url': cdn_url,
             'id': item_id,
+            'replaced': replaced,
             'processed_at': datetime.now().isoformat()
         }
     except Exception as e:
@@ -419,16 +588,407 @@ def process_media_item(item_data: Dict[str, Any]) -> Dict[str, str]:
         raise
 
 
+def host_to_emby_path(host_path: str) -> str:
+    """
+    把宿主机路径反向映射回 Emby 容器路径（EMBY_CONTAINER_MAPPINGS 的逆映射）
+
+    Args:
+        host_path: 宿主机路径
+
+    Returns:
+        Emby 容器路径，没有匹配的映射时原样返回
+    """
+    reverse_mappings = {target: source for source, target in config.EMBY_CONTAINER_MAPPINGS.items()}
+    return apply_path_mapping(host_path, reverse_mappings) or host_path
+
+
+async def run_library_scan(scanner: IncrementalScanner) -> int:
+    """
+    对所有配置的根目录执行一次增量扫描，并把新增/变化的文件送入预热流程
+
+    Args:
+        scanner: 增量扫描器
+
+    Returns:
+        送入预热流程的文件数量
+    """
+    loop = asyncio.get_running_loop()
+    emitted = 0
+
+    for root_dir in config.LIBRARY_SCAN_ROOTS:
+        # 扫描是阻塞的文件系统操作，放到线程池中执行
+        result = await loop.run_in_executor(None, scanner.scan, root_dir)
+
+        if result["first_scan"] and not config.LIBRARY_SCAN_EMIT_INITIAL:
+            logger.info(f"📁 首次扫描 {root_dir}，已建立文件清单（{len(result['changes'])} 个文件），不触发预热")
+            continue
+
+        for change in result["changes"]:
+            item_data = build_item_data(change, host_to_emby_path(change["path"]))
+            try:
+                # 每个文件都要写数据库并检查文件是否被替换，同样放到线程池中执行，重新扫描大量文件时
+                # 健康检查、Webhook 和 Telegram Bot 不会被阻塞
+                await loop.run_in_executor(None, process_media_item, item_data)
+                emitted += 1
+            except Exception as e:
+                logger.error(f"处理扫描发现的文件失败 {change['path']}: {str(e)}")
+
+    return emitted
+
+
+async def library_scan_worker():
+    """后台任务：按 LIBRARY_SCAN_INTERVAL 定期执行增量扫描"""
+    scanner = IncrementalScanner(LibraryManifest())
+    logger.info("📁 媒体库增量扫描后台任务已启动")
+
+    while True:
+        try:
+            emitted = await run_library_scan(scanner)
+            if emitted:
+                logger.info(f"📁 增量扫描补充了 {emitted} 个媒体文件")
+            await asyncio.sleep(config.LIBRARY_SCAN_INTERVAL)
+        except asyncio.CancelledError:
+            logger.info("媒体库增量扫描任务已取消")
+            break
+        except Exception as e:
+            logger.error(f"媒体库增量扫描出错: {str(e)}", exc_info=True)
+            await asyncio.sleep(60)
+
+
+async def run_expiry_sweep(timeout_seconds: int, batch_size: int, on_expired=None) -> int:
+    """
+    执行一次过期清理：分批把超时的待审核请求标记为已过期
+
+    每批在一个事务内完成，批次之间让出事件循环；本批数量小于 batch_size 时结束。
+
+    Args:
+        timeout_seconds: 审核时限（秒）
+        batch_size: 每批最多处理的数量
+        on_expired: 每批完成后调用的协程函数，参数为本批过期的请求 ID（用于编辑 Telegram 消息）
+
+    Returns:
+        本次处理的请求数量
+    """
+    loop = asyncio.get_running_loop()
+    total = 0
+
+    with metrics.EXPIRY_SWEEP_SECONDS.time():
+        while True:
+            rows = await loop.run_in_executor(None, db.expire_overdue_requests, timeout_seconds, batch_size)
+            if rows:
+                total += len(rows)
+                metrics.REVIEW_EXPIRED.inc(len(rows))
+                if on_expired:
+                    await on_expired([row['id'] for row in rows])
+            if len(rows) < batch_size:
+                break
+
+    metrics.EXPIRY_SWEEP_LAST_ROWS.set(total)
+    return total
+
+
+async def expiry_sweeper_worker():
+    """后台任务：按 EXPIRY_SWEEP_INTERVAL 定期清理超过审核时限的请求"""
+    logger.info(f"⌛ 审核过期清理后台任务已启动（时限 {config.REVIEW_TIMEOUT_SECONDS} 秒）")
+
+    on_expired = None
+    if config.TELEGRAM_REVIEW_ENABLED:
+        from telegram_bot import telegram_bot
+        on_expired = telegram_bot.mark_expired_messages
+
+    while True:
+        try:
+            expired = await run_expiry_sweep(
+                config.REVIEW_TIMEOUT_SECONDS, config.EXPIRY_SWEEP_BATCH_SIZE, on_expired
+            )
+            if expired:
+                logger.info(f"⌛ {expired} 个请求超过审核时限，已标记为过期")
+            await asyncio.sleep(config.EXPIRY_SWEEP_INTERVAL)
+        except asyncio.CancelledError:
+            logger.info("审核过期清理任务已取消")
+            break
+        except Exception as e:
+            logger.error(f"审核过期清理出错: {str(e)}", exc_info=True)
+            await asyncio.sleep(60)
+
+
+async def retention_worker():
+    """后台任务：按 RETENTION_INTERVAL 定期归档超过保留期的审核记录"""
+    from retention import ReviewArchive
+
+    store = get_db()
+    if store.db_file is None:
+        logger.info(f"🗄️  {store.backend} 存储引擎不支持归档，跳过审核记录归档")
+        return
+
+    archive = ReviewArchive(store.db_file)
+    loop = asyncio.get_running_loop()
+    logger.info(f"🗄️  审核记录归档后台任务已启动（保留 {config.RETENTION_DAYS} 天）")
+
+    while True:
+        try:
+            # 归档和 VACUUM 都是阻塞的数据库操作，放到线程池中执行
+            result = await loop.run_in_executor(
+                None, archive.run, config.RETENTION_DAYS, config.RETENTION_BATCH_SIZE
+            )
+            metrics.REVIEW_ARCHIVED.inc(result["archived"])
+            if result["archived"] or result["pages_freed"]:
+                logger.info(
+                    f"🗄️  归档 {result['archived']} 个请求，清理 {result['groups_removed']} 个分组，"
+                    f"归还 {result['pages_freed']} 页，耗时 {result['elapsed']:.1f} 秒"
+                )
+            await asyncio.sleep(config.RETENTION_INTERVAL)
+        except asyncio.CancelledError:
+            logger.info("审核记录归档任务已取消")
+            break
+        except Exception as e:
+            logger.error(f"审核记录归档出错: {str(e)}", exc_info=True)
+            await asyncio.sleep(600)
+
+
+async def preheat_queue_worker():
+    """后台任务：按 PREHEAT_QUEUE_INTERVAL 定期按剩余配额提交预热队列"""
+    from preheat_scheduler import get_scheduler
+
+    scheduler = get_scheduler()
+    if scheduler is None:
+        logger.info("📤 预热队列不可用（未启用预热或存储引擎不支持），批准后直接提交预热")
+        return
+
+    logger.info(f"📤 预热队列后台任务已启动（每 {config.PREHEAT_QUEUE_INTERVAL} 秒检查一次）")
+
+    while True:
+        try:
+            stats = await scheduler.drain_once()
+            if stats["submitted"] or stats["failed"] or stats["purged"]:
+                logger.info(
+                    f"📤 预热队列: 提交 {stats['submitted']} 个，失败 {stats['failed']} 个，"
+                    f"刷新 {stats['purged']} 个，"
+                    f"剩余 {stats['depth']} 个，当日剩余配额 "
+                    + "，".join(f"{account} {left}" for account, left in scheduler.remaining_quota().items())
+                )
+            await asyncio.sleep(config.PREHEAT_QUEUE_INTERVAL)
+        except asyncio.CancelledError:
+            logger.info("预热队列任务已取消")
+            break
+        except Exception as e:
+            logger.error(f"预热队列出错: {str(e)}", exc_info=True)
+            await asyncio.sleep(60)
+
+
+async def retry_queue_worker():
+    """后台任务：按 CDN_RETRY_INTERVAL 定期重新提交因 CDN API 故障失败的 URL"""
+    from retry_queue import get_drainer
+
+    drainer = get_drainer()
+    if drainer is None:
+        logger.info("🔁 重试队列不可用（存储引擎不支持），CDN API 故障时直接提交失败的 URL 不会重试")
+        return
+
+    logger.info(f"🔁 重试队列后台任务已启动（每 {config.CDN_RETRY_INTERVAL} 秒检查一次）")
+
+    while True:
+        try:
+            stats = await drainer.drain_once()
+            if stats["submitted"] or stats["dropped"]:
+                logger.info(
+                    f"🔁 重试队列: 重新提交 {stats['submitted']} 个，放弃 {stats['dropped']} 个，"
+                    f"剩余 {stats['depth']} 个"
+                )
+            await asyncio.sleep(config.CDN_RETRY_INTERVAL)
+        except asyncio.CancelledError:
+            logger.info("重试队列任务已取消")
+            break
+        except Exception as e:
+            logger.error(f"重试队列出错: {str(e)}", exc_info=True)
+            await asyncio.sleep(60)
+
+
+async def purge_queue_worker():
+    """后台任务：没有预热队列时按 PREHEAT_QUEUE_INTERVAL 定期分批刷新被替换文件的缓存"""
+    from cache_purge import get_purge_drainer
+
+    # 检查 CDN API 是否可用时会创建服务商（腾讯云 SDK 导入较慢），放到线程池中执行
+    drainer = await asyncio.get_running_loop().run_in_executor(None, get_purge_drainer)
+    if drainer is None:
+        logger.info("🧹 刷新队列由预热队列处理（或 CDN API、存储引擎不可用），不单独启动刷新任务")
+        return
+
+    logger.info(f"🧹 刷新队列后台任务已启动（每 {config.PREHEAT_QUEUE_INTERVAL} 秒检查一次）")
+
+    while True:
+        try:
+            stats = await drainer.drain_once()
+            if stats["purged"]:
+                logger.info(
+                    f"🧹 刷新队列: 刷新 {stats['purged']} 个，重新预热 {stats['repreheated']} 个，"
+                    f"剩余 {stats['depth']} 个"
+                )
+            await asyncio.sleep(config.PREHEAT_QUEUE_INTERVAL)
+        except asyncio.CancelledError:
+            logger.info("刷新队列任务已取消")
+            break
+        except Exception as e:
+            logger.error(f"刷新队列出错: {str(e)}", exc_info=True)
+            await asyncio.sleep(60)
+
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Prometheus 指标端点"""
+    return Response(content=metrics.REGISTRY.render(), media_type=metrics.CONTENT_TYPE)
+
+
 @app.get("/")
 async def root():
-    """健康检查端点"""
+    """健康检查端点（数据库初始化失败时返回 503）"""
+    if warmup_state["error"]:
+        return JSONResponse(
+            status_code=503,
+            content={
+                "status": "error",
+                "ready": False,
+                "error": f"数据库初始化失败: {warmup_state['error']}",
+                "service": "Emby CDN Preheat Webhook",
+                "timestamp": datetime.now().isoformat()
+            }
+        )
     return {
         "status": "running",
+        "ready": warmup_state["ready"],
         "service": "Emby CDN Preheat Webhook",
         "timestamp": datetime.now().isoformat()
     }
 
 
+REVIEW_STATUSES = ("pending", "approved", "rejected", "expired")
+
+
+def require_store():
+    """
+    查询接口在数据库初始化完成前返回 503
+
+    升级大数据库时回填可能持续较长时间，直接访问存储会让事件循环阻塞在初始化锁上
+    """
+    if warmup_state["error"]:
+        raise HTTPException(status_code=503, detail=f"数据库初始化失败: {warmup_state['error']}")
+    if not store_ready():
+        raise HTTPException(status_code=503, detail="数据库正在初始化，请稍后重试",
+                            headers={"Retry-After": "5"})
+
+
+@app.get("/api/requests")
+async def list_review_requests(
+    status: str = "pending",
+    limit: int = 20,
+    cursor: Optional[int] = None,
+    direction: str = "next"
+):
+    """
+    分页获取审核请求（按创建时间倒序，键集分页）
+
+    翻页时把上一次返回的 next_cursor / prev_cursor 作为 cursor 传入，
+    并指定 direction 为 next / prev
+    """
+    if status not in REVIEW_STATUSES:
+        raise HTTPException(status_code=400, detail=f"无效的状态: {status}")
+    limit = max(1, min(limit, 100))
+    require_store()
+
+    try:
+        page = db.get_requests_page(status, limit=limit, cursor=cursor, direction=direction)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return {
+        "status": status,
+        "count": len(page["items"]),
+        **page
+    }
+
+
+@app.get("/api/search")
+async def search_review_requests(
+    q: str,
+    status: Optional[str] = None,
+    limit: int = 20,
+    offset: int = 0
+):
+    """
+    按媒体名称、Emby 路径和 CDN URL 搜索审核请求（全文索引，按相关度排序）
+
+    多个关键词以空格分隔，需要同时匹配；翻页时把返回的 next_offset 作为 offset 传入
+    """
+    if not q.strip():
+        raise HTTPException(status_code=400, detail="搜索关键词不能为空")
+    if status is not None and status not in REVIEW_STATUSES:
+        raise HTTPException(status_code=400, detail=f"无效的状态: {status}")
+    limit = max(1, min(limit, 100))
+    offset = max(0, offset)
+    require_store()
+
+    result = db.search_requests(q, status=status, limit=limit, offset=offset)
+    return {
+        "query": q,
+        "count": len(result["items"]),
+        **result
+    }
+
+
+@app.get("/api/export")
+async def export_review_requests(
+    format: str = "ndjson",
+    status: Optional[str] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    gzip: bool = False
+):
+    """
+    流式导出审核请求（NDJSON 或 CSV，可选 gzip），按 ID 分批读取，不占用大量内存
+
+    since / until 按创建时间过滤（UTC，含 since 不含 until），如 2026-01-01
+    """
+    from review_export import EXPORT_FORMATS, iter_export
+
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"无效的导出格式: {format}")
+    if status is not None and status not in REVIEW_STATUSES:
+        raise HTTPException(status_code=400, detail=f"无效的状态: {status}")
+    require_store()
+    store = get_db()
+    if store.db_file is None:
+        raise HTTPException(status_code=400, detail=f"{store.backend} 存储引擎不支持导出")
+
+    filename = f"review_requests.{format}" + (".gz" if gzip else "")
+    media_type = "application/gzip" if gzip else ("text/csv" if format == "csv" else "application/x-ndjson")
+    # 同步生成器由 Starlette 放到线程池中迭代，不阻塞事件循环
+    return StreamingResponse(
+        iter_export(store.db_file, format, status, since, until, compress=gzip),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+
+def capture_webhook_request(path: str, raw_body: bytes):
+    """
+    把原始 Webhook 请求追加到采集文件（JSON Lines），用于压测回放
+
+    Args:
+        path: 请求路径
+        raw_body: 原始请求体
+    """
+    try:
+        record = {
+            "captured_at": datetime.now().isoformat(),
+            "path": path,
+            "body": raw_body.decode('utf-8', errors='replace')
+        }
+        with open(config.WEBHOOK_CAPTURE_FILE, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    except Exception as e:
+        logger.warning(f"采集 Webhook 请求失败: {str(e)}")
+
+
 async def handle_emby_webhook(request: Request):
     """
     处理 Emby Webhook 事件的核心逻辑
@@ -449,6 +1009,9 @@ async def handle_emby_webhook(request: Request):
     # 先获取原始请求体，用于调试
     raw_body = await request.body()
 
+    if config.WEBHOOK_CAPTURE_FILE:
+        capture_webhook_request(request.url.path, raw_body)
+
     # 输出请求详细信息（开发调试用）
     logger.info("=" * 80)
     logger.info("收到 Webhook 请求")
@@ -462,8 +1025,10 @@ async def handle_emby_webhook(request: Request):
     try:
         # 解析 JSON 数据
         try:
-            data = json.loads(raw_body)
+            with metrics.WEBHOOK_PARSE_SECONDS.time():
+                data = json.loads(raw_body)
         except json.JSONDecodeError as e:
+            metrics.WEBHOOK_REQUESTS.labels(result="invalid").inc()
             logger.error(f"JSON 解析失败: {str(e)}")
             logger.error(f"无法解析的内容: {raw_body.decode('utf-8', errors='replace')[:500]}")
             raise HTTPException(
@@ -490,11 +1055,19 @@ async def handle_emby_webhook(request: Request):
             # 只处理视频文件（电影和剧集）
             item_type = item_data.get('Type', '')
             if item_type in ['Movie', 'Episode']:
-                # 处理媒体项目
-                result = process_media_item(item_data)
+                # 处理媒体项目；数据库仍在升级时放到线程池中等待初始化完成，事件循环不阻塞
+                if store_ready():
+                    result = process_media_item(item_data)
+                elif warmup_state["error"]:
+                    # 初始化已经失败，不在每个 Webhook 中重试
+                    require_store()
+                else:
+                    loop = asyncio.get_running_loop()
+                    result = await loop.run_in_executor(None, process_media_item, item_data)
 
                 # TODO: 这里将来会添加 CDN 预热逻辑
                 logger.info(f"媒体项目处理完成: {result['name']}")
+                metrics.WEBHOOK_REQUESTS.labels(result="processed").inc()
 
                 return JSONResponse(
                     status_code=200,
@@ -506,6 +1079,7 @@ async def handle_emby_webhook(request: Request):
                 )
             else:
                 logger.info(f"忽略非视频类型: {item_type}")
+                metrics.WEBHOOK_REQUESTS.labels(result="skipped").inc()
                 return JSONResponse(
                     status_code=200,
                     content={
@@ -515,6 +1089,7 @@ async def handle_emby_webhook(request: Request):
                 )
         else:
             logger.info(f"忽略事件类型: {event_type}")
+            metrics.WEBHOOK_REQUESTS.labels(result="skipped").inc()
             return JSONResponse(
                 status_code=200,
                 content={
@@ -527,27 +1102,42 @@ async def handle_emby_webhook(request: Request):
         raise
     except Exception as e:
         logger.error(f"处理 Webhook 时出错: {str(e)}", exc_info=True)
+        metrics.WEBHOOK_REQUESTS.labels(result="error").inc()
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.post("/webhook/emby")
 async def emby_webhook_legacy(request: Request):
     """接收 Emby Webhook 事件 - 传统路径"""
-    return await handle_emby_webhook(request)
+    with metrics.WEBHOOK_HANDLE_SECONDS.time():
+        return await handle_emby_webhook(request)
 
 
 @app.post("/emby")
 async def emby_webhook(request: Request):
     """接收 Emby Webhook 事件 - 简短路径"""
-    return await handle_emby_webhook(request)
+    with metrics.WEBHOOK_HANDLE_SECONDS.time():
+        return await handle_emby_webhook(request)
 
 
 if __name__ == "__main__":
+    import uvicorn
+
     # 启动服务
     logger.info("启动 Emby Webhook 服务...")
-    uvicorn.run(
-        app,
-        host="0.0.0.0",  # 监听所有网络接口
-        port=8899,        # 端口号，可以在配置文件中修改
-        log_level="info"
-    )
+    if config.SERVER_WORKERS > 1:
+        # 多进程模式必须以导入字符串的形式传入应用
+        uvicorn.run(
+            "webhook_server:app",
+            host=config.SERVER_HOST,
+            port=config.SERVER_PORT,
+            workers=config.SERVER_WORKERS,
+            log_level="info"
+        )
+    else:
+        uvicorn.run(
+            app,
+            host=config.SERVER_HOST,  # 默认监听所有网络接口
+            port=config.SERVER_PORT,  # 默认 8899
+            log_level="info"
+        )